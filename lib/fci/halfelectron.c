@@ -0,0 +1,227 @@
+#include <stdint.h>
+#include <stdlib.h>
+#include <string.h>
+#include <omp.h>
+#include "../fblas.h"
+
+/*
+    Half-electron FCI kernels: operators which change the number of electrons by one, applied
+    directly between the N- and N+-1-electron determinant spaces without padding the CI vectors
+    with a dummy orbital.
+
+    The CI vectors are row-major arrays of shape (nmajor, nminor), with the operator acting on
+    the major (row) strings. Operators acting on the minor strings are handled by the *_minor
+    kernels or, for the TDMs, by the caller transposing the CI vectors.
+
+    The "link" arrays are of shape (nstr, nlink, 3) and contain (p, addr, sgn) triples, such that
+    for each string J of the space of the first argument, op_p|J> = sgn |addr>, where op_p is
+    either a creation or a destruction operator on orbital p. The "linkE" arrays are pyscf
+    linkstr arrays of shape (nstr, nlinkE, 4) with (a, i, addr, sgn) meaning a'i|J> = sgn|addr>.
+*/
+
+void FCIhe_contract1h (double * hci, double * ci, double * h1,
+                       int nbra, int nminor, int nlink, int * link)
+{
+/* hci[J,:] += sum_p h1[p] <J|op'_p|I> ci[I,:], where link contains op_p|J> = sgn|I>. For the
+   action of a creation operator, link is the destruction link of the bra strings, and vice versa.
+
+   Input:
+        ci : array of shape (nket,nminor)
+        h1 : array of shape (norb)
+        link : array of shape (nbra,nlink,3)
+
+   Input/Output:
+        hci : array of shape (nbra,nminor)
+*/
+const int i_one = 1;
+#pragma omp parallel
+{
+    int p, Istr, l;
+    double fac;
+    int * mylink;
+    #pragma omp for schedule(static)
+    for (int J = 0; J < nbra; J++){
+        mylink = link + ((size_t) J)*nlink*3;
+        for (l = 0; l < nlink; l++){
+            p = mylink[3*l];
+            Istr = mylink[3*l+1];
+            fac = mylink[3*l+2] * h1[p];
+            daxpy_(&nminor, &fac, ci+((size_t) Istr)*nminor, &i_one,
+                   hci+((size_t) J)*nminor, &i_one);
+        }
+    }
+}
+}
+
+void FCIhe_contract1h_minor (double * hci, double * ci, double * h1,
+                             int nmajor, int nbra, int nket, int nlink, int * link)
+{
+/* Same as FCIhe_contract1h, but acting on the minor strings:
+   hci[:,J] += sum_p h1[p] <J|op'_p|I> ci[:,I]
+
+   Input:
+        ci : array of shape (nmajor,nket)
+        h1 : array of shape (norb)
+        link : array of shape (nbra,nlink,3)
+
+   Input/Output:
+        hci : array of shape (nmajor,nbra)
+*/
+#pragma omp parallel
+{
+    int J, l;
+    double * myci;
+    double * myhci;
+    int * mylink;
+    #pragma omp for schedule(static)
+    for (int a = 0; a < nmajor; a++){
+        myci = ci + ((size_t) a)*nket;
+        myhci = hci + ((size_t) a)*nbra;
+        for (J = 0; J < nbra; J++){
+            mylink = link + ((size_t) J)*nlink*3;
+            for (l = 0; l < nlink; l++){
+                myhci[J] += mylink[3*l+2] * h1[mylink[3*l]] * myci[mylink[3*l+1]];
+            }
+        }
+    }
+}
+}
+
+void FCIhe_tdm1h (double * tdm1h, double * bra, double * ket,
+                  int norb, int nbra, int nminor, int nlink, int * link)
+{
+/* tdm1h[p] = <bra|op'_p|ket>, where link contains op_p|J> = sgn|I> for the bra strings J.
+
+   Input:
+        bra : array of shape (nbra,nminor)
+        ket : array of shape (nket,nminor)
+        link : array of shape (nbra,nlink,3)
+
+   Output:
+        tdm1h : array of shape (norb)
+*/
+const int i_one = 1;
+for (int p = 0; p < norb; p++){ tdm1h[p] = 0; }
+#pragma omp parallel
+{
+    int l;
+    int * mylink;
+    double * mytdm = calloc (norb, sizeof(double));
+    #pragma omp for schedule(static)
+    for (int J = 0; J < nbra; J++){
+        mylink = link + ((size_t) J)*nlink*3;
+        for (l = 0; l < nlink; l++){
+            mytdm[mylink[3*l]] += mylink[3*l+2] * ddot_(&nminor,
+                bra+((size_t) J)*nminor, &i_one,
+                ket+((size_t) mylink[3*l+1])*nminor, &i_one);
+        }
+    }
+    #pragma omp critical
+    {
+        for (int p = 0; p < norb; p++){ tdm1h[p] += mytdm[p]; }
+    }
+    free (mytdm);
+}
+}
+
+void FCIhe_tdm3h_same (double * tdm3h, double * bra, double * ket,
+                       int norb, int nket, int nminor,
+                       int nlinkE, int * linkE, int nlink, int * link)
+{
+/* tdm3h[r,p,q] = <bra|r'p'q|ket>, with r, p and q all acting on the major strings
+
+   Input:
+        bra : array of shape (nbra,nminor)
+        ket : array of shape (nket,nminor)
+        linkE : pyscf linkstr array of shape (nket,nlinkE,4) for the ket strings
+        link : array of shape (nket,nlink,3); the creation link of the ket strings,
+            r'|I> = sgn|J>
+
+   Output:
+        tdm3h : array of shape (norb,norb,norb)
+*/
+const int i_one = 1;
+const size_t norb3 = ((size_t) norb)*norb*norb;
+for (size_t i = 0; i < norb3; i++){ tdm3h[i] = 0; }
+#pragma omp parallel
+{
+    int a, i, Istr, l, m, sgnE;
+    int * mylinkE;
+    int * mylink;
+    double * myket;
+    double * mytdm = calloc (norb3, sizeof(double));
+    #pragma omp for schedule(static)
+    for (int K = 0; K < nket; K++){
+        myket = ket + ((size_t) K)*nminor;
+        mylinkE = linkE + ((size_t) K)*nlinkE*4;
+        for (l = 0; l < nlinkE; l++){
+            a = mylinkE[4*l];
+            i = mylinkE[4*l+1];
+            Istr = mylinkE[4*l+2];
+            sgnE = mylinkE[4*l+3];
+            mylink = link + ((size_t) Istr)*nlink*3;
+            for (m = 0; m < nlink; m++){
+                mytdm[(mylink[3*m]*norb + a)*norb + i] += sgnE * mylink[3*m+2] * ddot_(&nminor,
+                    bra+((size_t) mylink[3*m+1])*nminor, &i_one, myket, &i_one);
+            }
+        }
+    }
+    #pragma omp critical
+    {
+        for (size_t i = 0; i < norb3; i++){ tdm3h[i] += mytdm[i]; }
+    }
+    free (mytdm);
+}
+}
+
+void FCIhe_tdm3h_opp (double * tdm3h, double * bra, double * ket,
+                      int norb, int nket, int nminor,
+                      int nlinkE, int * linkE, int nlink, int * link)
+{
+/* tdm3h[r,p,q] = <bra|r'p'q|ket>, with r acting on the major strings and p and q on the minor
+   strings
+
+   Input:
+        bra : array of shape (nbra,nminor)
+        ket : array of shape (nket,nminor)
+        linkE : pyscf linkstr array of shape (nminor,nlinkE,4) for the minor strings
+        link : array of shape (nket,nlink,3); the creation link of the ket strings,
+            r'|I> = sgn|J>
+
+   Output:
+        tdm3h : array of shape (norb,norb,norb)
+*/
+const size_t norb3 = ((size_t) norb)*norb*norb;
+for (size_t i = 0; i < norb3; i++){ tdm3h[i] = 0; }
+#pragma omp parallel
+{
+    int K, l, m;
+    int * mylinkE;
+    int * mylink;
+    double * myket;
+    double * mybra;
+    double fac;
+    double * mytdm = calloc (norb3, sizeof(double));
+    #pragma omp for schedule(static)
+    for (int Istr = 0; Istr < nket; Istr++){
+        myket = ket + ((size_t) Istr)*nminor;
+        mylink = link + ((size_t) Istr)*nlink*3;
+        for (m = 0; m < nlink; m++){
+            mybra = bra + ((size_t) mylink[3*m+1])*nminor;
+            for (K = 0; K < nminor; K++){
+                fac = mylink[3*m+2] * myket[K];
+                mylinkE = linkE + ((size_t) K)*nlinkE*4;
+                for (l = 0; l < nlinkE; l++){
+                    mytdm[(mylink[3*m]*norb + mylinkE[4*l])*norb + mylinkE[4*l+1]] += (
+                        fac * mylinkE[4*l+3] * mybra[mylinkE[4*l+2]]);
+                }
+            }
+        }
+    }
+    #pragma omp critical
+    {
+        for (size_t i = 0; i < norb3; i++){ tdm3h[i] += mytdm[i]; }
+    }
+    free (mytdm);
+}
+}
@@ -323,3 +323,113 @@ const long SDdest_size = nroots*4*ntdest;
     }
 }
 }
+
+void LASSIRDMdputSD2x (double * SDdest, double * SDsrc, double * wgt,
+                       long * dest_off, long * src_off, int npair,
+                       int ndest, int nsrc, int * pdest,
+                       int * SDdest_idx, int * SDsrc_idx, int * SDlen,
+                       int nidx)
+{
+/* Add weighted copies of a batch of contiguous source arrays to segmented elements of many
+   different RDM2s arrays, i.e., do the work of npair calls to LASSIRDMdputSD2 in one call.
+
+   Input:
+        SDsrc : array containing blocks of shape (4,nsrc*nsrc,nsrc*nsrc)
+        wgt : array of shape (npair); factors multiplying each source block
+        dest_off : array of shape (npair)
+            offsets to the beginnings of destination blocks in SDdest. Must not repeat.
+        src_off : array of shape (npair)
+            offsets to the beginnings of source blocks in SDsrc
+        pdest : array of shape (nsrc,nsrc)
+            Indices of all addressed elements in the second-minor dimension of SDdest blocks
+        SDdest_idx : array of shape (nidx)
+            beginnings of contiguous blocks in the minor dimension of SDdest blocks
+        SDsrc_idx : array of shape (nidx)
+            beginnings of contiguous blocks in the minor dimension of SDsrc blocks
+        SDlen : array of shape (nidx); lengths of contiguous blocks
+
+   Input/Output:
+        SDdest : array containing blocks of shape (4,ndest*ndest,ndest*ndest)
+            Elements of SDsrc corresponding to SDdest_idx are added
+*/
+const unsigned int i_one = 1;
+const int npdest = ndest*ndest;
+const int npsrc = nsrc*nsrc;
+const long ntdest = ((long) npdest)*npdest;
+const long ntsrc = ((long) npsrc)*npsrc;
+const long lspin = ((long) npsrc)*nidx;
+const long lpair = 4*lspin;
+const long nblk = lpair*npair;
+#pragma omp parallel
+{
+    int ipdest, ispin, iidx;
+    long ipair, j, sidx, didx;
+    #pragma omp for schedule(static)
+    for (long i = 0; i < nblk; i++){
+        ipair = i/lpair;
+        j = i%lpair;
+        ispin = j/lspin;
+        j = j%lspin;
+        ipdest = j/nidx;
+        iidx = j%nidx;
+        sidx = src_off[ipair] + ispin*ntsrc + ((long) ipdest*npsrc + SDsrc_idx[iidx]);
+        didx = dest_off[ipair] + ispin*ntdest + ((long) pdest[ipdest]*npdest + SDdest_idx[iidx]);
+        daxpy_(SDlen+iidx, wgt+ipair, SDsrc+sidx, &i_one, SDdest+didx, &i_one);
+    }
+}
+}
+
+void LASSIRDMzputSD2x (double complex * SDdest, double complex * SDsrc, double complex * wgt,
+                       long * dest_off, long * src_off, int npair,
+                       int ndest, int nsrc, int * pdest,
+                       int * SDdest_idx, int * SDsrc_idx, int * SDlen,
+                       int nidx)
+{
+/* Add weighted copies of a batch of contiguous source arrays to segmented elements of many
+   different RDM2s arrays, i.e., do the work of npair calls to LASSIRDMzputSD2 in one call.
+
+   Input:
+        SDsrc : array containing blocks of shape (4,nsrc*nsrc,nsrc*nsrc)
+        wgt : array of shape (npair); factors multiplying each source block
+        dest_off : array of shape (npair)
+            offsets to the beginnings of destination blocks in SDdest. Must not repeat.
+        src_off : array of shape (npair)
+            offsets to the beginnings of source blocks in SDsrc
+        pdest : array of shape (nsrc,nsrc)
+            Indices of all addressed elements in the second-minor dimension of SDdest blocks
+        SDdest_idx : array of shape (nidx)
+            beginnings of contiguous blocks in the minor dimension of SDdest blocks
+        SDsrc_idx : array of shape (nidx)
+            beginnings of contiguous blocks in the minor dimension of SDsrc blocks
+        SDlen : array of shape (nidx); lengths of contiguous blocks
+
+   Input/Output:
+        SDdest : array containing blocks of shape (4,ndest*ndest,ndest*ndest)
+            Elements of SDsrc corresponding to SDdest_idx are added
+*/
+const unsigned int i_one = 1;
+const int npdest = ndest*ndest;
+const int npsrc = nsrc*nsrc;
+const long ntdest = ((long) npdest)*npdest;
+const long ntsrc = ((long) npsrc)*npsrc;
+const long lspin = ((long) npsrc)*nidx;
+const long lpair = 4*lspin;
+const long nblk = lpair*npair;
+#pragma omp parallel
+{
+    int ipdest, ispin, iidx;
+    long ipair, j, sidx, didx;
+    #pragma omp for schedule(static)
+    for (long i = 0; i < nblk; i++){
+        ipair = i/lpair;
+        j = i%lpair;
+        ispin = j/lspin;
+        j = j%lspin;
+        ipdest = j/nidx;
+        iidx = j%nidx;
+        sidx = src_off[ipair] + ispin*ntsrc + ((long) ipdest*npsrc + SDsrc_idx[iidx]);
+        didx = dest_off[ipair] + ispin*ntdest + ((long) pdest[ipdest]*npdest + SDdest_idx[iidx]);
+        zaxpy_(SDlen+iidx, wgt+ipair, SDsrc+sidx, &i_one, SDdest+didx, &i_one);
+    }
+}
+}
@@ -447,8 +447,8 @@ void SINT_SDCDERI_MO_LVEC (double * dense_cderi, double * mo_coeff, double * cde
         sv_thresh : threshold at which to discard singular values
 
     Input/output:
-        wrk : array of shape (nthreads*(lwork+global_K+nent_max[global_K*nmo*naux]); used to store intermediates
-            where lwork and global_K are defined below
+        wrk : array of shape (nthreads*(lwork+global_K+nent_max*(global_K+naux+nmo)+global_K*nmo)); used to store
+            intermediates, where lwork and global_K are defined below
 
     Output:
         cderi_out : array of shape (nao, naux, global_K); contains the CDERI array with one AO index transformed
@@ -458,26 +458,23 @@ void SINT_SDCDERI_MO_LVEC (double * dense_cderi, double * mo_coeff, double * cde
     const char svdjob = 'S';
     const char trans = 'T';
     const char notrans = 'N';
+    const double d_zero = 0.0;
     const double d_one = 1.0;
-    const unsigned int global_K = MIN(nent_max,nmo);
-    const unsigned int lwork = (4*global_K*global_K) + (7*global_K);
-    const unsigned int npair = nao * (nao + 1) / 2;
-    const unsigned int i_one = 1;
-    const unsigned int lfullwrk = lwork + global_K + nent_max*(global_K+naux+nmo);
+    const int global_K = MIN(nent_max,nmo);
+    const int lwork = (4*global_K*global_K) + (7*global_K) + nent_max + nmo;
+    const int npair = nao * (nao + 1) / 2;
+    const int i_one = 1;
+    const int lfullwrk = lwork + global_K + nent_max*(global_K+naux+nmo) + global_K*nmo;
 
 #pragma omp parallel default(shared)
 {
 
-    unsigned int nthreads = omp_get_num_threads ();
-    unsigned int ithread = omp_get_thread_num ();
-    unsigned int iao_ix, iao, jao_ix, jao; // AO indices
-    unsigned int nsv_p, nsv_n, nsv_nn, nsv;
-    unsigned int my_k;
-    unsigned int my_info;
-    unsigned int uint_wrk;
-    unsigned int my_nent;
+    int ithread = omp_get_thread_num ();
+    int iao_ix, iao, jao_ix, jao, isv; // AO and singular-vector indices
+    int my_nent, my_k, nsv;
+    int my_info;
     double * ptr_wrk;
-    double * my_vt;
+    double * my_out;
     int * my_entlist;
     // Partition out the wrk array
     double * my_svdwork = wrk + ithread*lfullwrk;
@@ -485,6 +482,7 @@ void SINT_SDCDERI_MO_LVEC (double * dense_cderi, double * mo_coeff, double * cde
     double * my_singval = my_mo + nent_max*nmo;
     double * my_u = my_singval + global_K;
     double * my_cderi = my_u + global_K*nent_max;
+    double * my_vt = my_cderi + nent_max*naux;
     // Integer array allocation
     int * iwork = malloc (8 * global_K * sizeof(int));
 
@@ -494,49 +492,39 @@ void SINT_SDCDERI_MO_LVEC (double * dense_cderi, double * mo_coeff, double * cde
         iao = iao_sort[iao_ix];
         my_nent = iao_nent[iao];
         my_entlist = iao_entlist + (iao*nent_max);
-        my_vt = mo_out + (iao * nent_max * nmo);
+        imo_nent[iao] = 0;
+        if (my_nent == 0){ continue; }
+        // Gather the rows of mo_coeff and the columns of dense_cderi of the coupled AOs into column-major
+        // arrays of shape (my_nent, nmo) and (my_nent, naux)
         for (jao_ix = 0; jao_ix < my_nent; jao_ix++){
             jao = my_entlist[jao_ix];
-            dcopy_(&nmo, &mo_coeff[jao], &i_one, &my_mo[jao_ix], &my_nent);
-            // The source has AO index slower-moving; the dest has AO index faster-moving! Row- to col-major order, but it's the same shape!
+            dcopy_(&nmo, mo_coeff + (jao*nmo), &i_one, my_mo + jao_ix, &my_nent);
             if (iao > jao){ 
                 ptr_wrk = dense_cderi + ((iao * (iao + 1) / 2) + jao);
             } else {
                 ptr_wrk = dense_cderi + ((jao * (jao + 1) / 2) + iao);
             }
-            dcopy_(&naux, ptr_wrk, &npair, &my_cderi[jao_ix], &my_nent);
+            dcopy_(&naux, ptr_wrk, &npair, my_cderi + jao_ix, &my_nent);
         }
         my_k = MIN (my_nent, nmo);
         dgesdd_(&svdjob, &my_nent, &nmo, my_mo, &my_nent, my_singval, my_u, &my_nent, my_vt, &my_k,
             my_svdwork, &lwork, iwork, &my_info);
         if (my_info != 0){ printf ("SVD return value = %d", my_info); }
         assert (my_info == 0);
-        // Compress away zero singular values.  Singvals can be negative unfortunately because of mo gauge invariance
-        nsv_p = 0; nsv_n = my_k;
-        for (jao_ix = 0; jao_ix < my_k; jao_ix++){
-            if (my_singval[jao_ix] < -sv_thresh){ break; }
-            else { nsv_n--; }
-            if (my_singval[jao_ix] > sv_thresh){ nsv_p++; }
-        }
-        nsv_nn = my_k - nsv_n;
-        dcopy_(&nsv_n, &my_singval[nsv_nn], &i_one, &my_singval[nsv_p], &i_one);
-        uint_wrk = my_nent * nsv_n;
-        dcopy_(&uint_wrk, &my_u[nsv_nn*my_nent], &i_one, &my_u[nsv_p*my_nent], &i_one);
-        ptr_wrk = my_vt + nsv_p;
-        for (jao_ix = 0; jao_ix < my_k; jao_ix++){ // This one's tricky because I'm compressing away the faster-moving index
-            uint_wrk = nsv_n + nsv_p;
-            dcopy_(&uint_wrk, &my_vt[(jao_ix*my_k)+nsv_nn], &i_one, ptr_wrk, &i_one);
-            ptr_wrk += uint_wrk;
-        }
-        // Scale by singular value! Do it on the right because the right has singvec index faster-moving!
-        imo_nent[iao] = nsv_nn;
-        for (jao_ix = 0; jao_ix < nsv_nn; jao_ix++){
-            dscal_(&nmo, &my_singval[jao_ix], &my_vt[jao_ix], &nmo);
+        // Singular values are nonnegative and in descending order; discard the small ones
+        for (nsv = 0; nsv < my_k; nsv++){ if (my_singval[nsv] <= sv_thresh){ break; } }
+        imo_nent[iao] = nsv;
+        if (nsv == 0){ continue; }
+        // Right-singular vectors times singular values, in row-major order with shape (nsv, nmo)
+        my_out = mo_out + (iao * nent_max * nmo);
+        for (isv = 0; isv < nsv; isv++){
+            dcopy_(&nmo, my_vt + isv, &my_k, my_out + (isv*nmo), &i_one);
+            dscal_(&nmo, my_singval + isv, my_out + (isv*nmo), &i_one);
         }
-        // Finally, matrix-multiply
-        dgemm_(&trans, &notrans, imo_nent + iao, &naux, &my_nent,
+        // Left-singular vectors times CDERI, in column-major order with shape (global_K, naux)
+        dgemm_(&trans, &notrans, &nsv, &naux, &my_nent,
             &d_one, my_u, &my_nent, my_cderi, &my_nent,
-            &d_one, &cderi_out[iao*global_K*naux], &global_K);
+            &d_zero, cderi_out + (iao*global_K*naux), &global_K);
     }
     free (iwork);
 
@@ -562,28 +550,26 @@ void SINT_SDCDERI_DDMAT_MOSVD (double * cderi_mo, double * mo_rvecs, double * vk
     */
     const char trans = 'T';
     const char notrans = 'N';
+    const double d_zero = 0.0;
     const double d_one = 1.0;
-    const unsigned int i_one = 1;
-    const unsigned int npair = nao * (nao + 1) / 2;
-    const unsigned int lfullwork = global_K*(global_K+naux);
-    const unsigned int global_K_naux = global_K * naux;
-    const unsigned int nent_max_nmo = nent_max * nmo;
+    const int i_one = 1;
+    const int npair = nao * (nao + 1) / 2;
+    const int lfullwork = global_K*(global_K+naux);
+    const int global_K_naux = global_K * naux;
+    const int nent_max_nmo = nent_max * nmo;
 
 #pragma omp parallel default(shared)
 {
 
-    unsigned int nthreads = omp_get_num_threads ();
-    unsigned int ithread = omp_get_thread_num ();
-    unsigned int ipair, iao, jao, kao, lao; // AO indices
-    unsigned int iao_nent, jao_nent, kao_nent, lao_nent;
-    unsigned int uint_wrk;
-    double * ptr_wrk;
-    double * my_vt;
-    int * my_entlist;
-    double * kao_rvecs;
-    double * lao_rvecs;
-    double * kao_cderi;
-    double * lao_cderi;
+    int ithread = omp_get_thread_num ();
+    int ipair, iao, jao, iaux; // AO and auxbasis indices
+    int iao_nent, jao_nent;
+    int uint_wrk;
+    double * iao_rvecs;
+    double * jao_rvecs;
+    double * iao_cderi;
+    double * jao_cderi;
+    double my_vk;
     // Partition out the wrk array
     double * dm = wrk + ithread*lfullwork;
     double * vdm = dm + global_K*global_K;
@@ -591,42 +577,39 @@ void SINT_SDCDERI_DDMAT_MOSVD (double * cderi_mo, double * mo_rvecs, double * vk
 #pragma omp for schedule(dynamic) 
 
     for (ipair = 0; ipair < npair; ipair++){
+        // Lower-triangular pair index -> iao >= jao
         uint_wrk = 0;
         iao = 0;
-        jao = 0;
-        while (uint_wrk + iao + 1 < ipair){
+        while (uint_wrk + iao + 1 <= ipair){
             iao++;
             uint_wrk += iao;
         }
         jao = ipair - uint_wrk;
         iao_nent = imo_nent[iao];
         jao_nent = imo_nent[jao];
-        // Put longer-range index at faster-moving position
-        if (iao_nent > jao_nent){
-            kao = iao; kao_nent = iao_nent;
-            lao = jao; lao_nent = jao_nent;
-        } else {
-            kao = jao; kao_nent = jao_nent;
-            lao = iao; lao_nent = iao_nent;
+        my_vk = 0.0;
+        if (iao_nent > 0 && jao_nent > 0){
+            iao_rvecs = mo_rvecs + (iao * nent_max_nmo);
+            jao_rvecs = mo_rvecs + (jao * nent_max_nmo);
+            iao_cderi = cderi_mo + (iao * global_K_naux);
+            jao_cderi = cderi_mo + (jao * global_K_naux);
+            // Make density matrix of shape (iao_nent, jao_nent)
+            dgemm_(&trans, &notrans, &iao_nent, &jao_nent, &nmo,
+                &d_one, iao_rvecs, &nmo, jao_rvecs, &nmo,
+                &d_zero, dm, &iao_nent);
+            // Contract density matrix with first CDERI factor -> shape (jao_nent, naux)
+            dgemm_(&trans, &notrans, &jao_nent, &naux, &iao_nent,
+                &d_one, dm, &iao_nent, iao_cderi, &global_K,
+                &d_zero, vdm, &jao_nent);
+            // Final contraction
+            for (iaux = 0; iaux < naux; iaux++){
+                my_vk += ddot_(&jao_nent, vdm + (iaux*jao_nent), &i_one,
+                               jao_cderi + (iaux*global_K), &i_one);
+            }
         }
-        kao_rvecs = mo_rvecs + (kao * nent_max_nmo);
-        lao_rvecs = mo_rvecs + (lao * nent_max_nmo);
-        kao_cderi = cderi_mo + (kao * global_K_naux);
-        lao_cderi = cderi_mo + (lao * global_K_naux);
-        // Make density matrix
-        dgemm_(&trans, &notrans, &kao_nent, &lao_nent, &nmo,
-            &d_one, kao_rvecs, &nmo, lao_rvecs, &nmo,
-            &d_one, dm, &kao_nent);
-        // Contract density matrix with first CDERI factor
-        dgemm_(&trans, &notrans, &naux, &lao_nent, &kao_nent,
-            &d_one, kao_cderi, &kao_nent, dm, &kao_nent,
-            &d_one, vdm, &naux);
-        // Final contraction
-        uint_wrk = lao_nent * naux;
-        vk[(iao*nao)+jao] = ddot_(&uint_wrk, vdm, &i_one, lao_cderi, &i_one);
-        vk[(jao*nao)+iao] = vk[(iao*nao)+jao];
+        vk[(iao*nao)+jao] = my_vk;
+        vk[(jao*nao)+iao] = my_vk;
     }
 
 }
 }
-
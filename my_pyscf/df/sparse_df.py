@@ -53,7 +53,7 @@ class sparsedf_array (np.ndarray):
         return sparsedf_array (np.asfortranarray (self), nmo=self.nmo)
 
     def naux_slow (self): # Since naux is always the first index, this corresponds to making the array C-contiguous
-        return sparsedf_array (np.ascontiguousnarray (self), nmo=self.nmo)
+        return sparsedf_array (np.ascontiguousarray (self), nmo=self.nmo)
 
     def get_sparsity_ (self, thresh=1e-8):
         metric = linalg.norm (self, axis=0)
@@ -78,7 +78,7 @@ class sparsedf_array (np.ndarray):
         Returns:
             vPuv : np.ndarray of shape (nao, nmo, naux) stored in row-major order
         '''
-        if self.ndim == 3: return self.pack_mo ()
+        if self.ndim == 3: self = self.pack_mo ()
         if not self.flags['C_CONTIGUOUS']: self = self.naux_slow ()
         cmat = np.ascontiguousarray (cmat)
         nao = self.nmo[0]
@@ -109,7 +109,7 @@ class sparsedf_array (np.ndarray):
         Returns:
             vk : np.ndarray of shape (nao, nao)
         '''
-        if self.ndim == 3: return self.pack_mo ()
+        if self.ndim == 3: self = self.pack_mo ()
         if not self.flags['F_CONTIGUOUS']: self = self.naux_fast ()
         if self.nent_max is None: self.get_sparsity_ ()
         nao = self.nmo[0]
@@ -129,20 +129,82 @@ class sparsedf_array (np.ndarray):
         vk[np.diag_indices (nao)] /= 2
         return vk
 
-    def vk_svd (self, mo_coeff, mo_occ, thresh=1e-8):
-        t0, w0 = lib.logger.process_clock (), lib.logger.perf_counter ()
-        if self.ndim == 3: return self.pack_mo ()
+    def get_jk (self, dm, hermi=1, with_j=True, with_k=True, eig_thresh=1e-8):
+        ''' Coulomb and exchange matrices of symmetric density matrices. The exchange matrix is
+        built with contract1 from the low-rank factors of the density matrix,
+        dm = X+ X+^T - X- X-^T, discarding eigenvalues of dm smaller than eig_thresh in magnitude.
+        The AO-pair screening of self is that of the last call to get_sparsity_.
+
+        vk_svd is not used here, even for density matrices with nonnegative occupations. It gives
+        the same exchange matrix but is 10-15 times slower than contract1 for H chains of 10-160
+        atoms (tests/lasscf/bench_sparse_df.py).
+
+        Args:
+            dm : np.ndarray of shape (nao, nao) or (ndm, nao, nao)
+
+        Kwargs:
+            hermi : integer
+                Must be 1 (dm is symmetric)
+            with_j : logical
+                Whether to compute vj
+            with_k : logical
+                Whether to compute vk
+            eig_thresh : float
+                Eigenvalues of dm with magnitude below this are discarded in computing vk
+
+        Returns:
+            vj : np.ndarray of the same shape as dm, or None if not with_j
+            vk : np.ndarray of the same shape as dm, or None if not with_k
+        '''
+        assert (hermi == 1), 'sparse DF exchange requires symmetric density matrices'
+        if self.ndim == 3: self = self.pack_mo ()
+        if self.nent_max is None: self.get_sparsity_ ()
+        dm = np.asarray (dm)
+        dm_shape = dm.shape
+        dms = dm.reshape (-1, dm_shape[-2], dm_shape[-1])
+        vj = vk = None
+        if with_j:
+            dm_tril = dms + dms.transpose (0,2,1)
+            for d in dm_tril: d[np.diag_indices (d.shape[0])] /= 2
+            rho = np.dot (lib.pack_tril (dm_tril), np.asarray (self).T)
+            vj = lib.unpack_tril (np.dot (rho, np.asarray (self))).reshape (dm_shape)
+        if with_k:
+            vk = np.zeros_like (dms)
+            for v, d in zip (vk, dms):
+                evals, evecs = linalg.eigh (d)
+                for sgn, idx in ((1, evals > eig_thresh), (-1, evals < -eig_thresh)):
+                    if not np.count_nonzero (idx): continue
+                    x = evecs[:,idx] * np.sqrt (np.abs (evals[idx]))[None,:]
+                    vPux = self.contract1 (x)
+                    v += sgn * np.tensordot (vPux, vPux, axes=((1,2),(1,2)))
+            vk = vk.reshape (dm_shape)
+        return vj, vk
+
+    def vk_svd (self, mo_coeff, mo_occ, thresh=1e-8, verbose=lib.logger.NOTE):
+        ''' Exchange matrix of the density matrix (mo_coeff * mo_occ) @ mo_coeff.T, from the SVDs
+        of the rows of mo_coeff coupled to each AO by the CDERI array. Singular values smaller than
+        thresh are discarded. mo_occ must be nonnegative.
+
+        Returns:
+            vk : np.ndarray of shape (nao, nao)
+        '''
+        assert (np.all (mo_occ > -1e-8)), 'vk_svd requires nonnegative occupation numbers'
+        log = lib.logger.new_logger (None, verbose)
+        t0 = (lib.logger.process_clock (), lib.logger.perf_counter ())
+        if self.ndim == 3: self = self.pack_mo ()
         if not self.flags['C_CONTIGUOUS']: self = self.naux_slow ()
+        if self.nent_max is None: self.get_sparsity_ ()
         nao = self.nmo[0]
         idx = np.abs (mo_occ) > 1e-8
         nmo = np.count_nonzero (idx)
         global_K = min (self.nent_max, nmo)
-        mo = mo_coeff[:,idx] * np.sqrt (mo_occ[idx])[None,:]
+        mo = np.ascontiguousarray (mo_coeff[:,idx] * np.sqrt (mo_occ[idx])[None,:])
         cderi_lvec = np.zeros ((nao, self.naux, global_K), dtype=self.dtype)
         mo_lvec = np.zeros ((nao, self.nent_max, nmo), dtype=self.dtype)
         imo_nent = np.zeros_like (self.iao_nent)
-        lwrk = (4*global_K*global_K) + (8*global_K) + self.nent_max * (global_K + self.naux + nmo)
-        lwrk = max (lwrk, self.nent_max * (self.nent_max + nmo))
+        lwrk = (4*global_K*global_K) + (8*global_K) + self.nent_max + nmo
+        lwrk += self.nent_max * (global_K + self.naux + nmo) + global_K*nmo
+        lwrk = max (lwrk, global_K * (global_K + self.naux))
         lwrk *= lib.num_threads ()
         wrk = np.zeros (lwrk, dtype=self.dtype)
         libsint.SINT_SDCDERI_MO_LVEC (self.ctypes.data_as (ctypes.c_void_p),
@@ -157,9 +219,7 @@ class sparsedf_array (np.ndarray):
             imo_nent.ctypes.data_as (ctypes.c_void_p),
             ctypes.c_int (nao), ctypes.c_int (self.naux),
             ctypes.c_int (nmo), ctypes.c_int (self.nent_max))
-        print ("First C function time: {} clock ; {} wall".format (lib.logger.process_clock () - t0, lib.logger.perf_counter () - w0))
-        t0, w0 = lib.logger.process_clock (), lib.logger.perf_counter ()
-        wrk[:self.nent_max*(self.nent_max+nmo)] = 0.0
+        t0 = log.timer_debug1 ('vk_svd SINT_SDCDERI_MO_LVEC', *t0)
         vk = np.zeros ((nao, nao), dtype=mo_coeff.dtype)
         libsint.SINT_SDCDERI_DDMAT_MOSVD (cderi_lvec.ctypes.data_as (ctypes.c_void_p),
             mo_lvec.ctypes.data_as (ctypes.c_void_p),
@@ -169,7 +229,7 @@ class sparsedf_array (np.ndarray):
             ctypes.c_int (nao), ctypes.c_int (nmo),
             ctypes.c_int (self.naux), ctypes.c_int (self.nent_max),
             ctypes.c_int (global_K))
-        print ("Second C function time: {} clock ; {} wall".format (lib.logger.process_clock () - t0, lib.logger.perf_counter () - w0))
+        log.timer_debug1 ('vk_svd SINT_SDCDERI_DDMAT_MOSVD', *t0)
         return vk
 
 
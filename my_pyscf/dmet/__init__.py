@@ -2,7 +2,7 @@ import numpy as np
 from functools import reduce
 from pyscf import gto, scf, dft, lo, lib, mcscf
 from pyscf.csf_fci import csf_solver
-from mrh.my_pyscf.dmet._dmet import _DMET 
+from mrh.my_pyscf.dmet._dmet import _DMET, run_multi_dmet
 
 # Author: Bhavnesh Jangid <jangidbhavnesh@uchicago.edu>
 
@@ -66,7 +66,44 @@ def _get_dmet_fragment(mf, lo_method='meta_lowdin', bath_tol=1e-6, density_fit=T
 
     return get_fragment_mf(mf, lo_method, bath_tol, density_fit, atmlst, atmlabel, verbose, **kwargs)
 
+def _get_dmet_fragments(mf, atmlsts, lo_method='meta_lowdin', bath_tol=1e-6, density_fit=True,
+                        max_workers=1, verbose=None, **kwargs):
+    '''
+    Get the DMET Mean Field objects of several fragments of the same molecule, sharing the
+    localization and the AO-level integrals and solving the fragments concurrently
+    Args:
+        mf : SCF object
+            SCF object for the molecule
+        atmlsts : list of lists
+            List of atom indices of each fragment
+        lo_method : str
+            Localization method
+        bath_tol : float
+            Bath tolerance
+        max_workers : int
+            Number of fragments solved concurrently in separate threads (default: 1)
+        verbose : int
+            Print level
+    Returns:
+        dmet_mfs : list of SCF objects
+            DMET mean-field object of each fragment
+        mydmets : list of _DMET objects
+            DMET object of each fragment
+    '''
+    if isinstance(mf, dft.rks.KohnShamDFT) or isinstance(mf, scf.uhf.UHF):
+        mf = mf.to_rhf()
+    elif hasattr(mf, 'kpts'):
+        raise NotImplementedError("Use pDMET code")
+
+    dmet_mfs, mydmets = run_multi_dmet(mf, atmlsts, lo_method=lo_method, bath_tol=bath_tol,
+                                       density_fit=density_fit, max_workers=max_workers,
+                                       verbose=verbose, **kwargs)
+    for mydmet, dmet_mf in zip(mydmets, dmet_mfs):
+        _energy_contribution(mydmet, dmet_mf, mf.verbose)
+    return dmet_mfs, mydmets
+
 runDMET = _get_dmet_fragment
+runMultiDMET = _get_dmet_fragments
 if __name__ == '__main__':
     mol = gto.Mole(basis='6-31G', spin=1, charge=0, verbose=4, max_memory = 10000)
     mol.atom='''
@@ -1,9 +1,11 @@
+import h5py
 import numpy as np
 import scipy
 from pyscf import gto, ao2mo, lib, scf
 from mrh.my_pyscf.dmet.localization import Localization
 from mrh.my_pyscf.dmet.fragmentation import Fragmentation
 from mrh.my_pyscf.dmet.basistransformation import BasisTransform
+from mrh.my_pyscf.lib.parallel import map_threaded
 
 # Author: Bhavnesh Jangid <jangidbhavnesh@uchicago.edu>
 
@@ -358,7 +360,7 @@ class _DMET:
 
         if hasattr(mf, 'with_df') and mf.with_df is not None and self.density_fit:
             mftemp = scf.ROHF(self.mol).density_fit()
-            mftemp.with_df._cderi = eri
+            _set_cderi_(mftemp.with_df, eri)
             j, k = mftemp.with_df.get_jk(dm=dm, hermi=1)
             del mftemp
         else:
@@ -381,6 +383,33 @@ class _DMET:
         '''
         Get the DMET mean-field object
         '''
+        eri, fock, dm_guess, nelecs, core_energy = self._get_dmet_mf_args()
+        emb_mf = self._make_dmet_mf(eri, fock, nelecs, core_energy)
+        emb_mf.kernel(dm_guess)
+
+        assert emb_mf.converged, 'DMET mean-field did not converge'
+
+        return emb_mf
+
+    def _get_dmet_mf_args(self, eri=None):
+        '''
+        Get the embedded integrals and the guess density matrix
+        args:
+            eri: np.array
+                precomputed cderi or eri in the embedding basis (optional). The cderi may also
+                be given as a tuple (filename, dataname) locating them in an HDF5 file.
+        returns:
+            eri: np.array
+                cderi (naux, neo*(neo+1)//2) or eri (s8) in the embedding basis
+            fock: np.array (neo,neo)
+                one-electron Hamiltonian of the embedding space
+            dm_guess: np.array (neo,neo) or (2,neo,neo)
+                mean-field 1RDM in the embedding basis
+            nelecs: float
+                number of electrons in the embedding space
+            core_energy: float
+                core energy
+        '''
         mf = self.mf
         neo = self.ao2eo.shape[1]
         s = mf.get_ovlp()
@@ -390,10 +419,11 @@ class _DMET:
 
         basistransf = BasisTransform(mf, ao2eo, ao2co)
 
-        if hasattr(mf, 'with_df') and mf.with_df is not None and self.density_fit:
-            eri = basistransf._get_cderi_transformed(ao2eo)
-        else:
-            eri = ao2mo.restore(8, basistransf._get_eri_transformed(ao2eo=ao2eo), neo)
+        if eri is None:
+            if hasattr(mf, 'with_df') and mf.with_df is not None and self.density_fit:
+                eri = basistransf._get_cderi_transformed(ao2eo)
+            else:
+                eri = ao2mo.restore(8, basistransf._get_eri_transformed(ao2eo=ao2eo), neo)
         
         fock = basistransf._get_fock_transformed()
        
@@ -410,18 +440,26 @@ class _DMET:
             veff = self.get_veff(eri, dm_guess)
             nelecs = np.trace(dm_guess)
             fock -= veff
-        
+
+        # Core energy contribution
+        core_energy = self._get_core_contribution(ao2eo=ao2eo, ao2co=ao2co)
+        return eri, fock, dm_guess, nelecs, core_energy
+
+    def _make_dmet_mf(self, eri, fock, nelecs, core_energy):
+        '''
+        Build (but don't run) the DMET mean-field object from the output of _get_dmet_mf_args
+        '''
+        mf = self.mf
+        neo = self.ao2eo.shape[1]
+
         emb_mol = self._dummy_mol()
         emb_mol.nelectron = round(nelecs)
         emb_mol.max_memory = mf.mol.max_memory
         emb_mol.build()
 
-        # Core energy contribution
-        core_energy = self._get_core_contribution(ao2eo=ao2eo, ao2co=ao2co)
-
         if hasattr(mf, 'with_df') and mf.with_df is not None and self.density_fit:
             emb_mf = scf.ROHF(emb_mol).density_fit()
-            emb_mf.with_df._cderi = eri
+            _set_cderi_(emb_mf.with_df, eri)
         else:
             emb_mf = scf.ROHF(emb_mol)
             emb_mf._eri = eri
@@ -431,10 +469,6 @@ class _DMET:
         emb_mf.conv_tol = 1e-10
         emb_mf.max_cycle = 100
         emb_mf.energy_nuc = lambda *args: core_energy
-        emb_mf.kernel(dm_guess)
-
-        assert emb_mf.converged, 'DMET mean-field did not converge'
-
         return emb_mf
 
     def runDMET(self):
@@ -605,3 +639,98 @@ class _DMET:
     def kernel(self):
         dmet_mf = self.runDMET()
         return dmet_mf
+
+
+# Multi-fragment driver. The fragments share the localization and the AO-level integrals, and
+# with density fitting all of their embedded cderi are made in a single pass over the DF blocks
+# and stored on disk. The rest of runDMET is done concurrently for the different fragments in a
+# thread pool; the fragments only read mf (including its DF tensor or _eri).
+
+def _set_cderi_(with_df, eri):
+    '''Point with_df at the cderi eri, which is either an array or a tuple (filename, dataname)
+    locating them in an HDF5 file'''
+    if isinstance(eri, tuple):
+        with_df._cderi, with_df._dataname = eri
+    else:
+        with_df._cderi = eri
+
+def _run_fragment_subspace(mydmet):
+    mydmet.do_fragmentation_()
+    mydmet.generate_impurity_subspace_()
+    mydmet.get_imp_nelecs()
+    mydmet.get_core_elecs()
+    return mydmet.ao2eo
+
+def _run_fragment(mydmet, cderi=None):
+    '''
+    Everything in runDMET that comes after the localization, for one fragment, returning the
+    embedded mean-field object. If cderi is provided, the impurity subspace of mydmet has
+    already been generated, and cderi is a tuple (filename, dataname) locating the embedded
+    cderi, which are read from disk as they are needed.
+    '''
+    if cderi is None:
+        _run_fragment_subspace(mydmet)
+    eri, fock, dm_guess, nelecs, core_energy = mydmet._get_dmet_mf_args(eri=cderi)
+    emb_mf = mydmet._make_dmet_mf(eri, fock, nelecs, core_energy)
+    emb_mf.kernel(dm_guess)
+    assert emb_mf.converged, 'DMET mean-field did not converge'
+    return emb_mf
+
+def run_multi_dmet(mf, atmlsts, lo_method='meta_lowdin', bath_tol=1e-6, density_fit=True,
+                   max_workers=1, **kwargs):
+    '''
+    Run DMET for several fragments of the same molecule
+    Args:
+        mf : SCF object
+            SCF object for the molecule
+        atmlsts : list of lists
+            List of atom indices of each fragment
+        lo_method : str
+            Localization method
+        bath_tol : float
+            Bath tolerance
+        density_fit: boolean
+            DF option for the embedded part. The embedded cderi of all fragments are made in a
+            single pass over the DF blocks and kept in a temporary HDF5 file, which the DF
+            objects of the returned mean-field objects read from.
+        max_workers: int
+            Number of fragments to solve concurrently, each in its own thread with
+            lib.num_threads()//max_workers OpenMP threads. Defaults to 1, in which case the
+            fragments are solved one after the other in this thread.
+    Returns:
+        dmet_mfs : list of SCF objects
+            DMET mean-field object of each fragment
+        mydmets : list of _DMET objects
+            DMET object of each fragment
+    '''
+    mydmets = [_DMET(mf, lo_method=lo_method, bath_tol=bath_tol, atmlst=atmlst,
+                     density_fit=density_fit, **kwargs) for atmlst in atmlsts]
+    nfrags = len(mydmets)
+
+    # Shared parts: the localization and the AO-level integrals
+    mydmets[0].do_localization_()
+    for mydmet in mydmets[1:]:
+        mydmet.ao2lo = mydmets[0].ao2lo
+        mydmet.loc_rdm1 = mydmets[0].loc_rdm1
+    use_df = getattr(mf, 'with_df', None) is not None and density_fit
+    if use_df and getattr(mf.with_df, '_cderi', None) is None:
+        mf.with_df.build()
+
+    cderis = [None,] * nfrags
+    erifile = None
+    if use_df:
+        # The impurity subspaces are needed first to make all the cderi in one pass
+        ao2eos = map_threaded(_run_fragment_subspace, [(mydmet,) for mydmet in mydmets],
+                              max_workers=max_workers)
+        # Deleted when erifile is released, like DF._cderi_to_save
+        erifile = lib.NamedTemporaryFile(dir=lib.param.TMPDIR)
+        basistransf = BasisTransform(mf, None, None)
+        with h5py.File(erifile.name, 'w') as f:
+            basistransf._get_cderi_transformed_multi(ao2eos, out=f)
+        cderis = [(erifile.name, 'Lij/{}'.format(ifrag)) for ifrag in range(nfrags)]
+    dmet_mfs = map_threaded(_run_fragment, list(zip(mydmets, cderis)), max_workers=max_workers)
+    for mydmet, emb_mf in zip(mydmets, dmet_mfs):
+        mydmet.dump_flags()
+        if use_df:
+            emb_mf.with_df._cderi_to_save = erifile # Keeps the file from being deleted
+    return dmet_mfs, mydmets
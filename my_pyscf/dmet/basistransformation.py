@@ -1,6 +1,6 @@
 import numpy as np
 from functools import reduce
-from pyscf import ao2mo
+from pyscf import ao2mo, lib
 
 # Author: Bhavnesh Jangid <jangidbhavnesh@uchicago.edu>
 
@@ -79,19 +79,64 @@ class BasisTransform:
         Returns:
             Transformed CDERI integrals (Lij).
         """
-        nmo = mo.shape[-1]
+        return self._get_cderi_transformed_multi([mo,])[0]
+
+    def _get_cderi_transformed_multi(self, mos, out=None):
+        """
+        Transforms CDERI integrals from AO to MO basis for several sets of MOs (i.e., the
+        embedding bases of several fragments) in a single pass over the DF blocks.
+        Lpq---> Lij for each mo in mos
+        Args:
+           mos: list of np.array (nao*neo_i)
+           out: h5py File or Group, optional
+                If provided, Lij of mos[i] is written to the chunked dataset out['Lij/i']
+                instead of being kept in memory, so that only one block of the auxiliary
+                index is in memory at a time.
+        Returns:
+            List of transformed CDERI integrals (Lij), as np.arrays or h5py datasets.
+        """
         mf = self.mf
-        
-        Lij = np.empty((mf.with_df.get_naoaux(), nmo * (nmo + 1) // 2), dtype=mo.dtype)
-        
-        ijmosym, mij_pair, moij, ijslice = ao2mo.incore._conc_mos(mo, mo, compact=True)
+        naux = mf.with_df.get_naoaux()
+        nao = mf.mol.nao_nr()
+        npairs = [mo.shape[-1] * (mo.shape[-1] + 1) // 2 for mo in mos]
+        mem_av = mf.max_memory - lib.current_memory()[0]
+        if out is None:
+            mem_eris = 8 * sum(npairs) * naux / 1e6
+            if len(mos) > 1:
+                assert mem_av > 2. * mem_eris, "Not enough memory for ERI transformation."
+            mem_av -= mem_eris
+        # One block of the AO tensor and of each Lij
+        mem_row = 8 * (nao * (nao + 1) // 2 + sum(npairs)) / 1e6
+        blksize = min(naux, mf.with_df.blockdim)
+        if mem_av / 2 / mem_row < blksize:
+            # Shrink the DF blocks to fit in memory, but never below one block of 16 rows
+            blksize = max(min(16, blksize), int(mem_av / 2 / mem_row))
+            lib.logger.debug(mf, 'CDERI transformation: DF blocks of %d rows', blksize)
+
+        Lijs = []
+        conc_mos = []
+        for i, mo in enumerate(mos):
+            nmo = mo.shape[-1]
+            shape = (naux, nmo * (nmo + 1) // 2)
+            if out is None:
+                Lijs.append(np.empty(shape, dtype=mo.dtype))
+            else:
+                Lijs.append(out.create_dataset('Lij/{}'.format(i), shape, dtype=mo.dtype,
+                                               chunks=(blksize, shape[1])))
+            conc_mos.append(ao2mo.incore._conc_mos(mo, mo, compact=True))
+
         b0 = 0
-        for eri1 in mf.with_df.loop():
+        for eri1 in mf.with_df.loop(blksize=blksize):
             b1 = b0 + eri1.shape[0]
-            eri2 = Lij[b0:b1]
-            eri2 = ao2mo._ao2mo.nr_e2(eri1, moij, ijslice, aosym='s2', mosym=ijmosym, out=eri2)
+            for Lij, (ijmosym, mij_pair, moij, ijslice) in zip(Lijs, conc_mos):
+                if out is None:
+                    ao2mo._ao2mo.nr_e2(eri1, moij, ijslice, aosym='s2', mosym=ijmosym,
+                                       out=Lij[b0:b1])
+                else:
+                    Lij[b0:b1] = ao2mo._ao2mo.nr_e2(eri1, moij, ijslice, aosym='s2',
+                                                    mosym=ijmosym)
             b0 = b1
-        return Lij
+        return Lijs
 
     def _get_eri_transformed(self, ao2eo=None):
         '''
@@ -1,6 +1,8 @@
 import numpy as np
 from mrh.my_pyscf.fci import dummy
-from pyscf.fci import direct_spin1
+from mrh.my_pyscf.fci import rdm
+from mrh.my_pyscf.fci.rdm import libfcihe, gen_he_link, c_arr, c_int
+from pyscf.fci import direct_spin1, cistring
 from pyscf.fci.addons import _unpack_nelec
 
 def contract_1he (h1he, cre, spin, ci, norb, nelec, link_index=None):
@@ -29,6 +31,8 @@ def contract_1he (h1he, cre, spin, ci, norb, nelec, link_index=None):
         hci: ndarray
             Hamiltonian-vector product
     '''
+    if rdm.NATIVE_HALFELECTRON:
+        return _contract_1he_native (h1he, cre, spin, ci, norb, nelec)
     neleca, nelecb = _unpack_nelec (nelec)
     nelec_bra = [neleca, nelecb]
     ket_occ = [0,0]
@@ -51,6 +55,40 @@ def contract_1he (h1he, cre, spin, ci, norb, nelec, link_index=None):
     hci = direct_spin1.contract_1e (f1e, ci, norb+1, nelecd, link_index=link_index)
     return dummy.read_orbital (hci, norb, nelec_bra, occ_a=bra_occ[0], occ_b=bra_occ[1])
 
+def _contract_1he_native (h1he, cre, spin, ci, norb, nelec):
+    ''' Same as contract_1he, but between the N- and N+-1-electron spaces directly using the C
+    kernels of libfcihe, without padding the CI vector with a dummy orbital. '''
+    neleca, nelecb = _unpack_nelec (nelec)
+    nelec_bra = [neleca, nelecb]
+    nelec_bra[spin] += (-1,1)[int (cre)]
+    ndet_bra = [cistring.num_strings (norb, n) if 0 <= n <= norb else 0 for n in nelec_bra]
+    hci = np.zeros (ndet_bra, dtype=np.result_type (h1he, ci))
+    if not hci.size: return hci
+    ndeta, ndetb = cistring.num_strings (norb, neleca), cistring.num_strings (norb, nelecb)
+    ci = np.asarray (ci).reshape (ndeta, ndetb)
+    h1he = np.asarray (h1he)
+    if spin and (neleca % 2): h1he = -h1he
+    # The action of p' (p) on the ket is read off from p (p') acting on the bra strings
+    link = gen_he_link (norb, nelec_bra[spin], not cre)
+    nlink = c_int (link.shape[1])
+    h_parts = [(h1he.real, 1), (h1he.imag, 1j)] if np.iscomplexobj (h1he) else [(h1he, 1)]
+    c_parts = [(ci.real, 1), (ci.imag, 1j)] if np.iscomplexobj (ci) else [(ci, 1)]
+    for h, hfac in h_parts:
+        h = np.ascontiguousarray (h, dtype=np.float64)
+        for c, cfac in c_parts:
+            c = np.ascontiguousarray (c, dtype=np.float64)
+            buf = np.zeros (hci.shape, dtype=np.float64)
+            if spin:
+                libfcihe.FCIhe_contract1h_minor (c_arr (buf), c_arr (c), c_arr (h),
+                                                 c_int (ndeta), c_int (buf.shape[1]),
+                                                 c_int (ndetb), nlink, c_arr (link))
+            else:
+                libfcihe.FCIhe_contract1h (c_arr (buf), c_arr (c), c_arr (h),
+                                           c_int (buf.shape[0]), c_int (ndetb),
+                                           nlink, c_arr (link))
+            hci += (hfac * cfac) * buf
+    return hci
+
 def absorb_h1he (h1he, h3he, cre, spin, norb, nelec, fac=1):
     '''Combine one-half-electron and three-half-electron elements into a packed form.
 
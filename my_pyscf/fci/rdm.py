@@ -8,6 +8,15 @@ from pyscf.fci.addons import _unpack_nelec
 from mrh.my_pyscf.fci import dummy
 from pyscf.lib import param
 from pyscf.fci import cistring
+from pyscf import __config__
+from mrh.lib.helper import load_library
+import ctypes
+import functools
+libfcihe = load_library ('libfcihe')
+def c_arr (arr): return arr.ctypes.data_as(ctypes.c_void_p)
+c_int = ctypes.c_int
+
+NATIVE_HALFELECTRON = getattr (__config__, 'fci_rdm_native_halfelectron', True)
 
 def _unpack(norb, nelec, link_index, spin=None):
     if link_index is None:
@@ -19,6 +28,120 @@ def _unpack(norb, nelec, link_index, spin=None):
     else:
         return link_index
 
+@functools.lru_cache (maxsize=128)
+def gen_he_link (norb, nelec, cre):
+    ''' Link table between the strings of nelec electrons in norb orbitals and those of nelec+1
+    (cre=True) or nelec-1 (cre=False) electrons, for the native half-electron kernels.
+
+    Returns:
+        link: ndarray of shape (nstr,nlink,3)
+            link[J,l] = (p,I,sgn) such that p'|J> = sgn|I> (cre=True) or p|J> = sgn|I>
+            (cre=False)
+    '''
+    nstr = cistring.num_strings (norb, nelec)
+    if (cre and nelec >= norb) or ((not cre) and nelec <= 0):
+        return np.zeros ((nstr,0,3), dtype=np.int32)
+    if cre:
+        idx = cistring.gen_cre_str_index (range (norb), nelec)
+        orb = idx[:,:,0]
+    else:
+        idx = cistring.gen_des_str_index (range (norb), nelec)
+        orb = idx[:,:,1]
+    return np.ascontiguousarray (np.stack ([orb, idx[:,:,2], idx[:,:,3]], axis=-1),
+                                 dtype=np.int32)
+
+@functools.lru_cache (maxsize=128)
+def gen_linkstr (norb, nelec):
+    ''' pyscf.fci.cistring.gen_linkstr_index for range (norb) as a cached int32 array '''
+    return np.ascontiguousarray (cistring.gen_linkstr_index (range (norb), nelec),
+                                 dtype=np.int32)
+
+def _he_kernel_call (fn, shape, bra, ket, *args):
+    ''' Evaluate the real kernel fn (out, bra, ket, *args) for conj (bra) and ket, splitting
+    complex arguments into real and imaginary parts '''
+    def call (b, k):
+        out = np.zeros (shape, dtype=np.float64)
+        fn (c_arr (out), c_arr (np.ascontiguousarray (b, dtype=np.float64)),
+            c_arr (np.ascontiguousarray (k, dtype=np.float64)), *args)
+        return out
+    if not (np.iscomplexobj (bra) or np.iscomplexobj (ket)):
+        return call (bra, ket)
+    br, bi = bra.real, bra.imag
+    kr, ki = ket.real, ket.imag
+    return call (br, kr) + call (bi, ki) + 1j * (call (br, ki) - call (bi, kr))
+
+def _trans_rdm1hs_native (cre, cibra, ciket, norb, nelec, spin=0):
+    ''' Same as _trans_rdm1hs, but between the N- and N+1-electron spaces directly using the
+    C kernels of libfcihe, without padding the CI vectors with a dummy orbital. '''
+    nelec = list (_unpack_nelec (nelec))
+    if not cre:
+        cibra, ciket = ciket, cibra
+        nelec[spin] -= 1
+    nelec_bra = list (nelec)
+    nelec_bra[spin] += 1
+    tdm1h = np.zeros (norb, dtype=np.result_type (cibra, ciket))
+    if nelec[spin] < 0 or nelec_bra[spin] > norb: return tdm1h
+    ndeta_bra = cistring.num_strings (norb, nelec_bra[0])
+    ndetb_bra = cistring.num_strings (norb, nelec_bra[1])
+    ndeta_ket = cistring.num_strings (norb, nelec[0])
+    ndetb_ket = cistring.num_strings (norb, nelec[1])
+    cibra = np.asarray (cibra).reshape (ndeta_bra, ndetb_bra)
+    ciket = np.asarray (ciket).reshape (ndeta_ket, ndetb_ket)
+    if spin:
+        cibra, ciket = cibra.T, ciket.T
+    link = gen_he_link (norb, nelec_bra[spin], False)
+    tdm1h = _he_kernel_call (libfcihe.FCIhe_tdm1h, (norb,), cibra, ciket,
+                             c_int (norb), c_int (cibra.shape[0]), c_int (cibra.shape[1]),
+                             c_int (link.shape[1]), c_arr (link))
+    if spin and (nelec[0] % 2): tdm1h *= -1
+    if not cre: tdm1h = tdm1h.conj ()
+    return tdm1h
+
+def _trans_rdm13hs_native (cre, cibra, ciket, norb, nelec, spin=0):
+    ''' Same as _trans_rdm13hs, but between the N- and N+1-electron spaces directly using the
+    C kernels of libfcihe, without padding the CI vectors with a dummy orbital. '''
+    nelec = list (_unpack_nelec (nelec))
+    if not cre:
+        cibra, ciket = ciket, cibra
+        nelec[spin] -= 1
+    nelec_bra = list (nelec)
+    nelec_bra[spin] += 1
+    dtype = np.result_type (cibra, ciket)
+    tdm1h = np.zeros (norb, dtype=dtype)
+    tdm3h = np.zeros ((2,norb,norb,norb), dtype=dtype)
+    if nelec[spin] < 0 or nelec_bra[spin] > norb: return tdm1h, tdm3h[0], tdm3h[1]
+    ndeta_bra = cistring.num_strings (norb, nelec_bra[0])
+    ndetb_bra = cistring.num_strings (norb, nelec_bra[1])
+    ndeta_ket = cistring.num_strings (norb, nelec[0])
+    ndetb_ket = cistring.num_strings (norb, nelec[1])
+    cibra = np.asarray (cibra).reshape (ndeta_bra, ndetb_bra)
+    ciket = np.asarray (ciket).reshape (ndeta_ket, ndetb_ket)
+    if spin:
+        cibra, ciket = cibra.T, ciket.T
+    nbra, nket, nminor = cibra.shape[0], ciket.shape[0], ciket.shape[1]
+    link = gen_he_link (norb, nelec_bra[spin], False)
+    tdm1h = _he_kernel_call (libfcihe.FCIhe_tdm1h, (norb,), cibra, ciket,
+                             c_int (norb), c_int (nbra), c_int (nminor),
+                             c_int (link.shape[1]), c_arr (link))
+    link = gen_he_link (norb, nelec[spin], True)
+    linkE = gen_linkstr (norb, nelec[spin])
+    tdm3h[spin] = _he_kernel_call (libfcihe.FCIhe_tdm3h_same, (norb,norb,norb), cibra, ciket,
+                                   c_int (norb), c_int (nket), c_int (nminor),
+                                   c_int (linkE.shape[1]), c_arr (linkE),
+                                   c_int (link.shape[1]), c_arr (link))
+    linkE = gen_linkstr (norb, nelec[1-spin])
+    tdm3h[1-spin] = _he_kernel_call (libfcihe.FCIhe_tdm3h_opp, (norb,norb,norb), cibra, ciket,
+                                     c_int (norb), c_int (nket), c_int (nminor),
+                                     c_int (linkE.shape[1]), c_arr (linkE),
+                                     c_int (link.shape[1]), c_arr (link))
+    if spin and (nelec[0] % 2):
+        tdm1h *= -1
+        tdm3h *= -1
+    if not cre:
+        tdm1h = tdm1h.conj ()
+        tdm3h = tdm3h.conj ().transpose (0,1,3,2)
+    return tdm1h, tdm3h[0], tdm3h[1]
+
 def _trans_rdm1hs (cre, cibra, ciket, norb, nelec, spin=0, link_index=None):
     '''Evaluate the one-half-particle transition density matrix between ci vectors in different
     Hilbert spaces: <cibra|r'|ciket>, where |cibra> has the same number of orbitals but one
@@ -70,6 +193,8 @@ def _trans_rdm1hs (cre, cibra, ciket, norb, nelec, spin=0, link_index=None):
         exit()
     elif custom_fci and use_gpu: 
       tdm1h = _trans_rdm1hs_o1(cre, cibra, ciket, norb, nelec, spin=spin, link_index=link_index)
+    elif NATIVE_HALFELECTRON:
+      return _trans_rdm1hs_native (cre, cibra, ciket, norb, nelec, spin=spin)
     else:
       tdm1h = _trans_rdm1hs_o0(cre, cibra, ciket, norb, nelec, spin=spin, link_index=link_index)
     tdm1h = tdm1h[-1,:-1]
@@ -208,6 +333,8 @@ def _trans_rdm13hs (cre, cibra, ciket, norb, nelec, spin=0, link_index=None, reo
         exit()
     elif custom_fci and use_gpu: 
       tdm1h, tdm3ha, tdm3hb = _trans_rdm13hs_o5(cre, cibra, ciket, norb, nelec, spin=spin, link_index=link_index, reorder = reorder)
+    elif NATIVE_HALFELECTRON and reorder:
+      tdm1h, tdm3ha, tdm3hb = _trans_rdm13hs_native(cre, cibra, ciket, norb, nelec, spin=spin)
     else:
       tdm1h, tdm3ha, tdm3hb = _trans_rdm13hs_o0(cre, cibra, ciket, norb, nelec, spin=spin, link_index=link_index, reorder = reorder)
     return tdm1h, (tdm3ha, tdm3hb)
@@ -643,3 +770,322 @@ def trans_hhdm (cibra, ciket, norb, nelec, spin=0, link_index=None):
 
 
 
+
+# Batched kernels: all bra/ket root pairs of a pair of Hilbert spaces at once. The intermediates
+# p|ket> (or q p|ket>) are built for all roots and orbitals together by scattering along the
+# destruction string index, and each TDM is then a single GEMM over the determinant dimension.
+# These intermediates take O(norb**2 * ndet) memory per root, versus O(ndet) for the single-pair
+# kernels. If max_memory (MB) is given, the roots are processed in blocks which fit in it, and
+# MemoryError is raised if even a single bra and ket do not fit.
+
+def _ndet (norb, nelec):
+    neleca, nelecb = nelec
+    if min (neleca, nelecb) < 0 or max (neleca, nelecb) > norb: return 0
+    return cistring.num_strings (norb, neleca) * cistring.num_strings (norb, nelecb)
+
+def _des_ndet (norb, nelec, *spins):
+    ''' Number of determinants after destroying one electron of each of spins '''
+    nelec = list (_unpack_nelec (nelec))
+    for s in spins: nelec[s] -= 1
+    return _ndet (norb, nelec)
+
+def _call_by_root_blocks (kernel, bravecs, ketvecs, mem_bra, mem_ket, max_memory, *args,
+                          **kwargs):
+    ''' Call kernel (bravecs, ketvecs, *args, **kwargs) on blocks of the bra and ket roots such
+    that the intermediates, taking mem_bra and mem_ket MB per root respectively, fit in
+    max_memory MB, and assemble the results along the first two (nbra,nket) dimensions. '''
+    nbra, nket = bravecs.shape[0], ketvecs.shape[0]
+    if nbra*mem_bra + nket*mem_ket <= max_memory:
+        return kernel (bravecs, ketvecs, *args, **kwargs)
+    if mem_bra + mem_ket > max_memory:
+        raise MemoryError (('batched TDM intermediates of one bra and one ket need {:.1f} MB; '
+                            'only {:.1f} MB available').format (mem_bra+mem_ket, max_memory))
+    bblk = nbra if mem_bra == 0 else min (nbra, max (1, int (max_memory / 2 / mem_bra)))
+    kblk = nket if mem_ket == 0 else min (nket, int ((max_memory - bblk*mem_bra) / mem_ket))
+    out = None
+    for i0 in range (0, nbra, bblk):
+        i1 = min (nbra, i0+bblk)
+        for j0 in range (0, nket, kblk):
+            j1 = min (nket, j0+kblk)
+            res = kernel (bravecs[i0:i1], ketvecs[j0:j1], *args, **kwargs)
+            is_tuple = isinstance (res, tuple)
+            if not is_tuple: res = (res,)
+            if out is None:
+                out = [np.empty ((nbra,nket) + r.shape[2:], dtype=r.dtype) for r in res]
+            for o, r in zip (out, res): o[i0:i1,j0:j1] = r
+    return tuple (out) if is_tuple else out[0]
+
+def des_batch (ci, norb, nelec, spin):
+    ''' Apply the destruction operator of every spatial orbital to a stack of CI vectors.
+
+    Args:
+        ci: ndarray of shape (nroots,ndeta,ndetb)
+            CI vectors in (norb,nelec) Hilbert space
+        norb: integer
+            Number of spatial orbitals
+        nelec: integer or sequence of length 2
+            Number of electrons in the Hilbert space of ci
+        spin: integer
+            0 = alpha, 1 = beta
+
+    Returns:
+        pci: ndarray of shape (nroots,norb,ndeta',ndetb')
+            pci[:,p] = p|ci>, with the same sign convention as pyscf.fci.addons.des_a/des_b
+    '''
+    neleca, nelecb = _unpack_nelec (nelec)
+    nroots = ci.shape[0]
+    if spin: ci = ci.transpose (0,2,1)
+    nelec_s = (neleca, nelecb)[spin]
+    nstr = cistring.num_strings (norb, nelec_s-1) if nelec_s > 0 else 0
+    pci = np.zeros ((nroots, norb, nstr, ci.shape[2]), dtype=ci.dtype)
+    if nelec_s > 0:
+        des_index = cistring.gen_des_str_index (range (norb), nelec_s)
+        str0 = np.repeat (np.arange (des_index.shape[0]), nelec_s)
+        orb, str1, sgn = des_index[:,:,1:].reshape (-1,3).T
+        if spin and (neleca % 2): sgn = -sgn
+        pci[:,orb,str1,:] = sgn[None,:,None] * ci[:,str0,:]
+    if spin: pci = pci.transpose (0,1,3,2)
+    return pci
+
+def _des_nelec (nelec, spin):
+    nelec = list (_unpack_nelec (nelec))
+    nelec[spin] -= 1
+    return tuple (nelec)
+
+def _contract_batch (bra, ket):
+    ''' out[i,...,j,...] = sum_ab bra[i,...,a,b].conj () * ket[j,...,a,b] as a single GEMM '''
+    bshape, kshape = bra.shape[:-2], ket.shape[:-2]
+    ndet = bra.shape[-2] * bra.shape[-1]
+    bra = bra.reshape (int (np.prod (bshape)), ndet)
+    ket = ket.reshape (int (np.prod (kshape)), ndet)
+    return np.dot (bra.conj (), ket.T).reshape (bshape + kshape)
+
+def _des_batch_twice (pci, norb, nelec, spin):
+    ''' q|pci[:,p]> for all q; returns shape (nroots,norb_q,norb_p,ndeta'',ndetb'') '''
+    nroots = pci.shape[0]
+    qpci = des_batch (pci.reshape ((nroots*norb,) + pci.shape[2:]), norb, nelec, spin)
+    return qpci.reshape ((nroots, norb) + qpci.shape[1:]).transpose (0,2,1,3,4)
+
+def trans_rdm1s_batch (bravecs, ketvecs, norb, nelec, max_memory=None):
+    ''' Spin-separated one-body transition density matrices between all pairs of CI vectors in
+    the same Hilbert space.
+
+    Args:
+        bravecs: ndarray of shape (nbra,ndeta,ndetb)
+        ketvecs: ndarray of shape (nket,ndeta,ndetb)
+        norb: integer
+        nelec: integer or sequence of length 2
+
+    Kwargs:
+        max_memory: float
+            If given, memory (MB) available for the intermediates; see _call_by_root_blocks
+
+    Returns:
+        tdm1s: ndarray of shape (nbra,nket,2,norb,norb)
+            tdm1s[i,j,s,p,q] = <bra_i|p_s'q_s|ket_j>
+    '''
+    nbra, nket = bravecs.shape[0], ketvecs.shape[0]
+    dtype = np.result_type (bravecs, ketvecs)
+    if max_memory is not None:
+        mem = norb * max (_des_ndet (norb, nelec, s) for s in range (2))
+        mem *= np.dtype (dtype).itemsize / 1e6
+        return _call_by_root_blocks (trans_rdm1s_batch, bravecs, ketvecs, mem, mem, max_memory,
+                                     norb, nelec)
+    tdm1s = np.zeros ((nbra,nket,2,norb,norb), dtype=dtype)
+    for s in range (2):
+        pbra = des_batch (bravecs, norb, nelec, s)
+        pket = des_batch (ketvecs, norb, nelec, s)
+        tdm1s[:,:,s] = _contract_batch (pbra, pket).transpose (0,2,1,3)
+    return tdm1s
+
+def trans_rdm12s_batch (bravecs, ketvecs, norb, nelec, max_memory=None):
+    ''' Spin-separated one- and two-body transition density matrices between all pairs of CI
+    vectors in the same Hilbert space. Batched equivalent of pyscf.fci.direct_spin1.trans_rdm12s.
+
+    Args:
+        bravecs: ndarray of shape (nbra,ndeta,ndetb)
+        ketvecs: ndarray of shape (nket,ndeta,ndetb)
+        norb: integer
+        nelec: integer or sequence of length 2
+
+    Kwargs:
+        max_memory: float
+            If given, memory (MB) available for the intermediates; see _call_by_root_blocks
+
+    Returns:
+        tdm1s: ndarray of shape (nbra,nket,2,norb,norb)
+            tdm1s[i,j,s,p,q] = <bra_i|p_s'q_s|ket_j>
+        tdm2s: ndarray of shape (nbra,nket,4,norb,norb,norb,norb)
+            tdm2s[i,j,(s,t),p,q,r,s] = <bra_i|p_s'r_t's_tq_s|ket_j>, for spin pairs (s,t) in the
+            order aa, ab, ba, bb
+    '''
+    nbra, nket = bravecs.shape[0], ketvecs.shape[0]
+    dtype = np.result_type (bravecs, ketvecs)
+    if max_memory is not None:
+        # p_s|ket> for both spins, and r_t p_s|ket> (twice, for the transpose in _contract_batch)
+        mem = norb * sum (_des_ndet (norb, nelec, s) for s in range (2))
+        mem += 2 * norb * norb * max (_des_ndet (norb, nelec, s, t)
+                                      for s in range (2) for t in range (s,2))
+        mem *= np.dtype (dtype).itemsize / 1e6
+        return _call_by_root_blocks (trans_rdm12s_batch, bravecs, ketvecs, mem, mem, max_memory,
+                                     norb, nelec)
+    tdm1s = np.zeros ((nbra,nket,2,norb,norb), dtype=dtype)
+    tdm2s = np.zeros ((nbra,nket,4,norb,norb,norb,norb), dtype=dtype)
+    pbra = [des_batch (bravecs, norb, nelec, s) for s in range (2)]
+    pket = [des_batch (ketvecs, norb, nelec, s) for s in range (2)]
+    for s in range (2):
+        tdm1s[:,:,s] = _contract_batch (pbra[s], pket[s]).transpose (0,2,1,3)
+        nelec_s = _des_nelec (nelec, s)
+        for t in range (s, 2):
+            # rpbra[i,r,p] = r_t p_s|bra_i>
+            rpbra = _des_batch_twice (pbra[s], norb, nelec_s, t)
+            sqket = _des_batch_twice (pket[s], norb, nelec_s, t)
+            d2 = _contract_batch (rpbra, sqket).transpose (0,3,2,5,1,4)
+            tdm2s[:,:,2*s+t] = d2
+            if s != t: tdm2s[:,:,2] = d2.transpose (0,1,4,5,2,3)
+    return tdm1s, tdm2s
+
+def trans_rdm1h_des_batch (bravecs, ketvecs, norb, nelec, spin=0, max_memory=None):
+    ''' One-half-particle transition density matrices <bra_i|r_s|ket_j> between all pairs of CI
+    vectors. Batched equivalent of trans_rdm1ha_des and trans_rdm1hb_des.
+
+    Args:
+        bravecs: ndarray of shape (nbra,ndeta',ndetb')
+            CI vectors in (norb,nelec-1) Hilbert space
+        ketvecs: ndarray of shape (nket,ndeta,ndetb)
+            CI vectors in (norb,nelec) Hilbert space
+        norb: integer
+        nelec: integer or sequence of length 2
+            Number of electrons in the ket Hilbert space
+
+    Kwargs:
+        spin: integer
+            Spin of the destroyed electron. 0 = alpha, 1 = beta
+        max_memory: float
+            If given, memory (MB) available for the intermediates; see _call_by_root_blocks
+
+    Returns:
+        tdm1h: ndarray of shape (nbra,nket,norb)
+    '''
+    nbra, nket = bravecs.shape[0], ketvecs.shape[0]
+    if max_memory is not None:
+        dtype = np.result_type (bravecs, ketvecs)
+        mem = norb * _des_ndet (norb, nelec, spin) * np.dtype (dtype).itemsize / 1e6
+        return _call_by_root_blocks (trans_rdm1h_des_batch, bravecs, ketvecs, 0, mem,
+                                     max_memory, norb, nelec, spin=spin)
+    rket = des_batch (ketvecs, norb, nelec, spin)
+    return _contract_batch (bravecs, rket)
+
+def trans_rdm13h_des_batch (bravecs, ketvecs, norb, nelec, spin=0, max_memory=None):
+    ''' One-half- and three-half-particle transition density matrices between all pairs of CI
+    vectors. Batched equivalent of trans_rdm13ha_des and trans_rdm13hb_des.
+
+    Args:
+        bravecs: ndarray of shape (nbra,ndeta',ndetb')
+            CI vectors in (norb,nelec-1) Hilbert space
+        ketvecs: ndarray of shape (nket,ndeta,ndetb)
+            CI vectors in (norb,nelec) Hilbert space
+        norb: integer
+        nelec: integer or sequence of length 2
+            Number of electrons in the ket Hilbert space
+
+    Kwargs:
+        spin: integer
+            Spin of the destroyed half-electron. 0 = alpha, 1 = beta
+        max_memory: float
+            If given, memory (MB) available for the intermediates; see _call_by_root_blocks
+
+    Returns:
+        tdm1h: ndarray of shape (nbra,nket,norb)
+            tdm1h[i,j,r] = <bra_i|r_s|ket_j>
+        tdm3h: ndarray of shape (nbra,nket,2,norb,norb,norb)
+            tdm3h[i,j,t,q,p,r] = <bra_i|p_t'q_tr_s|ket_j>
+    '''
+    nbra, nket = bravecs.shape[0], ketvecs.shape[0]
+    dtype = np.result_type (bravecs, ketvecs)
+    if max_memory is not None:
+        itemsize = np.dtype (dtype).itemsize
+        nelec_bra = _des_nelec (nelec, spin)
+        mem_bra = norb * max (_des_ndet (norb, nelec_bra, t) for t in range (2))
+        mem_ket = norb * _des_ndet (norb, nelec, spin)
+        mem_ket += 2 * norb * norb * max (_des_ndet (norb, nelec, spin, t) for t in range (2))
+        return _call_by_root_blocks (trans_rdm13h_des_batch, bravecs, ketvecs,
+                                     mem_bra*itemsize/1e6, mem_ket*itemsize/1e6, max_memory,
+                                     norb, nelec, spin=spin)
+    rket = des_batch (ketvecs, norb, nelec, spin)
+    tdm1h = _contract_batch (bravecs, rket)
+    tdm3h = np.zeros ((nbra,nket,2,norb,norb,norb), dtype=dtype)
+    nelec_bra = _des_nelec (nelec, spin)
+    for t in range (2):
+        pbra = des_batch (bravecs, norb, nelec_bra, t)
+        qrket = _des_batch_twice (rket, norb, nelec_bra, t) # q_t r_s|ket_j>: (j,r,q)
+        tdm3h[:,:,t] = _contract_batch (pbra, qrket).transpose (0,2,4,1,3)
+    return tdm1h, tdm3h
+
+def trans_sfddm1_batch (bravecs, ketvecs, norb, nelec, max_memory=None):
+    ''' Spin-flip-down transition density matrices <bra_i|b_p'a_q|ket_j> between all pairs of CI
+    vectors. Batched equivalent of trans_sfddm1.
+
+    Args:
+        bravecs: ndarray of shape (nbra,ndeta',ndetb')
+            CI vectors in (norb,(neleca-1,nelecb+1)) Hilbert space
+        ketvecs: ndarray of shape (nket,ndeta,ndetb)
+            CI vectors in (norb,(neleca,nelecb)) Hilbert space
+        norb: integer
+        nelec: integer or sequence of length 2
+            Number of electrons in the ket Hilbert space
+
+    Kwargs:
+        max_memory: float
+            If given, memory (MB) available for the intermediates; see _call_by_root_blocks
+
+    Returns:
+        sfddm: ndarray of shape (nbra,nket,norb,norb)
+    '''
+    nelec = _unpack_nelec (nelec)
+    nelec_bra = (nelec[0]-1, nelec[1]+1)
+    nbra, nket = bravecs.shape[0], ketvecs.shape[0]
+    if max_memory is not None:
+        dtype = np.result_type (bravecs, ketvecs)
+        mem = norb * _des_ndet (norb, nelec, 0) * np.dtype (dtype).itemsize / 1e6
+        return _call_by_root_blocks (trans_sfddm1_batch, bravecs, ketvecs, mem, mem, max_memory,
+                                     norb, nelec)
+    pbra = des_batch (bravecs, norb, nelec_bra, 1)
+    qket = des_batch (ketvecs, norb, nelec, 0)
+    return _contract_batch (pbra, qket).transpose (0,2,1,3)
+
+def trans_hhdm_batch (bravecs, ketvecs, norb, nelec, spin=0, max_memory=None):
+    ''' Pair-destruction transition density matrices <bra_i|p q|ket_j> between all pairs of CI
+    vectors. Batched equivalent of trans_hhdm.
+
+    Args:
+        bravecs: ndarray of shape (nbra,ndeta',ndetb')
+            CI vectors in (norb,nelec-2) Hilbert space
+        ketvecs: ndarray of shape (nket,ndeta,ndetb)
+            CI vectors in (norb,nelec) Hilbert space
+        norb: integer
+        nelec: integer or sequence of length 2
+            Number of electrons in the ket Hilbert space
+
+    Kwargs:
+        spin: integer
+            Spin of destroyed pair. 0 = aa, 1 = ab (p is beta), 2 = bb
+        max_memory: float
+            If given, memory (MB) available for the intermediates; see _call_by_root_blocks
+
+    Returns:
+        hhdm: ndarray of shape (nbra,nket,norb,norb)
+    '''
+    s1 = int (spin>1)
+    s2 = int (spin>0)
+    nbra, nket = bravecs.shape[0], ketvecs.shape[0]
+    if max_memory is not None:
+        dtype = np.result_type (bravecs, ketvecs)
+        mem = norb * _des_ndet (norb, nelec, s1) + 2 * norb * norb * _des_ndet (norb, nelec, s1, s2)
+        mem *= np.dtype (dtype).itemsize / 1e6
+        return _call_by_root_blocks (trans_hhdm_batch, bravecs, ketvecs, 0, mem, max_memory,
+                                     norb, nelec, spin=spin)
+    qket = des_batch (ketvecs, norb, nelec, s1)
+    pqket = _des_batch_twice (qket, norb, _des_nelec (nelec, s1), s2)
+    return _contract_batch (bravecs, pqket)
+
@@ -1,9 +1,21 @@
+import os
+import copy
+import queue
 import numpy as np
+from pyscf import lib
 from pyscf.grad import rhf as rhf_grad
 from pyscf.lib import param, logger
+from mrh.my_pyscf.lib.parallel import imap_threaded
 
 STEPSIZE_DEFAULT=0.001
 SCANNER_VERBOSE_DEFAULT=4
+STENCIL_DEFAULT=2
+MAX_WORKERS_DEFAULT=1
+
+# Central-difference first-derivative stencils: npoints -> (offsets, weights)
+STENCILS = {2: ((-1, 1), (-1/2, 1/2)),
+            4: ((-2, -1, 1, 2), (1/12, -2/3, 2/3, -1/12)),
+            6: ((-3, -2, -1, 1, 2, 3), (-1/60, 3/20, -3/4, 3/4, -3/20, 1/60))}
 
 # MRH 05/04/2020: I don't know why I have to present the molecule instead
 # of just the coordinates, but somehow I can't get the units right any other
@@ -12,33 +24,215 @@ SCANNER_VERBOSE_DEFAULT=4
 def _make_mol (mol, coords):
     return [[mol.atom_symbol (i), coords[i,:]] for i in range (mol.natm)]
 
-def _numgrad_1df (mol, scanner, coords, iatm, icoord, delta=0.002):
-    coords[iatm,icoord] += delta
-    ep = scanner (_make_mol (mol, coords))
-    ep_states = np.array (getattr (scanner, 'e_states', [ep]))
-    coords[iatm,icoord] -= 2*delta
-    em = scanner (_make_mol (mol, coords))
-    em_states = np.array (getattr (scanner, 'e_states', [em]))
-    coords[iatm,icoord] += delta
-    de_states = (ep_states - em_states) / (2*delta)*param.BOHR
-    return (ep-em) / (2*delta)*param.BOHR, de_states
+GUESS_KEYS = ('mo_coeff', 'ci', 'mo_occ', 'mo_energy')
+
+def get_guess (mc):
+    '''Snapshot of the attributes from which a scanner (and its SCF scanner) builds the initial
+    guess of its next calculation'''
+    guess = {key: getattr (mc, key) for key in GUESS_KEYS if hasattr (mc, key)}
+    mf = getattr (mc, '_scf', None)
+    if mf is not None: guess['_scf'] = get_guess (mf)
+    return guess
+
+def set_guess_(mc, guess):
+    '''Restore a snapshot from get_guess, so that the next calculation of a scanner is warm-started
+    from the same point regardless of which calculations it has done in the meantime'''
+    for key, val in guess.items ():
+        if key == '_scf': set_guess_(mc._scf, val)
+        else: setattr (mc, key, copy.deepcopy (val))
+    return mc
+
+def _task_key (task):
+    return '{}_{}_{:+d}'.format (*task)
+
+def _run_displacement (mol, scanner, guess, coords, stepsize, task):
+    '''Single point at coords displaced by task = (iatm, icoord, offset) in units of stepsize.
+    If scanner is a gradient scanner, return the gradient; otherwise, the total energy and the
+    energies of all states.'''
+    iatm, icoord, offset = task
+    coords = coords.copy ()
+    coords[iatm,icoord] += offset * stepsize
+    if isinstance (scanner, lib.GradScanner):
+        set_guess_(scanner.base, guess)
+        e, de = scanner (_make_mol (mol, coords))
+        return {'de': np.asarray (de)}
+    set_guess_(scanner, guess)
+    e = scanner (_make_mol (mol, coords))
+    e_states = np.asarray (getattr (scanner, 'e_states', [e]))
+    return {'e_tot': e, 'e_states': e_states}
+
+# Sub-objects which a scanner call resets in place or which keep state between calls
+_SCANNER_COPY_KEYS = ('base', '_scf', 'with_df', 'fcisolver')
+
+def _copy_scanner (scanner, memo=None):
+    '''Shallow copy of scanner, with its own copies of the sub-objects in _SCANNER_COPY_KEYS, so
+    that it can be called in one thread while scanner is called in another. A sub-object shared
+    by several parents (e.g., with_df of a DF-CASSCF and of its SCF) is copied only once. The
+    chkfile of the copy is unset, since the threads cannot all write it.'''
+    if memo is None: memo = {}
+    if id (scanner) in memo: return memo[id (scanner)]
+    scanner1 = memo[id (scanner)] = copy.copy (scanner)
+    for key in _SCANNER_COPY_KEYS:
+        obj = getattr (scanner, key, None)
+        if obj is not None: setattr (scanner1, key, _copy_scanner (obj, memo=memo))
+    fciboxes = getattr (scanner, 'fciboxes', None)
+    if fciboxes is not None:
+        # LAS methods replace and reconfigure the fcisolvers of their fciboxes in place
+        scanner1.fciboxes = [copy.copy (f) for f in fciboxes]
+        for f in scanner1.fciboxes:
+            f.fcisolvers = [_copy_scanner (s, memo=memo) for s in f.fcisolvers]
+    if getattr (scanner1, 'chkfile', None): scanner1.chkfile = None
+    return scanner1
+
+def get_signature (mol, scanner):
+    '''String identifying the method, basis, and number of states of scanner, which must agree
+    for displacements saved to a chkfile to be reused'''
+    mc = scanner.base if isinstance (scanner, lib.GradScanner) else scanner
+    method = [c for c in type (mc).__mro__
+              if not issubclass (c, (lib.SinglePointScanner, lib.GradScanner))][0]
+    return '{}.{} basis={} nroots={}'.format (method.__module__, method.__name__,
+                                              repr (mol.basis), getattr (mc, 'nroots', None))
+
+def run_displacements (mol, scanner, coords, stepsize, tasks, guess=None, max_workers=1,
+                       chkfile=None, chkkey='numeric_grad', verbose=None):
+    '''Single-point calculations at a set of displaced geometries
+
+    Args:
+        mol : gto.Mole
+            Molecule at the reference geometry
+        scanner : SinglePointScanner or GradScanner
+            Method to evaluate at each displaced geometry
+        coords : ndarray of shape (natm,3)
+            Reference coordinates in Angstrom
+        stepsize : float
+            Displacement unit in Angstrom
+        tasks : list of (iatm, icoord, offset)
+            Displaced geometries
+
+    Kwargs:
+        guess : dict
+            Output of get_guess. Each displaced calculation is warm-started from it. Defaults to
+            a snapshot of scanner (of scanner.base for a GradScanner) before any displacements.
+        max_workers : int
+            Number of displaced geometries to compute concurrently, each in its own thread
+            (with its own copy of scanner; see _copy_scanner) with
+            lib.num_threads()//max_workers OpenMP threads. If 1, they are computed one after the
+            other in this thread with scanner itself.
+        chkfile : str
+            If provided, the result of each displacement is saved to this HDF5 file as soon as
+            it is complete, and results found there from a previous run with the same reference
+            coordinates, stepsize, and signature (see get_signature) are reused.
+        chkkey : str
+            Group in chkfile in which to store results
+
+    Returns:
+        results : dict
+            Keys are tasks; values are dicts with 'e_tot' and 'e_states', or 'de'
+    '''
+    log = logger.new_logger (mol, verbose)
+    if guess is None:
+        guess = get_guess (scanner.base if isinstance (scanner, lib.GradScanner) else scanner)
+    results = {}
+    if chkfile is not None:
+        signature = get_signature (mol, scanner)
+        results = load_displacements (chkfile, chkkey, coords, stepsize, tasks,
+                                      signature=signature)
+        if len (results): log.info ('Restarting from %d displacements in %s/%s',
+                                    len (results), chkfile, chkkey)
+        else: lib.chkfile.dump (chkfile, chkkey, {'coords': coords, 'stepsize': stepsize,
+                                                  'signature': signature})
+    todo = [task for task in tasks if task not in results]
+    def _finish (task, result):
+        results[task] = result
+        log.debug ('Displacement %s done (%d/%d)', str (task), len (results), len (tasks))
+        if chkfile is not None:
+            lib.chkfile.dump (chkfile, chkkey + '/' + _task_key (task), result)
+    max_workers = max (1, min (max_workers, len (todo)))
+    if max_workers == 1:
+        for task in todo:
+            _finish (task, _run_displacement (mol, scanner, guess, coords, stepsize, task))
+    else:
+        scanners = queue.Queue ()
+        for i in range (max_workers): scanners.put (_copy_scanner (scanner))
+        def _worker (task):
+            scanner1 = scanners.get ()
+            try:
+                return _run_displacement (mol, scanner1, guess, coords, stepsize, task)
+            finally:
+                scanners.put (scanner1)
+        for i, result in imap_threaded (_worker, [(task,) for task in todo],
+                                        max_workers=max_workers):
+            _finish (todo[i], result)
+    return results
+
+def load_displacements (chkfile, chkkey, coords, stepsize, tasks, signature=None):
+    '''Results of run_displacements saved to chkfile, if they belong to the same reference
+    coordinates, stepsize, and signature (see get_signature)'''
+    if not os.path.isfile (chkfile): return {}
+    saved = lib.chkfile.load (chkfile, chkkey)
+    if saved is None: return {}
+    if saved.get ('stepsize', None) != stepsize: return {}
+    saved_signature = saved.get ('signature', None)
+    if isinstance (saved_signature, bytes): saved_signature = saved_signature.decode ()
+    if saved_signature != signature: return {}
+    saved_coords = saved.get ('coords', None)
+    if saved_coords is None or saved_coords.shape != coords.shape: return {}
+    if not np.allclose (saved_coords, coords, rtol=0, atol=1e-10): return {}
+    results = {}
+    for task in tasks:
+        key = _task_key (task)
+        if key in saved: results[task] = saved[key]
+    return results
+
+def get_stencil (npoints):
+    if npoints not in STENCILS:
+        raise ValueError ('{}-point stencil (available: {})'.format (
+            npoints, list (STENCILS.keys ())))
+    return STENCILS[npoints]
 
 
 class Gradients (rhf_grad.GradientsMixin):
+    '''Central finite-difference nuclear gradients of any method with a scanner
+
+    Extra attributes:
+        stepsize : float
+            Displacement in Angstrom
+        stencil : int
+            Number of points in the central-difference stencil of each coordinate (2, 4, or 6)
+        max_workers : int
+            Number of displaced geometries to compute concurrently in separate threads.
+            See run_displacements.
+        chkfile : str
+            HDF5 file in which completed displacements are saved. A calculation which is
+            killed and rerun with the same chkfile, reference geometry, and stepsize resumes
+            where it left off.
+    '''
 
-    def __init__(self, method, stepsize=STEPSIZE_DEFAULT, scanner_verbose=SCANNER_VERBOSE_DEFAULT):
+    def __init__(self, method, stepsize=STEPSIZE_DEFAULT, scanner_verbose=SCANNER_VERBOSE_DEFAULT,
+                 stencil=STENCIL_DEFAULT, max_workers=MAX_WORKERS_DEFAULT, chkfile=None):
         self.stepsize = stepsize
-        self.scanner = None 
+        self.stencil = stencil
+        self.max_workers = max_workers
+        self.chkfile = chkfile
+        self.scanner = None
         # MRH 05/04/2020: there must be a better way to do this
         if hasattr (self.scanner, '_scf'):
             self.scanner._scf.verbose = scanner_verbose
         rhf_grad.GradientsMixin.__init__(self, method)
         self.scanner = self.base.as_scanner ()
         self.scanner.verbose = scanner_verbose
+        self.scanner_verbose = scanner_verbose
 
-    def _numgrad_1df (self, iatm, icoord):
-        return _numgrad_1df (self.mol, self.scanner, self.mol.atom_coords () * param.BOHR,
-            iatm, icoord, delta=self.stepsize)
+    def get_tasks (self, atmlst):
+        offsets = get_stencil (self.stencil)[0]
+        return [(i, j, k) for i in atmlst for j in range (3) for k in offsets]
+
+    def run_displacements (self, scanner, atmlst, chkkey):
+        coords = self.mol.atom_coords () * param.BOHR
+        return run_displacements (self.mol, scanner, coords, self.stepsize,
+                                  self.get_tasks (atmlst), guess=get_guess (self.base),
+                                  max_workers=self.max_workers, chkfile=self.chkfile,
+                                  chkkey=chkkey, verbose=self.verbose)
 
     def kernel (self, atmlst=None, stepsize=None, state=None):
         if atmlst is None:
@@ -49,15 +243,61 @@ class Gradients (rhf_grad.GradientsMixin):
             self.stepsize = stepsize
         if atmlst is None:
             atmlst = list (range (self.mol.natm))
-        
+
         coords = self.mol.atom_coords () * param.BOHR
-        de = [[self._numgrad_1df (i, j) for j in range (3)] for i in atmlst]
+        results = self.run_displacements (self.scanner, atmlst, 'numeric_grad/energy')
+        offsets, weights = get_stencil (self.stencil)
+        nstates = len (results[(atmlst[0],0,offsets[0])]['e_states'])
+        de = np.zeros ((len (atmlst), 3))
+        de_states = np.zeros ((nstates, len (atmlst), 3))
+        for ix, i in enumerate (atmlst):
+            for j in range (3):
+                for k, w in zip (offsets, weights):
+                    de[ix,j] += w * results[(i,j,k)]['e_tot']
+                    de_states[:,ix,j] += w * results[(i,j,k)]['e_states']
+        fac = param.BOHR / stepsize
+        set_guess_(self.scanner, get_guess (self.base))
         self.scanner (_make_mol (self.mol, coords)) # Reset!
-        self.de = np.asarray ([[i for i,j in k] for k in de])
-        self.de_states = np.asarray ([[j for i,j in k] for k in de]).transpose (2,0,1)
+        self.de = de * fac
+        self.de_states = de_states * fac
         if state is not None: self.de = self.de_states[state]
         return self.de
 
+    def hessian (self, atmlst=None, stepsize=None, state=None):
+        '''Semi-numerical Hessian: central finite differences of the analytical nuclear gradients
+        of self.base, which must implement nuc_grad_method.
+
+        Returns:
+            hess : ndarray of shape (len (atmlst), natm, 3, 3)
+                d^2 E / dx[atmlst[i],a] dx[j,b] in Hartree/Bohr^2. Symmetrized if atmlst
+                includes all atoms.
+        '''
+        if atmlst is None:
+            atmlst = self.atmlst
+        if stepsize is None:
+            stepsize = self.stepsize
+        else:
+            self.stepsize = stepsize
+        if atmlst is None:
+            atmlst = list (range (self.mol.natm))
+        mcgrad = self.base.nuc_grad_method ()
+        if state is not None: mcgrad.state = state
+        grad_scanner = mcgrad.as_scanner ()
+        grad_scanner.base.verbose = self.scanner_verbose
+        # Saved gradients are kept apart for each state and stencil
+        chkkey = 'numeric_grad/gradient_state{}_stencil{}'.format (state, self.stencil)
+        results = self.run_displacements (grad_scanner, atmlst, chkkey)
+        offsets, weights = get_stencil (self.stencil)
+        hess = np.zeros ((len (atmlst), 3, self.mol.natm, 3))
+        for ix, i in enumerate (atmlst):
+            for j in range (3):
+                for k, w in zip (offsets, weights):
+                    hess[ix,j] += w * results[(i,j,k)]['de']
+        hess = hess.transpose (0,2,1,3) * param.BOHR / stepsize
+        if len (atmlst) == self.mol.natm and list (atmlst) == list (range (self.mol.natm)):
+            hess = .5 * (hess + hess.transpose (1,0,3,2))
+        return hess
+
     def grad_elec (self, atmlst=None, stepsize=None):
         # This is just computed backwards from full gradients
         if atmlst is None:
@@ -81,4 +321,3 @@ class Gradients (rhf_grad.GradientsMixin):
             self._write(self.mol, self.de, self.atmlst)
             logger.note(self, '----------------------------------------------')
 
-
@@ -1,4 +1,5 @@
 import sys
+import copy
 import numpy as np
 import functools
 import itertools
@@ -350,6 +351,8 @@ class NullOrthBasis (OrthBasisBase):
 
     def _rmatvec (self, x): return x
 
+    def get_diag_orth (self, diag_raw): return np.asarray (diag_raw).copy ()
+
     def get_xmat_rows (self, iroot, _col=None):
         xmat = np.eye (self.nprods_raw[iroot])
         if _col is not None:
@@ -510,6 +513,20 @@ class OrthBasis (OrthBasisBase):
             xmat = xmat[:,_col]
         return xmat
 
+    def get_diag_orth (self, diag_raw):
+        '''Diagonal of raw2orth @ diag (diag_raw) @ raw2orth.H, i.e., the diagonal elements in
+        the orthonormal basis of an operator which is diagonal in the primitive basis'''
+        sqabs = copy.copy (self)
+        sqabs.dtype = np.float64
+        sqabs.manifolds = []
+        for manifold in self.manifolds:
+            manifold = copy.copy (manifold)
+            if manifold.xmat is not None:
+                manifold.xmat = np.abs (manifold.xmat)**2
+            manifold.umat = np.abs (manifold.umat)**2
+            sqabs.manifolds.append (manifold)
+        return sqabs._matvec (np.asarray (diag_raw))
+
     def get_mstr_env (self, addr_sn, addr_m, inv):
         m_strs = self.manifolds[addr_sn].m_strs
         nm, nfrags = m_strs.shape
@@ -1,8 +1,12 @@
+import h5py
 from mrh.my_pyscf.mcscf import chkfile as las_chkfile
 
 KEYS_CONFIG_LASSI = las_chkfile.KEYS_CONFIG_LASSCF + ['nfrags', 'break_symmetry', 'soc', 'opt']
 KEYS_SACONSTR_LASSI = las_chkfile.KEYS_SACONSTR_LASSCF
 KEYS_RESULTS_LASSI = ['e_states', 'e_roots', 'si', 's2', 'nelec', 'wfnsym', 'rootsym']
+# LASSIS fragment basis functions, stored in the subgroup method_key/fbf
+KEYS_FBF_LASSIS = ['sf_converged', 'ch_converged', 'ch_disc_sval', 'converged',
+                   'max_disc_sval']
 
 def load_lsi_(lsi, chkfile=None, method_key='lsi',
               keys_config=KEYS_CONFIG_LASSI,
@@ -23,7 +27,78 @@ def dump_lsi (lsi, chkfile=None, method_key='lsi', mo_coeff=None, ci=None,
                                  ci=ci, overwrite_mol=overwrite_mol, keys_config=keys_config,
                                  keys_saconstr=keys_saconstr, keys_results=keys_results, **kwargs)
 
-                                  
+def dump_fbf (lsi, chkfile=None, method_key='lsi', compression=las_chkfile.CHK_COMPRESSION):
+    '''Save the fragment basis functions of a LASSIS calculation (ci_spin_flips and
+    ci_charge_hops, including unset (None) elements) and the convergence of the CI problems
+    which produced them to the subgroup method_key/fbf of chkfile. The spin flips are stored with
+    one row per fragment (s = 0,1) and the charge hops with one row per (i,a) pair of fragments
+    (in the order s,p). As in dump_las, only changed datasets are rewritten, and the content
+    hashes of the CI vectors are kept on lsi between calls, so that only the fragment basis
+    functions replaced since the last call are hashed again.'''
+    if chkfile is None: chkfile = lsi.chkfile
+    if not chkfile: return lsi
+    nfrags = lsi.nfrags
+    ci_sf = lsi.ci_spin_flips
+    ci_ch = [[ci for ci_s in lsi.ci_charge_hops[i][a] for ci in ci_s]
+             for i in range (nfrags) for a in range (nfrags)]
+    with h5py.File (chkfile, 'a') as fh5:
+        chkdata = las_chkfile._require_method_group (fh5, method_key)
+        fbf = chkdata.require_group ('fbf')
+        for key in KEYS_FBF_LASSIS:
+            val = getattr (lsi, key, None)
+            if val is not None: las_chkfile._put_dataset (fbf, key, val)
+        memo = getattr (lsi, '_fbf_keys_memo', None)
+        if memo is None or memo[0] != (chkfile, method_key): memo = ((chkfile, method_key), {})
+        for lbl, ci in (('sf', ci_sf), ('ch', ci_ch)):
+            memo[1][lbl] = las_chkfile._put_ci (fbf.require_group (lbl), ci,
+                                                compression=compression,
+                                                keys_memo=memo[1].get (lbl, None))
+        lsi._fbf_keys_memo = memo
+    return lsi
 
+def load_fbf_(lsi, chkfile=None, method_key='lsi'):
+    '''Read the data written by dump_fbf into lsi'''
+    if chkfile is None: chkfile = lsi.chkfile
+    if chkfile is None: raise RuntimeError ('chkfile not specified')
+    nfrags = lsi.nfrags
+    with h5py.File (chkfile, 'r') as fh5:
+        if method_key not in fh5 or 'fbf' not in fh5[method_key]:
+            raise KeyError ('{} fragment basis functions not in chkfile'.format (
+                method_key.upper ()))
+        fbf = fh5[method_key]['fbf']
+        for key in KEYS_FBF_LASSIS:
+            if key in fbf: setattr (lsi, key, fbf[key][()])
+        lsi.ci_spin_flips = las_chkfile._get_ci (fbf['sf'], nfrags, 2)
+        ci_ch = las_chkfile._get_ci (fbf['ch'], nfrags*nfrags, 8)
+    lsi.ci_charge_hops = [[[ci_ch[i*nfrags+a][2*s:2*(s+1)] for s in range (4)]
+                           for a in range (nfrags)]
+                          for i in range (nfrags)]
+    # converged fragment basis functions are not reoptimized by the next prepare_states_ call
+    lsi._fbf_from_chk = True
+    return lsi
 
+def dump_lsis (lsi, chkfile=None, method_key='lsi', **kwargs):
+    '''Save a LASSIS calculation to chkfile: the fragment basis functions (see dump_fbf) and,
+    if the model state has been diagonalized, everything saved by dump_lsi.'''
+    if lsi.si is not None:
+        dump_lsi (lsi, chkfile=chkfile, method_key=method_key, **kwargs)
+    return dump_fbf (lsi, chkfile=chkfile, method_key=method_key)
 
+def load_lsis_(lsi, chkfile=None, method_key='lsi', keys_results=KEYS_RESULTS_LASSI):
+    '''Restore a LASSIS calculation from chkfile. The LASSCF reference and the fragment basis
+    functions are read, and if the model state had been diagonalized, the model states are
+    rebuilt from them and the results are read. A chkfile dumped in the middle of
+    LASSIS.prepare_states_ can also be read, in which case the next kernel call resumes from
+    the first unconverged fragment basis function.'''
+    if chkfile is None: chkfile = lsi.chkfile
+    if chkfile is None: raise RuntimeError ('chkfile not specified')
+    lsi._las.load_chk (chkfile=chkfile)
+    lsi.mo_coeff = lsi._las.mo_coeff
+    version, data = las_chkfile._load_group (chkfile, method_key, with_ci=False)
+    if data is None: raise KeyError ('{} record not in chkfile'.format (method_key.upper()))
+    load_fbf_(lsi, chkfile=chkfile, method_key=method_key)
+    if 'si' in data:
+        lsi.set_model_states_()
+        for key in keys_results:
+            if key in data: setattr (lsi, key, data[key])
+    return lsi
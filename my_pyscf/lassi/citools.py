@@ -158,6 +158,28 @@ def get_unique_roots (ci, nelec_r, screen_linequiv=True, screen_thresh=SCREEN_TH
     root_unique = np.ones (nroots, dtype=bool)
     unique_root = np.arange (nroots, dtype=int)
     umat_root = {}
+    for i, j in _get_unique_roots_candidates (ci, nelec_r, lroots, screen_linequiv, screen_thresh,
+                                              discriminator):
+        if not root_unique[i]: continue
+        if not root_unique[j]: continue
+        isequal, umat = _is_equiv_roots (ci[i], ci[j], lroots[i], screen_linequiv, screen_thresh)
+        if umat is not None: umat_root[j] = umat
+        if isequal:
+            root_unique[j] = False
+            unique_root[j] = i
+    for i in range (nroots):
+        assert (root_unique[unique_root[i]])
+    return root_unique, unique_root, umat_root
+
+def get_unique_roots_slow (ci, nelec_r, screen_linequiv=True, screen_thresh=SCREEN_THRESH,
+                           discriminator=None):
+    '''Reference implementation of get_unique_roots, which tests all pairs of CI vectors.'''
+    nroots = len (ci)
+    if discriminator is None: discriminator = np.zeros (nroots, dtype=int)
+    lroots = get_lroots (ci)
+    root_unique = np.ones (nroots, dtype=bool)
+    unique_root = np.arange (nroots, dtype=int)
+    umat_root = {}
     for i, j in combinations (range (nroots), 2):
         if not root_unique[i]: continue
         if not root_unique[j]: continue
@@ -165,30 +187,8 @@ def get_unique_roots (ci, nelec_r, screen_linequiv=True, screen_thresh=SCREEN_TH
         if lroots[i] != lroots[j]: continue
         if ci[i].shape != ci[j].shape: continue
         if discriminator[i] != discriminator[j]: continue
-        isequal = False
-        if ci[i] is ci[j]: isequal = True
-        else:
-            try:
-                isequal = np.shares_memory (ci[i], ci[j], max_work=1000)
-            except np.exceptions.TooHardError:
-                isequal = False
-        if (not isequal) and screen_linequiv:
-            if np.all (ci[i]==ci[j]): isequal = True
-            elif np.all (np.abs (ci[i]-ci[j]) < screen_thresh): isequal=True
-            else:
-                ci_i = ci[i].reshape (lroots[i],-1)
-                ci_j = ci[j].reshape (lroots[j],-1)
-                ovlp = ci_i.conj () @ ci_j.T
-                isequal = np.all (np.abs (ovlp - np.eye (lroots[i])) < screen_thresh)
-                                  # need extremely high precision on this one
-                if not isequal:
-                    err1 = abs ((np.trace (ovlp @ ovlp.conj ().T) / lroots[i]) - 1.0)
-                    err2 = abs ((np.trace (ovlp.conj ().T @ ovlp) / lroots[i]) - 1.0)
-                    isequal = (err1 < screen_thresh) and (err2 < screen_thresh)
-                    if isequal:
-                        u, svals, vh = linalg.svd (ovlp)
-                        assert (len (svals) == lroots[i])
-                        umat_root[j] = u @ vh
+        isequal, umat = _is_equiv_roots (ci[i], ci[j], lroots[i], screen_linequiv, screen_thresh)
+        if umat is not None: umat_root[j] = umat
         if isequal:
             root_unique[j] = False
             unique_root[j] = i
@@ -196,6 +196,117 @@ def get_unique_roots (ci, nelec_r, screen_linequiv=True, screen_thresh=SCREEN_TH
         assert (root_unique[unique_root[i]])
     return root_unique, unique_root, umat_root
 
+def _is_equiv_roots (ci_i, ci_j, lroots, screen_linequiv, screen_thresh):
+    '''Exact equivalence test of get_unique_roots for one pair of groups of CI vectors'''
+    isequal = False
+    umat = None
+    if ci_i is ci_j: isequal = True
+    else:
+        try:
+            isequal = np.shares_memory (ci_i, ci_j, max_work=1000)
+        except np.exceptions.TooHardError:
+            isequal = False
+    if (not isequal) and screen_linequiv:
+        if np.all (ci_i==ci_j): isequal = True
+        elif np.all (np.abs (ci_i-ci_j) < screen_thresh): isequal=True
+        else:
+            ci_i = ci_i.reshape (lroots,-1)
+            ci_j = ci_j.reshape (lroots,-1)
+            ovlp = ci_i.conj () @ ci_j.T
+            isequal = np.all (np.abs (ovlp - np.eye (lroots)) < screen_thresh)
+                              # need extremely high precision on this one
+            if not isequal:
+                err1 = abs ((np.trace (ovlp @ ovlp.conj ().T) / lroots) - 1.0)
+                err2 = abs ((np.trace (ovlp.conj ().T @ ovlp) / lroots) - 1.0)
+                isequal = (err1 < screen_thresh) and (err2 < screen_thresh)
+                if isequal:
+                    u, svals, vh = linalg.svd (ovlp)
+                    assert (len (svals) == lroots)
+                    umat = u @ vh
+    return isequal, umat
+
+try:
+    from numpy.lib.array_utils import byte_bounds
+except ImportError:
+    byte_bounds = np.byte_bounds
+
+FPRINT_NVEC = 4
+
+def _get_unique_roots_candidates (ci, nelec_r, lroots, screen_linequiv, screen_thresh,
+                                  discriminator):
+    '''Pairs (i<j), in lexical order, of groups of CI vectors which may be equivalent according
+    to _is_equiv_roots. The groups are first bucketed by number of electrons, number of roots,
+    shape, and discriminator. Within each bucket, a pair is a candidate if its memory overlaps
+    or, if screen_linequiv, if the fingerprints of the two groups agree to within the largest
+    difference compatible with linear equivalence at the precision screen_thresh.
+
+    The fingerprint of a group of lroots CI vectors C is diag (P) @ U, where P = C'(CC')^-1 C is
+    the projector onto the span of the group and U is a fixed random matrix with elements in
+    [0,1). It is invariant to linear transformations of the group, and each of its elements
+    differs between two groups by at most the trace norm of the difference of their projectors.
+    With t = screen_thresh, every test in _is_equiv_roots implies |CiCj'|_F^2 >= lroots*(1-e),
+    where e <= 2*(1+sqrt(ndet))*t to first order in t if the overlap matrices CC' differ from
+    the identity by less than t elementwise. Then tr (PiPj) >= lroots*(1-e-2*lroots*t), and
+    since Pi-Pj has rank at most 2*lroots,
+        |Pi-Pj|_1 <= 2*lroots*sqrt(e+2*lroots*t) <= 4*lroots*sqrt((lroots+sqrt(ndet))*t),
+    which is the tolerance used. Groups whose overlap matrices are not that close to the identity
+    are paired with all other members of their bucket.
+    '''
+    buckets = {}
+    for i, c in enumerate (ci):
+        disc = discriminator[i]
+        try:
+            hash (disc)
+        except TypeError:
+            disc = repr (disc)
+        key = (tuple (nelec_r[i]), lroots[i], c.shape, disc)
+        buckets.setdefault (key, []).append (i)
+    pairs = []
+    for idx in buckets.values ():
+        if len (idx) < 2: continue
+        pairs.extend (_get_memory_overlap_pairs ([ci[i] for i in idx], idx))
+        if screen_linequiv:
+            pairs.extend (_get_fprint_pairs ([ci[i] for i in idx], idx, lroots[idx[0]],
+                                             screen_thresh))
+    return sorted (set (pairs))
+
+def _get_memory_overlap_pairs (ci, idx):
+    bounds = [byte_bounds (np.asarray (c)) for c in ci]
+    order = np.argsort ([b[0] for b in bounds], kind='stable')
+    pairs = []
+    for k, i in enumerate (order):
+        for j in order[k+1:]:
+            if bounds[j][0] >= bounds[i][1]: break
+            pairs.append ((min (idx[i], idx[j]), max (idx[i], idx[j])))
+    return pairs
+
+def _get_fprint_pairs (ci, idx, lroots, screen_thresh):
+    ci = [np.asarray (c).reshape (lroots, -1) for c in ci]
+    ndet = ci[0].shape[1]
+    umat = np.random.default_rng (0).random ((ndet, FPRINT_NVEC))
+    ovlp = [c.conj () @ c.T for c in ci]
+    isorth = np.array ([np.all (np.abs (o - np.eye (lroots)) < screen_thresh) for o in ovlp])
+    fprint = np.zeros ((len (ci), FPRINT_NVEC))
+    for i in np.where (isorth)[0]:
+        # Loewdin-orthonormalize, so that the fingerprint belongs to the projector
+        w, v = linalg.eigh (ovlp[i])
+        c = (v / np.sqrt (w)) @ v.conj ().T @ ci[i]
+        fprint[i] = (c.conj () * c).real.sum (0) @ umat
+    tol = 4 * lroots * np.sqrt ((lroots + np.sqrt (ndet)) * screen_thresh)
+    pairs = []
+    # Non-orthonormal groups: no useful bound, so every pair is a candidate
+    for i in np.where (~isorth)[0]:
+        for j in range (len (ci)):
+            if j != i: pairs.append ((min (idx[i], idx[j]), max (idx[i], idx[j])))
+    orth = np.where (isorth)[0]
+    order = orth[np.argsort (fprint[orth,0], kind='stable')]
+    for k, i in enumerate (order):
+        for j in order[k+1:]:
+            if fprint[j,0] - fprint[i,0] > tol: break
+            if np.all (np.abs (fprint[j] - fprint[i]) <= tol):
+                pairs.append ((min (idx[i], idx[j]), max (idx[i], idx[j])))
+    return pairs
+
 def _fake_gen_contract_op_si_hdiag (matrix_builder, las, h1, h2, ci_fr, nelec_frs, soc=0,
                                     orbsym=None, wfnsym=None, **kwargs):
     ham, s2, ovlp, _get_ovlp = matrix_builder (las, h1, h2, ci_fr, nelec_frs, soc=soc,
@@ -207,9 +318,12 @@ def _fake_gen_contract_op_si_hdiag (matrix_builder, las, h1, h2, ci_fr, nelec_fr
     def contract_ovlp (x):
         return ovlp @ x
 
-    h_op = CallbackLinearOperator (ham, ham.shape, dtype=ham.dtype, matvec=contract_ham_si)
-    s2_op = CallbackLinearOperator (s2, s2.shape, dtype=s2.dtype, matvec=contract_s2)
-    ovlp_op = CallbackLinearOperator (ovlp, ovlp.shape, dtype=ovlp.dtype, matvec=contract_ovlp)
+    h_op = CallbackLinearOperator (ham, ham.shape, dtype=ham.dtype, matvec=contract_ham_si,
+                                   matmat=contract_ham_si)
+    s2_op = CallbackLinearOperator (s2, s2.shape, dtype=s2.dtype, matvec=contract_s2,
+                                    matmat=contract_s2)
+    ovlp_op = CallbackLinearOperator (ovlp, ovlp.shape, dtype=ovlp.dtype, matvec=contract_ovlp,
+                                      matmat=contract_ovlp)
     hdiag = np.diagonal (ham)
     return h_op, s2_op, ovlp_op, hdiag, _get_ovlp
 
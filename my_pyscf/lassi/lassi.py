@@ -1,7 +1,9 @@
 import sys
+import copy
 import numpy as np
 import time
 from scipy import linalg
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from mrh.my_pyscf.lassi import op_o0
 from mrh.my_pyscf.lassi import op_o1
 from mrh.my_pyscf.lassi import chkfile
@@ -37,6 +39,7 @@ TOL_SI = getattr (__config__, 'lassi_tol_si', 1e-8)
 DAVIDSON_SCREEN_THRESH_SI = getattr (__config__, 'lassi_hsi_screen_thresh', 1e-12)
 PSPACE_SIZE_SI = getattr (__config__, 'lassi_hsi_pspace_size', 400)
 PRIVREF_SI = getattr (__config__, 'lassi_privref_si', True)
+MAX_WORKERS_SI = getattr (__config__, 'lassi_max_workers_si', 1)
 
 op = (op_o0, op_o1)
 
@@ -304,7 +307,14 @@ def lassi (las, mo_coeff=None, ci=None, veff_c=None, h2eff_sub=None, orbsym=None
     # Loop over symmetry blocks
     qn_lbls = ['nelec',] if soc else ['neleca','nelecb',]
     if not break_symmetry: qn_lbls.append ('irrep')
-    for it, (las1,sym,indices,indexed) in enumerate (iterate_subspace_blocks(las,ci,statesym)):
+    max_workers = getattr (las, 'max_workers_si', MAX_WORKERS_SI)
+    si0 = getattr (las, 'si', None)
+    blocks = iterate_subspace_blocks (las, ci, statesym)
+    eig_results = None
+    if max_workers > 1:
+        blocks, eig_results = _eig_blocks_concurrent (las, blocks, e0, h1, h2, soc, opt, davidson_only,
+                                         max_memory, max_workers, si0=si0)
+    for it, (las1,sym,indices,indexed) in enumerate (blocks):
         idx_space, idx_prod = indices
         ci_blk, nelec_blk, smult_blk, disc_blk = indexed
         idx_allprods.extend (list(np.where(idx_prod)[0]))
@@ -320,10 +330,15 @@ def lassi (las, mo_coeff=None, ci=None, veff_c=None, h2eff_sub=None, orbsym=None
             s2_roots.extend (s2_states[idx_space])
             rootsym.extend ([sym,])
             continue
-        wfnsym = None if break_symmetry else sym[-1]
-        las.converged_si, e, c, s2_blk = _eig_block (las1, e0, h1, h2, ci_blk, nelec_blk, smult_blk,
-                                                     disc_blk, soc, opt, davidson_only=davidson_only,
-                                                     max_memory=max_memory)
+        if eig_results is not None:
+            las.converged_si, e, c, s2_blk = eig_results[it]
+        else:
+            wfnsym = None if break_symmetry else sym[-1]
+            las.converged_si, e, c, s2_blk = _eig_block (las1, e0, h1, h2, ci_blk, nelec_blk,
+                                                         smult_blk, disc_blk, soc, opt,
+                                                         davidson_only=davidson_only,
+                                                         max_memory=max_memory,
+                                                         si0=_get_si0_blk (si0, idx_prod))
         si.append (c)
         e_roots.extend (list(e))
         s2_roots.extend (list (s2_blk))
@@ -379,9 +394,30 @@ def lassi (las, mo_coeff=None, ci=None, veff_c=None, h2eff_sub=None, orbsym=None
             break
     return e_roots, si
 
+def _get_si0_blk (si0, idx_prod):
+    '''Rows of the guess SI vectors si0 that belong to one symmetry block, keeping only the
+    vectors that have support in that block. Returns None if there are no such vectors or if
+    si0 does not have the right number of rows (i.e., the model space has changed).'''
+    if si0 is None or si0.shape[0] != idx_prod.size: return None
+    si0 = np.asarray (si0).reshape (idx_prod.size, -1)[idx_prod]
+    idx = linalg.norm (si0, axis=0) > 1e-8
+    if not np.any (idx): return None
+    return si0[:,idx]
+
 def _eig_block (las, e0, h1, h2, ci_blk, nelec_blk, smult_blk, disc_blk, soc, opt,
-                max_memory=param.MAX_MEMORY, davidson_only=False):
-    nstates = np.prod (get_lroots (ci_blk), axis=0).sum ()
+                max_memory=param.MAX_MEMORY, davidson_only=False, incore=None, si0=None):
+    if incore is None:
+        nstates = np.prod (get_lroots (ci_blk), axis=0).sum ()
+        incore = _eig_block_memcheck (las, nstates, opt, max_memory, davidson_only)[0]
+    if not incore:
+        return _eig_block_Davidson (las, e0, h1, h2, ci_blk, nelec_blk, smult_blk, disc_blk, soc,
+                                    opt, si0=si0)
+    return _eig_block_incore (las, e0, h1, h2, ci_blk, nelec_blk, smult_blk, soc, opt)
+
+def _eig_block_memcheck (las, nstates, opt, max_memory, davidson_only):
+    '''Whether a block of nstates model states can be diagonalized incore, and the memory (MB)
+    that its diagonalization requires. For the Davidson algorithm, the latter is only the memory
+    of the subspace vectors; the op_o1 operator intermediates are not counted.'''
     req_memory = 24*nstates*nstates/1e6
     current_memory = lib.current_memory ()[0]
     if current_memory+req_memory > max_memory:
@@ -391,20 +427,94 @@ def _eig_block (las, e0, h1, h2, ci_blk, nelec_blk, smult_blk, disc_blk, soc, op
         lib.logger.info (las, "Need %f MB of %f MB av for incore LASSI diag; Davidson alg forced",
                          req_memory, max_memory-current_memory)
     if davidson_only or current_memory+req_memory > max_memory:
-        return _eig_block_Davidson (las, e0, h1, h2, ci_blk, nelec_blk, smult_blk, disc_blk, soc,
-                                    opt)
-    return _eig_block_incore (las, e0, h1, h2, ci_blk, nelec_blk, smult_blk, soc, opt)
+        max_space_si = getattr (las, 'max_space_si', MAX_SPACE_SI)
+        return False, 8*nstates*(max_space_si+2)/1e6
+    return True, req_memory
+
+def _detach_subspace_env (las):
+    '''Shallow copy of las which retains the fcisolvers and e_states of the current
+    _LASSI_subspace_env after it exits'''
+    las1 = copy.copy (las)
+    las1.fciboxes = [copy.copy (f) for f in las.fciboxes]
+    for f in las1.fciboxes: f.fcisolvers = list (f.fcisolvers)
+    las1.e_states = las.e_states
+    return las1
+
+def _eig_blocks_concurrent (las, blocks, e0, h1, h2, soc, opt, davidson_only, max_memory,
+                            max_workers, si0=None):
+    '''Diagonalize the symmetry blocks generated by iterate_subspace_blocks in a thread pool of
+    at most max_workers workers, each running OpenMP code with lib.num_threads () // max_workers
+    threads. Blocks are started in order of decreasing estimated cost, as long as the sum of the
+    memory required by all running blocks fits in max_memory. A block diagonalized with the
+    Davidson algorithm is assumed to require at least a 1/max_workers share of the memory
+    available at the start. Because each block runs with fewer
+    OpenMP threads than in the serial path, the results agree with the serial path only to within
+    floating-point roundoff.
 
-def _eig_block_Davidson (las, e0, h1, h2, ci_blk, nelec_blk, smult_blk, disc_blk, soc, opt):
-    # si0
+    Returns:
+        blocks : list
+            The items generated by iterate_subspace_blocks, in the same order, with las1
+            replaced by a detached copy (see _detach_subspace_env)
+        results : dict
+            The output of _eig_block for the ith block, for all blocks with more than one state
+    '''
+    log = lib.logger.new_logger (las, las.verbose)
+    blocks = [(_detach_subspace_env (las1), sym, indices, indexed)
+              for las1, sym, indices, indexed in blocks]
+    budget = max_memory - lib.current_memory ()[0]
+    todo = []
+    for i, (las1, sym, indices, indexed) in enumerate (blocks):
+        nstates = np.count_nonzero (indices[1])
+        if nstates == 1: continue
+        incore, req_memory = _eig_block_memcheck (las1, nstates, opt, max_memory, davidson_only)
+        if incore: cost = float (nstates)**3
+        else:
+            cost = float (nstates)**2 * getattr (las, 'max_space_si', MAX_SPACE_SI)
+            # The operator intermediates, which dominate, can't be estimated before they are
+            # built, so hold back a worker's share of the memory for them
+            req_memory = max (req_memory, budget / max_workers)
+        todo.append ((cost, i, incore, req_memory))
+    todo.sort (key=lambda x: -x[0])
+    nthreads = max (1, lib.num_threads () // max_workers)
+    log.debug ('Diagonalizing %d LASSI symmetry blocks with %d workers of %d OpenMP threads',
+               len (todo), max_workers, nthreads)
+    results = {}
+    def _eig_block_worker (i, incore):
+        las1, sym, indices, (ci_blk, nelec_blk, smult_blk, disc_blk) = blocks[i]
+        with lib.with_omp_threads (nthreads):
+            results[i] = _eig_block (las1, e0, h1, h2, ci_blk, nelec_blk, smult_blk, disc_blk,
+                                     soc, opt, incore=incore,
+                                     si0=_get_si0_blk (si0, indices[1]))
+    running = {}
+    mem_running = 0
+    with ThreadPoolExecutor (max_workers=max_workers) as executor:
+        while len (todo) or len (running):
+            j = 0
+            while j < len (todo) and len (running) < max_workers:
+                cost, i, incore, req_memory = todo[j]
+                if len (running) and mem_running+req_memory > budget:
+                    j += 1
+                    continue
+                running[executor.submit (_eig_block_worker, i, incore)] = req_memory
+                mem_running += req_memory
+                todo.pop (j)
+            done = wait (running, return_when=FIRST_COMPLETED)[0]
+            for future in done:
+                future.result ()
+                mem_running -= running.pop (future)
+    return blocks, results
+
+def _eig_block_Davidson (las, e0, h1, h2, ci_blk, nelec_blk, smult_blk, disc_blk, soc, opt,
+                         si0=None, hdiag_shift=None):
     # nroots_si
     # level_shift
+    # hdiag_shift: ndarray of shape (nprods,); added to the diagonal of the Hamiltonian in the
+    # primitive (raw) product-state basis
     verbose = las.verbose
     davidson_log = log = lib.logger.new_logger (las, verbose)
     # We want this Davidson diagonalizer to be louder than usual
     if verbose >= lib.logger.NOTE:
         davidson_log = lib.logger.new_logger (las, verbose+1)
-    si0 = getattr (las, 'si', None)
     level_shift = getattr (las, 'level_shift_si', LEVEL_SHIFT_SI)
     nroots_si = getattr (las, 'nroots_si', NROOTS_SI)
     max_cycle_si = getattr (las, 'max_cycle_si', MAX_CYCLE_SI)
@@ -419,6 +529,9 @@ def _eig_block_Davidson (las, e0, h1, h2, ci_blk, nelec_blk, smult_blk, disc_blk
         las, h1, h2, ci_blk, nelec_blk, smult_fr=smult_blk, soc=soc, disc_fr=disc_blk,
         screen_thresh=screen_thresh
     )
+    if hdiag_shift is not None:
+        hdiag_shift = np.asarray (hdiag_shift)
+        hdiag_raw = hdiag_raw + hdiag_shift
     if verbose >= lib.logger.DEBUG:
         # The sort is slow
         log.debug ("fingerprint of hdiag raw: %15.10e", lib.fp (np.sort (hdiag_raw)))
@@ -430,6 +543,8 @@ def _eig_block_Davidson (las, e0, h1, h2, ci_blk, nelec_blk, smult_blk, disc_blk
     mem_orth = raw2orth.get_nbytes () / 1e6
     t0 = log.timer ('LASSI get orthogonal basis ({:.2f} MB)'.format (mem_orth), *t0)
     hdiag_orth = op[opt].get_hdiag_orth (hdiag_raw, h_op_raw, raw2orth)
+    if hdiag_shift is not None:
+        hdiag_orth = hdiag_orth + raw2orth.get_diag_orth (hdiag_shift)
     if verbose >= lib.logger.DEBUG:
         # The sort is slow
         log.debug ("fingerprint of hdiag orth: %15.10e", lib.fp (np.sort (hdiag_orth)))
@@ -447,7 +562,7 @@ def _eig_block_Davidson (las, e0, h1, h2, ci_blk, nelec_blk, smult_blk, disc_blk
                 hdiag_penalty[i:] = penvalue
     if pspace_size:
         pw, pv, addr = pspace (hdiag_orth, h_op_raw, raw2orth, opt, pspace_size, log=log,
-                               penalty=hdiag_penalty)
+                               penalty=hdiag_penalty, hdiag_shift=hdiag_shift)
         t0 = log.timer ('LASSI make pspace Hamiltonian', *t0)
         if pspace_size >= hdiag_orth.size:
             pv = pv[:,:nroots_si]
@@ -463,20 +578,26 @@ def _eig_block_Davidson (las, e0, h1, h2, ci_blk, nelec_blk, smult_blk, disc_blk
     else:
         x0 = None
     x0 = get_init_guess (hdiag_orth, nroots_si, x0, log=log, penalty=hdiag_penalty)
-    def h_op (x):
-        return raw2orth (h_op_raw (orth2raw (x)))
+    def h_op (xs):
+        # All trial vectors of a Davidson cycle at once
+        xs = orth2raw (np.stack (xs, axis=-1))
+        hxs = h_op_raw (xs)
+        if hdiag_shift is not None:
+            hxs += hdiag_shift[:,None] * xs
+        hxs = raw2orth (hxs)
+        return [hx for hx in hxs.T]
     log.info ("LASSI E(const) = %15.10f", e0)
-    conv, e, x1 = lib.davidson1 (lambda xs: [h_op (x) for x in xs],
-                                 x0, precond_op, nroots=nroots_si,
+    conv, e, x1 = lib.davidson1 (h_op, x0, precond_op, nroots=nroots_si,
                                  verbose=davidson_log, max_cycle=max_cycle_si,
                                  max_space=max_space_si, tol=tol_si)
     conv = all (conv)
     if not conv: log.warn ('LASSI Davidson diagonalization not converged')
-    si1 = np.stack ([orth2raw (x) for x in x1], axis=-1)
-    s2 = np.array ([np.dot (x.conj (), s2_op (x)) for x in si1.T])
+    si1 = orth2raw (np.stack (x1, axis=-1))
+    s2 = lib.einsum ('ij,ij->j', si1.conj (), s2_op (si1))
     return conv, e, si1, s2
 
-def pspace (hdiag_orth, h_op_raw, raw2orth, opt, pspace_size, log=None, penalty=None):
+def pspace (hdiag_orth, h_op_raw, raw2orth, opt, pspace_size, log=None, penalty=None,
+            hdiag_shift=None):
     heff = hdiag_orth.copy ()
     if penalty is not None:
         heff += penalty
@@ -488,6 +609,12 @@ def pspace (hdiag_orth, h_op_raw, raw2orth, opt, pspace_size, log=None, penalty=
         except AttributeError:
             addr = np.argsort(heff)[:pspace_size].copy()
     h0 = op[opt].pspace_ham (h_op_raw, raw2orth, addr)
+    if hdiag_shift is not None:
+        # Operator which is diagonal in the raw basis
+        x = np.zeros ((raw2orth.shape[0], len (addr)), dtype=raw2orth.dtype)
+        x[addr,np.arange (len (addr))] = 1.0
+        x = raw2orth.H (x)
+        h0 = h0 + x.conj ().T @ (hdiag_shift[:,None] * x)
     pw, pv = linalg.eigh (h0)
     if log is not None:
         raw2orth.log_debug_hdiag_orth (log, hdiag_orth, idx=addr)
@@ -509,6 +636,8 @@ def pspace (hdiag_orth, h_op_raw, raw2orth, opt, pspace_size, log=None, penalty=
             x[addr[i]] = 1.0
             x = raw2orth.H (x)
             e_ref = np.dot (x.conj (), h_op_raw (x))
+            if hdiag_shift is not None:
+                e_ref += np.dot (x.conj (), hdiag_shift * x)
             log.error (fmt_str.format (addr[i], e_pspace[i], e_hdiag[i], e_ref))
         raise RuntimeError ("LASSI hdiag and pspace Hamiltonian disagree!")
     return pw, pv, addr
@@ -657,7 +786,8 @@ def _eig_block_incore (las, e0, h1, h2, ci_blk, nelec_blk, smult_blk, soc, opt):
     s2_blk = ((s2_blk @ c) * c.conj ()).sum (0)
     return True, e, c, s2_blk
 
-def make_stdm12s (las, ci=None, orbsym=None, soc=False, break_symmetry=False, spaces=None, opt=1):
+def make_stdm12s (las, ci=None, orbsym=None, soc=False, break_symmetry=False, spaces=None, opt=1,
+                  blksize=None, out=None):
     ''' Evaluate <I|p'q|J> and <I|p'r'sq|J> where |I>, |J> are LAS states.
 
         Args:
@@ -675,12 +805,43 @@ def make_stdm12s (las, ci=None, orbsym=None, soc=False, break_symmetry=False, sp
             opt: Optimization level, i.e.,  take outer product of
                 0: CI vectors
                 1: TDMs
+            blksize: integer
+                Maximum number of bra and ket LAS states per block when out is provided (see
+                iter_stdm12s). Requires out; use iter_stdm12s to process blocks in memory.
+            out: instance of :class:`h5py.Group`
+                If provided, stdm1s and stdm2s are computed blockwise and written to datasets
+                'stdm1s' and 'stdm2s' of this HDF5 group instead of being held in memory, and the
+                datasets are returned. Requires opt=1.
 
         Returns:
             stdm1s: ndarray of shape (nroots,2,ncas,ncas,nroots) if soc==False;
                 or of shape (nroots,2*ncas,2*ncas,nroots) if soc==True.
             stdm2s: ndarray of shape (nroots,2,ncas,ncas,2,ncas,ncas,nroots)
     '''
+    if (blksize is not None) and (out is None):
+        raise ValueError ("make_stdm12s blksize requires out; use iter_stdm12s to process the "
+                          "blocks in memory")
+    if out is not None:
+        if opt != 1: raise NotImplementedError ("blockwise make_stdm12s with opt={}".format (opt))
+        if ci is None: ci = las.ci
+        nprods = np.prod (get_lroots (ci), axis=0).sum ()
+        norb = las.ncas
+        dtype = ci[0][0].dtype
+        shape1 = (nprods, 2*norb, 2*norb, nprods) if soc else (nprods, 2, norb, norb, nprods)
+        shape2 = (nprods, 2, norb, norb, 2, norb, norb, nprods)
+        stdm1s = out.create_dataset ('stdm1s', shape1, dtype=dtype, fillvalue=0)
+        stdm2s = out.create_dataset ('stdm2s', shape2, dtype=dtype, fillvalue=0)
+        for bra, ket, d1s, d2s in iter_stdm12s (las, ci=ci, orbsym=orbsym, soc=soc,
+                                                 break_symmetry=break_symmetry, spaces=spaces,
+                                                 blksize=blksize):
+            # Write hyperslabs of contiguous state indices rather than using fancy indexing
+            for i0, i1, a0 in _contig_runs (bra):
+                a1 = a0 + i1 - i0
+                for j0, j1, b0 in _contig_runs (ket):
+                    b1 = b0 + j1 - j0
+                    stdm1s[a0:a1,...,b0:b1] = d1s[i0:i1,...,j0:j1]
+                    stdm2s[a0:a1,...,b0:b1] = d2s[i0:i1,...,j0:j1]
+        return stdm1s, stdm2s
     # NOTE: A spin-pure dm1s is two ncas-by-ncas matrices,
     #    _______    _______
     #    |     |    |     |
@@ -771,6 +932,41 @@ def make_stdm12s (las, ci=None, orbsym=None, soc=False, break_symmetry=False, sp
             stdm2s[a,...,b] = d2s[i,...,j]
     return stdm1s, stdm2s
 
+def _contig_runs (idx):
+    '''Split an array of integers into runs of consecutive values. Returns a list of tuples
+    (i0, i1, idx[i0]) such that idx[i0:i1] == idx[i0] + np.arange (i1-i0).'''
+    idx = np.asarray (idx)
+    brk = np.where (np.diff (idx) != 1)[0] + 1
+    i0 = np.append (0, brk)
+    i1 = np.append (brk, len (idx))
+    return [(p, q, idx[p]) for p, q in zip (i0, i1)]
+
+def iter_stdm12s (las, ci=None, orbsym=None, soc=False, break_symmetry=False, spaces=None,
+                  blksize=None):
+    ''' Evaluate <I|p'q|J> and <I|p'r'sq|J> where |I>, |J> are LAS states, in blocks of at most
+        blksize bra and ket states at a time. Blocks coupling states of different symmetry, which
+        are zero, are not generated. Arguments are the same as for make_stdm12s (with opt=1).
+
+        Yields:
+            bra: ndarray of ints
+                Indices of the LAS states in the bra block
+            ket: ndarray of ints
+                Indices of the LAS states in the ket block
+            stdm1s: ndarray of shape (len(bra),2,ncas,ncas,len(ket)) if soc==False;
+                or of shape (len(bra),2*ncas,2*ncas,len(ket)) if soc==True.
+            stdm2s: ndarray of shape (len(bra),2,ncas,ncas,2,ncas,ncas,len(ket))
+    '''
+    if ci is None: ci = las.ci
+    statesym = las_symm_tuple (las, spaces=spaces, break_spin=soc, break_symmetry=break_symmetry,
+                               verbose=0)[0]
+    for las1, sym, indices, indexed in iterate_subspace_blocks (las, ci, statesym, spaces=spaces):
+        idx_prod = np.where (indices[1])[0]
+        ci_blk, nelec_blk, smult_blk, disc_blk = indexed
+        smult_fr = None if soc else smult_blk
+        for bra, ket, d1s, d2s in op_o1.iter_stdm12s (las1, ci_blk, nelec_blk, blksize=blksize,
+                                                       smult_fr=smult_fr):
+            yield idx_prod[bra], idx_prod[ket], d1s, d2s
+
 def guess_rootsym (si, statesym, lroots):
     rootsym = []
     nprods = np.prod (lroots, axis=0)
@@ -937,6 +1133,97 @@ def roots_make_rdm12s (las, ci, si, orbsym=None, soc=None, break_symmetry=None,
                                break_symmetry=break_symmetry, spaces=spaces, opt=opt,
                                **kwargs)
 
+def roots_make_rdm1s (las, ci, si, break_symmetry=None, spaces=None, **kwargs):
+    '''Evaluate the 1-electron reduced density matrices of LASSI states, without crunching any
+    2-electron intermediates
+
+        Args:
+            las: LASCI object
+            ci: list of list of ci vectors
+            si: tagged ndarray of shape (nroots,nroots)
+               Linear combination vectors defining LASSI states.
+
+        Kwargs:
+            break_symmetry: logical
+                Whether to allow coupling between states of different point-group irreps
+                Overrides tag of si if provided by caller.
+            spaces : list of instances of :class:`SingleLASRootspace`
+                Contain symmetry information; defaults to data from las
+
+        Returns:
+            rdm1s: ndarray of shape (nroots,2,ncas,ncas)
+    '''
+    if getattr (si, 'soc', getattr (las, 'soc', False)):
+        raise NotImplementedError ("1-RDMs alone with spin-orbit coupling")
+    if break_symmetry is None:
+        break_symmetry = getattr (si, 'break_symmetry', getattr (las, 'break_symmetry', False))
+    nroots = si.shape[1]
+    rdm1s = [None for i in range (nroots)]
+    statesym = las_symm_tuple (las, spaces=spaces, break_symmetry=break_symmetry, verbose=0)[0]
+    lroots = get_lroots (ci)
+    rootsym = guess_rootsym (si, statesym, lroots)
+    for las1, sym, indcs, indxd in iterate_subspace_blocks(las,ci,statesym,subset=set(rootsym),spaces=spaces):
+        idx_ci, idx_prod = indcs
+        ci_blk, nelec_blk, smult_blk, disc_blk = indxd
+        idx_si = np.all (np.array (rootsym) == sym, axis=1)
+        si_blk = si[np.ix_(idx_prod,idx_si)]
+        t0 = (lib.logger.process_clock (), lib.logger.perf_counter ())
+        d1s = op_o1.roots_make_rdm1s (las1, ci_blk, nelec_blk, si_blk, smult_fr=smult_blk,
+                                      **kwargs)
+        t0 = lib.logger.timer (las, 'LASSI rdm1s rootsym {}'.format (sym), *t0)
+        for (i,a) in enumerate (np.where (idx_si)[0]):
+            rdm1s[a] = d1s[i]
+    return np.stack (rdm1s, axis=0)
+
+def roots_make_rdm1s_ontop (las, ci, si, grid2amo, break_symmetry=None, spaces=None, **kwargs):
+    '''Evaluate the 1-electron reduced density matrices of LASSI states and the part of their
+    on-top pair densities on a grid which depends on the 2-electron reduced density matrices,
+    without building the latter
+
+        Args:
+            las: LASCI object
+            ci: list of list of ci vectors
+            si: tagged ndarray of shape (nroots,nroots)
+               Linear combination vectors defining LASSI states.
+            grid2amo: ndarray of shape (nderiv,ngrids,ncas)
+               Values (and gradients if nderiv==4) of the active orbitals on the grid
+
+        Kwargs:
+            break_symmetry: logical
+                Whether to allow coupling between states of different point-group irreps
+                Overrides tag of si if provided by caller.
+            spaces : list of instances of :class:`SingleLASRootspace`
+                Contain symmetry information; defaults to data from las
+
+        Returns:
+            rdm1s: ndarray of shape (nroots,2,ncas,ncas)
+            pi2: ndarray of shape (nroots,nderiv,ngrids)
+                1/2 * sum_pqrs phi_p phi_q dm2[p,q,r,s] phi_r phi_s, and its gradient
+    '''
+    if getattr (si, 'soc', getattr (las, 'soc', False)):
+        raise NotImplementedError ("on-top pair density with spin-orbit coupling")
+    if break_symmetry is None:
+        break_symmetry = getattr (si, 'break_symmetry', getattr (las, 'break_symmetry', False))
+    nroots = si.shape[1]
+    rdm1s = [None for i in range (nroots)]
+    pi2 = [None for i in range (nroots)]
+    statesym = las_symm_tuple (las, spaces=spaces, break_symmetry=break_symmetry, verbose=0)[0]
+    lroots = get_lroots (ci)
+    rootsym = guess_rootsym (si, statesym, lroots)
+    for las1, sym, indcs, indxd in iterate_subspace_blocks(las,ci,statesym,subset=set(rootsym),spaces=spaces):
+        idx_ci, idx_prod = indcs
+        ci_blk, nelec_blk, smult_blk, disc_blk = indxd
+        idx_si = np.all (np.array (rootsym) == sym, axis=1)
+        si_blk = si[np.ix_(idx_prod,idx_si)]
+        t0 = (lib.logger.process_clock (), lib.logger.perf_counter ())
+        d1s, p2 = op_o1.roots_make_rdm1s_ontop (las1, ci_blk, nelec_blk, si_blk, grid2amo,
+                                                smult_fr=smult_blk, **kwargs)
+        t0 = lib.logger.timer (las, 'LASSI rdm1s_ontop rootsym {}'.format (sym), *t0)
+        for (i,a) in enumerate (np.where (idx_si)[0]):
+            rdm1s[a] = d1s[i]
+            pi2[a] = p2[i]
+    return np.stack (rdm1s, axis=0), np.stack (pi2, axis=0)
+
 def root_trans_rdm12s (las, ci, si_bra, si_ket, state=0, orbsym=None, soc=None, break_symmetry=None,
                        spaces=None, opt=1, **kwargs):
     '''Evaluate 1- and 2-electron reduced transition density matrices of one single pair of LASSI
@@ -1089,6 +1376,7 @@ class LASSI(lib.StreamObject):
         self.davidson_screen_thresh_si = DAVIDSON_SCREEN_THRESH_SI
         self.pspace_size_si = PSPACE_SIZE_SI
         self.privref_si = PRIVREF_SI
+        self.max_workers_si = MAX_WORKERS_SI
         self._keys = set((self.__dict__.keys())).union(keys)
 
     def copy (self):
@@ -58,7 +58,10 @@ class ExcitationPSFCISolver (ProductStateFCISolver):
     |ref(i)> = A prod_K |ci(ref(i))_K>
     |exc> = A prod_{K in excited} |ci(exc)_K> prod_{K not in excited} |ci(ref(0))_K>
 
-    with {ci(ref(i))_K} fixed.'''
+    with {ci(ref(i))_K} fixed.
+
+    This class has its own kernel and does not go through ProductStateFCISolver._1shot, so the
+    max_workers attribute inherited from ProductStateFCISolver has no effect.'''
 
     def __init__(self, solvers_ref, ci_ref, norb_ref, nelec_ref, orbsym_ref=None,
                  wfnsym_ref=None, stdout=None, verbose=0, opt=0, ref_weights=None, 
@@ -61,6 +61,7 @@ class HessianOperator (sparse_linalg.LinearOperator):
         self.fock1 = self.get_fock1 (self.h1, self.h2_paaa, self.casdm1, self.casdm2)
         self.spaces = list_spaces (lsi)
         self.e_roots_si = np.zeros (self.nroots_si)
+        self._hobj_cache = None # set by _init_fragints_
         self.e_roots_si = np.dot (self.si.conj ().T, self.hsi_op (self.ci, self.si))
         if self.opt > 0: self._init_fragints_()
 
@@ -83,6 +84,8 @@ class HessianOperator (sparse_linalg.LinearOperator):
             ptmap[:,1] += self.nroots*(i+1)
             myint.symmetrize_pt1_(ptmap)
             self._ptmaps.append (ptmap)
+        # HamS2OvlpOperators objects built on self._fragints, reused by hsi_op
+        self._hobj_cache = {}
 
     def _make_ints_cache (self, *args, **kwargs):
         return self._fragints
@@ -188,9 +191,11 @@ class HessianOperator (sparse_linalg.LinearOperator):
         ncore, ncas = self.lsi.ncore, self.lsi.ncas
         nocc = ncore+ncas
         h0, h1, h2 = ham_2q
+        kwargs = {}
+        if self._hobj_cache is not None: kwargs['_hobj_cache'] = self._hobj_cache
         ham_op = op[self.opt].gen_contract_op_si_hdiag (
             self.lsi, h1, h2, ci, nelec_frs,
-            pt_order=self.pt_order[:len(ci[0])], do_pt_order=pto,
+            pt_order=self.pt_order[:len(ci[0])], do_pt_order=pto, **kwargs
         )[0]
         hsi = ham_op (si) - (self.e_roots_si - h0) * si
         if add_transpose is not None and self.opt==0:
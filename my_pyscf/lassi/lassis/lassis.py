@@ -13,10 +13,11 @@ from mrh.my_pyscf.mcscf.lasci import get_space_info
 from mrh.my_pyscf.mcscf.productstate import ProductStateFCISolver
 from mrh.my_pyscf.lassi.lassis.excitations import ExcitationPSFCISolver
 from mrh.my_pyscf.lassi.spaces import spin_shuffle, spin_shuffle_ci
-from mrh.my_pyscf.lassi.spaces import _spin_shuffle, list_spaces
+from mrh.my_pyscf.lassi.spaces import _spin_shuffle, list_spaces, SingleLASRootspace
 from mrh.my_pyscf.lassi.spaces import all_single_excitations
 from mrh.my_pyscf.lassi.spaces import orthogonal_excitations, combine_orthogonal_excitations
 from mrh.my_pyscf.lassi.lassi import LASSI
+from mrh.my_pyscf.lassi import chkfile
 
 # TODO: split prepare_states into three steps
 # 1. Compute the number of unique fragment CI vectors to be computed (including sz-flips but not
@@ -69,11 +70,19 @@ def prepare_model_states (lsi, ci_ref, ci_sf, ci_ch):
             spaces_ch[i][a].append (space_ias)
     t1=log.timer ("LASSIS model space preparation: make charge-hop objects ", *t1)
     # Excitation products and spin-shuffling
-    if lsi.nfrags > 3:
-        spaces = charge_excitation_products (lsi, spaces,spaces_ch, nroots_ref=1)
-    t1=log.timer ("LASSIS model space preparation: make charge excitation products ", *t1)
-    spaces = spin_flip_products (las, spaces, spin_flips, nroots_ref=1)
-    t1=log.timer ("LASSIS model space preparation: make spin flip products ", *t1)
+    key = _model_rootspaces_key (las, ci_sf, ci_ch)
+    spaces1 = _model_rootspaces_cached (lsi, key, spaces, spin_flips)
+    if spaces1 is not None:
+        spaces = spaces1
+        t1=log.timer ("LASSIS model space preparation: reuse spin flip products ", *t1)
+    else:
+        if lsi.nfrags > 3:
+            spaces = charge_excitation_products (lsi, spaces,spaces_ch, nroots_ref=1)
+        t1=log.timer ("LASSIS model space preparation: make charge excitation products ", *t1)
+        spaces = spin_flip_products (las, spaces, spin_flips, nroots_ref=1)
+        t1=log.timer ("LASSIS model space preparation: make spin flip products ", *t1)
+        lsi._model_rootspaces = (key, [(space.charges, space.spins, space.smults, space.weight,
+                                        space.entmap, space.fragsym) for space in spaces])
     # Throat-clear
     weights = [space.weight for space in spaces]
     charges = [space.charges for space in spaces]
@@ -98,6 +107,45 @@ def prepare_model_states (lsi, ci_ref, ci_sf, ci_ch):
     log.timer ("LASSIS model space preparation", *t0)
     return las, entmaps
 
+def _model_rootspaces_key (las, ci_sf, ci_ch):
+    key = tuple (tuple (map (tuple, x)) for x in get_space_info (las)[:3])
+    key_sf = tuple (tuple (c is not None for c in ci_sf_i) for ci_sf_i in ci_sf)
+    key_ch = tuple (tuple (tuple ((c[0] is not None) and (c[1] is not None) for c in ci_ch_ia)
+                           for ci_ch_ia in ci_ch_i) for ci_ch_i in ci_ch)
+    return key + (key_sf, key_ch)
+
+def _model_rootspaces_cached (lsi, key, spaces, spin_flips):
+    '''Reproduce the charge-excitation and spin-flip products of prepare_model_states without
+    enumerating them, if the reference rootspace and the set of available fragment basis functions
+    are the same as the last time this was called for lsi (e.g., at the previous geometry of a
+    scanner). Only the CI vectors are repopulated.
+
+    Returns:
+        spaces : list of instances of :class:`SingleLASRootspace` or None
+            None if there is no matching cache
+    '''
+    cache = getattr (lsi, '_model_rootspaces', None)
+    if cache is None or cache[0] != key: return None
+    qns = cache[1]
+    nspaces = len (spaces)
+    if len (qns) < nspaces: return None
+    for space, (charges, spins, smults, weight, entmap, fragsym) in zip (spaces, qns):
+        if not (np.array_equal (space.charges, charges) and np.array_equal (space.spins, spins)
+                and np.array_equal (space.smults, smults)):
+            return None
+    space0 = spaces[0]
+    spaces = spaces + [SingleLASRootspace (space0.las, spins, smults, charges, weight,
+                                           nlas=space0.nlas, nelelas=space0.nelelas,
+                                           fragsym=fragsym, stdout=space0.stdout,
+                                           verbose=space0.verbose)
+                       for (charges, spins, smults, weight, entmap, fragsym) in qns[nspaces:]]
+    for space, qn in zip (spaces, qns):
+        space.weight = qn[3]
+        space.entmap = qn[4]
+    logger.debug (lsi, 'LASSIS reusing %d enumerated spin-flip product rootspaces',
+                  len (spaces) - nspaces)
+    return _spin_shuffle_ci_(spaces, spin_flips, 1, nspaces)
+
 def prepare_fbf (lsi, ci_ref, ci_sf, ci_ch, ncharge=1, nspin=0, sa_heff=True,
                  deactivate_vrv=False, crash_locmin=False):
     t0 = (logger.process_clock (), logger.perf_counter ())
@@ -120,7 +168,7 @@ def prepare_fbf (lsi, ci_ref, ci_sf, ci_ch, ncharge=1, nspin=0, sa_heff=True,
     las1.e_states = las1.energy_nuc () + np.array (las1.states_energy_elec ())
     # 3. Charge excitations
     if ncharge:
-        las2 = all_single_excitations (las1, filter_shuffles=True)
+        las2 = _all_single_excitations_cached (lsi, las1)
         conv_ch, ci_ch, max_disc_sval = single_excitations_ci (
             lsi, las2, las1, ci_ch, ncharge=ncharge, sa_heff=sa_heff,
             deactivate_vrv=deactivate_vrv, spin_flips=spin_flips, crash_locmin=crash_locmin,
@@ -129,6 +177,21 @@ def prepare_fbf (lsi, ci_ref, ci_sf, ci_ch, ncharge=1, nspin=0, sa_heff=True,
     log.timer ("LASSIS fragment basis functions preparation", *t0)
     return conv_sf and conv_ch, ci_sf, ci_ch, max_disc_sval
 
+def _all_single_excitations_cached (lsi, las1):
+    '''all_single_excitations (las1, filter_shuffles=True), skipping the enumeration of the
+    rootspaces if the charges, spins, and spin multiplicities of the reference rootspaces are the
+    same as the last time this was called for lsi (e.g., at the previous geometry of a scanner)'''
+    key = tuple (tuple (map (tuple, x)) for x in get_space_info (las1)[:3])
+    cache = getattr (lsi, '_fbf_rootspaces', None)
+    if cache is not None and cache[0] == key:
+        weights, charges, spins, smults = cache[1]
+        logger.debug (lsi, 'LASSIS reusing %d enumerated singly-excited rootspaces',
+                      len (weights) - las1.nroots)
+        return las1.state_average (weights=weights, charges=charges, spins=spins, smults=smults)
+    las2 = all_single_excitations (las1, filter_shuffles=True)
+    lsi._fbf_rootspaces = (key, (list (las2.weights),) + tuple (get_space_info (las2)[:3]))
+    return las2
+
 def single_excitations_ci (lsi, las2, las1, ci_ch, ncharge=1, sa_heff=True, deactivate_vrv=False,
                            spin_flips=None, crash_locmin=False, ham_2q=None):
     log = logger.new_logger (lsi, lsi.verbose)
@@ -190,6 +253,11 @@ def single_excitations_ci (lsi, las2, las1, ci_ch, ncharge=1, sa_heff=True, deac
                 log.debug ('by %s', spaces[i].single_excitation_description_string (space))
         assert (key not in keys), 'Problem enumerating model states! Talk to Matt about it!'
         keys.add (key)
+        ifrag, afrag, spin = key
+        if _fbf_restored (lsi, ci_ch[ifrag][afrag][spin], lsi.ch_converged[ifrag,afrag,spin]):
+            log.info ("Electron hop %s restored from chkfile", keystr)
+            max_max_disc = max (max_max_disc, lsi.ch_disc_sval[ifrag,afrag,spin])
+            continue
         # throat-clearing into ExcitationPSFCISolver
         ciref = [[] for j in range (nfrags)]
         for k in range (nfrags):
@@ -208,7 +276,6 @@ def single_excitations_ci (lsi, las2, las1, ci_ch, ncharge=1, sa_heff=True, deac
         smults = spaces[i].smults
         for k in np.where (excfrags)[0]:
             psexc.set_excited_fragment_(k, (neleca[k],nelecb[k]), smults[k])
-        ifrag, afrag, spin = key
         norb_i, norb_a, smult_i, smult_a = norb[ifrag], norb[afrag], smults[ifrag], smults[afrag]
         nelec_i, nelec_a = (neleca[ifrag],nelecb[ifrag]), (neleca[afrag],nelecb[afrag])
         # Going into psexc.kernel, they have to be in lexical order
@@ -237,9 +304,19 @@ def single_excitations_ci (lsi, las2, las1, ci_ch, ncharge=1, sa_heff=True, deac
         converged = converged and conv
         log.info ('Electron hop {} max disc sval: {}'.format (keystr, disc_svals_max))
         max_max_disc = max (max_max_disc, disc_svals_max)
+        lsi.ch_converged[ifrag,afrag,spin] = conv
+        lsi.ch_disc_sval[ifrag,afrag,spin] = disc_svals_max
+        lsi.dump_fbf ()
         t0 = log.timer ("Electron hop {}".format (keystr), *t0)
     return converged, ci_ch, max_max_disc
 
+def _fbf_restored (lsi, ci, conv):
+    '''Whether the fragment basis function(s) ci read from a chkfile (see LASSIS.load_chk_) can
+    be used without reoptimizing them'''
+    if not getattr (lsi, '_fbf_from_chk', False): return False
+    if isinstance (ci, list) and any ([c is None for c in ci]): return False
+    return (ci is not None) and bool (conv)
+
 class SpinFlips (object):
     '''For a single fragment, bundle the ci vectors of various spin-flipped states with their
        corresponding quantum numbers. Instances of this object are stored together in a list
@@ -339,16 +416,22 @@ def all_spin_flips (lsi, las, ci_sf, nspin=1, ham_2q=None):
             smults1_i.append (smult-2)
             spins1_i.append (smult-3)
             ci0 = ci_sf[ifrag][0]
-            m2 = np.sign (spin) * (abs (spin) - 2) if abs (spin) > 1 else spin
-            conv, e_i_down, ci1_i_down = cisolve (smult-2, m2, ndn0[ifrag], ci0)
-            log.info ("LASSIS fragment %d spin down (%de,%do;2S+1=%d) statelet energies:",
-                      ifrag, nelec, norb, smult-2)
-            for ix, e in enumerate (e_i_down):
-                log.info (" %d %15.10e", ix, e)
-            if not conv: log.warn ("CI vectors for spin-lowering of fragment %i not converged",
-                                   ifrag)
-            converged = converged & conv
-            ci_sf[ifrag][0] = ci1_i_down
+            if _fbf_restored (lsi, ci0, lsi.sf_converged[ifrag,0]):
+                log.info ("LASSIS fragment %d spin down restored from chkfile", ifrag)
+                ci1_i_down = ci0
+            else:
+                m2 = np.sign (spin) * (abs (spin) - 2) if abs (spin) > 1 else spin
+                conv, e_i_down, ci1_i_down = cisolve (smult-2, m2, ndn0[ifrag], ci0)
+                log.info ("LASSIS fragment %d spin down (%de,%do;2S+1=%d) statelet energies:",
+                          ifrag, nelec, norb, smult-2)
+                for ix, e in enumerate (e_i_down):
+                    log.info (" %d %15.10e", ix, e)
+                if not conv: log.warn ("CI vectors for spin-lowering of fragment %i not converged",
+                                       ifrag)
+                converged = converged & conv
+                ci_sf[ifrag][0] = ci1_i_down
+                lsi.sf_converged[ifrag,0] = conv
+                lsi.dump_fbf ()
             ci1_i.append (ci1_i_down)
         min_npair = max (0, nelec-norb)
         max_smult = (nelec - 2*min_npair) + 1
@@ -358,16 +441,22 @@ def all_spin_flips (lsi, las, ci_sf, nspin=1, ham_2q=None):
             smults1_i.append (smult+2)
             spins1_i.append (smult+1)
             ci0 = ci_sf[ifrag][1]
-            m2 = np.sign (spin) * (abs (spin) + 2)
-            conv, e_i_down, ci1_i_up = cisolve (smult+2, m2, nup0[ifrag], ci0)
-            log.info ("LASSIS fragment %d spin up (%de,%do;2S+1=%d) statelet energies:",
-                      ifrag, nelec, norb, smult+2)
-            for ix, e in enumerate (e_i_down):
-                log.info ("%d %15.10e", ix, e)
-            if not conv: log.warn ("CI vectors for spin-raising of fragment %i not converged",
-                                   ifrag)
-            converged = converged & conv
-            ci_sf[ifrag][1] = ci1_i_up
+            if _fbf_restored (lsi, ci0, lsi.sf_converged[ifrag,1]):
+                log.info ("LASSIS fragment %d spin up restored from chkfile", ifrag)
+                ci1_i_up = ci0
+            else:
+                m2 = np.sign (spin) * (abs (spin) + 2)
+                conv, e_i_down, ci1_i_up = cisolve (smult+2, m2, nup0[ifrag], ci0)
+                log.info ("LASSIS fragment %d spin up (%de,%do;2S+1=%d) statelet energies:",
+                          ifrag, nelec, norb, smult+2)
+                for ix, e in enumerate (e_i_down):
+                    log.info ("%d %15.10e", ix, e)
+                if not conv: log.warn ("CI vectors for spin-raising of fragment %i not converged",
+                                       ifrag)
+                converged = converged & conv
+                ci_sf[ifrag][1] = ci1_i_up
+                lsi.sf_converged[ifrag,1] = conv
+                lsi.dump_fbf ()
             ci1_i.append (ci1_i_up)
         smults1.append (smults1_i)
         spins1.append (spins1_i)
@@ -592,6 +681,13 @@ class LASSIS (LASSI):
                 p = 0,1 = i,a.
             entmaps: list of length nroots of tuple of tuples
                 Tracks which fragments are entangled to one another in each rootspace
+            sf_converged: ndarray of shape (nfrags,2)
+                Whether the CI problem for each element of ci_spin_flips converged
+            ch_converged: ndarray of shape (nfrags,nfrags,4)
+                Whether the ExcitationPSFCISolver problem for each element [i][a][s] of
+                ci_charge_hops converged
+            ch_disc_sval: ndarray of shape (nfrags,nfrags,4)
+                Largest discarded singular value for each element [i][a][s] of ci_charge_hops
         '''
         self.ncharge = ncharge
         self.nspin = nspin
@@ -606,7 +702,14 @@ class LASSIS (LASSI):
         self.ci_charge_hops = [[[[None,None] for s in range (4)]
                                 for a in range (self.nfrags)]
                                for i in range (self.nfrags)]
+        self.sf_converged = np.zeros ((self.nfrags,2), dtype=bool)
+        self.ch_converged = np.zeros ((self.nfrags,self.nfrags,4), dtype=bool)
+        self.ch_disc_sval = np.zeros ((self.nfrags,self.nfrags,4))
         self._cached_ham_2q = None
+        self._fbf_rootspaces = None
+        self._model_rootspaces = None
+        self._fbf_keys_memo = None
+        self._fbf_from_chk = False
         self.ci = None
         if las.nroots>1:
             logger.warn (self, ("Only the first LASSCF state is used by LASSIS! "
@@ -626,6 +729,9 @@ class LASSIS (LASSI):
              for xia in xi]
             for xi in self.ci_charge_hops
         ]
+        mycopy.sf_converged = self.sf_converged.copy ()
+        mycopy.ch_converged = self.ch_converged.copy ()
+        mycopy.ch_disc_sval = self.ch_disc_sval.copy ()
         return mycopy
 
     def ham_2q (self, *args, **kwargs):
@@ -663,6 +769,7 @@ class LASSIS (LASSI):
             self.e_roots, self.si = self.eig (**kwargs)
             t1 = log.timer ("LASSIS diagonalization", *t1)
 
+        self.dump_chk ()
         log.timer ("LASSIS kernel", *t0)
         return self.e_roots, self.si
 
@@ -701,7 +808,20 @@ class LASSIS (LASSI):
         )
         self.ci_spin_flips = ci_sf
         self.ci_charge_hops = ci_ch
+        self._fbf_from_chk = False
 
+        self.set_model_states_(ci_ref=ci_ref)
+        log.info ('LASSIS model state summary: %d rootspaces; %d model states; converged? %s',
+                  self.nroots, self.get_lroots ().prod (0).sum (), str (self.converged))
+        log.info ('LASSIS overall max disc sval: %e', self.max_disc_sval)
+        return self.converged
+
+    def set_model_states_(self, ci_ref=None, ci_sf=None, ci_ch=None):
+        '''Build the model state rootspaces from the fragment basis functions and store them,
+        as LASSI expects'''
+        if ci_ref is None: ci_ref = self.get_ci_ref ()
+        if ci_sf is None: ci_sf = self.ci_spin_flips
+        if ci_ch is None: ci_ch = self.ci_charge_hops
         las, self.entmaps = self.prepare_model_states (ci_ref, ci_sf, ci_ch)
         #self.__dict__.update(las.__dict__) # Unsafe
         self.fciboxes = las.fciboxes
@@ -710,10 +830,7 @@ class LASSIS (LASSI):
         self.weights = las.weights
         self.e_lexc = las.e_lexc
         self.e_states = las.e_states
-        log.info ('LASSIS model state summary: %d rootspaces; %d model states; converged? %s',
-                  self.nroots, self.get_lroots ().prod (0).sum (), str (self.converged))
-        log.info ('LASSIS overall max disc sval: %e', self.max_disc_sval)
-        return self.converged
+        return self
 
     def energy_tot (self, mo_coeff=None, ci_ref=None, ci_sf=None, ci_ch=None, si=None, soc=None):
         if ci_ref is None: ci_ref = self.get_ci_ref ()
@@ -754,6 +871,9 @@ class LASSIS (LASSI):
         return LASSI.get_raw2orth (self, ci=ci, soc=soc, opt=opt)
 
     eig = LASSI.kernel
+    dump_chk = chkfile.dump_lsis
+    load_chk = load_chk_ = chkfile.load_lsis_
+    dump_fbf = chkfile.dump_fbf
     as_scanner = as_scanner
     prepare_fbf = prepare_fbf
     prepare_model_states = prepare_model_states
@@ -13,6 +13,8 @@ from mrh.my_pyscf.lassi.op_o1.utilities import *
 from mrh.my_pyscf.fci.rdm import trans_rdm1ha_des, trans_rdm1hb_des #make_rdm1_spin1
 from mrh.my_pyscf.fci.rdm import trans_rdm13ha_des, trans_rdm13hb_des #is make_rdm12_spin1
 from mrh.my_pyscf.fci.rdm import trans_sfddm1, trans_hhdm ##trans_sfddm1 is make_rdm12_spin1, trans_hhdm is make_rdm12_spin1
+from mrh.my_pyscf.fci.rdm import trans_rdm1s_batch, trans_rdm12s_batch, trans_rdm1h_des_batch
+from mrh.my_pyscf.fci.rdm import trans_rdm13h_des_batch, trans_sfddm1_batch, trans_hhdm_batch
 from mrh.my_pyscf.fci import rdm_smult
 from mrh.my_pyscf.fci.direct_halfelectron import contract_1he, absorb_h1he, contract_3he
 from mrh.my_pyscf.fci.direct_nosym_uhf import contract_1e as contract_1e_nosym_uhf
@@ -24,6 +26,7 @@ import copy
 
 SCREEN_THRESH = getattr (__config__, 'lassi_frag_screen_thresh', 1e-10)
 DO_SCREEN_LINEQUIV = getattr (__config__, 'lassi_frag_do_screen_linequiv', True)
+BATCH_TDM = getattr (__config__, 'lassi_frag_batch_tdm', True)
 
 class FragTDMInt (object):
     ''' Fragment-local LAS state transition density matrix intermediate
@@ -124,6 +127,11 @@ class FragTDMInt (object):
                 array.
     '''
 
+    # Compute all lroots pairs of a pair of rootspaces together with the batched kernels of
+    # mrh.my_pyscf.fci.rdm, in blocks of roots which fit in max_memory; if False, or if a single
+    # pair does not fit, loop over the pairs calling the single-pair functions
+    batch_tdm = BATCH_TDM
+
     def __init__(self, las, ci, norb, nroots, nelec_rs,
                  rootaddr, fragaddr, idx_frag, mask_ints, smult_r=None,
                  dtype=np.float64, discriminator=None,
@@ -135,6 +143,7 @@ class FragTDMInt (object):
         t0 = (lib.logger.process_clock (), lib.logger.perf_counter ())
         self.verbose = verbose
         self.log = lib.logger.new_logger (las, self.verbose)
+        self.max_memory = getattr (las, 'max_memory', las.mol.max_memory)
         self.ci = ci
         self.norb = norb
         self.nroots = nroots
@@ -559,6 +568,18 @@ class FragTDMInt (object):
         self.log.timer ('Update density matrices of fragment intermediate', *t0)
     
 
+    def _tdm_batch (self, kernel, bravecs, ketvecs, *args, **kwargs):
+        ''' Call the batched TDM kernel with the memory currently available. Returns None if
+        batch_tdm is False or if the intermediates of even one bra/ket pair do not fit, in which
+        case the caller loops over pairs. '''
+        if not self.batch_tdm: return None
+        max_memory = max (0, self.max_memory - lib.current_memory ()[0])
+        try:
+            return kernel (bravecs, ketvecs, *args, max_memory=max_memory, **kwargs)
+        except MemoryError as err:
+            self.log.debug ('%s; looping over bra/ket pairs', str (err))
+            return None
+
     def _trans_rdm12s_loop(self, bravecs, ketvecs, norb, nelec, linkstr):
         tdm1s = np.zeros ((bravecs.shape[0],ketvecs.shape[0],2,norb,norb), dtype=self.dtype)
         tdm2s = np.zeros ((bravecs.shape[0],ketvecs.shape[0],4,norb,norb,norb,norb),dtype=self.dtype)
@@ -584,9 +605,14 @@ class FragTDMInt (object):
         #  else: 
         #    print("TDM12s incorrect")
         #    exit()
+        tdms = None
+        if not mgpu_fci:
+          tdms = self._tdm_batch (trans_rdm12s_batch, bravecs, ketvecs, norb, nelec)
         if mgpu_fci:
           from gpu4mrh.fci import rdm_loops
           tdm1s, tdm2s = rdm_loops.trans_rdm12s(tdm1s, tdm2s, bravecs, ketvecs, norb, nelec, linkstr=linkstr)
+        elif tdms is not None:
+          tdm1s, tdm2s = [d.astype (self.dtype, copy=False) for d in tdms]
         else:
           for i, j in product (range (bravecs.shape[0]), range (ketvecs.shape[0])):
             d1s, d2s = trans_rdm12s (bravecs[i], ketvecs[j], norb, nelec,link_index=linkstr)
@@ -620,9 +646,15 @@ class FragTDMInt (object):
         #  else: 
         #    print("TDM13h incorrect")
         #    exit()
+        tdms = None
+        if not mgpu_fci:
+          tdms = self._tdm_batch (trans_rdm13h_des_batch, bravecs, ketvecs, norb, nelec_ket,
+                                  spin=spin)
         if mgpu_fci:
           from gpu4mrh.fci import rdm_loops
           tdm1h, tdm3h = rdm_loops.trans_rdm13h(tdm1h, tdm3h, bravecs, ketvecs, norb, nelec_ket, spin,linkstr)
+        elif tdms is not None:
+          tdm1h, tdm3h = [d.astype (self.dtype, copy=False) for d in tdms]
         else:
           trans_rdm13h = (trans_rdm13ha_des, trans_rdm13hb_des)[spin]
           for i, j in product (range (bravecs.shape[0]), range (ketvecs.shape[0])):
@@ -650,9 +682,14 @@ class FragTDMInt (object):
         #  else:
         #     print("sfddm incorrect")
         #     exit()
+        tdm = None
+        if not mgpu_fci:
+          tdm = self._tdm_batch (trans_sfddm1_batch, bravecs, ketvecs, norb, nelec_ket)
         if mgpu_fci:
           from gpu4mrh.fci import rdm_loops
           sfddm = rdm_loops.trans_sfddm1(sfddm, bravecs, ketvecs, norb, nelec_ket, linkstr=linkstr)
+        elif tdm is not None:
+          sfddm = tdm.astype (self.dtype, copy=False)
         else:
           for i, j in product (range (bravecs.shape[0]), range (ketvecs.shape[0])):
             d1 = trans_sfddm1 (bravecs[i], ketvecs[j], norb, nelec_ket, link_index=linkstr)
@@ -679,9 +716,14 @@ class FragTDMInt (object):
         #  else:
         #     print("hhdm incorrect")
         #     exit()
+        tdm = None
+        if not mgpu_fci:
+          tdm = self._tdm_batch (trans_hhdm_batch, bravecs, ketvecs, norb, nelec_ket, spin=spin)
         if mgpu_fci:
           from gpu4mrh.fci import rdm_loops
           hhdm = rdm_loops.trans_hhdm(hhdm, bravecs, ketvecs, norb, nelec_ket, spin, linkstr=linkstr)
+        elif tdm is not None:
+          hhdm = tdm.astype (self.dtype, copy=False)
         else:
           for i, j in product (range (bravecs.shape[0]), range (ketvecs.shape[0])):
             d1 = trans_hhdm (bravecs[i], ketvecs[j], norb, nelec_ket, spin, link_index=linkstr)
@@ -735,8 +777,13 @@ class FragTDMInt (object):
                 smult_ket=self.smult_r[ket_r]
             )
             linkstr = self._check_linkstr_cache (norb, nelec[0], nelec[1])
+            tdm2s = tdm1s = None
             if do2:
                 tdm1s, tdm2s = self._trans_rdm12s_loop(bravecs, ketvecs, norb, nelec, linkstr)
+            else:
+                tdm1s = self._tdm_batch (trans_rdm1s_batch, bravecs, ketvecs, norb, nelec)
+            if tdm1s is not None:
+                tdm1s = tdm1s.astype (self.dtype, copy=False)
             else:
                 tdm1s = np.zeros ((bravecs.shape[0],ketvecs.shape[0],2,norb,norb), dtype=self.dtype)
                 for i, j in product (range (bravecs.shape[0]), range (ketvecs.shape[0])):
@@ -757,8 +804,14 @@ class FragTDMInt (object):
                 smult_ket=self.smult_r[ket_r]
             )
             linkstr = self._check_linkstr_cache (norb+1, nelec_ket[0], nelec_ket[1])
+            tdm3h = tdm1h = None
             if do3h:
                 tdm1h, tdm3h = self._trans_rdm13h_loop(bravecs, ketvecs, norb, nelec_ket, spin, linkstr)
+            else:
+                tdm1h = self._tdm_batch (trans_rdm1h_des_batch, bravecs, ketvecs, norb,
+                                         nelec_ket, spin=spin)
+            if tdm1h is not None:
+                tdm1h = tdm1h.astype (self.dtype, copy=False)
             else:
                 tdm1h = np.zeros ((bravecs.shape[0],ketvecs.shape[0],norb), dtype=self.dtype)
                 for i, j in product (range (bravecs.shape[0]), range (ketvecs.shape[0])):
@@ -767,7 +820,7 @@ class FragTDMInt (object):
                     tdm1h[i,j] = d1s
             return tdm1h, tdm3h
         def trans_rdm1h_loop (bra_r, ket_r, spin=0):
-            return trans_rdm13h_loop (bra_r, ket_r, do3h=False)[0]
+            return trans_rdm13h_loop (bra_r, ket_r, spin=spin, do3h=False)[0]
         def trans_sfddm_loop (bra_r, ket_r):
             bravecs = ci[bra_r].reshape (-1, ndeta[bra_r], ndetb[bra_r])
             ketvecs = ci[ket_r].reshape (-1, ndeta[ket_r], ndetb[ket_r])
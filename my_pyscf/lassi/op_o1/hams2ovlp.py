@@ -91,7 +91,22 @@ class HamS2Ovlp (stdm.LSTDM):
                         nspman, nuniq, lbl)
         return exc
 
-    def _init_buffers_(self): pass
+    def _init_buffers_(self):
+        # No persistent scratch: the _crunch_*_ methods only allocate local arrays, and ints,
+        # h1, and h2 are read-only, so thread-parallel workers share them safely and need only
+        # private ham and s2 accumulators (_init_crunch_worker_)
+        pass
+
+    def _init_crunch_worker_(self):
+        self.ham = np.zeros_like (self.ham)
+        self.s2 = np.zeros_like (self.s2)
+
+    def _reduce_crunch_worker_(self, worker):
+        self.ham += worker.ham
+        self.s2 += worker.s2
+
+    def _crunch_worker_memory (self):
+        return (self.ham.nbytes + self.s2.nbytes) / 1e6
 
     def _add_transpose_(self):
         self.ham += self.ham.conj ().T
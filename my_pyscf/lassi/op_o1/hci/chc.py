@@ -429,6 +429,13 @@ class ContractHamCI_CHC (stdm.LSTDM):
     #def _crunch_all_(self):
     #    for row in self.exc_1c: self._crunch_env_(self._crunch_1c_, *row)
 
+    def _crunch_all_(self):
+        '''Serial: every row accumulates into the same hci_fr_pabq arrays, so the rows are not
+        partitioned among threads regardless of self.nworkers'''
+        for _crunch_fn, exc in self._crunch_tables ():
+            for row in exc: self._crunch_env_(_crunch_fn, *row)
+        self._add_transpose_()
+
     def _orbrange_env_kwargs (self, inv): return {}
     def _add_transpose_(self): return
 
@@ -58,6 +58,8 @@ class ContractHamCI_SHS (rdm.LRRDM):
     _hconst_ci_ = ContractHamCI_CHC._hconst_ci_
     init_profiling = ContractHamCI_CHC.init_profiling
     sprint_profile = ContractHamCI_CHC.sprint_profile
+    # Serial: _put_ham_ accumulates into the shared fragment objects in self.ints
+    _crunch_all_ = ContractHamCI_CHC._crunch_all_
     def _add_transpose_(self): return
 
     # Handling for 1s1c: need to do both a'.sm.b and b'.sp.a explicitly
@@ -10,7 +10,7 @@ from mrh.my_pyscf.lassi.op_o1.hams2ovlp import HamS2Ovlp, ham, soc_context
 from mrh.my_pyscf.lassi.citools import _fake_gen_contract_op_si_hdiag
 from mrh.my_pyscf.lassi.op_o1.utilities import *
 from mrh.util.my_scipy import CallbackLinearOperator
-import functools, itertools
+import copy, functools, itertools
 from itertools import product
 from pyscf import __config__
 import sys
@@ -30,6 +30,9 @@ class HamS2OvlpOperators (HamS2Ovlp):
         get_hdiag
             Take no arguments and return and ndarray of shape (nstates,) which contains the
             Hamiltonian diagonal
+        reset_ham
+            Return a shallow copy with h1 and h2 replaced and the operators rebuilt, reusing the
+            excitation tables and the overlap-link indexing
     '''
     def __init__(self, ints, nlas, lroots, h1, h2, mask_bra_space=None,
                  mask_ket_space=None, pt_order=None, do_pt_order=None, log=None,
@@ -51,10 +54,49 @@ class HamS2OvlpOperators (HamS2Ovlp):
         op_debug = getattr (param, 'gpu_op_debug', False)
         if op_debug: self.ox1_gpu = np.zeros(self.nstates, self.dtype)
 
+        self._ovlplink_cache = {}
         self.init_cache_profiling ()
         self.checkmem_oppart ()
         self._cache_()
 
+    def reset_ham_(self, h1, h2):
+        '''Replace the Hamiltonian amplitudes and rebuild the cached operators. Everything that
+        depends only on the fragment intermediates' quantum numbers (excitation tables, their
+        fingerprints, spin-manifold splitting, and overlap-link indexing) is reused. The fragment
+        intermediates in self.ints may have been updated in-place (i.e., by
+        FragTDMInt.update_ci_) since this object was constructed.
+
+        Args:
+            h1 : ndarray of size ncas**2 or 2*(ncas**2)
+                Contains effective 1-electron Hamiltonian amplitudes in second quantization
+            h2 : ndarray of size ncas**4
+                Contains 2-electron Hamiltonian amplitudes in second quantization
+
+        Returns:
+            self
+        '''
+        t0 = (logger.process_clock (), logger.perf_counter ())
+        if h1.ndim==2: h1 = np.stack ([h1,h1], axis=0)
+        self.h1 = np.ascontiguousarray (h1)
+        self.h2 = np.ascontiguousarray (h2)
+        self.ovlp = [i.ovlp for i in self.ints]
+        self.init_cache_profiling ()
+        self.checkmem_oppart ()
+        self._cache_()
+        self.log.timer ('HamS2OvlpOperators reset_ham_', *t0)
+        return self
+
+    def reset_ham (self, h1, h2):
+        '''Out-of-place version of reset_ham_. The copy shares the excitation tables and the
+        overlap-link cache with self but has its own operators and scratch vectors, so operators
+        previously generated from self keep acting with the old h1 and h2.'''
+        hobj = copy.copy (self)
+        hobj.x = hobj.si = np.zeros_like (self.x)
+        hobj.ox = np.zeros_like (self.ox)
+        hobj.ox1 = np.zeros_like (self.ox1)
+        if hasattr (self, 'ox1_gpu'): hobj.ox1_gpu = np.zeros_like (self.ox1_gpu)
+        return hobj.reset_ham_(h1, h2)
+
     def checkmem_oppart (self):
         rm = 0
         for exc, fn in zip ((self.exc_1d, self.exc_2d, self.exc_1s, self.exc_1c, self.exc_1c1d,
@@ -103,12 +145,15 @@ class HamS2OvlpOperators (HamS2Ovlp):
         t0 = (logger.process_clock (), logger.perf_counter ())
         self.optermgroups_s = {}
         self.optermgroups_h = {}
-        for exc, fn in zip ((self.exc_1d, self.exc_2d, self.exc_1s, self.exc_1c, self.exc_1c1d,
-                             self.exc_1s1c, self.exc_2c),
-                            (self._crunch_1d_, self._crunch_2d_, self._crunch_1s_,
+        tables = list (zip ((self._crunch_1d_, self._crunch_2d_, self._crunch_1s_,
                              self._crunch_1c_, self._crunch_1c1d_, self._crunch_1s1c_,
-                             self._crunch_2c_)):
-            self._crunch_oppart_(exc, fn)
+                             self._crunch_2c_),
+                            (self.exc_1d, self.exc_2d, self.exc_1s, self.exc_1c, self.exc_1c1d,
+                             self.exc_1s1c, self.exc_2c)))
+        # Operators are computed in parallel but grouped serially so that the order of the
+        # OpTermGroups doesn't depend on the number of workers
+        oprows = self._crunch_parallel_(tables, env_fn_name='_crunch_oprow_', collect=True)
+        for oprow in oprows: self._put_oprow_(*oprow)
         self.optermgroups_s = self._index_ovlppart (self.optermgroups_s)
         self.optermgroups_h = self._index_ovlppart (self.optermgroups_h)
         self.log.debug (self.sprint_cache_profile ())
@@ -164,35 +209,56 @@ class HamS2OvlpOperators (HamS2Ovlp):
         self.dw_oT += (w1-w0)
         return op
 
-    def _crunch_oppart_(self, exc, fn):
+    def _crunch_oprow_(self, fn, *row):
+        '''Compute the screened Hamiltonian and S2 operators for one row of an excitation table.
+        Does not modify optermgroups_h or optermgroups_s, so it can be called by parallel workers.
+
+        Returns:
+            key : tuple
+                Unique fragments involved
+            ham : instance of :class:`OpTerm` or None
+            s2 : instance of :class:`OpTerm` or None
+        '''
         has_s = self._fn_contributes_to_s2 (fn)
-        for row in exc:
-            if self._fn_row_has_spin (fn):
-                inv = row[2:-1]
-            else:
-                inv = row[2:]
-            data = fn (*row)
-            bra, ket = row[:2]
-            row = inv.copy ()
-            sinv = data[2]
-            inv = list (set (inv))
-            op = self.opterm_std_shape (bra, ket, data[0], inv, sinv)
-            key = tuple (inv)
+        if self._fn_row_has_spin (fn):
+            inv = row[2:-1]
+        else:
+            inv = row[2:]
+        data = fn (*row)
+        bra, ket = row[:2]
+        row = tuple (inv)
+        sinv = data[2]
+        inv = list (set (inv))
+        key = tuple (inv)
+        spincase_keys = [tuple ((mybra, myket)) + row
+                         for mybra, myket in self.spman[tuple((bra,ket))+row]]
+        ham = s2 = None
+        op = self.opterm_std_shape (bra, ket, data[0], inv, sinv)
+        if op.maxabs () >= self.screen_thresh:
+            op.spincase_keys.extend (spincase_keys)
+            ham = op
+        if has_s:
+            op = self.opterm_std_shape (bra, ket, data[1], inv, sinv)
             if op.maxabs () >= self.screen_thresh:
-                val = self.optermgroups_h.get (key, opterm.OpTermGroup (key))
-                for mybra, myket in self.spman[tuple((bra,ket))+tuple(row)]:
-                    op.spincase_keys.append (tuple ((mybra, myket)) + tuple (row))
-                val.append (op)
-                self.optermgroups_h[key] = val
-            if has_s:
-                op = self.opterm_std_shape (bra, ket, data[1], inv, sinv)
-                if op.maxabs () >= self.screen_thresh:
-                    val = self.optermgroups_s.get (key, opterm.OpTermGroup (key))
-                    for mybra, myket in self.spman[tuple((bra,ket))+tuple(row)]:
-                        op.spincase_keys.append (tuple ((mybra, myket)) + tuple (row))
-                    val.append (op)
-                    self.optermgroups_s[key] = val
-            
+                op.spincase_keys.extend (spincase_keys)
+                s2 = op
+        return key, ham, s2
+
+    def _put_oprow_(self, key, ham, s2):
+        if ham is not None:
+            val = self.optermgroups_h.get (key, opterm.OpTermGroup (key))
+            val.append (ham)
+            self.optermgroups_h[key] = val
+        if s2 is not None:
+            val = self.optermgroups_s.get (key, opterm.OpTermGroup (key))
+            val.append (s2)
+            self.optermgroups_s[key] = val
+
+    def _init_crunch_worker_(self): pass
+
+    def _reduce_crunch_worker_(self, worker): pass
+
+    def _crunch_worker_memory (self): return 0
 
     def _index_ovlppart (self, groups):
         # TODO: redesign this in a scalable graph-theoretic way
@@ -200,40 +266,43 @@ class HamS2OvlpOperators (HamS2Ovlp):
         t0, w0 = logger.process_clock (), logger.perf_counter ()
         #x0 = (logger.process_clock (), logger.perf_counter ())
         for inv, group in groups.items ():
-            len_tab = 0
-            for op in group.ops:
-                for key in op.spincase_keys:
-                    tab = self.nonuniq_exc[key]
-                    len_tab += tab.shape[0]
-                    len_tab += np.count_nonzero (tab[:,0] != tab[:,1])
-            #x0 = self.log.timer ('tab_len', *x0)
-            ovlplinkstr = np.empty ((len_tab, self.nfrags+1), dtype=int)
-            seen = set ()
-            i = 0
-            for op in group.ops:
-                for key in op.spincase_keys:
-                    tab = self.nonuniq_exc[key]
-                    for bra, ket in tab:
-                        ovlplinkstr[i,0] = ket
-                        ovlplinkstr[i,1:] = self.ox_ovlp_urootstr (bra, ket, inv)
-                        fp = hash (tuple (ovlplinkstr[i,:]))
-                        if fp not in seen:
-                            seen.add (fp)
-                            i += 1
-                        if bra != ket:
-                            ovlplinkstr[i,0] = bra
-                            ovlplinkstr[i,1:] = self.ox_ovlp_urootstr (ket, bra, inv)
-                            fp = hash (tuple (ovlplinkstr[i,:]))
-                            if fp not in seen:
-                                seen.add (fp)
-                                i += 1
-            ovlplinkstr = ovlplinkstr[:i]
-            group.ovlplink = np.asarray (ovlplinkstr)
+            ovlplinkstr = [self._get_ovlplink (inv, key)
+                           for op in group.ops for key in op.spincase_keys]
+            ovlplinkstr = np.concatenate (ovlplinkstr, axis=0)
+            # Remove duplicates across keys without changing the order of first appearance
+            idx = np.unique (ovlplinkstr, axis=0, return_index=True)[1]
+            group.ovlplink = ovlplinkstr[np.sort (idx)]
         t1, w1 = logger.process_clock (), logger.perf_counter ()
         self.dt_i += (t1-t0)
         self.dw_i += (w1-w0)
         return groups
 
+    def _get_ovlplink (self, inv, key):
+        '''Overlap links (ket, urootstr of spectators) of the images of one unique interaction,
+        which depend only on the excitation tables and are therefore cached across reset_ham_'''
+        if (inv, key) in self._ovlplink_cache: return self._ovlplink_cache[(inv, key)]
+        tab = self.nonuniq_exc[key]
+        ovlplinkstr = np.empty ((2*len (tab), self.nfrags+1), dtype=int)
+        seen = set ()
+        i = 0
+        for bra, ket in tab:
+            ovlplinkstr[i,0] = ket
+            ovlplinkstr[i,1:] = self.ox_ovlp_urootstr (bra, ket, inv)
+            fp = hash (tuple (ovlplinkstr[i,:]))
+            if fp not in seen:
+                seen.add (fp)
+                i += 1
+            if bra != ket:
+                ovlplinkstr[i,0] = bra
+                ovlplinkstr[i,1:] = self.ox_ovlp_urootstr (ket, bra, inv)
+                fp = hash (tuple (ovlplinkstr[i,:]))
+                if fp not in seen:
+                    seen.add (fp)
+                    i += 1
+        ovlplinkstr = ovlplinkstr[:i]
+        self._ovlplink_cache[(inv, key)] = ovlplinkstr
+        return ovlplinkstr
+
     def get_nonuniq_exc_square (self, key, also_bras=True):
         tab_bk = self.nonuniq_exc[key]
         idx_equal = tab_bk[:,0]==tab_bk[:,1]
@@ -336,15 +405,21 @@ class HamS2OvlpOperators (HamS2Ovlp):
     def get_xvec (self, iroot, *inv):
         fac = self.spin_shuffle[iroot] * self.fermion_frag_shuffle (iroot, inv)
         i, j = self.offs_lroots[iroot]
-        return fac * self.x[i:j]
+        return fac * self.x[:,i:j]
 
     def put_ox1_(self, vec, iroot, *inv):
+        '''Add op.dot (vec.T), of shape (nbra, nspec*nvec), to the columns of ox1 for rootspace
+        iroot, which are ordered (nbra, nspec) for each vector'''
         i, j, fac = self.get_ox1_params(iroot, *inv)
-        self.ox1[i:j] += fac * vec
+        nvec = self.ox1.shape[0]
+        vec = vec.reshape (len (vec), -1, nvec).transpose (2,0,1)
+        self.ox1[:,i:j] += fac * vec.reshape (nvec, j-i)
         return
     def put_ox1_debug(self, vec, iroot, *inv):
         i, j, fac = self.get_ox1_params(iroot, *inv)
-        self.ox1_gpu[i:j] += fac * vec
+        nvec = self.ox1_gpu.shape[0]
+        vec = vec.reshape (len (vec), -1, nvec).transpose (2,0,1)
+        self.ox1_gpu[:,i:j] += fac * vec.reshape (nvec, j-i)
         return
 
 
@@ -355,35 +430,53 @@ class HamS2OvlpOperators (HamS2Ovlp):
 
     def _umat_linequiv_(self, ifrag, iroot, umat, ivec, *args):
         if ivec==0:
-            self.x = umat_dot_1frag_(self.x, umat.conj ().T, self.lroots, ifrag, iroot)
+            self.x = umat_dot_1frag_(self.x, umat.conj ().T, self.lroots, ifrag, iroot, axis=1)
         elif ivec==1:
-            self.ox = umat_dot_1frag_(self.ox, umat, self.lroots, ifrag, iroot)
+            self.ox = umat_dot_1frag_(self.ox, umat, self.lroots, ifrag, iroot, axis=1)
         else:
             raise RuntimeError ("Invalid ivec = {}; must be 0 or 1".format (ivec))
 
     def _ham_op (self, x):
         t0 = (logger.process_clock (), logger.perf_counter ())
-        self.init_profiling ()
-        self.x[:] = x.flat[:]
-        self.ox[:] = 0
-        self._umat_linequiv_loop_(0) # U.conj () @ x
-        for inv, group in self.optermgroups_h.items (): self._opuniq_x_group_(inv, group)
-        self._umat_linequiv_loop_(1) # U.T @ ox
-        self.log.info (self.sprint_profile ())
+        ox = self._opuniq_x_groups (self.optermgroups_h, x)
         self.log.timer ('HamS2OvlpOperators._ham_op', *t0)
-        return self.ox.copy ()
+        return ox
 
     def _s2_op (self, x):
         t0 = (logger.process_clock (), logger.perf_counter ())
+        ox = self._opuniq_x_groups (self.optermgroups_s, x)
+        self.log.timer ('HamS2OvlpOperators._s2_op', *t0)
+        return ox
+
+    def get_xblock (self, x):
+        '''Work arrays x, ox, and ox1 of shape (nvec, nstates) for a single vector x of shape
+        (nstates,) or a block of column vectors x of shape (nstates, nvec)'''
+        xblock = np.zeros ((x.size // self.nstates, self.nstates), dtype=self.dtype)
+        xblock[:] = x.reshape (self.nstates, -1).T
+        kwargs = {'x': xblock, 'ox': np.zeros_like (xblock), 'ox1': np.zeros_like (xblock)}
+        if getattr (param, 'gpu_op_debug', False): kwargs['ox1_gpu'] = np.zeros_like (xblock)
+        return kwargs
+
+    def _opuniq_x_groups (self, optermgroups, x):
+        '''Apply the operator terms in optermgroups to a single vector x of shape (nstates,) or
+        to all columns of x of shape (nstates, nvec) at once, so that the nonspectator-fragment
+        contractions are matrix-matrix products over the vector dimension'''
+        x = np.asarray (x)
+        xshape = x.shape
+        nvec = x.size // self.nstates
+        if nvec > 1 and getattr (param, 'use_gpu', False):
+            # GPU kernels are written for one vector at a time
+            x = x.reshape (self.nstates, nvec)
+            ox = [self._opuniq_x_groups (optermgroups, x[:,i]) for i in range (nvec)]
+            return np.stack (ox, axis=-1).reshape (xshape)
         self.init_profiling ()
-        self.x[:] = x.flat[:]
-        self.ox[:] = 0
-        self._umat_linequiv_loop_(0) # U.conj () @ x
-        for inv, group in self.optermgroups_s.items (): self._opuniq_x_group_(inv, group)
-        self._umat_linequiv_loop_(1) # U.T @ ox
+        with lib.temporary_env (self, **self.get_xblock (x)):
+            self._umat_linequiv_loop_(0) # U.conj () @ x
+            for inv, group in optermgroups.items (): self._opuniq_x_group_(inv, group)
+            self._umat_linequiv_loop_(1) # U.T @ ox
+            ox = self.ox.T.reshape (xshape)
         self.log.info (self.sprint_profile ())
-        self.log.timer ('HamS2OvlpOperators._s2_op', *t0)
-        return self.ox.copy ()
+        return np.ascontiguousarray (ox)
 
     def _opuniq_x_group_(self, inv, group):
         '''All unique operations which have a set of nonspectator fragments in common'''
@@ -418,9 +511,9 @@ class HamS2OvlpOperators (HamS2Ovlp):
 
         for bra in range (self.nroots):
             i, j = self.offs_lroots[bra]
-            self.ox[i:j] += transpose_sivec_with_slow_fragments (
-                self.ox1[i:j], self.lroots[:,bra], *inv
-            )[0]
+            self.ox[:,i:j] += transpose_sivec_with_slow_fragments (
+                self.ox1[:,i:j].T, self.lroots[:,bra], *inv
+            )
         t3, w3 = logger.process_clock (), logger.perf_counter ()
         self.dt_pX += (t3-t2)
         self.dw_pX += (w3-w2)
@@ -470,12 +563,12 @@ class HamS2OvlpOperators (HamS2Ovlp):
                     brakets, bras, braHs = self.get_nonuniq_exc_square (key)
                     for bra in bras:
                       i,j,_ = self.get_ox1_params(bra, *key[2:])  
-                      if np.allclose(self.ox1[i:j],self.ox1_gpu[i:j]) != True:
+                      if np.allclose(self.ox1[:,i:j],self.ox1_gpu[:,i:j]) != True:
                         print("Error in bras",flush=True)
                     if len(braHs):
                       for bra in braHs:
                         i,j,_ = self.get_ox1_params(bra, *key[2:])  
-                        if np.allclose(self.ox1[i:j],self.ox1_gpu[i:j]) != True:
+                        if np.allclose(self.ox1[:,i:j],self.ox1_gpu[:,i:j]) != True:
                           print("Error in braHs",flush=True)
               exit()
            
@@ -536,7 +629,8 @@ class HamS2OvlpOperators (HamS2Ovlp):
           ox_final = self.ox1
           _opuniq_x = self._opuniq_x_
 
-        ox_final[:] = 0 #of shape nstates
+        ox_final[:] = 0 #of shape (1,nstates)
+        ox_final = ox_final.reshape (self.nstates)
         from mrh.my_pyscf.gpu import libgpu
         gpu = param.use_gpu
         total_vecsize=sum([vec.size for vec in vecs.values ()])
@@ -596,7 +690,7 @@ class HamS2OvlpOperators (HamS2Ovlp):
         self.dw_non_uniq_exc += (w2-w1)
         for bra in bras:
             vec = ovecs[self.ox_ovlp_urootstr (bra, oket, inv)]
-            self.put_ox1_(op.dot (vec.T).ravel (), bra, *inv)
+            self.put_ox1_(op.dot (vec.T), bra, *inv)
             self._profile_4frag_(op)
         t3, w3 = logger.process_clock (), logger.perf_counter ()
         if len (set (inv)) == 4:
@@ -616,7 +710,7 @@ class HamS2OvlpOperators (HamS2Ovlp):
                 self.dw_4fo += w1-w0
             for bra in braHs:
                 vec = ovecs[self.ox_ovlp_urootstr (bra, obra, inv)]
-                self.put_ox1_(op.dot (vec.T).ravel (), bra, *inv)
+                self.put_ox1_(op.dot (vec.T), bra, *inv)
                 self._profile_4frag_(op)
             t2, w2 = logger.process_clock (), logger.perf_counter ()
             if len (set (inv)) == 4:
@@ -634,12 +728,12 @@ class HamS2OvlpOperators (HamS2Ovlp):
         brakets, bras, braHs = self.get_nonuniq_exc_square (key)
         for bra in bras:
             vec = ovecs[self.ox_ovlp_urootstr (bra, oket, inv)]
-            self.put_ox1_debug(op.dot (vec.T).ravel (), bra, *inv)
+            self.put_ox1_debug(op.dot (vec.T), bra, *inv)
         if len (braHs):
             op = op.conj ().T
             for bra in braHs:
                 vec = ovecs[self.ox_ovlp_urootstr (bra, obra, inv)]
-                self.put_ox1_debug(op.dot (vec.T).ravel (), bra, *inv)
+                self.put_ox1_debug(op.dot (vec.T), bra, *inv)
         return
 
     
@@ -738,30 +832,31 @@ class HamS2OvlpOperators (HamS2Ovlp):
 
     def _ovlp_op (self, x):
         t0 = (logger.process_clock (), logger.perf_counter ())
-        self.x[:] = x.flat[:]
-        self.ox[:] = 0
-        self._umat_linequiv_loop_(0) # U.conj () @ x
-        for bra, ket in self.exc_null:
-            i0, i1 = self.offs_lroots[bra]
-            j0, j1 = self.offs_lroots[ket]
-            ovlp = self.crunch_ovlp (bra, ket)
-            self.ox[i0:i1] += np.dot (ovlp, self.x[j0:j1])
-            self.ox[j0:j1] += np.dot (ovlp.conj ().T, self.x[i0:i1])
-        self._umat_linequiv_loop_(1) # U.T @ ox
+        xshape = np.asarray (x).shape
+        with lib.temporary_env (self, **self.get_xblock (np.asarray (x))):
+            self._umat_linequiv_loop_(0) # U.conj () @ x
+            for bra, ket in self.exc_null:
+                i0, i1 = self.offs_lroots[bra]
+                j0, j1 = self.offs_lroots[ket]
+                ovlp = self.crunch_ovlp (bra, ket)
+                self.ox[:,i0:i1] += np.dot (self.x[:,j0:j1], ovlp.T)
+                self.ox[:,j0:j1] += np.dot (self.x[:,i0:i1], ovlp.conj ())
+            self._umat_linequiv_loop_(1) # U.T @ ox
+            ox = self.ox.T.reshape (xshape)
         self.log.timer ('HamS2OvlpOperators._ovlp_op', *t0)
-        return self.ox.copy ()
+        return np.ascontiguousarray (ox)
 
     def get_ham_op (self):
         return CallbackLinearOperator (self, [self.nstates,]*2, dtype=self.dtype,
-                                             matvec=self._ham_op)
+                                             matvec=self._ham_op, matmat=self._ham_op)
 
     def get_s2_op (self):
         return CallbackLinearOperator (self, [self.nstates,]*2, dtype=self.dtype,
-                                             matvec=self._s2_op)
+                                             matvec=self._s2_op, matmat=self._s2_op)
 
     def get_ovlp_op (self):
         return CallbackLinearOperator (self, [self.nstates,]*2, dtype=self.dtype,
-                                             matvec=self._ovlp_op)
+                                             matvec=self._ovlp_op, matmat=self._ovlp_op)
 
     def get_neutral (self, verbose=None):
         # Get a Hamiltonian operator, but the 3- and 4-fragment terms are dropped
@@ -1254,7 +1349,7 @@ class HamS2OvlpOperators (HamS2Ovlp):
 #gen_contract_op_si_hdiag = functools.partial (_fake_gen_contract_op_si_hdiag, ham)
 def gen_contract_op_si_hdiag (las, h1, h2, ci, nelec_frs, smult_fr=None, disc_fr=None, soc=0,
                               nlas=None, _HamS2Ovlp_class=HamS2OvlpOperators, _return_int=False,
-                              screen_thresh=SCREEN_THRESH, **kwargs):
+                              screen_thresh=SCREEN_THRESH, _hobj_cache=None, **kwargs):
     ''' Build Hamiltonian, spin-squared, and overlap matrices in LAS product state basis
 
     Args:
@@ -1287,6 +1382,14 @@ def gen_contract_op_si_hdiag (las, h1, h2, ci, nelec_frs, smult_fr=None, disc_fr
             operator matrices
         screen_thresh : float
             Tolerance for screening Hamiltonian and S^2 operator components
+        _hobj_cache : dict
+            If provided, the main intermediate object is stored here, keyed by the identities of
+            the fragment intermediates and the perturbation-theory order arguments. On a later
+            call that gets the same fragment intermediates back from frag.make_ints (for
+            instance, because frag.make_ints is patched to return cached objects whose CI vectors
+            are updated in-place), the new operators are built from a copy of the stored object
+            that reuses its excitation tables and overlap-link indexing (see
+            HamS2OvlpOperators.reset_ham). Operators returned by earlier calls are unaffected.
         
     Returns: 
         ham_op : LinearOperator of shape (nstates,nstates)
@@ -1328,10 +1431,22 @@ def gen_contract_op_si_hdiag (las, h1, h2, ci, nelec_frs, smult_fr=None, disc_fr
     t1 = log.timer ('LASSI hsi operator first pass nstates making', *t1)
     # Second pass: upper-triangle
     t0 = (lib.logger.process_clock (), lib.logger.perf_counter ())
-    outerprod = _HamS2Ovlp_class (ints, nlas, lroots, h1, h2,
-                                  pt_order=pt_order, do_pt_order=do_pt_order,
-                                  dtype=dtype, max_memory=max_memory, log=log,
-                                  screen_thresh=screen_thresh)
+    outerprod = None
+    if _hobj_cache is not None:
+        # The cached object holds references to the ints, so their ids cannot be recycled
+        cache_key = (_HamS2Ovlp_class, tuple (id (i) for i in ints), np.dtype (dtype).char,
+                     None if pt_order is None else tuple (pt_order),
+                     None if do_pt_order is None else tuple (np.atleast_1d (do_pt_order)),
+                     screen_thresh)
+        outerprod = _hobj_cache.get (cache_key, None)
+    if outerprod is not None:
+        outerprod = outerprod.reset_ham (h1, h2)
+    else:
+        outerprod = _HamS2Ovlp_class (ints, nlas, lroots, h1, h2,
+                                      pt_order=pt_order, do_pt_order=do_pt_order,
+                                      dtype=dtype, max_memory=max_memory, log=log,
+                                      screen_thresh=screen_thresh)
+    if _hobj_cache is not None: _hobj_cache[cache_key] = outerprod
 
     t1 = log.timer ('LASSI hsi operator hams2ovlp class', *t1)
     if soc and not spin_pure:
@@ -37,7 +37,6 @@ class LRRDM (stdm.LSTDM):
         si : ndarray of shape (nroots,nroots_si)
             Contains LASSI eigenvectors
     '''
-    # TODO: at some point, if it ever becomes rate-limiting, make this multithread better
     # TODO: SO-LASSI o1 implementation: these density matrices can only be defined in the full
     # spinorbital basis
 
@@ -64,9 +63,29 @@ class LRRDM (stdm.LSTDM):
         self._si_c_nrow = c_int (self.si_bra.shape[0])
         self._si_c_ncol = c_int (self.si_bra.shape[1])
         self.d1buf = self.d1 = np.empty ((self.nroots_si,self.d1.size), dtype=self.d1.dtype)
-        self.d2buf = self.d2 = np.empty ((self.nroots_si,self.d2.size), dtype=self.d2.dtype)
+        self._d1buf_c = c_arr (self.d1buf)
+        self.d2buf = self._d2buf_c = None
+        if self._need_d2:
+            self.d2buf = self.d2 = np.empty ((self.nroots_si,self.d2.size), dtype=self.d2.dtype)
+            self._d2buf_c = c_arr (self.d2buf)
+
+    def _init_crunch_worker_(self):
+        self.d1buf = self.d1 = np.empty_like (self.d1buf)
+        self.d2buf = self.d2 = np.empty_like (self.d2buf)
         self._d1buf_c = c_arr (self.d1buf)
         self._d2buf_c = c_arr (self.d2buf)
+        self.rdm1s = np.zeros_like (self.rdm1s)
+        self.rdm2s = np.zeros_like (self.rdm2s)
+        self._rdm1s_c = c_arr (self.rdm1s)
+        self._rdm2s_c = c_arr (self.rdm2s)
+
+    def _reduce_crunch_worker_(self, worker):
+        self.rdm1s += worker.rdm1s
+        self.rdm2s += worker.rdm2s
+
+    def _crunch_worker_memory (self):
+        return (self.rdm1s.nbytes + self.rdm2s.nbytes + self.d1buf.nbytes
+                + self.d2buf.nbytes) / 1e6
 
     def _add_transpose_(self):
         if self.hermi:
@@ -559,15 +578,234 @@ class LRRDM (stdm.LSTDM):
             d1_shape = [self.nroots_si,] + [2,] + [norb,]*2
             d1_size = np.prod (d1_shape)
             d1 = self.d1.ravel ()[:d1_size].reshape (d1_shape)
-        d2_shape = [self.nroots_si,] + [4,] + [norb,]*4
-        d2_size = np.prod (d2_shape)
-        d2 = self.d2.ravel ()[:d2_size].reshape (d2_shape)
+        d2 = self.d2
+        if d2 is not None:
+            d2_shape = [self.nroots_si,] + [4,] + [norb,]*4
+            d2_size = np.prod (d2_shape)
+            d2 = self.d2.ravel ()[:d2_size].reshape (d2_shape)
         env_kwargs = {'nlas': nlas, 'd1': d1, 'd2': d2, '_orbidx': _orbidx}
         env_kwargs.update (self._orbrange_env_kwargs_orbidx (_orbidx))
         dt, dw = logger.process_clock () - t0, logger.perf_counter () - w0
         self.dt_i, self.dw_i = self.dt_i + dt, self.dw_i + dw
         return env_kwargs
 
+class LRRDM1s (LRRDM):
+    __doc__ = LRRDM.__doc__ + '''
+
+    SUBCLASS: 1-body reduced density matrices only
+
+    `kernel` call returns only the spin-separated 1-body reduced density matrices of LASSI roots.
+    Only single-fragment density fluctuations and single electron hops are crunched, and no
+    2-body buffer is allocated.
+    '''
+
+    _need_d2 = False
+
+    def _init_crunch_worker_(self):
+        self.d1buf = self.d1 = np.empty_like (self.d1buf)
+        self._d1buf_c = c_arr (self.d1buf)
+        self.rdm1s = np.zeros_like (self.rdm1s)
+        self._rdm1s_c = c_arr (self.rdm1s)
+
+    def _reduce_crunch_worker_(self, worker):
+        self.rdm1s += worker.rdm1s
+
+    def _crunch_worker_memory (self):
+        return (self.rdm1s.nbytes + self.d1buf.nbytes) / 1e6
+
+    def _add_transpose_(self):
+        if self.hermi:
+            self.rdm1s += self.rdm1s.conj ().transpose (0,1,3,2)
+
+    def _crunch_tables (self):
+        return ((self._crunch_1d_, self.exc_1d),
+                (self._crunch_1c_, self.exc_1c))
+
+    def kernel (self):
+        ''' Main driver method of class.
+
+        Returns:
+            rdm1s : ndarray of shape (nroots_si,2,ncas,ncas)
+                Spin-separated 1-body reduced density matrices of LASSI states
+            t0 : tuple of length 2
+                timestamp of entry into this function, for profiling by caller
+        '''
+        t0 = (lib.logger.process_clock (), lib.logger.perf_counter ())
+        self.init_profiling ()
+        self.rdm1s = np.zeros ([self.nroots_si,2] + [self.norb,]*2, dtype=self.dtype)
+        self._rdm1s_c = c_arr (self.rdm1s)
+        self._rdm1s_c_ncol = c_int (2*(self.norb**2))
+        self._crunch_all_()
+        return self.rdm1s, t0
+
+    def _crunch_1d_(self, bra, ket, i):
+        '''Compute a single-fragment density fluctuation, for the 1-RDM only.'''
+        d_rII = self.get_fdm (bra, ket, i) # time-profiled by itself
+        t0, w0 = logger.process_clock (), logger.perf_counter ()
+        d1 = self._get_D1_(bra, ket)
+        p, q = self.get_range (i)
+        d1[:,:,p:q,p:q] = np.tensordot (d_rII, self.ints[i].get_dm1 (bra, ket), axes=2)
+        dt, dw = logger.process_clock () - t0, logger.perf_counter () - w0
+        self.dt_1d, self.dw_1d = self.dt_1d + dt, self.dw_1d + dw
+        self._put_D1_()
+
+    def _crunch_1c_(self, bra, ket, i, j, s1):
+        '''Compute the 1-RDM elements of a single electron hop; i.e.,
+
+        <bra|j'(s1)i(s1)|ket>
+
+        and conjugate transpose
+        '''
+        d_rJJII = self.get_fdm (bra, ket, i, j) # time-profiled by itself
+        t0, w0 = logger.process_clock (), logger.perf_counter ()
+        d1 = self._get_D1_(bra, ket)
+        inti, intj = self.ints[i], self.ints[j]
+        p, q = self.get_range (i)
+        r, s = self.get_range (j)
+        fac = fermion_des_shuffle (self.nelec_rf[bra], (i, j), i)
+        fac *= fermion_des_shuffle (self.nelec_rf[ket], (i, j), j)
+        d_riJJ = np.tensordot (d_rJJII, inti.get_p (bra, ket, s1), axes=2).transpose (0,3,1,2)
+        d1[:,s1,p:q,r:s] = fac * np.tensordot (d_riJJ, intj.get_h (bra, ket, s1), axes=2)
+        dt, dw = logger.process_clock () - t0, logger.perf_counter () - w0
+        self.dt_1c, self.dw_1c = self.dt_1c + dt, self.dw_1c + dw
+        self._put_D1_()
+
+class LRRDMOnTop (LRRDM):
+    __doc__ = LRRDM.__doc__ + '''
+
+    SUBCLASS: on-top pair density of LASSI roots on a grid
+
+    `kernel` call returns the 1-body reduced density matrices and the part of the on-top pair
+    density (and its gradient) which is quadratic in the active orbitals,
+
+    pi2[r,0,g] = 1/2 * sum_pqrs phi_p[g] phi_q[g] dm2[r,p,q,r,s] phi_r[g] phi_s[g]
+
+    without ever building the 2-body reduced density matrices. Each fragment-local block of the
+    spin-summed 2-RDM is accumulated in a buffer keyed by its orbital subset, and buffers are
+    contracted with the grid when their total size exceeds buf_memory MB. Only hermitian
+    (si_bra == si_ket), real-valued cases are implemented.
+
+    Additional args:
+        grid2amo : ndarray of shape (nderiv,ngrids,ncas)
+            Values (and gradients if nderiv==4) of the active orbitals on the grid
+
+    Additional kwargs:
+        buf_memory : float
+            Maximum size of the 2-RDM block buffers in MB. Defaults to half of the remaining
+            memory.
+    '''
+
+    def __init__(self, ints, nlas, lroots, si_bra, si_ket, grid2amo, buf_memory=None,
+                 **kwargs):
+        LRRDM.__init__(self, ints, nlas, lroots, si_bra, si_ket, **kwargs)
+        assert (self.hermi), 'on-top pair density of transition densities not implemented'
+        assert (self.dtype == np.float64), 'on-top pair density only implemented for real si'
+        self.grid2amo = grid2amo
+        self.nderiv, self.ngrids = grid2amo.shape[:2]
+        assert (self.nderiv in (1,4)), 'on-top pair density deriv > 1 not implemented'
+        if buf_memory is None:
+            buf_memory = max (0, self.max_memory - lib.current_memory ()[0]) / 2
+        self.buf_memory = buf_memory
+
+    def _init_crunch_worker_(self):
+        self.d1buf = self.d1 = np.empty_like (self.d1buf)
+        self.d2buf = self.d2 = np.empty_like (self.d2buf)
+        self._d1buf_c = c_arr (self.d1buf)
+        self._d2buf_c = c_arr (self.d2buf)
+        self.rdm1s = np.zeros_like (self.rdm1s)
+        self._rdm1s_c = c_arr (self.rdm1s)
+        self.pi2 = np.zeros_like (self.pi2)
+        self._d2blks = {}
+
+    def _reduce_crunch_worker_(self, worker):
+        worker._flush_d2blks_()
+        self.rdm1s += worker.rdm1s
+        self.pi2 += worker.pi2
+
+    def _crunch_worker_memory (self):
+        return (self.rdm1s.nbytes + self.pi2.nbytes + self.d1buf.nbytes
+                + self.d2buf.nbytes) / 1e6 + self.buf_memory
+
+    def _add_transpose_(self):
+        # The transpose of the 2-RDM (pq,rs -> qp,sr) has the same on-top pair density
+        self._flush_d2blks_()
+        self.rdm1s += self.rdm1s.conj ().transpose (0,1,3,2)
+        self.pi2 *= 2
+
+    def kernel (self):
+        ''' Main driver method of class.
+
+        Returns:
+            rdm1s : ndarray of shape (nroots_si,2,ncas,ncas)
+                Spin-separated 1-body reduced density matrices of LASSI states
+            pi2 : ndarray of shape (nroots_si,nderiv,ngrids)
+                On-top pair density (and gradient) of LASSI states, 2-RDM part
+            t0 : tuple of length 2
+                timestamp of entry into this function, for profiling by caller
+        '''
+        t0 = (lib.logger.process_clock (), lib.logger.perf_counter ())
+        self.init_profiling ()
+        self.rdm1s = np.zeros ([self.nroots_si,2] + [self.norb,]*2, dtype=self.dtype)
+        self._rdm1s_c = c_arr (self.rdm1s)
+        self._rdm1s_c_ncol = c_int (2*(self.norb**2))
+        self.pi2 = np.zeros ((self.nroots_si, self.nderiv, self.ngrids), dtype=self.dtype)
+        self._d2blks = {}
+        self._crunch_all_()
+        return self.rdm1s, self.pi2, t0
+
+    def init_profiling (self):
+        LRRDM.init_profiling (self)
+        self.dt_g, self.dw_g = 0.0, 0.0
+
+    def sprint_profile (self):
+        fmt_str = '{:>5s} CPU: {:9.2f} ; wall: {:9.2f}'
+        profile = LRRDM.sprint_profile (self)
+        profile += '\n' + fmt_str.format ('grid', self.dt_g, self.dw_g)
+        return profile
+
+    def _put_D2_(self):
+        t0, w0 = logger.process_clock (), logger.perf_counter ()
+        nsrc = self._nsrc_c.value
+        key = np.where (self._orbidx)[0].tobytes ()
+        d2 = self.d2.reshape (self.nroots_si, 4, nsrc*nsrc, nsrc*nsrc).sum (1)
+        if key in self._d2blks:
+            self._d2blks[key] += d2
+        else:
+            self._d2blks[key] = d2
+        dt, dw = logger.process_clock () - t0, logger.perf_counter () - w0
+        self.dt_p, self.dw_p = self.dt_p + dt, self.dw_p + dw
+        if sum (blk.nbytes for blk in self._d2blks.values ()) > self.buf_memory * 1e6:
+            self._flush_d2blks_()
+
+    def _flush_d2blks_(self):
+        t0, w0 = logger.process_clock (), logger.perf_counter ()
+        for key, d2 in self._d2blks.items ():
+            idx = np.frombuffer (key, dtype=np.int64)
+            self._contract_grid_(idx, d2)
+        self._d2blks = {}
+        dt, dw = logger.process_clock () - t0, logger.perf_counter () - w0
+        self.dt_g, self.dw_g = self.dt_g + dt, self.dw_g + dw
+
+    def _contract_grid_(self, idx, d2):
+        nsrc = len (idx)
+        npair = nsrc * nsrc
+        mem_av = max (0, self.max_memory - lib.current_memory ()[0])
+        # pair, wrk, and dpair (and its transpose): five (blksize,npair) arrays
+        blksize = max (1, min (self.ngrids, int (mem_av * 1e6 / 8 / (5 * npair))))
+        for g0 in range (0, self.ngrids, blksize):
+            g1 = min (self.ngrids, g0 + blksize)
+            phi = self.grid2amo[:,g0:g1][:,:,idx]
+            pair = (phi[0][:,:,None] * phi[0][:,None,:]).reshape (g1-g0, npair)
+            for d2r, pi2r in zip (d2, self.pi2):
+                wrk = np.dot (pair, d2r) # pq,pqrs->rs
+                pi2r[0,g0:g1] += (wrk * pair).sum (1) / 2
+                if self.nderiv < 4: continue
+                wrk += np.dot (pair, d2r.T) # rs,pqrs->pq
+                for ideriv in range (1, 4):
+                    dpair = phi[ideriv][:,:,None] * phi[0][:,None,:]
+                    dpair = (dpair + dpair.transpose (0,2,1)).reshape (g1-g0, npair)
+                    pi2r[ideriv,g0:g1] += (wrk * dpair).sum (1) / 2
+
 def get_fdm1_maker (las, ci, nelec_frs, si, **kwargs):
     ''' Get a function that can build the 1-fragment reduced density matrix
     in a single rootspace. For unittesting purposes (make_sdm1 in sitools does the same thing)
@@ -744,3 +982,101 @@ def roots_make_rdm12s (las, ci, nelec_frs, si, **kwargs):
     '''
     return roots_trans_rdm12s (las, ci, nelec_frs, si, si, **kwargs)        
 
+def roots_make_rdm1s (las, ci, nelec_frs, si, **kwargs):
+    ''' Build spin-separated LASSI 1-body reduced density matrices, without crunching any
+    2-body intermediates. Spin-orbit coupling is not implemented.
+
+    Args:
+        las : instance of :class:`LASCINoSymm`
+        ci : list of list of ndarrays
+            Contains all CI vectors
+        nelec_frs : ndarray of shape (nfrags,nroots,2)
+            Number of electrons of each spin in each rootspace in each
+            fragment
+        si : ndarray of shape (nroots,nroots_si)
+            Contains LASSI eigenvectors
+
+    Returns:
+        rdm1s : ndarray of shape (nroots_si,2,ncas,ncas)
+            Spin-separated 1-body reduced density matrices of LASSI states
+    '''
+    verbose = kwargs.get ('verbose', las.verbose)
+    smult_fr = kwargs.get ('smult_fr', None)
+    disc_fr = kwargs.get ('disc_fr', None)
+    log = lib.logger.new_logger (las, verbose)
+    nlas = las.ncas_sub
+    max_memory = getattr (las, 'max_memory', las.mol.max_memory)
+    nelec_rs = [tuple (x) for x in nelec_frs.sum (0)]
+    if len (set (nelec_rs)) != 1:
+        raise NotImplementedError ("1-RDMs alone with spin-orbit coupling")
+
+    ints, lroots = frag.make_ints (las, ci, nelec_frs, nlas=nlas, smult_fr=smult_fr,
+                                   disc_fr=disc_fr, _FragTDMInt_class=FragTDMInt)
+
+    t0 = (lib.logger.process_clock (), lib.logger.perf_counter ())
+    outerprod = LRRDM1s (ints, nlas, lroots, si, si, dtype=si.dtype, max_memory=max_memory,
+                         log=log)
+    lib.logger.timer (las, 'LASSI root RDM1s indexing setup', *t0)
+    rdm1s, t0 = outerprod.kernel ()
+    lib.logger.timer (las, 'LASSI root RDM1s crunching', *t0)
+    if las.verbose >= lib.logger.TIMER_LEVEL:
+        lib.logger.info (las, 'LASSI root RDM1s crunching profile:\n%s',
+                         outerprod.sprint_profile ())
+
+    # Put rdm1s in PySCF convention: [p,q] -> q'p
+    return rdm1s.transpose (0,1,3,2)
+
+def roots_make_rdm1s_ontop (las, ci, nelec_frs, si, grid2amo, **kwargs):
+    ''' Build spin-separated LASSI 1-body reduced density matrices and the 2-RDM part of the
+    on-top pair density of LASSI states on a grid, without building the 2-body reduced density
+    matrices. Spin-orbit coupling is not implemented.
+
+    Args:
+        las : instance of :class:`LASCINoSymm`
+        ci : list of list of ndarrays
+            Contains all CI vectors
+        nelec_frs : ndarray of shape (nfrags,nroots,2)
+            Number of electrons of each spin in each rootspace in each
+            fragment
+        si : ndarray of shape (nroots,nroots_si)
+            Contains LASSI eigenvectors
+        grid2amo : ndarray of shape (nderiv,ngrids,ncas)
+            Values (and gradients if nderiv==4) of the active orbitals on the grid
+
+    Kwargs:
+        buf_memory : float
+            Maximum size in MB of the buffered blocks of the 2-RDM; see :class:`LRRDMOnTop`
+
+    Returns:
+        rdm1s : ndarray of shape (nroots_si,2,ncas,ncas)
+            Spin-separated 1-body reduced density matrices of LASSI states
+        pi2 : ndarray of shape (nroots_si,nderiv,ngrids)
+            1/2 * sum_pqrs phi_p phi_q dm2[p,q,r,s] phi_r phi_s, and its gradient if nderiv==4
+    '''
+    verbose = kwargs.get ('verbose', las.verbose)
+    smult_fr = kwargs.get ('smult_fr', None)
+    disc_fr = kwargs.get ('disc_fr', None)
+    log = lib.logger.new_logger (las, verbose)
+    nlas = las.ncas_sub
+    max_memory = getattr (las, 'max_memory', las.mol.max_memory)
+    nelec_rs = [tuple (x) for x in nelec_frs.sum (0)]
+    if len (set (nelec_rs)) != 1:
+        raise NotImplementedError ("on-top pair density with spin-orbit coupling")
+
+    ints, lroots = frag.make_ints (las, ci, nelec_frs, nlas=nlas, smult_fr=smult_fr,
+                                   disc_fr=disc_fr, _FragTDMInt_class=FragTDMInt)
+
+    t0 = (lib.logger.process_clock (), lib.logger.perf_counter ())
+    outerprod = LRRDMOnTop (ints, nlas, lroots, si, si, grid2amo, dtype=si.dtype,
+                            buf_memory=kwargs.get ('buf_memory', None),
+                            max_memory=max_memory, log=log)
+    lib.logger.timer (las, 'LASSI root on-top pair density indexing setup', *t0)
+    rdm1s, pi2, t0 = outerprod.kernel ()
+    lib.logger.timer (las, 'LASSI root on-top pair density crunching', *t0)
+    if las.verbose >= lib.logger.TIMER_LEVEL:
+        lib.logger.info (las, 'LASSI root on-top pair density crunching profile:\n%s',
+                         outerprod.sprint_profile ())
+
+    # Put rdm1s in PySCF convention: [p,q] -> q'p
+    rdm1s = rdm1s.transpose (0,1,3,2)
+    return rdm1s, pi2
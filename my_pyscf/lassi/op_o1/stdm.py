@@ -1,8 +1,11 @@
+import copy
 import numpy as np
 from pyscf import lib
 from pyscf.lib import logger, param
+from pyscf import __config__
 from itertools import product, combinations
-from mrh.my_pyscf.lassi.citools import get_rootaddr_fragaddr, umat_dot_1frag_
+from concurrent.futures import ThreadPoolExecutor
+from mrh.my_pyscf.lassi.citools import get_lroots, get_rootaddr_fragaddr, umat_dot_1frag_
 from mrh.my_pyscf.lassi.op_o1 import frag
 from mrh.my_pyscf.lassi.op_o1.utilities import *
 
@@ -13,6 +16,9 @@ liblassi = load_library ('liblassi')
 def c_arr (arr): return arr.ctypes.data_as(ctypes.c_void_p)
 c_int = ctypes.c_int
 
+NWORKERS = getattr (__config__, 'lassi_op_o1_nworkers', 1)
+BATCH_2C = getattr (__config__, 'lassi_op_o1_batch_2c', True)
+
 def mask_exc_table (exc, col=0, mask_space=None):
     if mask_space is None: return np.ones (exc.shape[0], dtype=bool)
     mask_space = np.asarray (mask_space)
@@ -47,6 +53,18 @@ class LSTDM (object):
         different things which rely on LAS-state tdm12s as intermediates without cacheing the whole
         things (i.e. operators or DMs in different basis).
 
+        If the class attribute `nworkers` (default: pyscf.__config__.lassi_op_o1_nworkers or 1) is
+        greater than 1, the rows of the excitation tables are partitioned among that many threads
+        in "_crunch_all_". Each thread but the first works on a shallow copy of the object with its
+        own buffers and accumulators, which are summed at the end. Subclass the _init_crunch_worker_,
+        _reduce_crunch_worker_, and _crunch_worker_memory methods to support this for different
+        accumulators, or override _crunch_all_ to loop over the rows serially.
+
+        If the class attribute `batch_2c` (default: pyscf.__config__.lassi_op_o1_batch_2c or True)
+        is set, and none of _crunch_2c_, _put_D2_, or _put_SD2_ is overridden, the two-charge-hop
+        interactions are computed for all model states of each row of exc_2c at once by
+        "_crunch_2c_batch_", instead of looping over model states in Python.
+
         Args:
             ints : list of length nfrags of instances of :class:`FragTDMInt`
                 fragment-local intermediates
@@ -73,7 +91,9 @@ class LSTDM (object):
     # states as a basis requires the sz-breaking sector of the 1-body stdm1 to be added here. I.E.,
     # in addition to the interactions listed above, we also need "sm" (total spin lowering; ap'bq)
     # (N.B.: "sp" is just the adjoint of "sm"). 
-    # TODO: at some point, if it ever becomes rate-limiting, make this multithread better
+    nworkers = NWORKERS
+    batch_2c = BATCH_2C
+    _need_d2 = True # Subclasses which never touch the 2-body buffer set this to False
 
     def __init__(self, ints, nlas, lroots, mask_bra_space=None, mask_ket_space=None,
                  pt_order=None, do_pt_order=None, log=None, max_memory=param.MAX_MEMORY,
@@ -143,7 +163,9 @@ class LSTDM (object):
         # buffer
         bigorb = np.sort (self.nlas)[::-1]
         self.d1 = np.zeros (2*(sum(bigorb[:2])**2), dtype=self.dtype)
-        self.d2 = np.zeros (4*(sum(bigorb[:4])**4), dtype=self.dtype)
+        self.d2 = None
+        if self._need_d2:
+            self.d2 = np.zeros (4*(sum(bigorb[:4])**4), dtype=self.dtype)
         self._norb_c = c_int (self.norb)
         self._orbidx = np.ones (self.norb, dtype=bool)
 
@@ -152,9 +174,11 @@ class LSTDM (object):
         if self.dtype==np.float64:
             self._put_SD1_c_fn = liblassi.LASSIRDMdputSD1
             self._put_SD2_c_fn = liblassi.LASSIRDMdputSD2
+            self._put_SD2x_c_fn = liblassi.LASSIRDMdputSD2x
         elif self.dtype==np.complex128:
             self._put_SD1_c_fn = liblassi.LASSIRDMzputSD1
             self._put_SD2_c_fn = liblassi.LASSIRDMzputSD2
+            self._put_SD2x_c_fn = liblassi.LASSIRDMzputSD2x
         else:
             raise NotImplementedError (self.dtype)
 
@@ -645,6 +669,52 @@ class LSTDM (object):
         self.dt_g, self.dw_g = self.dt_g + dt, self.dw_g + dw
         return bra_rng, ket_rng, facs
 
+    def _get_spec_addr_ovlp_batch (self, bras, kets):
+        '''Vectorized version of _get_spec_addr_ovlp for many pairs of model states at once. The
+        cache prepared by _prepare_spec_addr_ovlp_ must apply to all of them.
+
+        Args:
+            bras: ndarray of integers
+                Indices of model states
+            kets: ndarray of integers of the same length as bras
+                Indices of model states
+
+        Returns:
+            bra_rng: ndarray of integers
+                Indices of model states in which the nonspectator fragments have the same state as
+                in the corresponding element of bras
+            ket_rng: ndarray of integers
+                Indices of model states in which the nonspectator fragments have the same state as
+                in the corresponding element of kets
+            facs: ndarray of floats
+                Overlap * permutation factors (cf. get_ovlp_fac) corresponding to the interactions
+                bra_rng, ket_rng.
+            pairs: ndarray of integers
+                Index of the element of bras and kets to which each interaction corresponds
+        '''
+        t0, w0 = logger.process_clock (), logger.perf_counter ()
+        npair = len (bras)
+        braenv = self.envaddr[bras]
+        ketenv = self.envaddr[kets]
+        bra_rng = []
+        ket_rng = []
+        facs = []
+        pairs = []
+        for (rbra1, rket1, b, k, o) in self._spec_addr_ovlp_cache:
+            dbra = np.dot (braenv, self.strides[rbra1])
+            dket = np.dot (ketenv, self.strides[rket1])
+            bra_rng.append ((dbra[:,None] + b[None,:]).ravel ())
+            ket_rng.append ((dket[:,None] + k[None,:]).ravel ())
+            facs.append (np.broadcast_to (o[None,:], (npair, len (o))).ravel ())
+            pairs.append (np.repeat (np.arange (npair), len (o)))
+        bra_rng = np.concatenate (bra_rng)
+        ket_rng = np.concatenate (ket_rng)
+        facs = np.concatenate (facs)
+        pairs = np.concatenate (pairs)
+        dt, dw = logger.process_clock () - t0, logger.perf_counter () - w0
+        self.dt_g, self.dw_g = self.dt_g + dt, self.dw_g + dw
+        return bra_rng, ket_rng, facs, pairs
+
     def _get_spec_addr_ovlp_1space (self, rbra, rket, *inv):
         '''Obtain the integer indices and overlap*permutation factors for all pairs of model states
         in the same rootspaces as bra, ket for which a specified list of nonspectator fragments are
@@ -995,6 +1065,110 @@ class LSTDM (object):
         self.dt_2c, self.dw_2c = self.dt_2c + dt, self.dw_2c + dw
         self._put_D2_(bra, ket, d2, i, j, k, l)
 
+    def _crunch_2c_batch_(self, bras, kets, i, j, k, l, s2lt):
+        '''Compute the reduced density matrix elements of a two-electron hop (see _crunch_2c_)
+        for all pairs of model states in bras x kets at once, and add them to tdm2s.
+
+        Args:
+            bras : ndarray of integers
+                Indices of all model states in one bra rootspace in which all fragments other than
+                i, j, k, l are in the zero state
+            kets : ndarray of integers
+                Indices of all model states in one ket rootspace in which all fragments other than
+                i, j, k, l are in the zero state
+            i, j, k, l, s2lt : integers
+                As in _crunch_2c_
+        '''
+        t0, w0 = logger.process_clock (), logger.perf_counter ()
+        # s2lt: 0, 1, 2 -> aa, ab, bb
+        # s2: 0, 1, 2, 3 -> aa, ab, ba, bb
+        s2  = (0, 1, 3)[s2lt] # aa, ab, bb
+        s2T = (0, 2, 3)[s2lt] # aa, ba, bb -> when you populate the e1 <-> e2 permutation
+        s11 = s2 // 2
+        s12 = s2 % 2
+        nelec_f_bra = self.nelec_rf[self.rootaddr[bras[0]]]
+        nelec_f_ket = self.nelec_rf[self.rootaddr[kets[0]]]
+        def get_blk (ifrag, getter, s):
+            # getter (rbra, rket, s) -> array of shape (lroots_bra, lroots_ket, ...)
+            inti = self.ints[ifrag]
+            rbra, rket = inti.rootaddr[bras[0]], inti.rootaddr[kets[0]]
+            return getter (rbra, rket, s)[np.ix_(inti.fragaddr[bras], inti.fragaddr[kets])]
+        fac = 1
+        if i == k:
+            pp = get_blk (i, self.ints[i].get_pp, s2lt)
+        else:
+            pp = np.einsum ('xyp,xyq->xypq', get_blk (i, self.ints[i].get_p, s11),
+                            get_blk (k, self.ints[k].get_p, s12))
+            fac *= (1,-1)[int (i>k)]
+            fac *= fermion_des_shuffle (nelec_f_bra, (i, j, k, l), i)
+            fac *= fermion_des_shuffle (nelec_f_bra, (i, j, k, l), k)
+        if j == l:
+            hh = get_blk (j, self.ints[j].get_hh, s2lt)
+        else:
+            hh = np.einsum ('xyp,xyq->xypq', get_blk (l, self.ints[l].get_h, s12),
+                            get_blk (j, self.ints[j].get_h, s11))
+            fac *= (1,-1)[int (j>l)]
+            fac *= fermion_des_shuffle (nelec_f_ket, (i, j, k, l), j)
+            fac *= fermion_des_shuffle (nelec_f_ket, (i, j, k, l), l)
+        nbra, nket = len (bras), len (kets)
+        d2_ijkl = fac * np.einsum ('xypq,xyrs->xypsqr', pp, hh) # Dirac -> Mulliken transp
+        d2_ijkl = d2_ijkl.reshape (nbra*nket, *d2_ijkl.shape[2:])
+        bras, kets = np.repeat (bras, nket), np.tile (kets, nbra)
+        p, q = self.get_range (i)
+        r, s = self.get_range (j)
+        t, u = self.get_range (k)
+        v, w = self.get_range (l)
+        norb = sum (self.nlas)
+        dt, dw = logger.process_clock () - t0, logger.perf_counter () - w0
+        self.dt_2c, self.dw_2c = self.dt_2c + dt, self.dw_2c + dw
+        # Put in batches limited by the memory footprint of the source array
+        pair_size = np.dtype (self.dtype).itemsize * 4 * (norb**4) / 1e6
+        rem_mem = self.max_memory - lib.current_memory ()[0]
+        nblk = max (1, min (len (bras), int (rem_mem / 2 / pair_size)))
+        for x0 in range (0, len (bras), nblk):
+            t0, w0 = logger.process_clock (), logger.perf_counter ()
+            x1 = min (x0 + nblk, len (bras))
+            d2 = np.zeros ((x1-x0,4,norb,norb,norb,norb), dtype=self.dtype)
+            d_ = d2_ijkl[x0:x1]
+            d2[:,s2, p:q,r:s,t:u,v:w] = d_
+            d2[:,s2T,t:u,v:w,p:q,r:s] = d_.transpose (0,3,4,1,2)
+            if s2 == s2T: # same-spin only: exchange happens
+                d2[:,s2,p:q,v:w,t:u,r:s] = -d_.transpose (0,1,4,3,2)
+                d2[:,s2,t:u,r:s,p:q,v:w] = -d_.transpose (0,3,2,1,4)
+            dt, dw = logger.process_clock () - t0, logger.perf_counter () - w0
+            self.dt_2c, self.dw_2c = self.dt_2c + dt, self.dw_2c + dw
+            self._put_D2_batch_(bras[x0:x1], kets[x0:x1], d2)
+
+    # _loop_lroots_ passes the whole bra and ket address ranges to functions with this flag
+    _crunch_2c_batch_.batch_lroots = True
+
+    def _put_D2_batch_(self, bras, kets, D2):
+        t0, w0 = logger.process_clock (), logger.perf_counter ()
+        bra1, ket1, wgt, pairs = self._get_spec_addr_ovlp_batch (bras, kets)
+        self._put_SD2_batch_(bra1, ket1, D2, wgt, pairs)
+        dt, dw = logger.process_clock () - t0, logger.perf_counter () - w0
+        self.dt_p, self.dw_p = self.dt_p + dt, self.dw_p + dw
+
+    def _put_SD2_batch_(self, bra, ket, D2, wgt, pairs):
+        t0, w0 = logger.process_clock (), logger.perf_counter ()
+        ndest = self.tdm2s[0,0].size
+        nsrc = D2[0].size
+        dest_off = ((bra * self.nstates) + ket) * ndest
+        src_off = pairs * nsrc
+        wgt = np.ascontiguousarray (wgt, dtype=self.dtype)
+        D2 = np.ascontiguousarray (D2)
+        self._put_SD2x_c_fn (c_arr (self.tdm2s), c_arr (D2), c_arr (wgt),
+                             c_arr (dest_off.astype (np.int64)), c_arr (src_off.astype (np.int64)),
+                             c_int (len (wgt)), self._norb_c, self._nsrc_c, self._pdest,
+                             self._dblk_idx, self._sblk_idx, self._lblk, self._nblk)
+        dt, dw = logger.process_clock () - t0, logger.perf_counter () - w0
+        self.dt_s, self.dw_s = self.dt_s + dt, self.dw_s + dw
+
+    def _crunch_2c_is_batched (self):
+        if not self.batch_2c: return False
+        return all ((getattr (type (self), fn) is getattr (LSTDM, fn)
+                     for fn in ('_crunch_2c_', '_put_D2_', '_put_SD2_')))
+
     def _fn_row_has_spin (self, _crunch_fn):
         return any ((i in _crunch_fn.__name__ for i in self.interaction_has_spin))
 
@@ -1064,20 +1238,115 @@ class LSTDM (object):
         self._prepare_spec_addr_ovlp_(row[0], row[1], *inv)
         bra_rng = self._get_addr_range (row[0], *inv)
         ket_rng = self._get_addr_range (row[1], *inv)
+        if getattr (_crunch_fn, 'batch_lroots', False):
+            return _crunch_fn (bra_rng, ket_rng, *row[2:])
         lrow = [l for l in row]
         for lrow[0], lrow[1] in product (bra_rng, ket_rng):
             _crunch_fn (*lrow)
 
+    def _crunch_tables (self):
+        _crunch_2c_ = self._crunch_2c_
+        if self._crunch_2c_is_batched (): _crunch_2c_ = self._crunch_2c_batch_
+        return ((self._crunch_1d_, self.exc_1d),
+                (self._crunch_2d_, self.exc_2d),
+                (self._crunch_1c_, self.exc_1c),
+                (self._crunch_1c1d_, self.exc_1c1d),
+                (self._crunch_1s_, self.exc_1s),
+                (self._crunch_1s1c_, self.exc_1s1c),
+                (_crunch_2c_, self.exc_2c))
+
     def _crunch_all_(self):
-        for row in self.exc_1d: self._crunch_env_(self._crunch_1d_, *row)
-        for row in self.exc_2d: self._crunch_env_(self._crunch_2d_, *row)
-        for row in self.exc_1c: self._crunch_env_(self._crunch_1c_, *row)
-        for row in self.exc_1c1d: self._crunch_env_(self._crunch_1c1d_, *row)
-        for row in self.exc_1s: self._crunch_env_(self._crunch_1s_, *row)
-        for row in self.exc_1s1c: self._crunch_env_(self._crunch_1s1c_, *row)
-        for row in self.exc_2c: self._crunch_env_(self._crunch_2c_, *row)
+        self._crunch_parallel_(self._crunch_tables ())
         self._add_transpose_()
 
+    def _crunch_parallel_(self, tables, env_fn_name='_crunch_env_', collect=False):
+        '''Call the member function `env_fn_name` (_crunch_fn, *row) for every row of every
+        excitation table in `tables`. If self.nworkers > 1, the rows are partitioned among threads,
+        each of which but the first works on a shallow copy of self made by _get_crunch_worker.
+        Each thread is given lib.num_threads () // nworkers OpenMP threads.
+
+        Args:
+            tables : sequence of tuples of (callable, ndarray)
+                Member functions of self and the excitation tables containing their arguments
+
+        Kwargs:
+            env_fn_name : str
+                Name of the member function that calls _crunch_fn (*row)
+            collect : logical
+                If True, return the values returned by every call in order
+
+        Returns:
+            results : list or None
+                Return values of env_fn_name if collect is True
+        '''
+        tasks = [(fn.__name__, row) for fn, exc in tables for row in exc]
+        nworkers = self.get_crunch_nworkers (len (tasks))
+        if nworkers < 2:
+            env_fn = getattr (self, env_fn_name)
+            results = [env_fn (getattr (self, fn), *row) for fn, row in tasks]
+            return results if collect else None
+        t0 = (lib.logger.process_clock (), lib.logger.perf_counter ())
+        nthreads = max (1, lib.num_threads () // nworkers)
+        workers = [self,] + [self._get_crunch_worker () for i in range (nworkers-1)]
+        def crunch (iworker):
+            worker = workers[iworker]
+            env_fn = getattr (worker, env_fn_name)
+            with lib.with_omp_threads (nthreads):
+                return [env_fn (getattr (worker, fn), *row)
+                        for fn, row in tasks[iworker::nworkers]]
+        with ThreadPoolExecutor (max_workers=nworkers) as executor:
+            chunks = list (executor.map (crunch, range (nworkers)))
+        for worker in workers[1:]: self._join_crunch_worker_(worker)
+        self.log.timer_debug1 ('{} rows crunched by {} workers'.format (len (tasks), nworkers), *t0)
+        if not collect: return None
+        results = [None,]*len (tasks)
+        for iworker, chunk in enumerate (chunks): results[iworker::nworkers] = chunk
+        return results
+
+    def get_crunch_nworkers (self, ntasks):
+        '''Number of threads among which to partition ntasks rows of the excitation tables,
+        limited by self.nworkers and by the memory needed for thread-private accumulators'''
+        nworkers = max (1, min (self.nworkers, ntasks))
+        if nworkers < 2: return nworkers
+        rem_mem = self.max_memory - lib.current_memory ()[0]
+        worker_mem = self._crunch_worker_memory ()
+        if worker_mem > 0:
+            nworkers = min (nworkers, 1 + int (rem_mem // worker_mem))
+            if nworkers < self.nworkers:
+                self.log.debug ('Insufficient memory for %d threads (%f MB each of %f MB); '
+                                'using %d', self.nworkers, worker_mem, rem_mem, max (nworkers, 1))
+        return max (nworkers, 1)
+
+    def _get_crunch_worker (self):
+        worker = copy.copy (self)
+        for key in self._crunch_profiling_keys (): setattr (worker, key, 0.0)
+        worker._init_crunch_worker_()
+        return worker
+
+    def _join_crunch_worker_(self, worker):
+        for key in self._crunch_profiling_keys ():
+            setattr (self, key, getattr (self, key) + getattr (worker, key))
+        self._reduce_crunch_worker_(worker)
+
+    def _crunch_profiling_keys (self):
+        return [key for key, val in self.__dict__.items ()
+                if (key.startswith ('dt_') or key.startswith ('dw_')) and isinstance (val, float)]
+
+    def _init_crunch_worker_(self):
+        '''Allocate thread-private buffers and accumulators on a shallow copy of self'''
+        self._init_buffers_()
+        self.tdm1s = np.zeros_like (self.tdm1s)
+        self.tdm2s = np.zeros_like (self.tdm2s)
+
+    def _reduce_crunch_worker_(self, worker):
+        '''Add the accumulators of a thread-private shallow copy of self to those of self'''
+        self.tdm1s += worker.tdm1s
+        self.tdm2s += worker.tdm2s
+
+    def _crunch_worker_memory (self):
+        '''Memory (MB) of the thread-private buffers and accumulators'''
+        return (self.tdm1s.nbytes + self.tdm2s.nbytes + self.d1.nbytes + self.d2.nbytes) / 1e6
+
     def _add_transpose_(self):
         self.tdm1s += self.tdm1s.conj ().transpose (1,0,2,4,3)
         self.tdm2s += self.tdm2s.conj ().transpose (1,0,2,4,3,6,5)
@@ -1144,6 +1413,16 @@ def make_stdm12s (las, ci, nelec_frs, **kwargs):
             Number of electrons of each spin in each rootspace in each
             fragment
 
+    Kwargs:
+        mask_bra_space : sequence of int or mask array of shape (nroots,)
+            If included, only interactions with the identified bra rootspaces are computed
+        mask_ket_space : sequence of int or mask array of shape (nroots,)
+            If included, only interactions with the identified ket rootspaces are computed
+        spin_pure : logical
+            Whether the rootspaces all have the same spin projection. If False, the
+            ``spinless mapping'' is engaged and tdm1s is returned in the spin-orbital format
+            even if all rootspaces have the same spin projection. Defaults to autodetection.
+
     Returns:
         tdm1s : ndarray of shape (nroots,2,ncas,ncas,nroots)
             Contains 1-body LAS state transition density matrices
@@ -1151,6 +1430,8 @@ def make_stdm12s (las, ci, nelec_frs, **kwargs):
             Contains 2-body LAS state transition density matrices
     '''
     verbose = kwargs.get ('verbose', las.verbose)
+    mask_bra_space = kwargs.get ('mask_bra_space', None)
+    mask_ket_space = kwargs.get ('mask_ket_space', None)
     log = lib.logger.new_logger (las, verbose)
     nlas = las.ncas_sub
     ncas = las.ncas
@@ -1159,10 +1440,23 @@ def make_stdm12s (las, ci, nelec_frs, **kwargs):
     disc_fr = kwargs.get ('disc_fr', None)
     dtype = ci[0][0].dtype
     max_memory = getattr (las, 'max_memory', las.mol.max_memory)
+    mask_ints = None
+    discriminator = None
+    if (mask_bra_space is not None) or (mask_ket_space is not None):
+        if mask_bra_space is None:
+            mask_bra_space = np.arange (nroots, dtype=int)
+        if mask_ket_space is None:
+            mask_ket_space = np.arange (nroots, dtype=int)
+        mask_ints = np.zeros ((nroots,nroots), dtype=bool)
+        mask_ints[np.ix_(mask_bra_space,mask_ket_space)] = True
+        discriminator = np.zeros (nroots, dtype=int)
+        discriminator[mask_bra_space] += 1
+        discriminator[mask_ket_space] += 2
 
     # Handle possible SOC
     nelec_rs = [tuple (x) for x in nelec_frs.sum (0)]
-    spin_pure = len (set (nelec_rs)) == 1
+    spin_pure = kwargs.get ('spin_pure', None)
+    if spin_pure is None: spin_pure = len (set (nelec_rs)) == 1
     if not spin_pure: # Engage the ``spinless mapping''
         ci = ci_map2spinless (ci, nlas, nelec_frs)
         ix = spin_shuffle_idx (nlas)
@@ -1175,7 +1469,7 @@ def make_stdm12s (las, ci, nelec_frs, **kwargs):
 
     # First pass: single-fragment intermediates
     ints, lroots = frag.make_ints (las, ci, nelec_frs, smult_fr=smult_fr, disc_fr=disc_fr,
-                                   nlas=nlas)
+                                   nlas=nlas, mask_ints=mask_ints, discriminator=discriminator)
     nstates = np.sum (np.prod (lroots, axis=0))
 
     # Memory check
@@ -1188,7 +1482,8 @@ def make_stdm12s (las, ci, nelec_frs, **kwargs):
     # Second pass: upper-triangle
     t0 = (lib.logger.process_clock (), lib.logger.perf_counter ())
     outerprod = LSTDM (ints, nlas, lroots, dtype=dtype,
-                           max_memory=max_memory, log=log)
+                       mask_bra_space=mask_bra_space, mask_ket_space=mask_ket_space,
+                       max_memory=max_memory, log=log)
     if not spin_pure:
         outerprod.spin_shuffle = spin_shuffle_fac
     lib.logger.timer (las, 'LAS-state TDM12s second intermediate indexing setup', *t0)
@@ -1225,4 +1520,132 @@ def make_stdm12s (las, ci, nelec_frs, **kwargs):
 
     return tdm1s, tdm2s
 
+def get_stdm12s_blksize (las, nelec_frs, dtype=np.float64, max_memory=None):
+    '''Largest number of model states per block for which one step of iter_stdm12s fits in the
+    currently-available memory'''
+    if max_memory is None: max_memory = getattr (las, 'max_memory', las.mol.max_memory)
+    ncas = las.ncas
+    nelec_rs = [tuple (x) for x in nelec_frs.sum (0)]
+    if len (set (nelec_rs)) > 1: ncas = 2 * ncas
+    pair_mem = np.dtype (dtype).itemsize*(2*(ncas**2)+4*(ncas**4))/1e6
+    rem_mem = max_memory - lib.current_memory ()[0]
+    # The union of a bra and a ket block is crunched at once, and the spinless mapping or the
+    # slicing of the yielded blocks can make one more copy
+    return max (1, int (np.sqrt (max (rem_mem, 0) / pair_mem / 8)))
+
+def _partition_rootspaces (nprods_r, spaces, blksize, log):
+    blocks = []
+    blk, nblk = [], 0
+    for r in spaces:
+        if len (blk) and nblk + nprods_r[r] > blksize:
+            blocks.append (blk)
+            blk, nblk = [], 0
+        if nprods_r[r] > blksize:
+            log.warn ('rootspace %d has %d > blksize=%d model states', r, nprods_r[r], blksize)
+        blk.append (r)
+        nblk += nprods_r[r]
+    if len (blk): blocks.append (blk)
+    return [tuple (blk) for blk in blocks]
+
+def iter_stdm12s (las, ci, nelec_frs, blksize=None, **kwargs):
+    '''Generate the spin-separated LAS product-state 1- and 2-body transition density matrices
+    of make_stdm12s in bra-by-ket blocks. Each block is computed from the rootspaces involved in
+    it only, so the peak memory footprint is bounded by blksize instead of the total number of
+    model states. Blocks that are not requested are not computed.
+
+    Each pair of blocks is a separate make_stdm12s call on the union of their rootspaces, which
+    builds its own fragment intermediates (FragTDMInt). For two different blocks only the
+    bra-ket rectangle of rootspace pairs is crunched, so each fragment TDM is still computed
+    about once. The setup of the intermediates and the screening of linearly-equivalent
+    rootspaces, however, are repeated for every pair of blocks and cannot be shared between
+    them: for the 33 rootspaces of the single excitations of c2h4n4, blksize = 10, 5, and 3
+    make 16%, 25%, and 30% more fragment TDM kernel calls than a single make_stdm12s.
+
+    Args:
+        las : instance of :class:`LASCINoSymm`
+        ci : list of list of ndarrays
+            Contains all CI vectors
+        nelec_frs : ndarray of shape (nfrags,nroots,2)
+            Number of electrons of each spin in each rootspace in each
+            fragment
+
+    Kwargs:
+        blksize : integer
+            Maximum number of model states in a bra or ket block. Rootspaces are never split, so
+            a single rootspace larger than this forms its own block. Defaults to the largest
+            value allowed by max_memory (see get_stdm12s_blksize).
+        mask_bra_space : sequence of int or mask array of shape (nroots,)
+            Rootspaces spanning the bra blocks. Defaults to all rootspaces.
+        mask_ket_space : sequence of int or mask array of shape (nroots,)
+            Rootspaces spanning the ket blocks. Defaults to all rootspaces.
+        Other kwargs are passed to make_stdm12s.
+
+    Yields:
+        bra : ndarray of ints
+            Indices of the model states in the bra block
+        ket : ndarray of ints
+            Indices of the model states in the ket block
+        tdm1s : ndarray of shape (len(bra),2,ncas,ncas,len(ket))
+            Corresponding block of the 1-body LAS state transition density matrices
+        tdm2s : ndarray of shape (len(bra),2,ncas,ncas,2,ncas,ncas,len(ket))
+            Corresponding block of the 2-body LAS state transition density matrices
+    '''
+    verbose = kwargs.get ('verbose', las.verbose)
+    log = lib.logger.new_logger (las, verbose)
+    nfrags, nroots = nelec_frs.shape[:2]
+    mask_bra_space = kwargs.pop ('mask_bra_space', None)
+    mask_ket_space = kwargs.pop ('mask_ket_space', None)
+    smult_fr = kwargs.pop ('smult_fr', None)
+    disc_fr = kwargs.pop ('disc_fr', None)
+    if blksize is None:
+        blksize = get_stdm12s_blksize (las, nelec_frs, dtype=ci[0][0].dtype)
+        log.debug ('iter_stdm12s blksize = %d', blksize)
+    nelec_rs = [tuple (x) for x in nelec_frs.sum (0)]
+    # Every block must come out in the same format
+    kwargs['spin_pure'] = len (set (nelec_rs)) == 1
+    nprods_r = np.prod (get_lroots (ci), axis=0)
+    offs_r = np.cumsum (nprods_r) - nprods_r
+    def get_spaces (mask_space):
+        if mask_space is None: return np.arange (nroots)
+        mask_space = np.asarray (mask_space)
+        if mask_space.dtype in (bool, np.bool_):
+            mask_space = np.where (mask_space)[0]
+        return np.unique (mask_space)
+    def get_states (spaces):
+        return np.concatenate ([np.arange (offs_r[r], offs_r[r]+nprods_r[r]) for r in spaces])
+    bra_blocks = _partition_rootspaces (nprods_r, get_spaces (mask_bra_space), blksize, log)
+    ket_blocks = _partition_rootspaces (nprods_r, get_spaces (mask_ket_space), blksize, log)
+    requested = set (product (bra_blocks, ket_blocks))
+    ncalls = len (set (tuple (sorted (key)) for key in requested))
+    log.info ('iter_stdm12s: %d bra x %d ket blocks of at most %d model states; '
+              '%d make_stdm12s calls', len (bra_blocks), len (ket_blocks), blksize, ncalls)
+    t_start = (lib.logger.process_clock (), lib.logger.perf_counter ())
+    done = set ()
+    for bra_blk, ket_blk in product (bra_blocks, ket_blocks):
+        if (bra_blk, ket_blk) in done: continue
+        t0 = (lib.logger.process_clock (), lib.logger.perf_counter ())
+        spaces = sorted (set (bra_blk) | set (ket_blk))
+        blk_kwargs = kwargs.copy ()
+        lo, hi = sorted ([bra_blk, ket_blk])
+        if lo[-1] < hi[0]:
+            # Interactions between different rootspaces are stored with the later one as the bra
+            # (LSTDM.ltri), so only the hi-lo rectangle needs to be crunched.
+            blk_kwargs['mask_bra_space'] = [spaces.index (r) for r in hi]
+            blk_kwargs['mask_ket_space'] = [spaces.index (r) for r in lo]
+        ci_blk = [[c[r] for r in spaces] for c in ci]
+        nelec_blk = nelec_frs[:,spaces,:]
+        if smult_fr is not None: blk_kwargs['smult_fr'] = np.asarray (smult_fr)[:,spaces]
+        if disc_fr is not None: blk_kwargs['disc_fr'] = np.asarray (disc_fr)[:,spaces]
+        tdm1s, tdm2s = make_stdm12s (las, ci_blk, nelec_blk, **blk_kwargs)
+        log.timer ('iter_stdm12s block of rootspaces {} x {}'.format (bra_blk, ket_blk), *t0)
+        states = get_states (spaces)
+        for key in ((bra_blk, ket_blk), (ket_blk, bra_blk)):
+            if (key not in requested) or (key in done): continue
+            bra, ket = get_states (key[0]), get_states (key[1])
+            i, j = np.searchsorted (states, bra), np.searchsorted (states, ket)
+            done.add (key)
+            yield bra, ket, tdm1s[i][...,j], tdm2s[i][...,j]
+        tdm1s = tdm2s = None
+    log.timer ('iter_stdm12s ({} make_stdm12s calls)'.format (ncalls), *t_start)
+
 
@@ -0,0 +1,49 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pyscf import lib
+
+def imap_threaded (fn, args_list, max_workers=1):
+    '''Call fn (*args) for each args in args_list, at most max_workers at a time in a thread pool.
+    Each worker runs OpenMP code with lib.num_threads ()//max_workers threads, so that the node is
+    not oversubscribed. Threads rather than processes are used, because forking after OpenMP has
+    started can deadlock the children and the objects passed to fn generally can't be pickled;
+    fn must therefore not modify any object which it shares with another call.
+
+    Args:
+        fn : callable
+        args_list : list of tuples
+            Positional arguments of each call of fn
+
+    Kwargs:
+        max_workers : integer
+            Number of concurrent calls. If 1, the calls are made one after the other in this
+            thread.
+
+    Yields:
+        i : integer
+            Index in args_list
+        result : return value of fn (*args_list[i])
+            In order of completion. If the caller stops iterating, calls which have not yet
+            started are canceled.
+    '''
+    max_workers = max (1, min (max_workers, len (args_list)))
+    if max_workers == 1:
+        for i, args in enumerate (args_list): yield i, fn (*args)
+        return
+    nthreads = max (1, lib.num_threads () // max_workers)
+    def _worker (args):
+        with lib.with_omp_threads (nthreads):
+            return fn (*args)
+    with ThreadPoolExecutor (max_workers=max_workers) as executor:
+        futures = {executor.submit (_worker, args): i for i, args in enumerate (args_list)}
+        try:
+            for future in as_completed (futures):
+                yield futures[future], future.result ()
+        finally:
+            for future in futures: future.cancel ()
+
+def map_threaded (fn, args_list, max_workers=1):
+    '''Same as imap_threaded, but return the list of results in the order of args_list'''
+    results = [None,] * len (args_list)
+    for i, result in imap_threaded (fn, args_list, max_workers=max_workers):
+        results[i] = result
+    return results
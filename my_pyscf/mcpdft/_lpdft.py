@@ -4,7 +4,8 @@ from pyscf.lib import logger
 from pyscf import mcpdft, lib
 from pyscf.mcpdft import _dms
 from mrh.my_pyscf.lassi.lassi import las_symm_tuple, iterate_subspace_blocks
-from mrh.my_pyscf.lassi import op_o1
+from mrh.my_pyscf.lassi.lassi import _eig_block_memcheck, _eig_block_Davidson, _get_si0_blk
+from mrh.my_pyscf.lassi import op_o1, basis
 from pyscf.mcpdft import lpdft as lpdft_fns
 '''
 This file is taken from pyscf-forge and adopted for the LAS wavefunctions.
@@ -41,11 +42,24 @@ def make_lpdft_ham_(mc, mo_coeff=None, ci=None, ot=None):
         ot : an instance of on-top functional class - see otfnal.py
 
     Returns:
-        lpdft_ham : ndarray of shape (nroots, nroots) or (nirreps, nroots, nroots)
+        lpdft_ham : ndarray of shape (nprods, nprods) or None
             Linear approximation to the MC-PDFT energy expressed as a
-            hamiltonian in the basis provided by the CI vectors. If
-            StateAverageMix, then returns the block diagonal of the lpdft
-            hamiltonian for each irrep.
+            hamiltonian in the LAS product state basis (block-diagonal in
+            the symmetry blocks). None if any block was diagonalized with
+            the matrix-free Davidson algorithm.
+        e_states : ndarray of shape (nroots_pdft,)
+            L-PDFT energies
+        si : ndarray of shape (nprods, nroots_pdft)
+            L-PDFT eigenvectors in the LAS product state basis
+        rootsym : ndarray of shape (nroots_pdft, 3)
+            neleca, nelecb, irrep of each L-PDFT state
+        s2_roots : ndarray of shape (nroots_pdft,)
+            <S**2> of each L-PDFT state
+
+    Symmetry blocks too large to be diagonalized in memory, or all blocks
+    if mc.davidson_only is set, are diagonalized with the matrix-free
+    LASSI Davidson algorithm, which only solves for the lowest
+    len(mc.states) L-PDFT states of each block.
     '''
 
     if mo_coeff is None: mo_coeff = mc.mo_coeff
@@ -76,69 +90,97 @@ def make_lpdft_ham_(mc, mo_coeff=None, ci=None, ot=None):
 
     statesym, s2_states = las_symm_tuple(mc, verbose=0)
 
+    # Diagonal shift in the product-state basis: the MC-SCF (wfn) component of hybrid functionals
+    e_roots = np.asarray(mc.e_roots)
+    if abs(cas_hyb) < 1e-11:
+        e_roots = None
+    si_lassi = getattr(mc, 'si', None)
+    nstates = len(mc.states) if mc.states is not None else len(mc.e_roots)
+    davidson_only = getattr(mc, 'davidson_only', False)
+    max_memory = getattr(mc, 'max_memory', lib.param.MAX_MEMORY)
+
     # Initialize matrices
-    e_roots = []
+    e_states = []
     s2_roots = []
     rootsym = []
     si = []
-    s2_mat = []
+    ham = []
+    ham_complete = True # False once any block is diagonalized without building its matrix
     idx_allprods = []
     # Loop over symmetry blocks
     qn_lbls = ['neleca', 'nelecb', 'irrep']
     for it, (las1, sym, indices, indexed) in enumerate(iterate_subspace_blocks(mc, ci, statesym)):
         idx_space, idx_prod = indices
-        ci_blk, nelec_blk = indexed
+        ci_blk, nelec_blk, smult_blk, disc_blk = indexed
         idx_allprods.extend(list(np.where(idx_prod)[0]))
+        nprods = np.count_nonzero(idx_prod)
         lib.logger.info(mc, 'Build + diag H matrix L-PDFT-LASSI symmetry block %d\n'
                         + '{} = {}\n'.format(qn_lbls, sym)
                         + '(%d rootspaces; %d states)', it,
-                        np.count_nonzero(idx_space),
-                        np.count_nonzero(idx_prod))
-
-        ham_blk, s2_blk, ovlp_blk = op_o1.ham(mc, h1, h2, ci_blk, nelec_blk)
-        diag_idx = np.diag_indices_from(ham_blk)
-        ham_blk[diag_idx] += h0 + cas_hyb * mc.e_roots
-
-        try:
-            e, c = linalg.eigh(ham_blk, b=ovlp_blk)
-        except linalg.LinAlgError as err:
-            ovlp_det = linalg.det(ovlp_blk)
-            lc = 'checking if L-PDFT-LASSI basis has lindeps: |ovlp| = {:.6e}'.format(ovlp_det)
-            lib.logger.info(las, 'Caught error %s, %s', str(err), lc)
-            if ovlp_det < LINDEP_THRESH:
-                x = canonical_orth_(ovlp_blk, thr=LINDEP_THRESH)
-                lib.logger.info(las, '%d/%d linearly independent model states',
-                                x.shape[1], x.shape[0])
-                xhx = x.conj().T @ ham_blk @ x
-                e, c = linalg.eigh(xhx)
-                c = x @ c
-            else:
-                raise (err) from None
-
-        s2_mat.append(s2_blk)
+                        np.count_nonzero(idx_space), nprods)
+        # LASSI roots of this block: those whose SI vectors have support in it
+        si0 = _get_si0_blk(si_lassi, idx_prod)
+        hdiag_shift = None
+        if e_roots is not None:
+            if e_roots.size != idx_prod.size:
+                raise NotImplementedError("hybrid L-PDFT-LASSI with nroots_si < nprods")
+            hdiag_shift = cas_hyb * e_roots[idx_prod]
+        incore = _eig_block_memcheck(las1, nprods, 1, max_memory, davidson_only)[0]
+        if incore:
+            ham_blk, e, c, s2_blk = _eig_block_lpdft_incore(las1, h1, h2, ci_blk, nelec_blk,
+                                                            smult_blk, hdiag_shift=hdiag_shift)
+            ham.append(ham_blk)
+        else:
+            # Matrix-free: only the lowest nstates L-PDFT states of this block are solved for
+            with lib.temporary_env(las1, nroots_si=min(nstates, nprods)):
+                conv, e, c, s2_blk = _eig_block_Davidson(las1, h0, h1, h2, ci_blk, nelec_blk,
+                                                         smult_blk, disc_blk, False, 1,
+                                                         si0=si0, hdiag_shift=hdiag_shift)
+            ham_complete = False
         si.append(c)
-        s2_blk = c.conj().T @ s2_blk @ c
-        lib.logger.debug2(mc, 'Block S**2 in adiabat basis:')
-        lib.logger.debug2(mc, '{}'.format(s2_blk))
-        e_roots.extend(list(e))
-        s2_roots.extend(list(np.diag(s2_blk)))
+        e_states.extend(list(e))
+        s2_roots.extend(list(s2_blk))
         rootsym.extend([sym, ] * c.shape[1])
 
     idx_allprods = np.argsort(idx_allprods)
     si = linalg.block_diag(*si)[idx_allprods, :]
-    s2_mat = linalg.block_diag(*s2_mat)[np.ix_(idx_allprods, idx_allprods)]
-    idx = np.argsort(e_roots)
+    if ham_complete:
+        ham = linalg.block_diag(*ham)[np.ix_(idx_allprods, idx_allprods)]
+        ham[np.diag_indices_from(ham)] += h0
+    else:
+        ham = None
+    idx = np.argsort(e_states)
+    e_states = np.asarray(e_states)[idx] + h0
     rootsym = np.asarray(rootsym)[idx]
     s2_roots = np.asarray(s2_roots)[idx]
     si = si[:, idx]
-    return ham_blk, e, si, rootsym, s2_roots, s2_mat
+    return ham, e_states, si, rootsym, s2_roots
+
+
+def _eig_block_lpdft_incore(las, h1, h2, ci_blk, nelec_blk, smult_blk, hdiag_shift=None):
+    '''Build and diagonalize one symmetry block of the L-PDFT Hamiltonian in the LAS product
+    state basis, without its constant part. Linear dependencies are projected out.'''
+    ham_blk, s2_blk, ovlp_blk, _get_ovlp = op_o1.ham(las, h1, h2, ci_blk, nelec_blk,
+                                                     smult_fr=smult_blk)
+    if hdiag_shift is not None:
+        ham_blk[np.diag_indices_from(ham_blk)] += hdiag_shift
+    raw2orth = basis.get_orth_basis(ci_blk, las.ncas_sub, nelec_blk, _get_ovlp=_get_ovlp,
+                                    smult_fr=smult_blk)
+    xhx = raw2orth(ham_blk.T).T
+    lib.logger.info(las, '%d/%d linearly independent model states',
+                    xhx.shape[1], xhx.shape[0])
+    xhx = raw2orth(xhx.conj()).conj()
+    e, c = linalg.eigh(xhx)
+    c = raw2orth.H(c)
+    s2_blk = ((s2_blk @ c) * c.conj()).sum(0)
+    return ham_blk, e, c, s2_blk
 
 
 def kernel(mc, mo_coeff=None, ot=None, **kwargs):
     if ot is None: ot = mc.otfnal
     if mo_coeff is None: mo_coeff = mc.mo_coeff
     mc.optimize_mcscf_(mo_coeff=mo_coeff, **kwargs)
-    mc.lpdft_ham, mc.e_states, mc.si_pdft, mc.rootsym, mc.s2_roots, s2_mat = mc.make_lpdft_ham_(ot=ot)
+    mc.lpdft_ham, mc.e_states, mc.si_pdft, mc.rootsym, mc.s2_roots = mc.make_lpdft_ham_(ot=ot)
     logger.debug(mc, f"L-PDFT Hamiltonian in LASSI Basis:\n{mc.get_lpdft_ham()}")
 
     logger.debug(mc, f"L-PDFT SI:\n{mc.si_pdft}")
@@ -174,14 +216,15 @@ class _LPDFT(mcpdft.MultiStateMCPDFTSolver):
             CI vectors in the optimized adiabatic basis of MC-SCF. Related to
             the L-PDFT adiabat CI vectors by the expansion coefficients
             ``si_pdft''.
-        si_pdft : ndarray of shape (nroots, nroots)
+        si_pdft : ndarray of shape (nprods, nroots_pdft)
             Expansion coefficients of the L-PDFT adiabats in terms of the
-            optimized
-            MC-SCF adiabats
+            LAS product states
         e_mcscf : ndarray of shape (nroots)
             Energies of the MC-SCF adiabatic states
-        lpdft_ham : ndarray of shape (nroots, nroots)
-            L-PDFT Hamiltonian in the MC-SCF adiabatic basis
+        lpdft_ham : ndarray of shape (nprods, nprods) or None
+            L-PDFT Hamiltonian in the LAS product state basis. None if
+            any symmetry block was diagonalized with the matrix-free
+            Davidson algorithm
         veff1 : ndarray of shape (nao, nao)
             1-body effective potential in the AO basis computed using the
             zeroth-order densities.
@@ -218,9 +261,10 @@ class _LPDFT(mcpdft.MultiStateMCPDFTSolver):
         '''The L-PDFT effective Hamiltonian matrix
 
             Returns:
-                lpdft_ham : ndarray of shape (nroots, nroots)
-                    Contains L-PDFT Hamiltonian elements on the off-diagonals
-                    and PDFT approx energies on the diagonals
+                lpdft_ham : ndarray of shape (nprods, nprods) or None
+                    L-PDFT Hamiltonian in the LAS product state basis. None
+                    if any symmetry block was diagonalized with the
+                    matrix-free Davidson algorithm
                 '''
         return self.lpdft_ham
 
@@ -249,19 +293,23 @@ class _LPDFT(mcpdft.MultiStateMCPDFTSolver):
 
         log = logger.new_logger(self, verbose)
 
-        kernel(self, mo_coeff, ot=ot, verbose=log)
+        try:
+            kernel(self, mo_coeff, ot=ot, verbose=log)
+        finally:
+            if self.DoLASSI: self.close_rdmstore()
 
         return (
             self.e_tot, self.e_mcscf, self.e_cas, self.ci,
             self.mo_coeff, self.mo_energy)
 
-    def get_lpdft_hcore_only(self, casdm1s_0, hyb=1.0):
+    def get_lpdft_hcore_only(self, casdm1s_0, hyb=1.0, mo_coeff=None, ncore=None, ncas=None):
         '''
         Returns the lpdft hcore AO integrals weighted by the
         hybridization factor. Excludes the MC-SCF (wfn) component.
         '''
 
-        dm1s = _dms.casdm1s_to_dm1s(self, casdm1s=casdm1s_0)
+        dm1s = _dms.casdm1s_to_dm1s(self, casdm1s=casdm1s_0, mo_coeff=mo_coeff, ncore=ncore,
+                                    ncas=ncas)
         dm1 = dm1s[0] + dm1s[1]
         v_j = self._scf.get_j(dm=dm1)
         return hyb * self.get_hcore() + self.veff1 + hyb * v_j
@@ -1,11 +1,16 @@
 from pyscf import ao2mo, lib
+from pyscf import __config__
 from pyscf.mcscf.addons import StateAverageMCSCFSolver
 import numpy as np
-from mrh.my_pyscf.lassi import lassi
+from collections import OrderedDict
+from mrh.my_pyscf.lassi import lassi, op_o1
+from mrh.my_pyscf.mcscf.lasci import get_nelec_frs, get_space_info
 import h5py
 import tempfile
 from pyscf.mcpdft.otfnal import transfnal, get_transfnal
 from pyscf.mcpdft.mcpdft import _get_e_decomp
+from pyscf.mcpdft import _dms
+from pyscf.mcpdft.otpd import _grid_ao2mo
 
 try:
     from pyscf.mcpdft.mcpdft import _PDFT, _mcscf_env
@@ -14,27 +19,212 @@ except ImportError:
           "pyscf-forge can be found at : https://github.com/pyscf/pyscf-forge"
     raise ImportError(msg)
 
-
-def make_casdm1s(filename, i):
-    """
-    This function stores the rdm1s for the given state 'i' in a tempfile
-    """
-    with h5py.File(filename, 'r') as f:
-        rdm1s_key = f'rdm1s_{i}'
-        rdm1s = f[rdm1s_key][:]
-        rdm1s = np.array(rdm1s)
-    return rdm1s
+RDM_CACHE_MEMORY = getattr(__config__, 'mcpdft_laspdft_rdm_cache_memory', 1000)
+RDM_COMPRESSION = getattr(__config__, 'mcpdft_laspdft_rdm_compression', 'lzf')
+STREAM_ONTOP = getattr(__config__, 'mcpdft_laspdft_stream_ontop', False)
 
 
-def make_casdm2s(filename, i):
+class RDMStore:
     """
-    This function stores the rdm2s for the given state 'i' in a tempfile
+    Store of the spin-separated 1-RDMs and spin-summed 2-RDMs of LASSI states in an HDF5 file,
+    with chunked and (optionally) compressed datasets. The file is kept open for the lifetime of
+    the store, and the most recently used states are kept in memory up to max_memory MB.
+    Arrays returned by the store are copies of the cache. After close, the file is reopened
+    for reading on the next access.
     """
-    with h5py.File(filename, 'r') as f:
-        rdm2s_key = f'rdm2s_{i}'
-        rdm2s = f[rdm2s_key][:]
-        rdm2s = np.array(rdm2s)
-    return rdm2s
+    def __init__(self, filename, max_memory=RDM_CACHE_MEMORY, compression=RDM_COMPRESSION):
+        self.filename = filename
+        self.max_memory = max_memory
+        self.compression = compression
+        self._f = None
+        self._mode = 'w'
+        self._cache = OrderedDict()
+
+    @property
+    def f(self):
+        if self._f is None:
+            self._f = h5py.File(self.filename, self._mode)
+            self._mode = 'r+'
+        return self._f
+
+    def close(self):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+        self._cache.clear()
+
+    def _cache_put(self, state, casdm1s, casdm2):
+        self._cache[state] = (casdm1s, casdm2)
+        self._cache.move_to_end(state)
+        nbytes = sum(dm.nbytes for dm_pair in self._cache.values() for dm in dm_pair
+                     if dm is not None)
+        while len(self._cache) > 1 and nbytes > self.max_memory * 1e6:
+            dm_pair = self._cache.popitem(last=False)[1]
+            nbytes -= sum(dm.nbytes for dm in dm_pair if dm is not None)
+
+    def put(self, state, casdm1s, casdm2=None):
+        """
+        Write the rdm1s (2,ncas,ncas) and, if provided, the spin-summed rdm2
+        (ncas,ncas,ncas,ncas) of a state
+        """
+        casdm1s = np.array(casdm1s)
+        f = self.f
+        for key in (f'rdm1s_{state}', f'rdm2_{state}'):
+            if key in f: del f[key]
+        f.create_dataset(f'rdm1s_{state}', data=casdm1s, compression=self.compression)
+        if casdm2 is not None:
+            casdm2 = np.array(casdm2)
+            ncas = casdm2.shape[0]
+            f.create_dataset(f'rdm2_{state}', data=casdm2, chunks=(1, ncas, ncas, ncas),
+                             compression=self.compression)
+        self._cache_put(state, casdm1s, casdm2)
+
+    def get(self, state):
+        """
+        Returns the rdm1s and the spin-summed rdm2 (or None if it was not stored) of a state
+        """
+        if state in self._cache:
+            self._cache.move_to_end(state)
+        else:
+            casdm1s = self.f[f'rdm1s_{state}'][()]
+            casdm2 = None
+            if f'rdm2_{state}' in self.f:
+                casdm2 = self.f[f'rdm2_{state}'][()]
+            self._cache_put(state, casdm1s, casdm2)
+        return tuple(None if dm is None else dm.copy() for dm in self._cache[state])
+
+    def get_casdm1s(self, state):
+        return self.get(state)[0]
+
+    def get_casdm2(self, state):
+        return self.get(state)[1]
+
+
+def _ontop_pair_density_1rdm(rho, deriv=0):
+    '''The part of the on-top pair density (and its gradient) given by the product of the
+    spin densities rho (2,*,ngrids)'''
+    Pi = np.empty(((1, 4)[deriv], rho.shape[-1]), dtype=rho.dtype)
+    Pi[0] = rho[0,0] * rho[1,0]
+    for ideriv in range(1, Pi.shape[0]):
+        Pi[ideriv] = rho[0,ideriv]*rho[1,0] + rho[0,0]*rho[1,ideriv]
+    return Pi
+
+
+def _energy_2body(mc, mo_coeff, si):
+    '''1/2 sum_pqrs (pq|rs) dm2[p,q,r,s] of the LASSI state si, contracted through the LASSI
+    Hamiltonian operator so that the 2-RDM is never built'''
+    ncas = mc.ncas
+    aeri = ao2mo.restore(1, mc.get_h2eff(mo_coeff), ncas)
+    h1 = np.zeros((ncas, ncas), dtype=aeri.dtype)
+    nelec_frs = get_nelec_frs(mc)
+    smult_fr = get_space_info(mc)[2].T
+    hop = op_o1.gen_contract_op_si_hdiag(mc, h1, aeri, mc.ci, nelec_frs, smult_fr=smult_fr)[0]
+    si = si.reshape(-1, 1)
+    return np.dot(si.conj().ravel(), hop(si).ravel()), aeri
+
+
+def energy_tot_ontop(mc, mo_coeff=None, ot=None, state=0, max_memory=None):
+    '''
+    MC-PDFT energy of one LASSI state in which the on-top pair density is computed on the grid
+    directly from the LASSI fragment intermediates (see op_o1.rdm.LRRDMOnTop), so that the
+    2-RDM of the state is never built. The cumulant decomposition used by pyscf-forge is
+    reproduced as
+
+    Pi = rho_a*rho_b - rho_act_a*rho_act_b + 1/2 phi_p phi_q dm2[p,q,r,s] phi_r phi_s
+
+    For hybrid on-top functionals, the 2-RDM part of the cumulant energy is the expectation
+    value of the two-electron LASSI Hamiltonian operator. On-top functionals requiring the
+    off-top Laplacian of Pi (Pi_deriv > 1) fall back to building the 2-RDM of the state.
+
+    Returns:
+        e_tot : float
+            Total MC-PDFT energy including nuclear repulsion energy
+        E_ot : float
+            On-top (cf. exchange-correlation) energy
+        casdm1s : ndarray of shape (2,ncas,ncas)
+            Spin-separated active-space 1-RDM of the state
+    '''
+    if ot is None: ot = mc.otfnal
+    if mo_coeff is None: mo_coeff = mc.mo_coeff
+    if max_memory is None: max_memory = mc.max_memory
+    log = lib.logger.new_logger(mc, mc.verbose)
+    ot.reset(mol=mc.mol)
+    si = mc.si
+    break_symmetry = getattr(si, 'break_symmetry', getattr(mc, 'break_symmetry', False))
+    ni, xctype = ot._numint, ot.xctype
+    dens_deriv, Pi_deriv = ot.dens_deriv, ot.Pi_deriv
+    if Pi_deriv > 1:
+        log.warn("stream_ontop: building the 2-RDM of state %d for Pi_deriv = %d", state,
+                 Pi_deriv)
+        casdm1s, casdm2s = lassi.root_make_rdm12s(mc, mc.ci, si, state=state,
+                                                  break_symmetry=break_symmetry)
+        casdm2 = casdm2s.sum((0, 3))
+        e_mcwfn = mc.energy_mcwfn(ot=ot, mo_coeff=mo_coeff, casdm1s=casdm1s, casdm2=casdm2)
+        E_ot = ot.energy_ot(casdm1s, casdm2, mo_coeff, mc.ncore, max_memory=max_memory)
+        return e_mcwfn + E_ot, E_ot, casdm1s
+    ncore, ncas = mc.ncore, mc.ncas
+    nao = mo_coeff.shape[0]
+    mo_cas = mo_coeff[:,ncore:ncore+ncas]
+
+    # Active orbitals on the grid
+    if ot.grids.coords is None: ot.grids.build(with_non0tab=True)
+    ngrids = ot.grids.weights.size
+    grid2amo = np.empty(((1, 4)[Pi_deriv], ngrids, ncas), dtype=mo_coeff.dtype)
+    mem_av = max(0, max_memory - lib.current_memory()[0] - grid2amo.nbytes / 1e6)
+    g0 = 0
+    for ao, mask, weight, _ in ni.block_loop(ot.mol, ot.grids, nao, Pi_deriv, mem_av):
+        if ao.ndim == 2: ao = ao[None,:,:]
+        g1 = g0 + weight.size
+        grid2amo[:,g0:g1,:] = _grid_ao2mo(ot.mol, ao, mo_cas, non0tab=mask)
+        g0 = g1
+
+    casdm1s, pi2 = lassi.roots_make_rdm1s_ontop(mc, mc.ci, si[:,[state]], grid2amo,
+                                                break_symmetry=break_symmetry)
+    casdm1s, pi2 = casdm1s[0], pi2[0]
+    grid2amo = None
+
+    # Wave function part
+    hyb_x, hyb_c = ot._numint.rsh_and_hybrid_coeff(ot.otxc, mc.mol.spin)[2]
+    dm1s = _dms.casdm1s_to_dm1s(mc, casdm1s, mo_coeff=mo_coeff, ncore=ncore, ncas=ncas)
+    dm1 = dm1s[0] + dm1s[1]
+    if abs(hyb_x) > 1e-10:
+        vj, vk = mc._scf.get_jk(dm=dm1s)
+        vj = vj[0] + vj[1]
+    else:
+        vj = mc._scf.get_j(dm=dm1)
+    e_mcwfn = mc._scf.energy_nuc() + np.tensordot(mc._scf.get_hcore(), dm1)
+    e_mcwfn += np.tensordot(vj, dm1) / 2
+    if abs(hyb_x) > 1e-10:
+        E_x = -(np.tensordot(vk[0], dm1s[0]) + np.tensordot(vk[1], dm1s[1])) / 2
+        e_mcwfn += hyb_x * E_x
+    if abs(hyb_c) > 1e-10:
+        # cumulant: cm2 = dm2 - dm1[p,q]*dm1[r,s] + dm1s[s][p,s]*dm1s[s][r,q]
+        E_c, aeri = _energy_2body(mc, mo_coeff, si[:,state])
+        casdm1 = casdm1s[0] + casdm1s[1]
+        E_c -= lib.einsum('pqrs,pq,rs->', aeri, casdm1, casdm1) / 2
+        for dm in casdm1s:
+            E_c += lib.einsum('pqrs,ps,rq->', aeri, dm, dm) / 2
+        e_mcwfn += hyb_c * E_c
+        aeri = None
+
+    # On-top part
+    E_ot = 0.0
+    if xctype == 'HF': return e_mcwfn, E_ot, casdm1s
+    dm1s_act = [mo_cas @ dm @ mo_cas.T for dm in casdm1s]
+    make_rho = tuple(ni._gen_rho_evaluator(ot.mol, dm, hermi=1, with_lapl=False)
+                     for dm in list(dm1s) + list(dm1s_act))
+    mem_av = max(0, max_memory - lib.current_memory()[0])
+    g0 = 0
+    for ao, mask, weight, _ in ni.block_loop(ot.mol, ot.grids, nao, dens_deriv, mem_av):
+        g1 = g0 + weight.size
+        rho = np.asarray([m[0](0, ao, mask, xctype) for m in make_rho])
+        if rho.ndim == 2: rho = rho[:,None,:]
+        Pi = _ontop_pair_density_1rdm(rho[:2], Pi_deriv)
+        Pi -= _ontop_pair_density_1rdm(rho[2:], Pi_deriv)
+        Pi += pi2[:,g0:g1]
+        E_ot += ot.eval_ot(rho[:2], Pi, dderiv=0, weights=weight)[0].dot(weight)
+        g0 = g1
+    return e_mcwfn + E_ot, E_ot, casdm1s
 
 
 class _LASPDFT(_PDFT):
@@ -79,6 +269,8 @@ def get_mcpdft_child_class(mc, ot, DoLASSI=False, states=None, **kwargs):
         setattr(_mc_class, 'states', None)
         setattr(_mc_class, 'statlis', None)
         setattr(_mc_class, 'rdmstmpfile', None)
+        setattr(_mc_class, 'rdmstore', None)
+        stream_ontop = STREAM_ONTOP
 
         def get_h2eff(self, mo_coeff=None):
             if self._in_mcscf_env:
@@ -150,37 +342,75 @@ def get_mcpdft_child_class(mc, ot, DoLASSI=False, states=None, **kwargs):
                 else:
                     nblk = max(1, int((self.max_memory - current_mem) / mem_per_state) - 1)
 
-                log.debug('_store_rdms: looping over %d states at a time of %d total', len(self.states),
-                          nblk)
-
-                rdmstmpfile = self.rdmstmpfile
-                with h5py.File(rdmstmpfile, 'a') as f:
-                    for i in range(0, len(self.states), nblk):
-                        j = min(i + nblk, len(self.states))
-
-                        rdm1s, rdm2s = lassi.root_make_rdm12s(self, self.ci, self.si,
-                                                              state=self.states[i:j])
-
-                        if len(self.states[i:j]) == 1:
-                            rdm1s = [rdm1s]
-                            rdm2s = [rdm2s]
-
-                        for k in range(i, j):
-                            stateno = self.states[k]
-                            rdm1s_dname = f'rdm1s_{stateno}'
-                            f.create_dataset(rdm1s_dname, data=rdm1s[k])
-                            rdm2s_dname = f'rdm2s_{stateno}'
-                            f.create_dataset(rdm2s_dname, data=rdm2s[k])
-
-                        rdm1s = rdm2s = None
+                log.debug('_store_rdms: looping over %d states at a time of %d total', nblk,
+                          len(self.states))
+
+                if self.rdmstore is not None:
+                    self.rdmstore.close()
+                self.rdmstore = RDMStore(self.rdmstmpfile.name)
+                if self.stream_ontop:
+                    # 1-RDMs only; the 2-RDM enters only through the on-top pair density
+                    # which is computed state by state in energy_tot
+                    break_symmetry = getattr(self.si, 'break_symmetry',
+                                             getattr(self, 'break_symmetry', False))
+                    rdm1s = lassi.roots_make_rdm1s(self, self.ci, self.si[:,self.states],
+                                                   break_symmetry=break_symmetry)
+                    for k, stateno in enumerate(self.states):
+                        self.rdmstore.put(stateno, rdm1s[k])
+                    return
+                for i in range(0, len(self.states), nblk):
+                    j = min(i + nblk, len(self.states))
+
+                    rdm1s, rdm2s = lassi.root_make_rdm12s(self, self.ci, self.si,
+                                                          state=self.states[i:j])
+
+                    if len(self.states[i:j]) == 1:
+                        rdm1s = [rdm1s]
+                        rdm2s = [rdm2s]
+
+                    for k in range(i, j):
+                        self.rdmstore.put(self.states[k], rdm1s[k-i], rdm2s[k-i].sum((0, 3)))
+
+                    rdm1s = rdm2s = None
+
+            def close_rdmstore(self):
+                '''Release the HDF5 handle and the in-memory cache of the RDM store. The
+                RDMs stay in rdmstmpfile and are read back on demand.'''
+                if self.rdmstore is not None:
+                    self.rdmstore.close()
+
+            def kernel(self, mo_coeff=None, ci0=None, otxc=None, grids_attr=None,
+                       grids_level=None, **kwargs):
+                try:
+                    return _LASPDFT.kernel(self, mo_coeff=mo_coeff, ci0=ci0, otxc=otxc,
+                                           grids_attr=grids_attr, grids_level=grids_level,
+                                           **kwargs)
+                finally:
+                    self.close_rdmstore()
 
             def make_one_casdm1s(self, ci=None, state=0, **kwargs):
-                rdmstmpfile = self.rdmstmpfile
-                return make_casdm1s(rdmstmpfile, self.states[state])
+                return self.rdmstore.get_casdm1s(self.states[state])
 
             def make_one_casdm2(self, ci=None, state=0, **kwargs):
-                rdmstmpfile = self.rdmstmpfile
-                return make_casdm2s(rdmstmpfile, self.states[state]).sum((0, 3))
+                if self.stream_ontop:
+                    raise RuntimeError("2-RDMs are not stored if stream_ontop is set")
+                return self.rdmstore.get_casdm2(self.states[state])
+
+            def energy_tot(self, mo_coeff=None, ci=None, ot=None, state=0, verbose=None,
+                           logger_tag='MC-PDFT', **kwargs):
+                if not self.stream_ontop:
+                    return _LASPDFT.energy_tot(self, mo_coeff=mo_coeff, ci=ci, ot=ot,
+                                               state=state, verbose=verbose,
+                                               logger_tag=logger_tag, **kwargs)
+                if kwargs.get('otxc', None) is not None or kwargs.get('grids_attr', None) \
+                        or kwargs.get('grids_level', None) is not None:
+                    raise NotImplementedError("stream_ontop with otxc or grids overrides")
+                if ot is None: ot = self.otfnal
+                e_tot, e_ot = energy_tot_ontop(self, mo_coeff=mo_coeff, ot=ot,
+                                               state=self.states[state])[:2]
+                lib.logger.note(self, '%s E = %s, Eot(%s) = %s', logger_tag, e_tot, ot.otxc,
+                                e_ot)
+                return e_tot, e_ot
 
         else:
             make_one_casdm1s = mc.__class__.state_make_casdm1s
@@ -197,12 +427,12 @@ def get_mcpdft_child_class(mc, ot, DoLASSI=False, states=None, **kwargs):
 
             with _mcscf_env(self):
                 if self.DoLASSI:
-                    self.statlis = [x for x in range(len(self.e_roots))]  # LASSI-LPDFT
                     if self.states is None:
                         self.states = list(range(len(self.e_roots)))
                         self.fcisolver.nroots = len(self.e_roots)
                     else:
                         self.fcisolver.nroots = len(self.states)
+                    self.statlis = [x for x in range(len(self.states))]  # LASSI-LPDFT
 
                     self._store_rdms()
                 else:
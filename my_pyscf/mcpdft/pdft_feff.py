@@ -2,9 +2,10 @@ import time, math
 import numpy as np
 from scipy import linalg
 from itertools import combinations_with_replacement, product
-from pyscf import lib, ao2mo
-from pyscf.dft.gen_grid import BLKSIZE
-from pyscf.dft.numint import _contract_rho
+from concurrent.futures import ThreadPoolExecutor
+from pyscf import lib, ao2mo, __config__
+from pyscf.dft.gen_grid import BLKSIZE, NBINS
+from pyscf.dft.numint import _contract_rho, _sparse_enough, ALIGNMENT_UNIT, SWITCH_SIZE
 from pyscf.mcscf import mc1step
 from pyscf.scf import hf
 from pyscf.mcpdft._dms import dm2_cumulant
@@ -35,6 +36,8 @@ def _contract_rho_all (bra, ket):
 from mrh.util import la
 def vector_error (test, ref): return la.vector_error (test, ref, 'rel')
 
+MAX_WORKERS = getattr (__config__, 'mcpdft_pdft_feff_max_workers', 1)
+
 # PySCF's overall sign convention is
 #   de = h.D - D.h
 #   dD = x.D - D.x
@@ -75,11 +78,18 @@ class EotOrbitalHessianOperator (object):
     computed using cached effective Hamiltonian tensors that map
     straightforwardly to those involved in CASSCF orbital
     optimization.
+
+    The grid blocks are partitioned among max_workers threads, each
+    with a private accumulator. If cache_grid is True and memory
+    allows, the quantities on each grid block that do not depend on
+    the step vector (AO values, densities, their orbital derivatives
+    and the functional derivatives) are cached the first time the
+    operator is called and reused in subsequent calls.
     '''
     
     def __init__(self, mc, ot=None, mo_coeff=None, ncore=None, ncas=None,
             casdm1=None, casdm2=None, max_memory=None, do_cumulant=True,
-            incl_d2rho=False):
+            incl_d2rho=False, max_workers=MAX_WORKERS, cache_grid=True):
         if ot is None: ot = mc.otfnal
         if mo_coeff is None: mo_coeff = mc.mo_coeff
         if ncore is None: ncore = mc.ncore
@@ -117,6 +127,10 @@ class EotOrbitalHessianOperator (object):
         self.max_memory = max_memory        
         self.do_cumulant = do_cumulant
         self.incl_d2rho = incl_d2rho
+        self.max_workers = max (1, max_workers)
+        self.cache_grid = cache_grid
+        self._grid_blocks = None
+        self._grid_cache = None
 
         dm1 = 2 * np.eye (nocc, dtype=casdm1.dtype)
         dm1[ncore:,ncore:] = casdm1
@@ -217,11 +231,92 @@ class EotOrbitalHessianOperator (object):
              + nocc*(2*nderiv_rho+nderiv_Pi)) # drho_a, drho_b, dPi
         ncol *= 1.1 # fudge factor
         ngrids = self.ot.grids.coords.shape[0]
-        remaining_floats = (self.max_memory-lib.current_memory()[0]) * 1e6 / 8
+        remaining_memory = self.max_memory-lib.current_memory()[0]
+        if self.cache_grid: remaining_memory -= self.get_cache_size ()
+        # Each worker needs room for one block
+        remaining_floats = remaining_memory * 1e6 / 8 / self.max_workers
         blksize = int (remaining_floats/(ncol*BLKSIZE))*BLKSIZE
         ngrids_blk = int (ngrids / BLKSIZE) * BLKSIZE
         return max(BLKSIZE,min(blksize,ngrids_blk,BLKSIZE*1200))
 
+    def get_cache_size (self):
+        ''' Memory (in MB) required to cache the step-independent
+            quantities of every grid block '''
+        nderiv_ao, nao, nocc = self.nderiv_ao, self.nao, self.nocc
+        nderiv_rho, nderiv_Pi = self.nderiv_rho, self.nderiv_Pi
+        ngrids = self.ot.grids.coords.shape[0]
+        ncol = (nderiv_ao*nao                    # ao
+             + nocc*(nderiv_rho+nderiv_Pi)       # drho, dPi
+             + 2*(nderiv_rho+nderiv_Pi) + 21)    # rho, Pi, weights, vot, fot
+        return ngrids * ncol * 8 / 1e6
+
+    def get_grid_blocks (self):
+        ''' Partition the grid into blocks, once for the lifetime of
+            this object, and decide whether to cache the
+            step-independent quantities of each block
+
+            Returns:
+                blocks : list of tuples (ip0, ip1)
+                    Ranges of grid points of each block
+        '''
+        if self._grid_blocks is not None: return self._grid_blocks
+        grids = self.ot.grids
+        if grids.coords is None: grids.build (with_non0tab=True)
+        if self.cache_grid:
+            cache_size = self.get_cache_size ()
+            remaining_memory = self.max_memory-lib.current_memory()[0]
+            if cache_size < remaining_memory / 2:
+                self._grid_cache = {}
+            else:
+                self.log.debug ('Grid cache (%.1f MB) does not fit in memory '
+                    '(%.1f MB remaining)', cache_size, remaining_memory)
+                self.cache_grid = False
+        ngrids = grids.coords.shape[0]
+        blksize = self.get_blocksize ()
+        self._grid_blocks = list (lib.prange (0, ngrids, blksize))
+        self.log.debug ('EotOrbitalHessianOperator: %d grid blocks of %d '
+            'points; %d workers; cache_grid = %s', len (self._grid_blocks),
+            blksize, self.max_workers, self.cache_grid)
+        return self._grid_blocks
+
+    def eval_block (self, ip0, ip1):
+        ''' AO values on the grid points [ip0:ip1], as in
+            NumInt.block_loop '''
+        assert (ip0 % BLKSIZE == 0)
+        mol, grids = self.ot.mol, self.ot.grids
+        ngrids = grids.coords.shape[0]
+        coords = grids.coords[ip0:ip1]
+        weights = grids.weights[ip0:ip1]
+        non0tab = grids.non0tab if mol is grids.mol else None
+        if non0tab is None:
+            non0tab = np.empty (((ngrids+BLKSIZE-1)//BLKSIZE,mol.nbas),
+                dtype=np.uint8)
+            non0tab[:] = NBINS + 1
+        mask = non0tab[ip0//BLKSIZE:]
+        ao = self.ni.eval_ao (mol, coords, deriv=self.rho_deriv,
+            non0tab=mask, cutoff=grids.cutoff)
+        allow_sparse = ngrids % ALIGNMENT_UNIT == 0 and self.nao > SWITCH_SIZE
+        if not allow_sparse and not _sparse_enough (mask):
+            mask = None
+        return ao, mask, weights
+
+    def get_block_dens (self, iblk):
+        ''' Step-independent quantities on the iblk'th grid block: AO
+            values, mask, weights, density and on-top pair density, their
+            orbital derivatives, and the first and second functional
+            derivatives (vot, fot). Cached if cache_grid is True. '''
+        if self._grid_cache is not None and iblk in self._grid_cache:
+            return self._grid_cache[iblk]
+        ip0, ip1 = self.get_grid_blocks ()[iblk]
+        ao, mask, weights = self.eval_block (ip0, ip1)
+        rho0, Pi0 = self.make_dens0 (ao, mask)
+        if ao.ndim == 2: ao = ao[None,:,:]
+        drho, dPi = self.make_ddens (ao, rho0, mask)
+        vot_fot = self.get_fot (rho0, Pi0, weights)
+        dens = (ao, mask, weights, rho0, Pi0, drho, dPi, vot_fot)
+        if self._grid_cache is not None: self._grid_cache[iblk] = dens
+        return dens
+
     def make_dens0 (self, ao, mask, make_rho=None, casdm1s=None, cascm2=None,
             mo_cas=None):
         if make_rho is None: make_rho = self.make_rho
@@ -331,8 +426,9 @@ class EotOrbitalHessianOperator (object):
         return vrho, vPi
 
     def get_fxot (self, ao, rho0, Pi0, drho, dPi, x, weights, mask,
-            return_num=False):
-        vot, fot = self.get_fot (rho0, Pi0, weights)
+            return_num=False, vot_fot=None):
+        if vot_fot is None: vot_fot = self.get_fot (rho0, Pi0, weights)
+        vot, fot = vot_fot
         rho1_c, rho1_a, Pi1 = self.make_dens1 (ao, drho, dPi, mask, x)
         rho1 = rho1_c + rho1_a
         if self.verbose > lib.logger.DEBUG:
@@ -423,31 +519,7 @@ class EotOrbitalHessianOperator (object):
             x = self.unpack_uniq_var (x)
         else:
             x_packed = self.pack_uniq_var (x)
-        dg = np.zeros ((self.nocc, self.nao), dtype=x.dtype)
-        dg_cum = np.zeros_like (dg)
-        de = 0
-        for ao, mask, weights, coords in self.ni.block_loop (self.ot.mol,
-                self.ot.grids, self.nao, self.rho_deriv, self.max_memory,
-                blksize=self.get_blocksize ()):
-            rho0, Pi0 = self.make_dens0 (ao, mask)
-            if ao.ndim == 2: ao = ao[None,:,:]
-            drho, dPi = self.make_ddens (ao, rho0, mask)
-            dde, fxrho, fxPi, fxrho_c, fxrho_a = self.get_fxot (ao, rho0, Pi0,
-                drho, dPi, x, weights, mask)
-            de += dde
-            dg -= self.contract_v_ddens (fxrho, drho, ao, weights, mask).T
-            dg -= self.contract_v_ddens (fxPi, dPi, ao, weights, mask).T
-            # Transpose because update_jk_in_ah requires this shape
-            # Minus because I want to use 1 consistent sign rule here
-            if self.do_cumulant and ncore: # The D_c D_a part
-                drho_c = drho[:self.nderiv_Pi,:,:ncore]
-                drho_a = drho[:self.nderiv_Pi,:,ncore:nocc]
-                dg_cum[:ncore] -= self.contract_v_ddens (fxrho_c, drho_c,
-                    ao, weights, mask).T
-                dg_cum[:ncore] -= self.contract_v_ddens (fxrho_a, drho_c,
-                    ao, weights, mask).T
-                dg_cum[ncore:nocc] -= self.contract_v_ddens (fxrho_c, drho_a,
-                    ao, weights, mask).T
+        dg, dg_cum, de = self.contract_grid (x)
         dg = np.dot (dg, self.mo_coeff) 
         dg_cum = np.dot (dg_cum, self.mo_coeff) 
         if self.incl_d2rho:
@@ -470,6 +542,62 @@ class EotOrbitalHessianOperator (object):
             if self.incl_d2rho: dg += dg_d2rho
         return dg, de
 
+    def contract_block (self, dens, x, dg, dg_cum):
+        ''' Add the contribution of one grid block to the (nocc,nao)
+            accumulators dg and dg_cum and return its contribution to the
+            gradient-vector product '''
+        ncore, nocc = self.ncore, self.nocc
+        ao, mask, weights, rho0, Pi0, drho, dPi, vot_fot = dens
+        de, fxrho, fxPi, fxrho_c, fxrho_a = self.get_fxot (ao, rho0, Pi0,
+            drho, dPi, x, weights, mask, vot_fot=vot_fot)
+        dg -= self.contract_v_ddens (fxrho, drho, ao, weights, mask).T
+        dg -= self.contract_v_ddens (fxPi, dPi, ao, weights, mask).T
+        # Transpose because update_jk_in_ah requires this shape
+        # Minus because I want to use 1 consistent sign rule here
+        if self.do_cumulant and ncore: # The D_c D_a part
+            drho_c = drho[:self.nderiv_Pi,:,:ncore]
+            drho_a = drho[:self.nderiv_Pi,:,ncore:nocc]
+            dg_cum[:ncore] -= self.contract_v_ddens (fxrho_c, drho_c,
+                ao, weights, mask).T
+            dg_cum[:ncore] -= self.contract_v_ddens (fxrho_a, drho_c,
+                ao, weights, mask).T
+            dg_cum[ncore:nocc] -= self.contract_v_ddens (fxrho_c, drho_a,
+                ao, weights, mask).T
+        return de
+
+    def contract_grid (self, x):
+        ''' Integrate the Hessian-vector product over the grid, with the
+            blocks partitioned round-robin among up to max_workers threads,
+            each of which runs OpenMP code with
+            lib.num_threads () // max_workers threads and has its own
+            accumulator. The accumulators are summed in a fixed order, so
+            the result does not depend on the scheduling. '''
+        blocks = self.get_grid_blocks ()
+        nworkers = max (1, min (self.max_workers, len (blocks)))
+        nthreads = max (1, lib.num_threads () // nworkers)
+        def worker (iworker):
+            dg = np.zeros ((self.nocc, self.nao), dtype=x.dtype)
+            dg_cum = np.zeros_like (dg)
+            de = 0
+            for iblk in range (iworker, len (blocks), nworkers):
+                de += self.contract_block (self.get_block_dens (iblk), x, dg,
+                    dg_cum)
+            return dg, dg_cum, de
+        def omp_worker (iworker):
+            with lib.with_omp_threads (nthreads):
+                return worker (iworker)
+        if nworkers == 1:
+            results = [worker (0),]
+        else:
+            with ThreadPoolExecutor (max_workers=nworkers) as executor:
+                results = list (executor.map (omp_worker, range (nworkers)))
+        dg, dg_cum, de = results[0]
+        for dg1, dg_cum1, de1 in results[1:]:
+            dg += dg1
+            dg_cum += dg_cum1
+            de += de1
+        return dg, dg_cum, de
+
     def seminum_orb (self, x):
         ''' Calculate energy and gradient change seminumerically using
             updated-orbital recalculation of everything '''
@@ -534,9 +662,10 @@ class EotOrbitalHessianOperator (object):
         get_fxot = self.get_fxot
         def mask_fxot (irow, my_dg):
             def get_masked_fxot (ao, rho0, Pi0, drho, dPi, my_x, weights,
-                    mask):
+                    mask, vot_fot=None):
                 de, fxrho, fxPi, fxrho_c, fxrho_a, dvot = get_fxot (ao, rho0,
-                    Pi0, drho, dPi, my_x, weights, mask, return_num=True)
+                    Pi0, drho, dPi, my_x, weights, mask, return_num=True,
+                    vot_fot=vot_fot)
                 norm_x = linalg.norm (my_x)
                 if rho0.ndim == 1: rho0 = rho0[None,:]
                 dvrho, dvPi, rho1, Pi1 = dvot
@@ -558,8 +687,9 @@ class EotOrbitalHessianOperator (object):
         for irow, icol in product (range (ndim), repeat=2):
             sector = 'f_' + lbls[irow] + ',' + lbls[icol]
             dg_num = np.zeros ((nmo if packed else nocc, nao), dtype=x.dtype)
+            # max_workers=1: get_masked_fxot writes to the shared dg_num
             with lib.temporary_env (self, incl_d2rho=False, do_cumulant=False,
-                    get_fxot = mask_fxot (irow, dg_num[:nocc,:]),
+                    max_workers=1, get_fxot = mask_fxot (irow, dg_num[:nocc,:]),
                     make_dens1 = mask_dens1 (icol)):
                 dg_an = self (x, packed=packed)[0]
             dg_num = np.dot (dg_num, self.mo_coeff) 
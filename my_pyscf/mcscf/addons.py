@@ -1,6 +1,7 @@
 import numpy as np
 from scipy import linalg, special
 from scipy.sparse.linalg import LinearOperator
+from functools import partial
 from pyscf.lib import logger, temporary_env
 from pyscf.mcscf.addons import StateAverageMCSCFSolver, StateAverageMixFCISolver, state_average_mix
 from pyscf.mcscf.addons import StateAverageMixFCISolver_state_args as _state_arg
@@ -84,19 +85,38 @@ def get_h1e_zipped_fcisolver (fcisolver):
                 yield solver, my_args, my_kwargs
 
         def kernel(self, h1, h2, norb, nelec, ci0=None, verbose=0, ecore=0, orbsym=None, **kwargs):
+            tasks = self.kernel_tasks (h1, h2, norb, nelec, ci0=ci0, verbose=verbose,
+                                       ecore=ecore, orbsym=orbsym, **kwargs)
+            return self.kernel_finalize ([task () for task in tasks], norb, nelec,
+                                         verbose=verbose)
+
+        def kernel_tasks (self, h1, h2, norb, nelec, ci0=None, verbose=0, ecore=0, orbsym=None,
+                          **kwargs):
+            ''' The mutually independent solver.kernel calls of kernel, one for each solver in
+            self.fcisolvers, as argumentless callables. Pass their return values to
+            kernel_finalize. '''
             # Note self.orbsym is initialized lazily in mc1step_symm.kernel function
             log = logger.new_logger(self, verbose)
-            es = []
-            cs = []
             if isinstance (ecore, (int, float, np.integer, np.floating)):
                 ecore = [ecore,] * len (h1)
             if orbsym is None: orbsym=self.orbsym
+            tasks = []
             for solver, my_args, my_kwargs in self._loop_solver(_state_arg (ci0), _solver_arg (h1), _state_arg (ecore)):
                 c0 = my_args[0]
                 h1e = my_args[1]
                 e0 = my_args[2]
-                e, c = solver.kernel(h1e, h2, norb, self._get_nelec(solver, nelec), c0,
-                                     orbsym=orbsym, verbose=log, ecore=e0, **kwargs)
+                tasks.append (partial (solver.kernel, h1e, h2, norb,
+                                       self._get_nelec(solver, nelec), c0, orbsym=orbsym,
+                                       verbose=log, ecore=e0, **kwargs))
+            return tasks
+
+        def kernel_finalize (self, results, norb, nelec, verbose=0):
+            ''' Collect the return values of the callables generated by kernel_tasks into the
+            return value of kernel '''
+            log = logger.new_logger(self, verbose)
+            es = []
+            cs = []
+            for solver, (e, c) in zip (self.fcisolvers, results):
                 if solver.nroots == 1:
                     es.append(e)
                     cs.append(c)
@@ -1,4 +1,7 @@
 import h5py
+import hashlib
+import numpy as np
+from pyscf import __config__
 from pyscf.lib.chkfile import load
 from pyscf.lib.chkfile import load_mol, save_mol
 
@@ -6,13 +9,135 @@ KEYS_CONFIG_LASSCF = ['ncas', 'nelecas', 'ncore', 'ncas_sub', 'nelecas_sub']
 KEYS_SACONSTR_LASSCF = ['weights', 'charges', 'spins', 'smults', 'wfnsyms']
 KEYS_RESULTS_LASSCF = ['e_states', 'states_converged', 'e_tot', 'mo_coeff']
 
+# Format 1: ci/i/j datasets, the whole group rewritten on every dump
+# Format 2: each distinct CI array stored once in ci_data/<hash>, referenced by ci_keys/i; only
+#           changed datasets rewritten
+CHK_FORMAT_VERSION = 2
+CHK_COMPRESSION = getattr (__config__, 'mcscf_chkfile_compression', None)
+
+def ci_hash (ci):
+    '''Content hash of a CI array, used as its key in the ci_data group of a chkfile'''
+    ci = np.ascontiguousarray (ci)
+    h = hashlib.sha1 (ci.view (np.uint8))
+    h.update (str ((ci.shape, ci.dtype.str)).encode ())
+    return h.hexdigest ()
+
+def _put_dataset (grp, key, val, **kwargs):
+    '''Write val to grp[key], unless an identical dataset is already there.
+    Returns True if anything was written.'''
+    val = np.asarray (val)
+    if key in grp:
+        dset = grp[key]
+        if (isinstance (dset, h5py.Dataset) and dset.shape == val.shape
+                and dset.dtype == val.dtype):
+            if np.array_equal (dset[()], val): return False
+            dset[...] = val
+            return True
+        del grp[key]
+    if val.ndim == 0: kwargs = {}
+    grp.create_dataset (key, data=val, **kwargs)
+    return True
+
+def _put_ragged (grp, key, rows, **kwargs):
+    '''Write a list of arrays to the datasets grp[key][str(i)]'''
+    subgrp = grp.require_group (key)
+    for i, row in enumerate (rows):
+        _put_dataset (subgrp, str(i), row, **kwargs)
+    for i in range (len (rows), len (subgrp)):
+        if str(i) in subgrp: del subgrp[str(i)]
+
+def _put_ci (grp, ci, compression=None, keys_memo=None):
+    '''Store each distinct CI array of the nested list ci once in grp['ci_data'], keyed by its
+    content hash, with one row of keys per fragment in grp['ci_keys']. Arrays already in the
+    file are not rewritten, and arrays no longer referenced are deleted. None elements are
+    stored as empty keys.
+
+    Returns a dict id (array) -> (array, key) of the arrays in ci. Passing it back as keys_memo
+    to the next call for the same grp skips rehashing arrays which have not been replaced, so
+    arrays must not be modified in place between the two calls.'''
+    ci_data = grp.require_group ('ci_data')
+    if keys_memo is None: keys_memo = {}
+    new_memo = {} # the same array object is only hashed once
+    ci_keys = []
+    for cii in ci:
+        keys = []
+        for ciij in cii:
+            if ciij is None:
+                keys.append ('')
+                continue
+            arr_key = new_memo.get (id (ciij), keys_memo.get (id (ciij), None))
+            if arr_key is None or arr_key[0] is not ciij or arr_key[1] not in ci_data:
+                arr_key = (ciij, ci_hash (ciij))
+                key = arr_key[1]
+                if key not in ci_data:
+                    ciij = np.asarray (ciij)
+                    ci_data.create_dataset (key, data=ciij, chunks=(ciij.ndim>0) or None,
+                                            compression=compression)
+            new_memo[id (arr_key[0])] = arr_key
+            keys.append (arr_key[1])
+        ci_keys.append (np.asarray (keys, dtype='S40'))
+    _put_ragged (grp, 'ci_keys', ci_keys)
+    live = set (key for arr, key in new_memo.values ())
+    for key in list (ci_data.keys ()):
+        if key not in live: del ci_data[key]
+    return new_memo
+
+def _get_ci (grp, nfrags=None, nroots=None):
+    '''Read the CI vectors written by _put_ci. Each distinct array is read once, and rootspaces
+    which shared a CI array when it was dumped share it again. By default, nfrags and nroots are
+    those of the stored array.'''
+    ci_data = grp['ci_data']
+    ci_keys = grp['ci_keys']
+    if nfrags is None: nfrags = len (ci_keys)
+    if nroots is None: nroots = len (ci_keys['0']) if nfrags else 0
+    cache = {}
+    ci = []
+    for i in range (nfrags):
+        ci.append ([])
+        keys = ci_keys[str(i)][()]
+        for j in range (nroots):
+            key = keys[j].decode ()
+            if not key:
+                ci[-1].append (None)
+                continue
+            if key not in cache: cache[key] = ci_data[key][()]
+            ci[-1].append (cache[key])
+    return ci
+
+def _require_method_group (fh5, method_key):
+    '''The method_key group of an open chkfile, replacing it if it has another format'''
+    if method_key in fh5:
+        if fh5[method_key].attrs.get ('format_version', 1) != CHK_FORMAT_VERSION:
+            del (fh5[method_key])
+    grp = fh5.require_group (method_key)
+    grp.attrs['format_version'] = CHK_FORMAT_VERSION
+    return grp
+
+def _load_group (chkfile, method_key, with_ci=True):
+    '''Read a format-2 method_key group: the top-level datasets, the frags_orbs subgroup, and,
+    if with_ci, the CI vectors (as data['ci']; see _get_ci).'''
+    with h5py.File (chkfile, 'r') as fh5:
+        if method_key not in fh5: return None, None
+        grp = fh5[method_key]
+        version = grp.attrs.get ('format_version', 1)
+        if version < 2: return version, None
+        data = {key: grp[key][()] for key, dset in grp.items ()
+                if isinstance (dset, h5py.Dataset)}
+        if 'frags_orbs' in grp:
+            data['frags_orbs'] = {key: dset[()] for key, dset in grp['frags_orbs'].items ()}
+        if with_ci and 'ci_keys' in grp:
+            data['ci'] = _get_ci (grp)
+    return version, data
+
 def load_las_(mc, chkfile=None, method_key='las', 
               keys_config=KEYS_CONFIG_LASSCF,
               keys_saconstr=KEYS_SACONSTR_LASSCF,
               keys_results=KEYS_RESULTS_LASSCF):
     if chkfile is None: chkfile = mc.chkfile
     if chkfile is None: raise RuntimeError ('chkfile not specified')
-    data = load (chkfile, method_key)
+    version, data = _load_group (chkfile, method_key)
+    if version is not None and version < 2:
+        data = load (chkfile, method_key)
     if data is None: raise KeyError ('{} record not in chkfile'.format (method_key.upper()))
 
     # conditionals for backwards compatibility with older chkfiles that
@@ -40,13 +165,16 @@ def load_las_(mc, chkfile=None, method_key='las',
             setattr (mc, key, data[key])
     if 'frags_orbs' in data: mc.frags_orbs = data['frags_orbs']
     # special handling for ragged CI vector
-    ci = data['ci']
-    mc.ci = []
-    for i in range (mc.nfrags):
-        mc.ci.append ([])
-        cii = ci[str(i)]
-        for j in range (mc.nroots):
-            mc.ci[-1].append (cii[str(j)])
+    if version is not None and version >= 2:
+        mc.ci = [cii[:mc.nroots] for cii in data['ci'][:mc.nfrags]]
+    else:
+        ci = data['ci']
+        mc.ci = []
+        for i in range (mc.nfrags):
+            mc.ci.append ([])
+            cii = ci[str(i)]
+            for j in range (mc.nroots):
+                mc.ci[-1].append (cii[str(j)])
     # special handling for ragged frags_orbs
     if 'frags_orbs' in data:
         mc.frags_orbs = []
@@ -63,8 +191,12 @@ def load_las_(mc, chkfile=None, method_key='las',
 def dump_las (mc, chkfile=None, method_key='las', mo_coeff=None, ci=None,
               overwrite_mol=True, keys_config=KEYS_CONFIG_LASSCF,
               keys_saconstr=KEYS_SACONSTR_LASSCF,
-              keys_results=KEYS_RESULTS_LASSCF,
+              keys_results=KEYS_RESULTS_LASSCF, compression=CHK_COMPRESSION,
               **kwargs):
+    '''Save a LAS calculation to chkfile. Datasets which are already in the chkfile with the
+    same contents are not rewritten, and each distinct CI array is written only once even if
+    it is shared by many rootspaces (see _put_ci). CI arrays are stored as chunked datasets
+    with the h5py compression filter "compression" (default: no compression).'''
     if chkfile is None: chkfile = mc.chkfile
     if not chkfile: return mc
     if mo_coeff is None: mo_coeff = mc.mo_coeff
@@ -80,30 +212,33 @@ def dump_las (mc, chkfile=None, method_key='las', mo_coeff=None, ci=None,
         data[key] = kwargs.get (key, val)
 
     with h5py.File (chkfile, 'a') as fh5:
+        mol_str = mc.mol.dumps()
         if 'mol' not in fh5:
-            fh5['mol'] = mc.mol.dumps()
-        elif overwrite_mol:
+            fh5['mol'] = mol_str
+        elif overwrite_mol and fh5['mol'].asstr ()[()] != mol_str:
             del (fh5['mol'])
-            fh5['mol'] = mc.mol.dumps()
-        if method_key in fh5:
-            del (fh5[method_key])
-        chkdata = fh5.create_group (method_key)
+            fh5['mol'] = mol_str
+        chkdata = _require_method_group (fh5, method_key)
+        # top-level datasets from a previous dump which are no longer part of data
+        for key in list (chkdata.keys ()):
+            if (isinstance (chkdata[key], h5py.Dataset) and key not in data
+                    and key != 'mo_coeff_orbsym'):
+                del chkdata[key]
 
-        for key, val in data.items (): chkdata[key] = val
+        for key, val in data.items (): _put_dataset (chkdata, key, val)
         # special handling for ragged CI vector
-        for i, cii in enumerate (ci):
-            chkdata_ci_i = chkdata.create_group ('ci/'+str(i))
-            for j, ciij in enumerate (cii):
-                chkdata_ci_i[str(j)] = ciij
+        _put_ci (chkdata, ci, compression=compression)
         # special handling for ragged frags_orbs
         if getattr (mc, 'frags_orbs', None) is not None:
-            chkdata_frags_orbs = chkdata.create_group ('frags_orbs')
-            for i, frag_orbs in enumerate (mc.frags_orbs):
-                chkdata_frags_orbs[str(i)] = frag_orbs
+            _put_ragged (chkdata, 'frags_orbs', mc.frags_orbs)
+        elif 'frags_orbs' in chkdata:
+            del chkdata['frags_orbs']
         # if mo_coeff has tagged orbsym, save it, in case someone decides
         # to change PySCF symmetry convention again
         if getattr (mo_coeff, 'orbsym', None) is not None:
-            chkdata['mo_coeff_orbsym'] = mo_coeff.orbsym
+            _put_dataset (chkdata, 'mo_coeff_orbsym', mo_coeff.orbsym)
+        elif 'mo_coeff_orbsym' in chkdata:
+            del chkdata['mo_coeff_orbsym']
     return mc
 
 
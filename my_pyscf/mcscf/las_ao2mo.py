@@ -5,6 +5,10 @@ from mrh.my_pyscf.df.sparse_df import sparsedf_array
 
 def get_h2eff_df (las, mo_coeff):
     # Store intermediate with one contracted ao index for faster calculation of exchange!
+    # NOTE: this is rebuilt from the DF integrals every macrocycle on purpose. The bmPu tag can't
+    # be rotated to new MOs, since it lacks the mixing of active with inactive orbitals, and
+    # updating from cached (P|pq) of all MOs costs as much as this per cycle and 10-20x this to
+    # build; see tests/lasscf/bench_h2eff_update.py
     log = lib.logger.new_logger (las, las.verbose)
     gpu=las.use_gpu
     nao, nmo = mo_coeff.shape
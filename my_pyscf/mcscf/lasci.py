@@ -6,7 +6,7 @@ from pyscf.tools import dump_mat
 from pyscf import symm, gto, scf, ao2mo, lib
 from pyscf.fci.direct_spin1 import _unpack_nelec
 from mrh.my_pyscf.mcscf.addons import state_average_n_mix, get_h1e_zipped_fcisolver, las2cas_civec
-from mrh.my_pyscf.mcscf import lasci_sync, _DFLASCI, lasscf_guess, las_ao2mo
+from mrh.my_pyscf.mcscf import lasci_sync, _DFLASCI, lasscf_guess, las_ao2mo, productstate
 from mrh.my_pyscf.fci import csf_solver
 from mrh.my_pyscf.df.sparse_df import sparsedf_array
 from mrh.my_pyscf.mcscf import chkfile
@@ -319,7 +319,9 @@ def get_fock (las, mo_coeff=None, ci=None, eris=None, casdm1s=None, verbose=None
         fock = las.get_hcore()[None,:,:] + veff
         return get_roothaan_fock (fock, dm1s, las._scf.get_ovlp ())
     dm1 = dm1s[0] + dm1s[1]
-    if isinstance (las, _DFLASCI):
+    if isinstance (las, _DFLASCI) and las.with_sparse_df:
+        vj, vk = las.get_sparse_df ().get_jk (dm1, hermi=1, eig_thresh=las.sparse_df_eig_thresh)
+    elif isinstance (las, _DFLASCI):
         vj, vk = las.with_df.get_jk(dm1, hermi=1)
     else:
         vj, vk = las._scf.get_jk(las.mol, dm1, hermi=1)
@@ -754,6 +756,8 @@ def run_lasci (las, mo_coeff=None, ci0=None, lroots=None, lweights=None, verbose
     frozen orbitals using a fixed-point algorithm. "lasci_" (with the
     trailing underscore) sets self.mo_coeff from the kwarg if it is passed;
     "lasci" (without the trailing underscore) leaves self.mo_coeff unchanged.
+    The attribute las.max_workers_ps sets the max_workers attribute of the
+    ImpureProductStateFCISolver of each state.
 
     Kwargs:
         mo_coeff : ndarray of shape (nao,nmo)
@@ -829,7 +833,8 @@ def run_lasci (las, mo_coeff=None, ci0=None, lroots=None, lweights=None, verbose
         fcisolvers = [b.fcisolvers[state] for b in las.fciboxes]
         ci0_i = [c[state] for c in ci0]
         solver = ImpureProductStateFCISolver (fcisolvers, stdout=las.stdout,
-            lweights=[l[state] for l in lweights], verbose=verbose)
+            lweights=[l[state] for l in lweights], verbose=verbose,
+            max_workers=getattr (las, 'max_workers_ps', None))
         for ix, s in enumerate (solver.fcisolvers):
             # Set the calling las objects local bottom-layer fcisolvers to the
             # locally-state-averaged ones I just made so that I can more easily get
@@ -930,9 +935,16 @@ class LASCINoSymm (casci.CASCI):
         self.max_cycle_macro = 50
         self.max_cycle_micro = 5
         self.min_cycle_macro = 0
+        self.with_sparse_df = False
+        self.sparse_df_thresh = 1e-8
+        self.sparse_df_eig_thresh = 1e-8
+        self.max_workers_ci = lasci_sync.MAX_WORKERS_CI
+        self.max_workers_ps = productstate.MAX_WORKERS
         keys = set(('e_states', 'fciboxes', 'nroots', 'weights', 'ncas_sub', 'nelecas_sub',
                     'conv_tol_grad', 'conv_tol_self', 'max_cycle_macro', 'max_cycle_micro',
-                    'ah_level_shift', 'states_converged', 'chkfile', 'e_lexc'))
+                    'ah_level_shift', 'states_converged', 'chkfile', 'e_lexc',
+                    'with_sparse_df', 'sparse_df_thresh', 'sparse_df_eig_thresh',
+                    'max_workers_ci', 'max_workers_ps'))
         self._keys = set(self.__dict__.keys()).union(keys)
         self.fciboxes = []
         if isinstance(spin_sub,int):
@@ -2071,7 +2083,13 @@ class LASCINoSymm (casci.CASCI):
         if dm is None: dm = self.make_rdm1 (include_core=True, **kwargs).reshape (nao, nao)
         dm = np.asarray (dm)
         if dm.ndim == 2: dm = dm[None,:,:]
-        if isinstance (self, _DFLASCI):
+        if isinstance (self, _DFLASCI) and self.with_sparse_df and hermi == 1:
+            vj, vk = self.get_sparse_df ().get_jk (dm, hermi=hermi,
+                                                  eig_thresh=self.sparse_df_eig_thresh)
+        elif isinstance (self, _DFLASCI):
+            if self.with_sparse_df:
+                lib.logger.info (self, 'Sparse DF J/K requires hermi=1; using dense DF J/K for '
+                                 'hermi=%d', hermi)
             vj, vk = self.with_df.get_jk(dm, hermi=hermi)
         else:
             vj, vk = self._scf.get_jk(mol, dm, hermi=hermi)
@@ -2082,6 +2100,27 @@ class LASCINoSymm (casci.CASCI):
             veff = np.stack ([j - k/2 for j, k in zip (vj, vk)], axis=0)
             return np.squeeze (veff)
 
+    def get_sparse_df (self):
+        ''' The DF 3-center integrals as a sparsedf_array, whose AO-pair sparsity is screened
+            with sparse_df_thresh once per set of integrals (i.e., once per geometry). The
+            eigenvalues of the density matrices in get_veff are truncated separately, with
+            sparse_df_eig_thresh. '''
+        assert (isinstance (self, _DFLASCI))
+        if self.with_df._cderi is None: self.with_df.build ()
+        cderi = self.with_df._cderi
+        if not isinstance (cderi, np.ndarray):
+            raise NotImplementedError ("with_sparse_df requires in-core DF integrals")
+        cache = getattr (self, '_sparse_df', None)
+        if cache is None or cache[0] is not cderi or cache[1] != self.sparse_df_thresh:
+            t0 = (lib.logger.process_clock (), lib.logger.perf_counter ())
+            bPmn = sparsedf_array (cderi)
+            bPmn.get_sparsity_ (thresh=self.sparse_df_thresh)
+            lib.logger.debug (self, 'Sparse DF: %d of %d AO pairs retained', bPmn.nentpair,
+                              bPmn.shape[1])
+            lib.logger.timer (self, 'sparse DF screening', *t0)
+            self._sparse_df = cache = (cderi, self.sparse_df_thresh, bPmn)
+        return cache[2]
+
     def split_veff (self, veff, h2eff_sub, mo_coeff=None, ci=None, casdm1s_sub=None):
         ''' Split a spin-summed veff into alpha and beta terms using the h2eff eri array.
         Note that this will omit v(up_active - down_active)^virtual_inactive by necessity; 
@@ -2356,6 +2395,13 @@ class LASCINoSymm (casci.CASCI):
         log.info ('max_cycle_macro = %d', self.max_cycle_macro)
         log.info ('max_cycle_micro = %d', self.max_cycle_micro)
         log.info ('conv_tol_grad = %s', self.conv_tol_grad)
+        if self.max_workers_ci > 1:
+            log.info ('max_workers_ci = %d', self.max_workers_ci)
+        if self.max_workers_ps > 1:
+            log.info ('max_workers_ps = %d', self.max_workers_ps)
+        if isinstance (self, _DFLASCI) and self.with_sparse_df:
+            log.info ('with_sparse_df = True ; sparse_df_thresh = %s ; sparse_df_eig_thresh = %s',
+                      self.sparse_df_thresh, self.sparse_df_eig_thresh)
         log.info ('max_memory %d MB (current use %d MB)', self.max_memory,
                   lib.current_memory()[0])
         for i, fcibox in enumerate (self.fciboxes):
@@ -1,10 +1,14 @@
-from pyscf import lib, symm
+from pyscf import lib, symm, __config__
 from mrh.my_pyscf.fci.csfstring import ImpossibleCIvecError
 from mrh.my_pyscf.mcscf import _DFLASCI
 from scipy.sparse import linalg as sparse_linalg
-from scipy import linalg 
+from scipy import linalg, special
+from concurrent.futures import ThreadPoolExecutor
+import threading
 import numpy as np
 
+MAX_WORKERS_CI = getattr (__config__, 'mcscf_lasci_max_workers_ci', 1)
+
 # This must be locked to CSF solver for the forseeable future, because I know of no other way to
 # handle spin-breaking potentials while retaining spin constraint
 
@@ -263,8 +267,10 @@ def ci_cycle (las, mo, ci0, veff, h2eff_sub, casdm1frs, log):
     t1 = (lib.logger.process_clock(), lib.logger.perf_counter())
     h1eff_sub = las.get_h1eff (mo, veff=veff, h2eff_sub=h2eff_sub, casdm1frs=casdm1frs)
     ncas_cum = np.cumsum ([0] + las.ncas_sub.tolist ()) + las.ncore
+    max_workers = getattr (las, 'max_workers_ci', MAX_WORKERS_CI)
     e_cas = []
     ci1 = []
+    pending = []
     e0 = 0.0 
     for isub, (fcibox, ncas, nelecas, h1e, fcivec) in enumerate (zip (las.fciboxes, las.ncas_sub,
                                                                       las.nelecas_sub, h1eff_sub,
@@ -294,18 +300,90 @@ def ci_cycle (las, mo, ci0, veff, h2eff_sub, casdm1frs, log):
                 log.debug1 ("LASCI subspace {} state {} with wfnsym {}".format (isub, state,
                                                                                 wfnsym_str))
 
-        if isub not in frozen_ci:
+        if isub in frozen_ci:
+            e_sub = 0 # TODO: proper energy calculation (probably doesn't matter tho)
+        elif max_workers > 1 and getattr (fcibox, 'kernel_tasks', None):
+            tasks = fcibox.kernel_tasks (h1e, eri_cas, ncas, nelecas, ci0=fcivec, verbose=log,
+                                         max_memory=max_memory, ecore=e0, orbsym=orbsym)
+            pending.append ((isub, tasks))
+            e_sub = fcivec = None
+        else:
             e_sub, fcivec = fcibox.kernel(h1e, eri_cas, ncas, nelecas,
                                           ci0=fcivec, verbose=log,
                                           max_memory = max_memory,
                                           ecore=e0, orbsym=orbsym)
-        else:
-            e_sub = 0 # TODO: proper energy calculation (probably doesn't matter tho)
+            t1 = log.timer ('FCI box for subspace {}'.format (isub), *t1)
         e_cas.append (e_sub)
         ci1.append (fcivec)
-        t1 = log.timer ('FCI box for subspace {}'.format (isub), *t1)
+    if len (pending):
+        results = _ci_tasks_concurrent (las, pending, max_workers, log)
+        for isub, tasks in pending:
+            ncas, nelecas = las.ncas_sub[isub], las.nelecas_sub[isub]
+            e_cas[isub], ci1[isub] = las.fciboxes[isub].kernel_finalize (results[isub], ncas,
+                                                                         nelecas, verbose=log)
+        t1 = log.timer ('FCI boxes for {} subspaces'.format (len (pending)), *t1)
     return e_cas, ci1
 
+def _ci_tasks_concurrent (las, pending, max_workers, log):
+    '''Run the (fragment, state) CI solves generated by the kernel_tasks method of the fciboxes
+    in a thread pool of at most max_workers workers. Solves are started in order of decreasing
+    determinant count. Each runs OpenMP code with a share of lib.num_threads () proportional to
+    its determinant count relative to the total among the solves running concurrently with it,
+    without exceeding lib.num_threads () in total (unless max_workers itself exceeds it, in which
+    case every solve gets one thread).
+
+    Args:
+        las : instance of :class:`LASCINoSymm`
+        pending : list of tuples (isub, tasks)
+            tasks is the list of callables returned by las.fciboxes[isub].kernel_tasks
+        max_workers : integer
+        log : instance of :class:`lib.logger.Logger`
+
+    Returns:
+        results : dict
+            results[isub] is a list of the return values of the callables in the corresponding
+            tasks, in the same order
+    '''
+    todo = []
+    for isub, tasks in pending:
+        fcibox, norb = las.fciboxes[isub], las.ncas_sub[isub]
+        for istate, (solver, task) in enumerate (zip (fcibox.fcisolvers, tasks)):
+            neleca, nelecb = fcibox._get_nelec (solver, las.nelecas_sub[isub])
+            ndet = special.comb (norb, neleca, exact=True) * special.comb (norb, nelecb, exact=True)
+            todo.append ((ndet * solver.nroots, isub, istate, task))
+    todo.sort (key=lambda x: -x[0])
+    nworkers = min (max_workers, len (todo))
+    nthreads_tot = lib.num_threads ()
+    log.debug ('LASCI: %d CI solves with %d workers', len (todo), nworkers)
+    results = {isub: [None for task in tasks] for isub, tasks in pending}
+    lock = threading.Lock ()
+    # nthreads_free: threads not held by running solves; ndet_running: their determinant count
+    state = {'nthreads_free': nthreads_tot, 'ndet_running': 0, 'nrunning': 0, 'nstarted': 0}
+    def _ci_worker (ndet, isub, istate, task):
+        with lock:
+            state['nrunning'] += 1
+            state['nstarted'] += 1
+            # Solves which will start alongside this one before any running one finishes
+            i0 = state['nstarted']
+            nwait = min (nworkers - state['nrunning'], len (todo) - i0)
+            ndet_window = state['ndet_running'] + ndet + sum ([x[0] for x in todo[i0:i0+nwait]])
+            nthreads = int (round (nthreads_tot * ndet / ndet_window))
+            nthreads = max (1, min (nthreads, state['nthreads_free'] - nwait))
+            state['nthreads_free'] -= nthreads
+            state['ndet_running'] += ndet
+        try:
+            with lib.with_omp_threads (nthreads):
+                results[isub][istate] = task ()
+        finally:
+            with lock:
+                state['nthreads_free'] += nthreads
+                state['ndet_running'] -= ndet
+                state['nrunning'] -= 1
+    with ThreadPoolExecutor (max_workers=nworkers) as executor:
+        futures = [executor.submit (_ci_worker, *x) for x in todo]
+        for future in futures: future.result ()
+    return results
+
 def all_nonredundant_idx (nmo, ncore, ncas_sub):
     ''' Generate a index mask array addressing all nonredundant, lower-triangular elements of an
     nmo-by-nmo orbital-rotation unitary generator amplitude matrix for a LASSCF or LASCI problem
@@ -1,4 +1,5 @@
 import itertools
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import numpy as np
 from scipy import linalg
 from pyscf import lib
@@ -53,58 +54,36 @@ def kernel (las, mo_coeff=None, ci0=None, conv_tol_grad=1e-4,
     impurities = [get_impurity_casscf (las, i, imporb_builder=builder)
                   for i, builder in enumerate (imporb_builders)]
     t1 = log.timer_debug1 ('impurity solver construction', *t0)
-    # GRAND CHALLENGE: replace rigid algorithm below with dynamic task scheduling
-    for it in range (las.max_cycle_macro):
-        t_macro = (lib.logger.process_clock(), lib.logger.perf_counter())    
-        # 1. Divide into fragments
-        for impurity in impurities: 
-            impurity._pull_keyframe_(kf1)
-            t_macro = log.timer("Pull keyframe for fragment",*t_macro)
-        
-        # 2. CASSCF on each fragment
-        kf2_list = []
-        for impurity in impurities:
-            impurity.kernel ()
-            t_macro = log.timer("Fragment CASSCF",*t_macro)
-            kf2_list.append (impurity._push_keyframe (kf1))
-            t_macro = log.timer("Push keyframe for fragment",*t_macro)
-
-            
-        # 3. Combine from fragments. It should not be necessary to do this in any particular order,
-        #    and the below does it March Madness tournament style; e.g.:
-        #
-        #       kf2_list[0] --- kf2_list[1]     kf2_list[2] --- kf2_list[3]
-        #                    |                               |
-        #                   kfi --------------------------- kfj
-        #                                    |
-        #                                   kf2
-        #
-        nkf = len (kf2_list)
-        ncyc = int (np.ceil (np.log2 (nkf)))
-        for i in range (int (np.ceil (np.log2 (nkf)))):
-            nkfi = len (kf2_list)
-            kf3_list = []
-            for kf2, kf3 in zip (kf2_list[::2],kf2_list[1::2]):
-                kf3_list.append (combine.combine_pair (las, kf2, kf3, kf_ref=kf1))
-                t_macro = log.timer("Recombination",*t_macro)
-            if nkfi%2: kf3_list.insert (len(kf3_list)-1, kf2_list[-1])
-            # Insert this at second-to-last position so that it gets "mixed in" next cycle
-            kf2_list = kf3_list
-        assert (len (kf2_list) == 1)
-        kf1 = kf2_list[0]
-
-        # Evaluate status and break if converged
-        e_tot = las.energy_nuc () + las.energy_elec (
-            mo_coeff=kf1.mo_coeff, ci=kf1.ci, h2eff=kf1.h2eff_sub, veff=kf1.veff)
-        gvec = las.get_grad (ugg=ugg, kf=kf1)
-        norm_gvec = linalg.norm (gvec)
-        log.info ('LASSCF macro %d : E = %.15g ; |g| = %.15g', it+1, e_tot, norm_gvec)
-        if verbose > lib.logger.INFO: keyframe.gradient_analysis (las, kf1, log)
-        t1 = log.timer ('one LASSCF macro cycle', *t1)
-        las.dump_chk (mo_coeff=kf1.mo_coeff, ci=kf1.ci)
-        if norm_gvec < conv_tol_grad:
-            converged = True
-            break
+    scheduler = getattr (las, 'impurity_scheduler', 'tournament')
+    if scheduler == 'dynamic':
+        kf_iter = iterate_keyframes (las, impurities, kf1, log=log)
+    elif scheduler != 'tournament':
+        raise RuntimeError ("Unknown impurity_scheduler {}".format (scheduler))
+    try:
+        for it in range (las.max_cycle_macro):
+            t_macro = (lib.logger.process_clock(), lib.logger.perf_counter())    
+            if scheduler == 'dynamic':
+                # 1-3. Fragment CASSCFs recombined as soon as they finish
+                kf1 = next (kf_iter)
+                t_macro = log.timer("Fragment CASSCF and recombination",*t_macro)
+            else:
+                kf1 = _tournament_macrocycle (las, impurities, kf1, log, t_macro)
+
+            # Evaluate status and break if converged
+            e_tot = las.energy_nuc () + las.energy_elec (
+                mo_coeff=kf1.mo_coeff, ci=kf1.ci, h2eff=kf1.h2eff_sub, veff=kf1.veff)
+            gvec = las.get_grad (ugg=ugg, kf=kf1)
+            norm_gvec = linalg.norm (gvec)
+            log.info ('LASSCF macro %d : E = %.15g ; |g| = %.15g', it+1, e_tot, norm_gvec)
+            if verbose > lib.logger.INFO: keyframe.gradient_analysis (las, kf1, log)
+            t1 = log.timer ('one LASSCF macro cycle', *t1)
+            las.dump_chk (mo_coeff=kf1.mo_coeff, ci=kf1.ci)
+            if norm_gvec < conv_tol_grad:
+                converged = True
+                break
+    finally:
+        # Shut down the impurity thread pool even if the macrocycle raises
+        if scheduler == 'dynamic': kf_iter.close ()
 
 
 
@@ -135,6 +114,190 @@ def kernel (las, mo_coeff=None, ci0=None, conv_tol_grad=1e-4,
     e_cas = None # TODO: get rid of this worthless, meaningless variable
     return converged, e_tot, e_states, mo_energy, mo_coeff, e_cas, ci1, h2eff_sub, veff
 
+def _tournament_macrocycle (las, impurities, kf1, log, t_macro):
+    '''Optimize all impurities starting from keyframe kf1, then recombine them pairwise'''
+    # 1. Divide into fragments and 2. CASSCF on each fragment
+    kf2_list = crunch_impurities (las, impurities, kf1, log=log)
+    t_macro = log.timer("Fragment CASSCF",*t_macro)
+
+    # 3. Combine from fragments. It should not be necessary to do this in any particular order,
+    #    and the below does it March Madness tournament style; e.g.:
+    #
+    #       kf2_list[0] --- kf2_list[1]     kf2_list[2] --- kf2_list[3]
+    #                    |                               |
+    #                   kfi --------------------------- kfj
+    #                                    |
+    #                                   kf2
+    #
+    nkf = len (kf2_list)
+    for i in range (int (np.ceil (np.log2 (nkf)))):
+        nkfi = len (kf2_list)
+        kf3_list = []
+        for kf2, kf3 in zip (kf2_list[::2],kf2_list[1::2]):
+            kf3_list.append (combine.combine_pair (las, kf2, kf3, kf_ref=kf1))
+            t_macro = log.timer("Recombination",*t_macro)
+        if nkfi%2: kf3_list.insert (len(kf3_list)-1, kf2_list[-1])
+        # Insert this at second-to-last position so that it gets "mixed in" next cycle
+        kf2_list = kf3_list
+    assert (len (kf2_list) == 1)
+    return kf2_list[0]
+
+def _crunch_impurity (impurity, kf1, nthreads=None, log=None):
+    '''Pull keyframe kf1 into one impurity solver, optimize it, and push the result back, with
+    at most nthreads OpenMP threads'''
+    with lib.with_omp_threads (nthreads):
+        t0 = (lib.logger.process_clock(), lib.logger.perf_counter())
+        impurity._pull_keyframe_(kf1)
+        if log is not None: t0 = log.timer ("Pull keyframe for fragment {}".format (
+            impurity._ifrags), *t0)
+        impurity.kernel ()
+        if log is not None: t0 = log.timer ("Fragment {} CASSCF".format (impurity._ifrags), *t0)
+        kf2 = impurity._push_keyframe (kf1)
+        if log is not None: t0 = log.timer ("Push keyframe for fragment {}".format (
+            impurity._ifrags), *t0)
+    return kf2
+
+def get_impurity_threads (las, nworkers=None):
+    '''Number of concurrent impurity solvers and number of OpenMP threads per solver'''
+    if nworkers is None: nworkers = getattr (las, 'impurity_max_workers', 1)
+    nworkers = max (1, int (nworkers))
+    if getattr (las, 'use_gpu', None): nworkers = 1
+    nthreads = getattr (las, 'impurity_omp_threads', None)
+    if nthreads is None: nthreads = max (1, lib.num_threads () // nworkers)
+    return nworkers, nthreads
+
+def crunch_impurities (las, impurities, kf1, nworkers=None, log=None):
+    '''Pull a keyframe into each impurity solver, optimize all of them, and push the results
+    back out.
+
+    Args:
+        las : instance of :class:`LASSCFNoSymm`
+        impurities : list of instances of :class:`ImpurityCASSCF`
+        kf1 : instance of :class:`LASKeyframe`
+            Not altered in-place
+
+    Kwargs:
+        nworkers : integer
+            Number of impurity problems to solve concurrently. Defaults to
+            las.impurity_max_workers. If this is greater than 1, impurities are solved in a thread
+            pool, each worker running OpenMP code with las.impurity_omp_threads threads (default:
+            lib.num_threads () // nworkers).
+        log : instance of :class:`lib.logger.Logger`
+
+    Returns:
+        kf2_list : list of length len (impurities) of :class:`LASKeyframe`
+            Whole-molecule keyframes corresponding to each optimized impurity, in the same
+            order as impurities
+    '''
+    nworkers, nthreads = get_impurity_threads (las, nworkers=nworkers)
+    nworkers = min (nworkers, len (impurities))
+    if nworkers < 2:
+        return [_crunch_impurity (impurity, kf1, log=log) for impurity in impurities]
+    if log is not None:
+        log.debug ('Solving %d impurities with %d workers of %d OpenMP threads',
+                   len (impurities), nworkers, nthreads)
+    with ThreadPoolExecutor (max_workers=nworkers) as executor:
+        futures = [executor.submit (_crunch_impurity, impurity, kf1, nthreads=nthreads, log=log)
+                   for impurity in impurities]
+        kf2_list = [future.result () for future in futures]
+    return kf2_list
+
+def _merge_keyframe (las, kf_acc, kf2, kf_ref):
+    if kf_acc is None: return kf2
+    frags = kf_acc.frags.union (kf2.frags)
+    kf3 = combine.combine_pair (las, kf_acc, kf2, kf_ref=kf_ref)
+    kf3.frags = frags
+    return kf3
+
+def iterate_keyframes (las, impurities, kf0, nworkers=None, max_stale=None, log=None):
+    '''Dynamically-scheduled alternative to the tournament-style recombination of impurity
+    keyframes. Each optimized impurity keyframe is merged into a running whole-molecule keyframe
+    with combine_pair as soon as it is finished, and the impurity may then begin its next
+    optimization starting from the partially-updated keyframe.
+
+    Args:
+        las : instance of :class:`LASSCFNoSymm`
+        impurities : list of instances of :class:`ImpurityCASSCF`
+        kf0 : instance of :class:`LASKeyframe`
+            Starting point
+
+    Kwargs:
+        nworkers : integer
+            Number of impurity problems to solve concurrently. Defaults to
+            las.impurity_max_workers.
+        max_stale : integer
+            An impurity which has finished one generation may begin the next only if at most
+            this many other impurities have not yet contributed to the current generation; i.e.,
+            the partially-updated keyframe on which it starts may lack at most max_stale fragment
+            updates. Defaults to las.impurity_max_stale. If zero, every generation begins from
+            a fully-recombined keyframe. Larger values keep workers busier but may require more
+            macrocycles to converge.
+        log : instance of :class:`lib.logger.Logger`
+
+    Yields:
+        kf1 : instance of :class:`LASKeyframe`
+            Whole-molecule keyframe containing exactly one update of every impurity relative to
+            the previous yielded keyframe (or kf0). Impurity problems of the next generation
+            that are already running are finished before kf1 is yielded, so the caller may use
+            las freely while processing kf1; their results are merged after the generator
+            resumes. Closing the generator discards any unmerged results.
+    '''
+    nimp = len (impurities)
+    nworkers, nthreads = get_impurity_threads (las, nworkers=nworkers)
+    nworkers = min (nworkers, nimp)
+    if max_stale is None: max_stale = getattr (las, 'impurity_max_stale', 0)
+    kf_ref = kf0 # Most recent complete generation
+    kf_acc = None # Partially-merged current generation
+    nmerged = 0
+    pending = [] # (keyframe, base) of the next generation, not mergeable until kf_ref is updated
+    gen = [0,]*nimp # Relative to current generation; 0 = running, 1 = finished current
+    idle = []
+    running = {}
+    with ThreadPoolExecutor (max_workers=nworkers) as executor:
+        def submit (i, kf):
+            running[executor.submit (_crunch_impurity, impurities[i], kf, nthreads=nthreads,
+                                     log=log)] = (i, kf)
+        for i in range (nimp): submit (i, kf0)
+        try:
+            while True:
+                done = wait (running, return_when=FIRST_COMPLETED)[0]
+                t0 = (lib.logger.process_clock(), lib.logger.perf_counter())
+                for future in done:
+                    # Merge relative to the keyframe this impurity started from, which may be
+                    # a partially-updated one rather than kf_ref
+                    i, kf_base = running.pop (future)
+                    kf2 = future.result ()
+                    if gen[i]:
+                        pending.append ((kf2, kf_base))
+                    else:
+                        kf_acc = _merge_keyframe (las, kf_acc, kf2, kf_base)
+                        nmerged += 1
+                    gen[i] += 1
+                    idle.append (i)
+                if log is not None: t0 = log.timer ("Recombination", *t0)
+                if nmerged == nimp:
+                    kf_ref = kf_acc
+                    # Don't let the caller evaluate kf_ref while impurities are still working
+                    wait (running)
+                    yield kf_ref
+                    kf_acc, nmerged = None, 0
+                    gen = [g-1 for g in gen]
+                    for kf2, kf_base in pending:
+                        kf_acc = _merge_keyframe (las, kf_acc, kf2, kf_base)
+                        nmerged += 1
+                    pending = []
+                    if nmerged == nimp: continue
+                for i in idle[:]:
+                    if gen[i] and (gen[i]>1 or (nimp-nmerged)>max_stale): continue
+                    kf_base = kf_acc if kf_acc is not None else kf_ref
+                    if log is not None:
+                        log.debug ('Impurity %d starting from keyframe with %d/%d updates',
+                                   i, nmerged, nimp)
+                    submit (i, kf_base)
+                    idle.remove (i)
+        finally:
+            for future in running: future.cancel ()
+
 def get_grad (las, mo_coeff=None, ci=None, ugg=None, kf=None):
     '''Return energy gradient for orbital rotation and CI relaxation.
 
@@ -199,6 +362,20 @@ class LASSCFNoSymm (lasci.LASCINoSymm):
         for the ``LASCI'' step.
     combine_pair_max_frags : integer
         Maximum number of frags to simultaneously relax during the combine_pair step.
+    impurity_max_workers : integer
+        Maximum number of impurity subproblems to solve concurrently (in a thread pool).
+        Default is 1 (serial).
+    impurity_omp_threads : integer
+        Number of OpenMP threads given to each concurrent impurity solver. Default is
+        lib.num_threads () // impurity_max_workers, so that the node is not oversubscribed.
+    impurity_scheduler : str
+        'tournament' (default): all impurities are optimized from the same keyframe, and then
+        recombined pairwise. 'dynamic': each impurity keyframe is recombined as soon as it is
+        available, and fast impurities may begin their next optimization from a partially-updated
+        keyframe (see impurity_max_stale).
+    impurity_max_stale : integer
+        For impurity_scheduler='dynamic', the maximum number of fragment updates that may be
+        missing from the keyframe on which an impurity begins its next optimization. Default 0.
     '''
     def __init__(self, mf, ncas, nelecas, ncore=None, spin_sub=None, **kwargs):
         lasci.LASCINoSymm.__init__(self, mf, ncas, nelecas, ncore=ncore, spin_sub=spin_sub,
@@ -210,7 +387,13 @@ class LASSCFNoSymm (lasci.LASCINoSymm):
         for i, j in itertools.combinations (range (self.nfrags), 2):
             self.relax_params[(i,j)] = {}
         self.combine_pair_max_frags = self.nfrags
-        keys = set (('frags_orbs','impurity_params','relax_params','combine_pair_max_frags'))
+        self.impurity_max_workers = 1
+        self.impurity_omp_threads = None
+        self.impurity_scheduler = 'tournament'
+        self.impurity_max_stale = 0
+        keys = set (('frags_orbs','impurity_params','relax_params','combine_pair_max_frags',
+                     'impurity_max_workers','impurity_omp_threads','impurity_scheduler',
+                     'impurity_max_stale'))
         self._keys = self._keys.union (keys)
 
     @property
@@ -282,7 +465,12 @@ class LASSCFSymm (lasci.LASCISymm):
         lasci.LASCISymm.__init__(self, mf, ncas, nelecas, ncore=ncore, spin_sub=spin_sub, **kwargs)
         self.impurity_params = [{} for i in range (self.nfrags)]
         self.relax_params = {}
-        keys = set (('frags_orbs','impurity_params','relax_params'))
+        self.impurity_max_workers = 1
+        self.impurity_omp_threads = None
+        self.impurity_scheduler = 'tournament'
+        self.impurity_max_stale = 0
+        keys = set (('frags_orbs','impurity_params','relax_params','impurity_max_workers',
+                     'impurity_omp_threads','impurity_scheduler','impurity_max_stale'))
         self._keys = self._keys.union (keys)
 
     _ugg = lasscf_sync_o0.LASSCFSymm_UnitaryGroupGenerators
@@ -1,6 +1,7 @@
 import numpy as np
 from scipy import linalg
-from pyscf import lib
+from concurrent.futures import ThreadPoolExecutor
+from pyscf import lib, __config__
 from pyscf.scf.addons import canonical_orth_
 from pyscf.fci import cistring
 from pyscf.mcscf.addons import state_average as state_average_mcscf
@@ -9,6 +10,8 @@ from mrh.my_pyscf.fci.csfstring import CSFTransformer
 from mrh.my_pyscf.mcscf.addons import StateAverageNMixFCISolver
 from itertools import combinations
 
+MAX_WORKERS = getattr (__config__, 'mcscf_productstate_max_workers', 1)
+
 # TODO: linkstr support
 class ProductStateFCISolver (StateAverageNMixFCISolver, lib.StreamObject):
     r'''Minimize the energy of a wave function of the form
@@ -16,17 +19,29 @@ class ProductStateFCISolver (StateAverageNMixFCISolver, lib.StreamObject):
     |Psi> = A \prod_K |ci_K>
 
     Self-consistently over all ci_K.
+
+    In each cycle, the effective Hamiltonians of all fragments are built from the same previous
+    iterate (Jacobi update) and the fragment CI problems are solved.
+
+    Extra attributes:
+        max_workers : integer
+            If greater than 1, the fragment CI problems of each cycle are solved concurrently
+            in a thread pool of this many threads, with the OpenMP threads divided among them.
+            Ignored by subclasses with their own kernel (e.g., ExcitationPSFCISolver)
     '''
 
-    def __init__(self, fcisolvers, stdout=None, verbose=0, **kwargs):
+    def __init__(self, fcisolvers, stdout=None, verbose=0, max_workers=None, **kwargs):
         self.fcisolvers = fcisolvers
         self.verbose = verbose
         self.stdout = stdout
         self.log = lib.logger.new_logger (self, verbose)
+        self.max_workers = MAX_WORKERS if max_workers is None else max_workers
+        self.ncycle = 0
 
     def kernel (self, h1, h2, norb_f, nelec_f, ecore=0, ci0=None, orbsym=None,
             conv_tol_grad=1e-4, conv_tol_self=1e-10, max_cycle_macro=50,
             serialfrag=False, **kwargs):
+        t0 = (lib.logger.process_clock (), lib.logger.perf_counter ())
         log = self.log
         converged = False
         e_sigma = 0
@@ -55,9 +70,12 @@ class ProductStateFCISolver (StateAverageNMixFCISolver, lib.StreamObject):
             e, ci1 = self._1shot (it, h0eff, h1eff, h2, e, ci0, norb_f, nelec_f,
                 orbsym=orbsym, serialfrag=serialfrag, **kwargs)
             e_sigma = np.amax (e) - np.amin (e)
+        self.ncycle = it
         conv_str = ['NOT converged','converged'][int (converged)]
         log.info (('Product_state fixed-point CI iteration {} after {} '
                    'cycles').format (conv_str, it))
+        log.timer ('Product-state fixed-point CI iteration ({} cycles; '
+                   'max_workers={})'.format (it, self.max_workers), *t0)
         if not converged:
             ci1 = self.get_init_guess (ci1, norb_f, nelec_f, h1, h2)
             # Issue #86: see above, same problem
@@ -191,14 +209,28 @@ class ProductStateFCISolver (StateAverageNMixFCISolver, lib.StreamObject):
         zipper = [h0eff, h1eff, ci0, norb_f, nelec_f, self.fcisolvers, ni, nj]
         e1 = [e for e in e0]
         ci1 = [c for c in ci0]
+        tasks = []
         for ifrag, (h0e, h1e, c, no, ne, solver, i, j) in enumerate (zip (*zipper)):
             if serialfrag and it % nfrag != ifrag: continue
             h2e = h2[i:j,i:j,i:j,i:j]
             osym = getattr (solver, 'orbsym', None)
             if orbsym is not None: osym=orbsym[i:j]
             nelec = self._get_nelec (solver, ne)
-            e, c1 = solver.kernel (h1e, h2e, no, nelec, ci0=c, ecore=h0e,
-                orbsym=osym, **kwargs)
+            tasks.append ((ifrag, solver, (h1e, h2e, no, nelec),
+                           dict (ci0=c, ecore=h0e, orbsym=osym, **kwargs)))
+        nworkers = min (self.max_workers, len (tasks))
+        if nworkers > 1:
+            nthreads = max (1, lib.num_threads () // nworkers)
+            def _solve (solver, args, kw):
+                with lib.with_omp_threads (nthreads):
+                    return solver.kernel (*args, **kw)
+            with ThreadPoolExecutor (max_workers=nworkers) as executor:
+                futures = [executor.submit (_solve, solver, args, kw)
+                           for ifrag, solver, args, kw in tasks]
+                results = [future.result () for future in futures]
+        else:
+            results = [solver.kernel (*args, **kw) for ifrag, solver, args, kw in tasks]
+        for (ifrag, solver, args, kw), (e, c1) in zip (tasks, results):
             e1[ifrag] = e
             ci1[ifrag] = c1
         return e1, ci1
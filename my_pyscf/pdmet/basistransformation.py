@@ -1,3 +1,4 @@
+from contextlib import ExitStack
 from functools import reduce
 from pyscf import ao2mo, lib
 import numpy as np
@@ -77,40 +78,72 @@ class BasisTransform:
             Transformed CDERI integrals (Lij).
         """
         assert mo.ndim == 2, "MO_coeff should be a 2D array"
+        fsgdf = self.kmf.with_df._cderi
+        cderi_file = fsgdf.replace(".h5", "_df.h5") if fsgdf.endswith(".h5") else fsgdf + "_df"
+        return self._get_cderi_transformed_multi([mo,], cderi_files=[cderi_file,])[0]
 
-        nmo = mo.shape[-1]
+    def _get_cderi_transformed_multi(self, mos, cderi_files=None):
+        """
+        Transforms CDERI integrals from AO to MO basis for several sets of MOs (i.e., the
+        embedding bases of several fragments) in a single pass over the DF blocks. Each Lij is
+        written block by block into its own cderi file, with the j3c dataset chunked along
+        the auxiliary index, so that only one block of the auxiliary index is in memory at a
+        time.
+        Lpq---> Lij for each mo in mos
+        Args:
+           mos: list of np.array (nao*neo_i)
+           cderi_files: list of str
+                Names of the output cderi files. Defaults to the name of the input cderi
+                file with the suffix _df<i>.
+        Returns:
+            List of cderi files containing the transformed CDERI integrals (Lij).
+        """
         kmf = self.kmf
         fsgdf = kmf.with_df._cderi
-        neo = mo.shape[1]
         naux = kmf.with_df.get_naoaux ()
-        neo_pair = neo * (neo + 1) // 2
-        mem_eris = 8*(neo_pair*naux)/ 1e6
+        nao = kmf.cell.nao_nr()
+        npairs = [mo.shape[-1] * (mo.shape[-1] + 1) // 2 for mo in mos]
+        # One block of the AO tensor and of each Lij
+        mem_row = 8 * (nao * (nao + 1) // 2 + sum(npairs)) / 1e6
         mem_av = kmf.cell.max_memory - lib.current_memory ()[0]
-        is_enough_mem = mem_av > 2. * mem_eris
-        assert is_enough_mem, "Not enough memory for ERI transformation."
-       
-        Lij = np.empty((kmf.with_df.get_naoaux(), nmo * (nmo + 1) // 2), dtype=mo.dtype)
-        
-        ijmosym, mij_pair, moij, ijslice = ao2mo.incore._conc_mos(mo, mo, compact=True)
-        b0 = 0
-        for eri1 in kmf.with_df.loop():
-            b1 = b0 + eri1.shape[0]
-            eri2 = Lij[b0:b1]
-            eri2 = ao2mo._ao2mo.nr_e2(eri1, moij, ijslice, aosym='s4', mosym=ijmosym, out=eri2)
-            b0 = b1
+        blksize = min(naux, kmf.with_df.blockdim)
+        if mem_av / 2 / mem_row < blksize:
+            # Shrink the DF blocks to fit in memory, but never below one block of 16 rows
+            blksize = max(min(16, blksize), int(mem_av / 2 / mem_row))
+            lib.logger.debug(kmf, 'CDERI transformation: DF blocks of %d rows', blksize)
+        if cderi_files is None:
+            if fsgdf.endswith(".h5"):
+                cderi_files = [fsgdf.replace(".h5", "_df{}.h5".format(i)) for i in range(len(mos))]
+            else:
+                cderi_files = [fsgdf + "_df{}".format(i) for i in range(len(mos))]
+        assert len(cderi_files) == len(mos)
 
-        cderi_file = fsgdf.replace(".h5", "_df.h5") if fsgdf.endswith(".h5") else fsgdf + "_df"
+        with ExitStack() as stack:
+            old_gdf = stack.enter_context(h5py.File(fsgdf, 'r'))
+            new_gdfs = [stack.enter_context(h5py.File(cderi_file, 'w'))
+                        for cderi_file in cderi_files]
+            Lijs = []
+            conc_mos = []
+            for mo, new_gdf in zip(mos, new_gdfs):
+                assert mo.ndim == 2, "MO_coeff should be a 2D array"
+                nmo = mo.shape[-1]
+                npair = nmo * (nmo + 1) // 2
+                for key in old_gdf.keys():
+                    if key != 'j3c':
+                        old_gdf.copy(old_gdf[key], new_gdf, key)
+                Lijs.append(new_gdf.create_dataset('j3c/0/0', (naux, npair), dtype=mo.dtype,
+                                                   chunks=(blksize, npair)))
+                conc_mos.append(ao2mo.incore._conc_mos(mo, mo, compact=True))
+            old_gdf.close()
 
-        old_gdf = h5py.File(fsgdf, 'r')
-        new_gdf = h5py.File(cderi_file, 'w')
-        for key in old_gdf.keys():
-            if key == 'j3c':
-                new_gdf['j3c/0/0'] = Lij
-            else:
-                old_gdf.copy(old_gdf[key], new_gdf, key)
-        old_gdf.close()
-        new_gdf.close()
-        return cderi_file
+            b0 = 0
+            for eri1 in kmf.with_df.loop(blksize=blksize):
+                b1 = b0 + eri1.shape[0]
+                for Lij, (ijmosym, mij_pair, moij, ijslice) in zip(Lijs, conc_mos):
+                    Lij[b0:b1] = ao2mo._ao2mo.nr_e2(eri1, moij, ijslice, aosym='s4',
+                                                    mosym=ijmosym)
+                b0 = b1
+        return cderi_files
 
 
     def _get_eri_transformed(self, ao2eo=None):
@@ -1,7 +1,8 @@
 import unittest
 import numpy as np
-from pyscf import gto, scf
-from mrh.my_pyscf.dmet import runDMET
+from pyscf import gto, scf, lib
+from mrh.my_pyscf.dmet import runDMET, runMultiDMET
+from mrh.my_pyscf.dmet.basistransformation import BasisTransform
 
 '''
 ***** RHF Embedding *****
@@ -12,6 +13,9 @@ from mrh.my_pyscf.dmet import runDMET
 1. Consider all the atoms in embedding space
 2. Consider few atoms in embedding space
 3. Consider few atoms in embedding space with density fitting
+***** Multiple fragments *****
+1. Fragments solved together (sequentially and concurrently) == fragments solved one by one
+2. Single-pass CDERI transformation for several fragments == one fragment at a time
 '''
 
 def get_mole1():
@@ -158,6 +162,55 @@ class KnownValues(unittest.TestCase):
         del mol, mf, dmet_mf
         self.assertAlmostEqual(e_ref, e_check, 6)
 
+    # Multiple fragments
+    def test_multi_dmet(self):
+        mol = get_mole2()
+        for density_fit in (False, True):
+            mf = scf.ROHF(mol)
+            if density_fit: mf = mf.density_fit()
+            mf.kernel()
+            atmlsts = [[0,], [1,], [1,2]]
+            mfs_ref = [runDMET(mf, lo_method='lowdin', bath_tol=1e-10, atmlst=atmlst)[0]
+                       for atmlst in atmlsts]
+            e_ref = [mf_ref.e_tot for mf_ref in mfs_ref]
+            for max_workers in (1, 2):
+                dmet_mfs = runMultiDMET(mf, atmlsts, lo_method='lowdin', bath_tol=1e-10,
+                                        max_workers=max_workers)[0]
+                for i, dmet_mf in enumerate(dmet_mfs):
+                    with self.subTest(density_fit=density_fit, max_workers=max_workers, frag=i):
+                        self.assertTrue(dmet_mf.converged)
+                        self.assertAlmostEqual(dmet_mf.e_tot, e_ref[i], 8)
+                        self.assertAlmostEqual(dmet_mf.energy_tot(), e_ref[i], 8)
+                        for key in ('mo_ea', 'mo_eb'):
+                            self.assertAlmostEqual(lib.fp(getattr(dmet_mf.mo_energy, key)),
+                                                   lib.fp(getattr(mfs_ref[i].mo_energy, key)),
+                                                   7)
+            del mf, dmet_mfs, mfs_ref
+        del mol
+
+    def test_multi_cderi(self):
+        mol = get_mole1()
+        mf = scf.RHF(mol).density_fit()
+        mf.kernel()
+        mydmets = runMultiDMET(mf, [[0,], [1,], [1,2]], lo_method='lowdin', bath_tol=1e-10)[1]
+        mos = [mydmet.ao2eo for mydmet in mydmets]
+        basistransf = BasisTransform(mf, None, None)
+        ref = [basistransf._get_cderi_transformed(mo) for mo in mos]
+        with self.subTest('incore'):
+            for Lij, Lij_ref in zip(basistransf._get_cderi_transformed_multi(mos), ref):
+                self.assertAlmostEqual(lib.fp(Lij), lib.fp(Lij_ref), 10)
+        with self.subTest('hdf5'):
+            with lib.H5TmpFile() as f:
+                Lijs = basistransf._get_cderi_transformed_multi(mos, out=f)
+                for Lij, Lij_ref in zip(Lijs, ref):
+                    self.assertAlmostEqual(lib.fp(Lij[()]), lib.fp(Lij_ref), 10)
+        with self.subTest('low max_memory'):
+            # The single-fragment path shrinks the DF blocks instead of failing
+            with lib.temporary_env(mf, max_memory=0):
+                Lij = basistransf._get_cderi_transformed(mos[0])
+            self.assertAlmostEqual(lib.fp(Lij), lib.fp(ref[0]), 10)
+        del mol, mf, mydmets
+
 if __name__ == "__main__":
     # See the description of the tests at the top of the file.
     unittest.main()
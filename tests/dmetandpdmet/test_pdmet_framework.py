@@ -1,8 +1,11 @@
 import os
 import unittest
 import numpy as np
+import h5py
+from pyscf import lib
 from pyscf.pbc import gto, scf, df
 from mrh.my_pyscf.pdmet import runpDMET
+from mrh.my_pyscf.pdmet.basistransformation import BasisTransform
 
 '''
 ***** RHF Embedding *****
@@ -13,6 +16,8 @@ from mrh.my_pyscf.pdmet import runpDMET
 1. Consider all the atoms in embedding space
 2. Consider few atoms in embedding space
 3. Consider few atoms in embedding space with density fitting
+***** Multiple fragments *****
+1. Single-pass CDERI transformation for several fragments == one fragment at a time
 '''
 
 def get_cell1(basis='gth-SZV', pseudo = 'gth-pade'):
@@ -117,7 +122,28 @@ class KnownValues(unittest.TestCase):
             for f in [gdffile, egdffile]:
                 if os.path.exists(f): os.remove(f)
             self.assertAlmostEqual(e_ref, e_check, 6)
-        
+
+    def test_multi_cderi(self):
+        cell = get_cell1()
+        gdffile = precomputed_gdf(cell)
+        mf = scf.RHF(cell, exxdiv=None).density_fit()
+        mf.with_df._cderi = gdffile
+        mf.kernel()
+        mos = [runpDMET(mf, lo_method='lowdin', bath_tol=1e-10, atmlst=atmlst,
+                        density_fit=True)[1].ao2eo for atmlst in ([0,], [1,2])]
+        basistransf = BasisTransform(mf, None, None)
+        ref = []
+        for mo in mos:
+            with h5py.File(basistransf._get_cderi_transformed(mo), 'r') as f:
+                ref.append(f['j3c/0/0'][()])
+        cderi_files = basistransf._get_cderi_transformed_multi(mos)
+        for cderi_file, Lij_ref in zip(cderi_files, ref):
+            with h5py.File(cderi_file, 'r') as f:
+                self.assertAlmostEqual(lib.fp(f['j3c/0/0'][()]), lib.fp(Lij_ref), 10)
+        del cell, mf
+        for f in [gdffile, 'pdmet_unittest_df.h5'] + cderi_files:
+            if os.path.exists(f): os.remove(f)
+
 if __name__ == "__main__":
     # See the description of the tests at the top of the file.
     unittest.main()
@@ -4,7 +4,7 @@ from scipy import linalg
 from pyscf import lib
 from pyscf.fci import cistring, direct_spin1
 from pyscf.fci.addons import cre_a, cre_b, des_a, des_b
-from mrh.my_pyscf.fci import direct_halfelectron
+from mrh.my_pyscf.fci import direct_halfelectron, rdm
 
 def setUpModule ():
     global rng, cases
@@ -43,6 +43,26 @@ def case_contract_1he (self, norb, nelec, cre, spin):
     )
     self.assertAlmostEqual (lib.fp (hci_test), lib.fp (hci_ref), 8)
 
+def case_contract_1he_native (self, norb, nelec, cre, spin):
+    if (not cre) and (not nelec[spin]): return
+    if cre and (nelec[spin] == norb): return
+    ndeta, ndetb = cistring.num_strings (norb,nelec[0]), cistring.num_strings (norb,nelec[1])
+    for dtype in (float, complex):
+        ci = rng.random ((ndeta, ndetb)).astype (dtype)
+        h1he = rng.random ((norb)).astype (dtype)
+        if dtype is complex:
+            ci += 1j * rng.random ((ndeta, ndetb))
+            h1he += 1j * rng.random ((norb))
+        ci /= linalg.norm (ci)
+        hci_test = direct_halfelectron._contract_1he_native (h1he, cre, spin, ci, norb, nelec)
+        with lib.temporary_env (rdm, NATIVE_HALFELECTRON=False):
+            # The dummy-orbital implementation is real-only
+            ref = lambda h, c: direct_halfelectron.contract_1he (h, cre, spin, c, norb, nelec)
+            hci_ref = ref (h1he.real, ci.real) - ref (h1he.imag, ci.imag)
+            hci_ref = hci_ref + 1j * (ref (h1he.real, ci.imag) + ref (h1he.imag, ci.real))
+        with self.subTest (dtype=dtype):
+            self.assertAlmostEqual (lib.fp (hci_test), lib.fp (hci_ref), 8)
+
 def case_contract_3he (self, norb, nelec, cre, spin, _incl_1he=True):
     if (not cre) and (not nelec[spin]): return
     ci = rng.random ((cistring.num_strings (norb,nelec[0]),
@@ -85,6 +105,13 @@ class KnownValues(unittest.TestCase):
                     with self.subTest (cre=cre, spin=spin, norb=norb, nelec=nelec):
                         case_contract_1he (self, norb, nelec, cre, spin)
 
+    def test_contract_1he_native (self):
+        for norb, nelec in cases:
+            for cre in (True, False):
+                for spin in range (2):
+                    with self.subTest (cre=cre, spin=spin, norb=norb, nelec=nelec):
+                        case_contract_1he_native (self, norb, nelec, cre, spin)
+
     def test_contract_3he (self):
         for norb, nelec in cases:
             for cre in (True, False):
@@ -82,6 +82,27 @@ def case_trans_rdm13hs (self, norb, nelec):
     self.assertAlmostEqual (lib.fp (tdm3hba), lib.fp (tdm3hba_ref), 8)
     self.assertAlmostEqual (lib.fp (tdm3hbb), lib.fp (tdm3hbb_ref), 8)
 
+def case_trans_rdm13hs_native (self, norb, nelec):
+    for cre, spin in itertools.product ((True, False), range (2)):
+        nelec_bra = list (nelec)
+        nelec_bra[spin] += (-1,1)[int (cre)]
+        if not (0 <= nelec_bra[spin] <= norb): continue
+        shape_bra = [cistring.num_strings (norb, n) for n in nelec_bra]
+        shape_ket = [cistring.num_strings (norb, n) for n in nelec]
+        cibra = rng.random (shape_bra) + 1j * rng.random (shape_bra)
+        ciket = rng.random (shape_ket) + 1j * rng.random (shape_ket)
+        # The dummy-orbital implementation is real-only
+        o0 = lambda b, k: rdm._trans_rdm13hs_o0 (cre, b, k, norb, nelec, spin=spin)
+        parts = [o0 (cibra.real, ciket.real), o0 (cibra.imag, ciket.imag),
+                 o0 (cibra.real, ciket.imag), o0 (cibra.imag, ciket.real)]
+        tdm_ref = [rr + ii + 1j*(ri - ir) for rr, ii, ri, ir in zip (*parts)]
+        tdm_test = rdm._trans_rdm13hs_native (cre, cibra, ciket, norb, nelec, spin=spin)
+        tdm1h = rdm._trans_rdm1hs_native (cre, cibra, ciket, norb, nelec, spin=spin)
+        with self.subTest (cre=cre, spin=spin):
+            self.assertAlmostEqual (lib.fp (tdm1h), lib.fp (tdm_ref[0]), 8)
+            for test, ref in zip (tdm_test, tdm_ref):
+                self.assertAlmostEqual (lib.fp (test), lib.fp (ref), 8)
+
 def case_trans_sfudm1 (self, norb, nelec):
     if not nelec[1]: return
     ciket = rng.random ((cistring.num_strings (norb,nelec[0]),
@@ -120,6 +141,76 @@ def case_trans_ppdm (self, norb, nelec, spin):
             print (i,j,ppdm[i,j],ppdm_ref[i,j])
     self.assertAlmostEqual (lib.fp (ppdm), lib.fp (ppdm_ref), 8)
 
+def case_batch (self, norb, nelec):
+    def rand_ci (nroots, nelec):
+        if min (nelec) < 0: return None
+        ci = 1 - 2*rng.random ((nroots, cistring.num_strings (norb,nelec[0]),
+                                cistring.num_strings (norb,nelec[1])), dtype=float)
+        return ci / linalg.norm (ci.reshape (nroots,-1), axis=1)[:,None,None]
+    def ref_loop (fn, bra, ket):
+        return np.stack ([np.stack ([np.asarray (fn (b, k)) for k in ket]) for b in bra])
+    ket = rand_ci (3, nelec)
+    bra = rand_ci (2, nelec)
+    tdm1s, tdm2s = rdm.trans_rdm12s_batch (bra, ket, norb, nelec)
+    tdm1s_ref = ref_loop (lambda b, k: np.stack (direct_spin1.trans_rdm1s (
+        b, k, norb, nelec)).transpose (0,2,1), bra, ket)
+    tdm2s_ref = ref_loop (lambda b, k: np.stack (direct_spin1.trans_rdm12s (
+        b, k, norb, nelec)[1]), bra, ket)
+    with self.subTest ('trans_rdm12s'):
+        self.assertAlmostEqual (lib.fp (tdm1s), lib.fp (tdm1s_ref), 8)
+        self.assertAlmostEqual (lib.fp (tdm2s), lib.fp (tdm2s_ref), 8)
+        tdm1s = rdm.trans_rdm1s_batch (bra, ket, norb, nelec)
+        self.assertAlmostEqual (lib.fp (tdm1s), lib.fp (tdm1s_ref), 8)
+    # Intermediates of one root of trans_rdm12s_batch, in MB
+    mem = norb * sum (rdm._des_ndet (norb, nelec, s) for s in range (2))
+    mem += 2 * norb * norb * max (rdm._des_ndet (norb, nelec, s, t)
+                                  for s in range (2) for t in range (s,2))
+    mem *= 8 / 1e6
+    if mem > 0:
+        with self.subTest ('trans_rdm12s root blocks'):
+            # 2 bras and 3 kets; room for only one of each at a time
+            tdm1s, tdm2s = rdm.trans_rdm12s_batch (bra, ket, norb, nelec, max_memory=2.5*mem)
+            self.assertAlmostEqual (lib.fp (tdm1s), lib.fp (tdm1s_ref), 8)
+            self.assertAlmostEqual (lib.fp (tdm2s), lib.fp (tdm2s_ref), 8)
+            with self.assertRaises (MemoryError):
+                rdm.trans_rdm12s_batch (bra, ket, norb, nelec, max_memory=mem)
+    for spin in range (2):
+        nelec_bra = list (nelec)
+        nelec_bra[spin] -= 1
+        bra = rand_ci (2, nelec_bra)
+        if bra is None: continue
+        fn = (rdm.trans_rdm13ha_des, rdm.trans_rdm13hb_des)[spin]
+        tdm1h, tdm3h = rdm.trans_rdm13h_des_batch (bra, ket, norb, nelec, spin=spin)
+        tdm1h_ref = ref_loop (lambda b, k: fn (b, k, norb, nelec)[0], bra, ket)
+        tdm3h_ref = ref_loop (lambda b, k: np.stack (fn (b, k, norb, nelec)[1]), bra, ket)
+        with self.subTest ('trans_rdm13h', spin=spin):
+            self.assertAlmostEqual (lib.fp (tdm1h), lib.fp (tdm1h_ref), 8)
+            self.assertAlmostEqual (lib.fp (tdm3h), lib.fp (tdm3h_ref), 8)
+            tdm1h = rdm.trans_rdm1h_des_batch (bra, ket, norb, nelec, spin=spin)
+            self.assertAlmostEqual (lib.fp (tdm1h), lib.fp (tdm1h_ref), 8)
+    bra = rand_ci (2, (nelec[0]-1, nelec[1]+1))
+    if bra is not None and nelec[1] < norb:
+        sfddm = rdm.trans_sfddm1_batch (bra, ket, norb, nelec)
+        sfddm_ref = ref_loop (lambda b, k: rdm.trans_sfddm1 (b, k, norb, nelec), bra, ket)
+        with self.subTest ('trans_sfddm1'):
+            self.assertAlmostEqual (lib.fp (sfddm), lib.fp (sfddm_ref), 8)
+    for spin in range (3):
+        nelec_bra = list (nelec)
+        nelec_bra[int (spin>1)] -= 1
+        nelec_bra[int (spin>0)] -= 1
+        bra = rand_ci (2, nelec_bra)
+        if bra is None: continue
+        hhdm = rdm.trans_hhdm_batch (bra, ket, norb, nelec, spin=spin)
+        hhdm_ref = ref_loop (lambda b, k: rdm.trans_hhdm (b, k, norb, nelec, spin=spin), bra, ket)
+        with self.subTest ('trans_hhdm', spin=spin):
+            self.assertAlmostEqual (lib.fp (hhdm), lib.fp (hhdm_ref), 8)
+            # Only the kets need intermediates
+            mem = rdm._des_ndet (norb, nelec, int (spin>1)) * norb
+            mem += 2 * norb * norb * rdm._des_ndet (norb, nelec, int (spin>1), int (spin>0))
+            mem *= 8 / 1e6
+            hhdm = rdm.trans_hhdm_batch (bra, ket, norb, nelec, spin=spin, max_memory=1.5*mem)
+            self.assertAlmostEqual (lib.fp (hhdm), lib.fp (hhdm_ref), 8)
+
 class KnownValues(unittest.TestCase):
 
     def test_trans_rdm13hs (self):
@@ -132,6 +223,11 @@ class KnownValues(unittest.TestCase):
             with self.subTest (norb=norb, nelec=nelec):
                 case_trans_rdm1hs (self, norb, nelec)
 
+    def test_trans_rdm13hs_native (self):
+        for norb, nelec in cases:
+            with self.subTest (norb=norb, nelec=nelec):
+                case_trans_rdm13hs_native (self, norb, nelec)
+
     def test_trans_sfudm1 (self):
         for norb, nelec in cases:
             with self.subTest (norb=norb, nelec=nelec):
@@ -143,6 +239,11 @@ class KnownValues(unittest.TestCase):
                 with self.subTest (norb=norb, nelec=nelec, spin=spin):
                     case_trans_ppdm (self, norb, nelec, spin)
 
+    def test_batch (self):
+        for norb, nelec in cases:
+            with self.subTest (norb=norb, nelec=nelec):
+                case_batch (self, norb, nelec)
+
 if __name__ == "__main__":
     print("Full Tests for rdm")
     unittest.main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# Benchmark of rebuilding the (pa|aa) ERIs of LASSCF from the DF integrals (las_ao2mo.get_h2eff_df)
+# against updating them after an orbital rotation from a cache of the three-center integrals
+# (P|pq) transformed to the MO basis for all MOs. The update is exact for any rotation
+# mo1 = mo0 @ umat, but it has to contract (P|pq) with the rotated active orbitals, which costs
+# as many floating-point operations as the contract1 step of the rebuild. Prints, for linear
+# hydrogen chains with four (2,2) fragments, the wall time of one rebuild, of building the cache,
+# and of one update, the memory footprint of the cache, the number of macrocycles after which the
+# cache would pay for itself, and the deviation of the updated ERIs from the rebuilt ones.
+#
+# Usage: python bench_h2eff_update.py [basis [natom1 natom2 ...]]
+#   basis : basis set (default: 6-31g)
+#   natom : number of H atoms in each chain (default: 20 40 80)
+
+import sys, time
+import numpy as np
+from scipy import linalg
+from pyscf import gto, scf, lib
+from pyscf.ao2mo import _ao2mo
+from mrh.my_pyscf.mcscf.lasscf_o0 import LASSCF
+from mrh.my_pyscf.mcscf import las_ao2mo
+
+def get_las (natom, basis):
+    mol = gto.M (atom=[['H', (0, 0, 1.0*i)] for i in range (natom)], basis=basis,
+                 verbose=0, output='/dev/null')
+    mf = scf.RHF (mol).density_fit ().run ()
+    las = LASSCF (mf, (2,2,2,2), (2,2,2,2))
+    return las, mf.mo_coeff
+
+def get_cache (las, mo_coeff):
+    nmo = mo_coeff.shape[1]
+    bPpq = [_ao2mo.nr_e2 (cderi, mo_coeff, (0,nmo,0,nmo), aosym='s2', mosym='s2')
+            for cderi in las.with_df.loop ()]
+    return np.concatenate (bPpq, axis=0)
+
+def update_h2eff (las, bPpq, umat, blksize=64):
+    ncore, ncas = las.ncore, las.ncas
+    naux, nmo = bPpq.shape[0], umat.shape[0]
+    ucas = np.ascontiguousarray (umat[:,ncore:ncore+ncas])
+    eri = 0
+    for p0 in range (0, naux, blksize):
+        bPqr = lib.unpack_tril (bPpq[p0:p0+blksize])
+        n = bPqr.shape[0]
+        bPqu = np.dot (bPqr.reshape (n*nmo, nmo), ucas).reshape (n, nmo, ncas)
+        bvPu = np.dot (ucas.T, bPqu.transpose (1,0,2).reshape (nmo, n*ncas))
+        bPvu = bvPu.reshape (ncas, n, ncas).transpose (1,0,2).reshape (n, ncas*ncas)
+        eri += np.dot (bPqu.reshape (n, nmo*ncas).T, bPvu)
+    eri = np.dot (umat.T, eri.reshape (nmo, -1)).reshape (nmo*ncas, ncas, ncas)
+    return lib.pack_tril (eri).reshape (nmo, -1)
+
+if __name__ == '__main__':
+    basis = sys.argv[1] if len (sys.argv) > 1 else '6-31g'
+    natoms = [int (n) for n in sys.argv[2:]] or [20, 40, 80]
+    print ("{:>6s} {:>6s} {:>6s} {:>12s} {:>12s} {:>12s} {:>10s} {:>10s} {:>10s}".format (
+        'natom', 'nao', 'naux', 'rebuild (s)', 'cache (s)', 'update (s)', 'cache MB',
+        'breakeven', 'max err'))
+    for natom in natoms:
+        las, mo0 = get_las (natom, basis)
+        nmo = mo0.shape[1]
+        kappa = 1e-3 * np.random.rand (nmo, nmo)
+        umat = linalg.expm (kappa - kappa.T)
+        mo1 = mo0 @ umat
+        t0 = time.perf_counter ()
+        h2eff_ref = las_ao2mo.get_h2eff_df (las, mo1)
+        t1 = time.perf_counter ()
+        bPpq = get_cache (las, mo0)
+        t2 = time.perf_counter ()
+        h2eff_test = update_h2eff (las, bPpq, umat)
+        t3 = time.perf_counter ()
+        t_rebuild, t_cache, t_update = t1-t0, t2-t1, t3-t2
+        breakeven = t_cache / (t_rebuild-t_update) if t_rebuild > t_update else np.inf
+        print ("{:6d} {:6d} {:6d} {:12.4f} {:12.4f} {:12.4f} {:10.1f} {:10.1f} {:10.2e}".format (
+            natom, las.mol.nao_nr (), las.with_df.get_naoaux (), t_rebuild, t_cache, t_update,
+            bPpq.nbytes/1e6, breakeven, np.amax (np.abs (h2eff_test-h2eff_ref))))
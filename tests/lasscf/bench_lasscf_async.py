@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# Benchmark of concurrent impurity solves in lasscf_async. Runs the same LASSCF calculation on a
+# linear hydrogen chain split into two-atom fragments with impurity_max_workers = 1 (serial) and
+# with larger worker counts, and prints the wall time of crunch_impurities for one keyframe, the
+# wall time of the whole kernel, the ratio of process CPU time to wall time during the impurity
+# solves (greater than 1 only if the impurity solvers actually overlap) and the deviation of the
+# total energy from the serial result. Overlap requires more than one core: with a single core
+# the thread pool can only interleave the solves, so the serial default of
+# impurity_max_workers = 1 should be kept there.
+#
+# Usage: python bench_lasscf_async.py [nfrag [nworkers1 nworkers2 ...]]
+#   nfrag : number of two-atom fragments (default: 4)
+#   nworkers : values of impurity_max_workers to compare (default: 1 2 4)
+
+import sys, time
+import numpy as np
+from pyscf import gto, scf, lib
+from mrh.my_pyscf.mcscf import lasscf_async as asyn
+from mrh.my_pyscf.mcscf.lasscf_async.lasscf_async import crunch_impurities
+from mrh.my_pyscf.mcscf.lasscf_async.crunch import get_impurity_casscf
+from mrh.my_pyscf.mcscf.lasscf_async.split import get_impurity_space_constructor
+from mrh.my_pyscf.mcscf.lasscf_async.keyframe import LASKeyframe
+
+def get_las (nfrag):
+    mol = gto.M (atom=[['H', (0, 0, 1.0*i)] for i in range (2*nfrag)], basis='6-31g',
+                 verbose=0, output='/dev/null')
+    mf = scf.RHF (mol).density_fit ().run ()
+    las = asyn.LASSCF (mf, [2,]*nfrag, [2,]*nfrag)
+    frag_atom_list = [[2*i, 2*i+1] for i in range (nfrag)]
+    mo_coeff = las.set_fragments_(frag_atom_list, mf.mo_coeff)
+    return las, frag_atom_list, mo_coeff
+
+def get_impurities (las, frag_atom_list):
+    impurities = []
+    for i in range (las.nfrags):
+        builder = get_impurity_space_constructor (las, i, frag_atoms=frag_atom_list[i])
+        impurities.append (get_impurity_casscf (las, i, imporb_builder=builder))
+    return impurities
+
+def time_crunch (las, frag_atom_list, kf, nworkers):
+    impurities = get_impurities (las, frag_atom_list)
+    w0, c0 = time.perf_counter (), time.process_time ()
+    crunch_impurities (las, impurities, kf, nworkers=nworkers)
+    w1, c1 = time.perf_counter (), time.process_time ()
+    return w1-w0, (c1-c0)/(w1-w0)
+
+def time_kernel (las, mo_coeff, nworkers):
+    las.impurity_max_workers = nworkers
+    t0 = time.perf_counter ()
+    las.kernel (mo_coeff)
+    return time.perf_counter () - t0, las.e_tot
+
+if __name__ == '__main__':
+    nfrag = int (sys.argv[1]) if len (sys.argv) > 1 else 4
+    nworkers_list = [int (n) for n in sys.argv[2:]] or [1, 2, 4]
+    las, frag_atom_list, mo_coeff = get_las (nfrag)
+    las.lasci (mo_coeff)
+    kf = LASKeyframe (las, las.mo_coeff, las.ci)
+    print ("nfrag = {}, lib.num_threads () = {}".format (nfrag, lib.num_threads ()))
+    print ("{:>8s} {:>12s} {:>10s} {:>12s} {:>10s} {:>10s}".format (
+        'nworkers', 'crunch (s)', 'cpu/wall', 'kernel (s)', 'speedup', 'e err'))
+    t_ref = e_ref = None
+    for nworkers in nworkers_list:
+        t_crunch, cpu_ratio = time_crunch (las, frag_atom_list, kf, nworkers)
+        t_kernel, e_tot = time_kernel (las, mo_coeff, nworkers)
+        if t_ref is None: t_ref, e_ref = t_kernel, e_tot
+        print ("{:8d} {:12.4f} {:10.2f} {:12.4f} {:10.2f} {:10.2e}".format (
+            nworkers, t_crunch, cpu_ratio, t_kernel, t_ref/t_kernel, e_tot-e_ref))
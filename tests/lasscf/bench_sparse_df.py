@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# Benchmark of LASCI.get_veff with dense DF J/K (with_sparse_df=False) and with the sparse-DF
+# J/K engine (with_sparse_df=True) for linear hydrogen chains of increasing length, to locate the
+# system size at which screening the AO pairs of the DF integrals starts to pay off. Prints the
+# wall time per get_veff call in each case (the one-time sparsity screening is reported
+# separately) and the maximum deviation of the sparse result from the dense one. Also times the
+# low-rank exchange of sparsedf_array.vk_svd against that of the contract1 route used by
+# sparsedf_array.get_jk.
+#
+# Usage: python bench_sparse_df.py [natom1 natom2 ...]
+#   natom : number of H atoms in each chain (default: 10 20 40 80 160)
+
+import sys, time
+import numpy as np
+from scipy import linalg
+from pyscf import gto, scf, lib
+from mrh.my_pyscf.mcscf.lasscf_o0 import LASSCF
+
+def get_las (natom):
+    mol = gto.M (atom=[['H', (0, 0, 1.0*i)] for i in range (natom)], basis='6-31g',
+                 verbose=0, output='/dev/null')
+    mf = scf.RHF (mol).density_fit ().run ()
+    las = LASSCF (mf, (2,2), ((1,1),(1,1)))
+    return las, mf.make_rdm1 ()
+
+def time_vk (bPmn, dm, ncall=5):
+    t0 = time.perf_counter ()
+    for i in range (ncall): vk_eig = bPmn.get_jk (dm, with_j=False)[1]
+    t1 = time.perf_counter ()
+    evals, evecs = linalg.eigh (dm)
+    idx = evals > 1e-8
+    for i in range (ncall): vk_svd = bPmn.vk_svd (evecs[:,idx], evals[idx])
+    t2 = time.perf_counter ()
+    return (t1-t0) / ncall, (t2-t1) / ncall, np.amax (np.abs (vk_svd-vk_eig))
+
+def time_veff (las, dm, ncall=5):
+    las.get_veff (dm=dm)
+    t0 = time.perf_counter ()
+    for i in range (ncall): veff = las.get_veff (dm=dm)
+    return veff, (time.perf_counter () - t0) / ncall
+
+if __name__ == '__main__':
+    natoms = [int (n) for n in sys.argv[1:]] or [10, 20, 40, 80, 160]
+    print ("{:>6s} {:>6s} {:>12s} {:>12s} {:>12s} {:>8s} {:>10s} {:>12s} {:>12s} {:>10s}".format (
+        'natom', 'nao', 'dense (s)', 'sparse (s)', 'screen (s)', 'speedup', 'max err',
+        'vk eig (s)', 'vk_svd (s)', 'svd err'))
+    for natom in natoms:
+        las, dm = get_las (natom)
+        veff_dense, t_dense = time_veff (las, dm)
+        las.with_sparse_df = True
+        t0 = time.perf_counter ()
+        las.get_sparse_df ()
+        t_screen = time.perf_counter () - t0
+        veff_sparse, t_sparse = time_veff (las, dm)
+        t_eig, t_svd, err_svd = time_vk (las.get_sparse_df (), dm, ncall=1)
+        print ("{:6d} {:6d} {:12.4f} {:12.4f} {:12.4f} {:8.2f} {:10.2e} {:12.4f} {:12.4f} {:10.2e}".format (
+            natom, las.mol.nao_nr (), t_dense, t_sparse, t_screen, t_dense/t_sparse,
+            np.amax (np.abs (veff_sparse-veff_dense)), t_eig, t_svd, err_svd))
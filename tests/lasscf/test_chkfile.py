@@ -70,6 +70,63 @@ class KnownValues(unittest.TestCase):
             for j in range (las.nroots):
                 self.assertAlmostEqual (lib.fp (las.ci[i][j]), lib.fp (las2.ci[i][j]), 9)
 
+    def test_dedup_incremental (self):
+        import h5py
+        from mrh.my_pyscf.mcscf import chkfile as las_chkfile
+        # Rootspaces 1 and 3 share CI vector objects
+        ci = [[c for c in ci_i] for ci_i in las.ci]
+        for ci_i in ci: ci_i[3] = ci_i[1]
+        ndistinct = len (set (las_chkfile.ci_hash (c) for ci_i in ci for c in ci_i))
+        with tempfile.NamedTemporaryFile() as chkfile:
+            las.dump_chk (chkfile=chkfile.name, ci=ci)
+            with h5py.File (chkfile.name, 'r') as f:
+                self.assertEqual (f['las'].attrs['format_version'], las_chkfile.CHK_FORMAT_VERSION)
+                self.assertEqual (len (f['las/ci_data']), ndistinct)
+            # Unchanged datasets are not rewritten; a changed CI vector replaces the old one
+            ci[0][0] = -ci[0][0]
+            las.dump_chk (chkfile=chkfile.name, ci=ci)
+            with h5py.File (chkfile.name, 'r') as f:
+                self.assertEqual (len (f['las/ci_data']), ndistinct)
+                self.assertIn (las_chkfile.ci_hash (ci[0][0]), f['las/ci_data'])
+            las3 = LASSCF (mf, (2,2), (2,2))
+            las3.load_chk_(chkfile=chkfile.name)
+        for i in range (2):
+            self.assertIs (las3.ci[i][3], las3.ci[i][1])
+            for j in range (las.nroots):
+                self.assertAlmostEqual (lib.fp (las3.ci[i][j]), lib.fp (ci[i][j]), 9)
+
+    def test_stale_datasets (self):
+        import h5py
+        with tempfile.NamedTemporaryFile() as chkfile:
+            las.dump_chk (chkfile=chkfile.name)
+            with h5py.File (chkfile.name, 'a') as f:
+                f['las/stale'] = np.zeros (3)
+            las.dump_chk (chkfile=chkfile.name)
+            with h5py.File (chkfile.name, 'r') as f:
+                self.assertNotIn ('stale', f['las'])
+                self.assertIn ('ci_data', f['las'])
+                self.assertIn ('e_states', f['las'])
+
+    def test_load_format1 (self):
+        import h5py
+        with tempfile.NamedTemporaryFile() as chkfile:
+            las.dump_chk (chkfile=chkfile.name)
+            # Rewrite the CI vectors as in format 1
+            with h5py.File (chkfile.name, 'a') as f:
+                grp = f['las']
+                del grp.attrs['format_version']
+                del grp['ci_data']
+                del grp['ci_keys']
+                for i, ci_i in enumerate (las.ci):
+                    for j, ci_ij in enumerate (ci_i):
+                        grp['ci/{}/{}'.format (i, j)] = ci_ij
+            las3 = LASSCF (mf, (2,2), (2,2))
+            las3.load_chk_(chkfile=chkfile.name)
+        self.assertListEqual (list(las.e_states), list(las3.e_states))
+        for i in range (2):
+            for j in range (las.nroots):
+                self.assertAlmostEqual (lib.fp (las.ci[i][j]), lib.fp (las3.ci[i][j]), 9)
+
 if __name__ == "__main__":
     print("Full Tests for LASSCF chkfile")
     unittest.main()
@@ -27,9 +27,10 @@ def tearDownModule():
     mf.stdout.close ()
     del mf, frag_atom_list, mo0
 
-def _run_mod (mod):
+def _run_mod (mod, **kwargs):
     las=mod.LASSCF(mf, (2,2), (2,2))
     las.conv_tol_grad = 1e-7
+    las.__dict__.update (kwargs)
     localize_fn = getattr (las, 'set_fragments_', las.localize_init_guess)
     mo_coeff=localize_fn (frag_atom_list, mo0)
     las.state_average_(weights=[.2,]*5,
@@ -53,6 +54,31 @@ class KnownValues (unittest.TestCase):
             with self.subTest ('energy', state=i):
                 self.assertAlmostEqual (las_syn.e_states[i], las_asyn.e_states[i], 6)
 
+    def test_concurrent_impurities (self):
+        las_ref = _run_mod (asyn)
+        las_test = _run_mod (asyn, impurity_max_workers=2)
+        with self.subTest ('converged'):
+            self.assertTrue (las_test.converged)
+        with self.subTest ('average energy'):
+            self.assertAlmostEqual (las_test.e_tot, las_ref.e_tot, 8)
+        for i in range (5):
+            with self.subTest ('energy', state=i):
+                self.assertAlmostEqual (las_test.e_states[i], las_ref.e_states[i], 7)
+
+    def test_dynamic_scheduler (self):
+        las_ref = _run_mod (syn)
+        nfrags = len (frag_atom_list)
+        for max_stale in (0, 1, nfrags):
+            las_test = _run_mod (asyn, impurity_max_workers=2, impurity_scheduler='dynamic',
+                                 impurity_max_stale=max_stale)
+            with self.subTest ('converged', max_stale=max_stale):
+                self.assertTrue (las_test.converged)
+            with self.subTest ('average energy', max_stale=max_stale):
+                self.assertAlmostEqual (las_test.e_tot, las_ref.e_tot, 7)
+            for i in range (5):
+                with self.subTest ('energy', state=i, max_stale=max_stale):
+                    self.assertAlmostEqual (las_test.e_states[i], las_ref.e_states[i], 6)
+
 if __name__ == "__main__":
     print("Full Tests for lasscf_async")
     unittest.main()
@@ -71,6 +71,32 @@ class KnownValues(unittest.TestCase):
         las = LASSCF (mf_hs_df, (4,), ((4,0),), spin_sub=(5,)).set (conv_tol_grad=1e-5).run ()
         self.assertAlmostEqual (las.e_tot, mf_hs_df.e_tot, 8)
 
+    def test_energy_hs_sparse_df (self):
+        las = LASSCF (mf_hs_df, (4,), ((4,0),), spin_sub=(5,))
+        las.set (conv_tol_grad=1e-5, with_sparse_df=True)
+        dm = mf_hs_df.make_rdm1 ()
+        for spin_sep in (False, True):
+            with self.subTest (spin_sep=spin_sep):
+                veff_test = las.get_veff (dm=dm, spin_sep=spin_sep)
+                with lib.temporary_env (las, with_sparse_df=False):
+                    veff_ref = las.get_veff (dm=dm, spin_sep=spin_sep)
+                self.assertAlmostEqual (lib.fp (veff_test), lib.fp (veff_ref), 7)
+        with self.subTest ('hermi=0'):
+            veff_test = las.get_veff (dm=dm, hermi=0)
+            with lib.temporary_env (las, with_sparse_df=False):
+                veff_ref = las.get_veff (dm=dm, hermi=0)
+            self.assertAlmostEqual (lib.fp (veff_test), lib.fp (veff_ref), 9)
+        with self.subTest ('vk_svd'):
+            mo_occ = mf_hs_df.mo_occ
+            vk_test = las.get_sparse_df ().vk_svd (mf_hs_df.mo_coeff, mo_occ)
+            vk_ref = mf_hs_df.with_df.get_jk (dm.sum (0), hermi=1)[1]
+            self.assertAlmostEqual (lib.fp (vk_test), lib.fp (vk_ref), 6)
+            # Unpacked CDERI array
+            vk_test = las.get_sparse_df ().unpack_mo ().vk_svd (mf_hs_df.mo_coeff, mo_occ)
+            self.assertAlmostEqual (lib.fp (vk_test), lib.fp (vk_ref), 6)
+        las.run ()
+        self.assertAlmostEqual (las.e_tot, mf_hs_df.e_tot, 8)
+
     def test_derivatives (self):
         np.random.seed(1)
         las = LASSCF (mf, (4,), (4,), spin_sub=(1,)).set (max_cycle_macro=1, ah_level_shift=0).run ()
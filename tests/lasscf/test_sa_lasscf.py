@@ -4,6 +4,7 @@ from scipy import linalg
 from pyscf import scf, lib, tools, mcscf
 from pyscf.mcscf.addons import state_average_mix
 from mrh.my_pyscf.mcscf.lasscf_o0 import LASSCF
+from mrh.my_pyscf.mcscf import lasci_sync
 from pyscf.mcscf.newton_casscf import gen_g_hop, _pack_ci_get_H
 from c2h6n4_struct import structure as struct
 from mrh.my_pyscf.fci import csf_solver
@@ -129,6 +130,24 @@ class KnownValues(unittest.TestCase):
             for i, ht, hr in zip (lbls, hx_test, hx_ref):
                 with self.subTest (sector=(i,j)):
                     self.assertAlmostEqual (lib.fp (ht), lib.fp (hr), 9)
+
+    def test_ci_cycle_concurrent (self):
+        mo = las.mo_coeff
+        h2eff_sub = las.get_h2eff (mo)
+        casdm1frs = las.states_make_casdm1s_sub (ci=las.ci)
+        veff = las.get_veff (dm=las.make_rdm1 (mo_coeff=mo, ci=las.ci))
+        veff = las.split_veff (veff, h2eff_sub, mo_coeff=mo, ci=las.ci)
+        log = lib.logger.new_logger (las, las.verbose)
+        e_ref, ci_ref = lasci_sync.ci_cycle (las, mo, las.ci, veff, h2eff_sub, casdm1frs, log)
+        with lib.temporary_env (las, max_workers_ci=3):
+            e_test, ci_test = lasci_sync.ci_cycle (las, mo, las.ci, veff, h2eff_sub, casdm1frs,
+                                                   log)
+        for ifrag in range (las.nfrags):
+            with self.subTest (frag=ifrag):
+                self.assertAlmostEqual (e_test[ifrag], e_ref[ifrag], 9)
+                self.assertEqual (len (ci_test[ifrag]), len (ci_ref[ifrag]))
+                for c_test, c_ref in zip (ci_test[ifrag], ci_ref[ifrag]):
+                    self.assertAlmostEqual (abs (np.dot (c_test.ravel (), c_ref.ravel ())), 1, 8)
                 
 if __name__ == "__main__":
     print("Full Tests for LASSCF Newton-CG module functions state-averaging")
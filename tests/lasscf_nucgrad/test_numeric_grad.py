@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# Tests of the finite-difference engine of mrh.my_pyscf.grad.numeric
+
+import os
+import tempfile
+import unittest
+
+from pyscf import gto, scf, lib
+from mrh.my_pyscf.mcscf.lasscf_o0 import LASSCF
+from mrh.my_pyscf.grad import numeric as numeric_grad
+
+def setUpModule():
+    global mol, mf, las
+    mol = gto.M (atom='H 0 0 0; F 0 0 0.95', basis='6-31g', verbose=0, output='/dev/null')
+    mf = scf.RHF (mol).run (conv_tol=1e-12)
+    las = LASSCF (mf, (2,), (2,), spin_sub=(1,))
+    las.conv_tol_grad = 1e-7
+    las.kernel (las.localize_init_guess ([[0,1]], mf.mo_coeff))
+
+def tearDownModule():
+    global mol, mf, las
+    mol.stdout.close ()
+    del mol, mf, las
+
+class KnownValues(unittest.TestCase):
+
+    def test_grad (self):
+        de_ref = las.nuc_grad_method ().kernel ()
+        for stencil in (2, 4):
+            with self.subTest (stencil=stencil):
+                de = numeric_grad.Gradients (las, stencil=stencil, scanner_verbose=0).kernel ()
+                self.assertAlmostEqual (lib.fp (de), lib.fp (de_ref), 5)
+        with self.subTest ('bad stencil'):
+            with self.assertRaises (ValueError):
+                numeric_grad.Gradients (las, stencil=3, scanner_verbose=0).kernel ()
+
+    def test_parallel (self):
+        with self.subTest ('1 fragment, 1 state'):
+            de_ref = numeric_grad.Gradients (las, scanner_verbose=0).kernel (atmlst=[1])
+            de = numeric_grad.Gradients (las, scanner_verbose=0, max_workers=2).kernel (
+                atmlst=[1])
+            self.assertAlmostEqual (lib.fp (de), lib.fp (de_ref), 8)
+        # Concurrent displacements must not share fciboxes or fcisolvers
+        mol2 = gto.M (atom='H 0 0 0; H 0 0 0.8; H 0 0 2.5; H 0 0 3.4', basis='6-31g',
+                      verbose=0, output='/dev/null')
+        mf2 = scf.RHF (mol2).run (conv_tol=1e-12)
+        las2 = LASSCF (mf2, (2,2), (2,2), spin_sub=(1,1))
+        las2.conv_tol_grad = 1e-7
+        las2.state_average_(weights=[.5,.5], spins=[[0,0],[0,0]], smults=[[1,1],[3,3]])
+        las2.kernel (las2.localize_init_guess ([[0,1],[2,3]], mf2.mo_coeff))
+        with self.subTest ('2 fragments, 2 states'):
+            de_ref = numeric_grad.Gradients (las2, scanner_verbose=0).kernel (atmlst=[1,2])
+            de = numeric_grad.Gradients (las2, scanner_verbose=0, max_workers=2).kernel (
+                atmlst=[1,2])
+            self.assertAlmostEqual (lib.fp (de), lib.fp (de_ref), 8)
+        mol2.stdout.close ()
+
+    def test_signature (self):
+        with tempfile.TemporaryDirectory () as tmpdir:
+            chkfile = os.path.join (tmpdir, 'numgrad.chk')
+            numeric_grad.Gradients (las, scanner_verbose=0, chkfile=chkfile).kernel (atmlst=[1])
+            ncalls = [0]
+            run_displacement = numeric_grad._run_displacement
+            def count_calls (*args, **kwargs):
+                ncalls[0] += 1
+                return run_displacement (*args, **kwargs)
+            with lib.temporary_env (numeric_grad, _run_displacement=count_calls):
+                numeric_grad.Gradients (mf, scanner_verbose=0, chkfile=chkfile).kernel (
+                    atmlst=[1])
+            self.assertEqual (ncalls[0], 6)
+
+    def test_restart (self):
+        with tempfile.TemporaryDirectory () as tmpdir:
+            chkfile = os.path.join (tmpdir, 'numgrad.chk')
+            mygrad = numeric_grad.Gradients (las, scanner_verbose=0, chkfile=chkfile)
+            de_ref = mygrad.kernel (atmlst=[1])
+            ncalls = [0]
+            run_displacement = numeric_grad._run_displacement
+            def count_calls (*args, **kwargs):
+                ncalls[0] += 1
+                return run_displacement (*args, **kwargs)
+            with lib.temporary_env (numeric_grad, _run_displacement=count_calls):
+                mygrad = numeric_grad.Gradients (las, scanner_verbose=0, chkfile=chkfile)
+                de = mygrad.kernel (atmlst=[1])
+                with self.subTest ('resume'):
+                    self.assertEqual (ncalls[0], 0)
+                    self.assertAlmostEqual (lib.fp (de), lib.fp (de_ref), 10)
+                mygrad.stepsize *= 2
+                mygrad.kernel (atmlst=[1])
+                with self.subTest ('new stepsize'):
+                    self.assertEqual (ncalls[0], 6)
+
+    def test_hessian (self):
+        hess_ref = mf.Hessian ().kernel ()
+        with tempfile.TemporaryDirectory () as tmpdir:
+            chkfile = os.path.join (tmpdir, 'numhess.chk')
+            hess = numeric_grad.Gradients (mf, scanner_verbose=0, chkfile=chkfile).hessian ()
+            self.assertAlmostEqual (lib.fp (hess), lib.fp (hess_ref), 5)
+            with self.subTest ('chkkey'):
+                saved = lib.chkfile.load (chkfile, 'numeric_grad')
+                self.assertEqual (list (saved.keys ()), ['gradient_stateNone_stencil2'])
+
+if __name__ == "__main__":
+    print("Tests for finite-difference nuclear gradients")
+    unittest.main()
@@ -247,6 +247,13 @@ def case_contract_op_si (ks, las, h1, h2, ci_fr, nelec_frs, smult_fr=None, soc=0
         ks.assertAlmostEqual (lib.fp (ovlp_op (x)), lib.fp (ovlp @ x), 7)
         ks.assertAlmostEqual (lib.fp (ovlp_op (x)), lib.fp (ovlp @ x), 7)
         ks.assertAlmostEqual (lib.fp (ovlp_op (x)), lib.fp (x.conj () @ ovlp).conj (), 7)
+    x = (2 * np.random.rand (nstates, 3)) - 1
+    if soc:
+        x = x + 1j*np.random.rand (nstates, 3)
+    for lbl, lop, mat in (('ham', ham_op, ham), ('s2', s2_op, s2), ('ovlp', ovlp_op, ovlp)):
+        with ks.subTest (lbl + '_op block'):
+            ks.assertEqual (lop (x).shape, x.shape)
+            ks.assertAlmostEqual (lib.fp (lop (x)), lib.fp (mat @ x), 7)
 
 def debug_contract_op_si (ks, las, h1, h2, ci_fr, nelec_frs, smult_fr=None, soc=0):
     nroots = nelec_frs.shape[1]
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# Benchmark of LAS checkpointing for the rootspaces of a 6-fragment LASSIS model space (H12
+# chain, one H2 per fragment; ~2e4 rootspaces sharing a few hundred CI arrays; the SI vectors
+# are not computed), comparing the format-1 chkfile layout (the whole group deleted and every
+# CI vector of every rootspace rewritten on each dump) with the current deduplicated,
+# incremental layout of mrh.my_pyscf.mcscf.chkfile. Prints the time of the first dump, the time per dump
+# of ndumps repeated dumps (as in a macrocycle loop) and the file size in each case, and
+# checks that the CI vectors are read back correctly.
+#
+# Usage: python bench_chkfile.py [ndumps] [compression]
+#   ndumps : number of repeated dumps (default: 3)
+#   compression : h5py compression filter for the current layout, e.g. gzip (default: none)
+
+import os, sys, time, tempfile
+import h5py
+import numpy as np
+from pyscf import gto, scf, lib
+from mrh.my_pyscf.mcscf.lasscf_o0 import LASSCF
+from mrh.my_pyscf.mcscf import chkfile as las_chkfile
+from mrh.my_pyscf.mcscf.lasci import get_space_info
+from mrh.my_pyscf.lassi import LASSIS
+
+def get_las ():
+    nfrags = 6
+    atom = '\n'.join (['H {} 0 0\nH {} 0 0'.format (3.0*i, 3.0*i+0.9) for i in range (nfrags)])
+    mol = gto.M (atom=atom, basis='sto-3g', symmetry=False, verbose=0, output='/dev/null')
+    mf = scf.RHF (mol).run ()
+    las = LASSCF (mf, (2,)*nfrags, (2,)*nfrags)
+    frags = [[2*i, 2*i+1] for i in range (nfrags)]
+    mo_coeff = las.localize_init_guess (frags, mf.mo_coeff)
+    las.kernel (mo_coeff)
+    lsi = LASSIS (las)
+    lsi.prepare_states_()
+    return lsi.prepare_model_states (lsi.get_ci_ref (), lsi.ci_spin_flips,
+                                     lsi.ci_charge_hops)[0]
+
+def dump_format1 (mc, chkfile, method_key='las'):
+    keys = las_chkfile.KEYS_CONFIG_LASSCF + las_chkfile.KEYS_RESULTS_LASSCF
+    data = {key: getattr (mc, key) for key in keys}
+    data_saconstr = [mc.weights,] + list (get_space_info (mc))
+    for key, val in zip (las_chkfile.KEYS_SACONSTR_LASSCF, data_saconstr):
+        data[key] = val
+    with h5py.File (chkfile, 'a') as fh5:
+        if 'mol' in fh5: del (fh5['mol'])
+        fh5['mol'] = mc.mol.dumps ()
+        if method_key in fh5: del (fh5[method_key])
+        chkdata = fh5.create_group (method_key)
+        for key, val in data.items (): chkdata[key] = val
+        for i, cii in enumerate (mc.ci):
+            chkdata_ci_i = chkdata.create_group ('ci/'+str(i))
+            for j, ciij in enumerate (cii):
+                chkdata_ci_i[str(j)] = ciij
+
+if __name__ == '__main__':
+    ndumps = int (sys.argv[1]) if len (sys.argv) > 1 else 3
+    compression = sys.argv[2] if len (sys.argv) > 2 else None
+    las = get_las ()
+    nci = sum (len (ci_i) for ci_i in las.ci)
+    nuniq = len (set (id (c) for ci_i in las.ci for c in ci_i))
+    print ("{} fragments, {} rootspaces, {} CI vectors ({} distinct objects)".format (
+        las.nfrags, las.nroots, nci, nuniq))
+    def dump_current (mc, chkfile):
+        las_chkfile.dump_las (mc, chkfile=chkfile, compression=compression)
+    for lbl, dump in (('format 1', dump_format1), ('current', dump_current)):
+        with tempfile.NamedTemporaryFile (dir=lib.param.TMPDIR) as f:
+            t0 = time.perf_counter ()
+            dump (las, f.name)
+            t1 = time.perf_counter ()
+            for i in range (ndumps): dump (las, f.name)
+            t2 = time.perf_counter ()
+            size = os.path.getsize (f.name) / 1e6
+            if lbl == 'current':
+                t3 = time.perf_counter ()
+                ci = las_chkfile._load_group (f.name, 'las')[1]['ci']
+                t_load = time.perf_counter () - t3
+                err = max ([np.amax (np.abs (c1-c2)) for ci1, ci2 in zip (las.ci, ci)
+                            for c1, c2 in zip (ci1, ci2)])
+        print ("{:>8s}: first dump {:.4f} s; {:.4f} s/dump over {} repeated dumps; {:.3f} MB".format (
+            lbl, t1-t0, (t2-t1)/ndumps, ndumps, size))
+    print ("reading CI vectors back: {:.4f} s; max abs CI error = {:.3e}".format (t_load, err))
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# Benchmark of the two-charge-hop ("2c") rows of the LASSI op_o1 LAS-state TDM engine, with
+# (LSTDM.batch_2c = True) and without (LSTDM.batch_2c = False) the batched kernel. Prints the
+# number of exc_2c rows processed per second in each case and checks that the results agree.
+#
+# Usage: python bench_crunch_2c.py [lroots]
+#   lroots : maximum number of states per fragment per rootspace (default: 2)
+
+import sys, time
+import numpy as np
+from pyscf import lib
+from pyscf.fci import cistring
+from mrh.my_pyscf.lassi.op_o1 import stdm, frag
+from mrh.tests.lassi import test_4frag
+from mrh.tests.lassi.addons import random_orthrows
+
+def setup (max_lroots=None):
+    test_4frag.setUpModule ()
+    las, nelec_frs = test_4frag.las, test_4frag.nelec_frs
+    lroots = las.get_ugg ().ncsf_sub
+    if max_lroots is not None: lroots = np.minimum (max_lroots, lroots)
+    rng = np.random.default_rng (0)
+    for ifrag, c in enumerate (las.ci):
+        for iroot in range (len (c)):
+            ndeta = cistring.num_strings (las.ncas_sub[ifrag], nelec_frs[ifrag,iroot,0])
+            ndetb = cistring.num_strings (las.ncas_sub[ifrag], nelec_frs[ifrag,iroot,1])
+            lr = min (lroots[ifrag][iroot], ndeta*ndetb)
+            c[iroot] = random_orthrows (lr, ndeta*ndetb, rng=rng).reshape (lr, ndeta, ndetb)
+    return las, nelec_frs
+
+def crunch_2c (las, ints, lroots, batch_2c):
+    log = lib.logger.new_logger (las, 0)
+    with lib.temporary_env (stdm.LSTDM, batch_2c=batch_2c):
+        outerprod = stdm.LSTDM (ints, las.ncas_sub, lroots, max_memory=las.max_memory, log=log)
+        outerprod.init_profiling ()
+        outerprod.tdm1s = np.zeros ([outerprod.nstates,]*2 + [2,] + [outerprod.norb,]*2)
+        outerprod.tdm2s = np.zeros ([outerprod.nstates,]*2 + [4,] + [outerprod.norb,]*4)
+        _crunch_2c_ = outerprod._crunch_tables ()[-1][0]
+        nrows = len (outerprod.exc_2c)
+        t0 = time.perf_counter ()
+        outerprod._crunch_parallel_(((_crunch_2c_, outerprod.exc_2c),))
+        dt = time.perf_counter () - t0
+    return outerprod.tdm2s, nrows, dt
+
+if __name__ == '__main__':
+    max_lroots = int (sys.argv[1]) if len (sys.argv) > 1 else 2
+    las, nelec_frs = setup (max_lroots)
+    ints, lroots = frag.make_ints (las, las.ci, nelec_frs)
+    print ("{} model states; {} OpenMP threads".format (np.sum (np.prod (lroots, axis=0)),
+                                                        lib.num_threads ()))
+    fps = []
+    for lbl, batch_2c in (('before', False), ('after', True)):
+        tdm2s, nrows, dt = crunch_2c (las, ints, lroots, batch_2c)
+        fps.append (lib.fp (tdm2s))
+        del tdm2s
+        print ("{:>6s} (batch_2c={}): {} rows in {:.3f} s = {:.1f} rows/s".format (
+            lbl, batch_2c, nrows, dt, nrows/dt))
+    print ("fingerprint difference = {:.3e}".format (fps[1]-fps[0]))
+    test_4frag.tearDownModule ()
+
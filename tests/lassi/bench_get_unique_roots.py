@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# Benchmark of the screening for duplicate and linearly-equivalent CI vectors in
+# lassi.citools.get_unique_roots, which is called for every fragment when the op_o1 TDM engine
+# is set up. Compares the bucketed implementation with the all-pairs reference implementation
+# (get_unique_roots_slow) on a synthetic set of nroots rootspaces in the lowest-spin neutral
+# sector(s) of the fragment, about half of which are copies or rotations of other ones, and
+# checks that the results agree.
+#
+# Usage: python bench_get_unique_roots.py [nroots] [norb]
+#   nroots : number of rootspaces (default: 1000)
+#   norb : number of orbitals in the fragment (default: 6)
+
+import sys, time
+import numpy as np
+from scipy import linalg
+from pyscf.fci import cistring
+from mrh.my_pyscf.lassi import citools
+from mrh.tests.lassi.addons import random_orthrows
+
+def setup (nroots, norb, rng=None):
+    if rng is None: rng = np.random.default_rng (0)
+    nelec_choices = [(i,j) for i in range (norb+1) for j in range (norb+1)
+                     if i+j == norb and abs (i-j) <= 1]
+    ci, nelec_r = [], []
+    for i in range (nroots):
+        mode = rng.integers (4) if i else 0
+        if mode < 2:
+            nelec = nelec_choices[rng.integers (len (nelec_choices))]
+            ndeta = cistring.num_strings (norb, nelec[0])
+            ndetb = cistring.num_strings (norb, nelec[1])
+            lr = min (rng.integers (1, high=5), ndeta*ndetb)
+            ci.append (random_orthrows (lr, ndeta*ndetb, rng=rng).reshape (lr,ndeta,ndetb))
+            nelec_r.append (nelec)
+        else:
+            j = rng.integers (i)
+            lr = ci[j].shape[0]
+            if mode == 2:
+                ci.append (ci[j].copy ())
+            else:
+                umat = linalg.qr (rng.random ((lr,lr)))[0]
+                ci.append (np.tensordot (umat, ci[j], axes=1))
+            nelec_r.append (nelec_r[j])
+    return ci, nelec_r
+
+if __name__ == '__main__':
+    nroots = int (sys.argv[1]) if len (sys.argv) > 1 else 1000
+    norb = int (sys.argv[2]) if len (sys.argv) > 2 else 6
+    ci, nelec_r = setup (nroots, norb)
+    results = []
+    for lbl, fn in (('before', citools.get_unique_roots_slow),
+                    ('after', citools.get_unique_roots)):
+        t0 = time.perf_counter ()
+        results.append (fn (ci, nelec_r))
+        dt = time.perf_counter () - t0
+        print ("{:>6s} ({}): {} roots -> {} unique in {:.3f} s".format (
+            lbl, fn.__name__, nroots, np.count_nonzero (results[-1][0]), dt))
+    same = (np.all (results[0][0] == results[1][0])
+            and np.all (results[0][1] == results[1][1])
+            and sorted (results[0][2]) == sorted (results[1][2]))
+    print ("results agree: {}".format (same))
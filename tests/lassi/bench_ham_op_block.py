@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+# Benchmark of the LASSI op_o1 SI-vector Hamiltonian operator applied to a block of nvec vectors,
+# one vector at a time (as the LASSI Davidson driver used to) versus all at once. Prints the
+# number of vectors processed per second in each case and checks that the results agree.
+#
+# Usage: python bench_ham_op_block.py [nvec] [lroots]
+#   nvec : number of SI vectors (default: 8)
+#   lroots : maximum number of states per fragment per rootspace (default: 2)
+
+import sys, time
+import numpy as np
+from pyscf import lib
+from mrh.my_pyscf.lassi.lassi import ham_2q
+from mrh.my_pyscf.lassi.op_o1 import hsi
+from mrh.tests.lassi import test_4frag
+from mrh.tests.lassi.bench_crunch_2c import setup
+
+if __name__ == '__main__':
+    nvec = int (sys.argv[1]) if len (sys.argv) > 1 else 8
+    max_lroots = int (sys.argv[2]) if len (sys.argv) > 2 else 2
+    las, nelec_frs = setup (max_lroots)
+    h0, h1, h2 = ham_2q (las, las.mo_coeff)
+    ham_op = hsi.gen_contract_op_si_hdiag (las, h1, h2, las.ci, nelec_frs)[0]
+    nstates = ham_op.shape[0]
+    print ("{} model states; {} vectors; {} OpenMP threads".format (nstates, nvec,
+                                                                    lib.num_threads ()))
+    x = np.random.default_rng (0).random ((nstates, nvec)) - .5
+    hx = []
+    for lbl, fn in (('before', lambda x: np.stack ([ham_op (xi) for xi in x.T], axis=-1)),
+                    ('after', ham_op)):
+        t0 = time.perf_counter ()
+        hx.append (fn (x))
+        dt = time.perf_counter () - t0
+        print ("{:>6s}: {} vectors in {:.3f} s = {:.1f} vectors/s".format (
+            lbl, nvec, dt, nvec/dt))
+    print ("max abs difference = {:.3e}".format (np.amax (np.abs (hx[1]-hx[0]))))
+    test_4frag.tearDownModule ()
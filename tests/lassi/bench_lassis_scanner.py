@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# Benchmark of the LASSIS scanner along a dissociation curve of the c2h4n4 model system, with
+# (cached=True) and without (cached=False) reusing the rootspace enumeration of the previous
+# geometry. Prints the wall time per point in each case and checks that the energies agree.
+#
+# Usage: python bench_lassis_scanner.py [npoints]
+#   npoints : number of points on the curve (default: 10)
+
+import sys, time
+import numpy as np
+from pyscf import scf
+from mrh.tests.lasscf.c2h4n4_struct import structure as struct
+from mrh.my_pyscf.mcscf.lasscf_o0 import LASSCF
+from mrh.my_pyscf.lassi import LASSIS
+
+def get_mol (dr_nn):
+    mol = struct (dr_nn, dr_nn, '6-31g', symmetry=False)
+    mol.verbose = 0
+    mol.output = '/dev/null'
+    mol.spin = 8
+    return mol.build ()
+
+def get_scanner ():
+    mol = get_mol (2.0)
+    mf = scf.RHF (mol).run ()
+    las = LASSCF (mf, (5,5), ((3,2),(2,3)), spin_sub=(2,2))
+    mo_coeff = las.localize_init_guess ((list (range (5)), list (range (5,10))))
+    las.kernel (mo_coeff)
+    lsi = LASSIS (las).run ()
+    return lsi.as_scanner ()
+
+if __name__ == '__main__':
+    npoints = int (sys.argv[1]) if len (sys.argv) > 1 else 10
+    dr_nn = np.linspace (2.0, 1.55, npoints+1)[1:]
+    mols = [get_mol (dr) for dr in dr_nn]
+    e_tot = []
+    for lbl, cached in (('before', False), ('after', True)):
+        lsi_scanner = get_scanner ()
+        e_tot.append ([])
+        t0 = time.perf_counter ()
+        for mol in mols:
+            if not cached:
+                lsi_scanner._model_rootspaces = lsi_scanner._fbf_rootspaces = None
+            e_tot[-1].append (lsi_scanner (mol))
+        dt = time.perf_counter () - t0
+        print ("{:>6s} (cached={}): {} points in {:.3f} s = {:.3f} s/point".format (
+            lbl, cached, npoints, dt, dt/npoints))
+    print ("max abs energy difference = {:.3e}".format (np.amax (np.abs (np.subtract (*e_tot)))))
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# Benchmark of the product-state fixed-point CI solver (ImpureProductStateFCISolver) used by
+# las.lasci, on the c2h4n4 systems of test_c2h4n4.py (the lroots=2 LASCI of setUpModule, and
+# the LASCI of all single charge-transfer excitations of the reference, i.e., the rootspaces
+# prepared by LASSIS) and on the charge-transfer rootspaces of H4 with the random Hamiltonians
+# of test_22.py (several random seeds), which converge much more slowly. Compares serial and
+# concurrent fragment solves (las.max_workers_ps), printing the total number of macrocycles,
+# the wall time, and the largest state energy difference.
+#
+# Usage: python bench_productstate.py [max_workers] [nseeds]
+#   max_workers : number of threads for concurrent fragment solves (default: 2)
+#   nseeds : number of random H4 Hamiltonians (default: 8)
+
+import os, sys, time
+import numpy as np
+from pyscf import lib, gto, scf
+from mrh.my_pyscf.mcscf.lasscf_o0 import LASSCF
+from mrh.my_pyscf.mcscf.productstate import ProductStateFCISolver
+from mrh.my_pyscf.lassi.spaces import all_single_excitations
+from mrh.tests.lasscf.c2h4n4_struct import structure as struct
+topdir = os.path.abspath (os.path.join (__file__, '..'))
+
+def setup_h4 (seed):
+    xyz='''H 0 0 0
+    H 1 0 0
+    H 3 0 0
+    H 4 0 0'''
+    mol = gto.M (atom=xyz, basis='sto3g', symmetry=False, verbose=0, output='/dev/null')
+    mf = scf.RHF (mol).run ()
+    rng = np.random.default_rng (seed)
+    mf._eri = rng.random (mf._eri.shape)
+    hcore = rng.random ((4,4))
+    hcore = hcore + hcore.T
+    mf.get_hcore = lambda *args: hcore
+    las = all_single_excitations (LASSCF (mf, (2,2), (2,2), spin_sub=(1,1)))
+    las.max_cycle_macro = 200
+    return las
+
+def setup ():
+    mol = struct (2.0, 2.0, '6-31g', symmetry=False)
+    mol.verbose = 0
+    mol.output = '/dev/null'
+    mol.spin = 0
+    mol.build ()
+    mf = scf.RHF (mol).run ()
+    las = LASSCF (mf, (4,4), (4,4), spin_sub=(1,1))
+    las.state_average_(weights=[1.0/5.0,]*5,
+        spins=[[0,0],[0,0],[2,-2],[-2,2],[2,2]],
+        smults=[[1,1],[3,3],[3,3],[3,3],[3,3]])
+    las.frozen = list (range (las.mo_coeff.shape[-1]))
+    ugg = las.get_ugg ()
+    las.mo_coeff = np.loadtxt (os.path.join (topdir, 'test_c2h4n4_mo.dat'))
+    ci0 = ugg.unpack (np.loadtxt (os.path.join (topdir, 'test_c2h4n4_ci.dat')))[1]
+    lroots = 2 * np.ones ((2,7), dtype=int)
+    lroots[:,1] = 1
+    las.conv_tol_grad = 1e-8
+    las1 = LASSCF (mf, (4,4), (4,4), spin_sub=(1,1))
+    las1.mo_coeff = las.mo_coeff
+    las1.lasci ()
+    las1 = all_single_excitations (las1)
+    las1.conv_tol_grad = 1e-8
+    ci1 = [[c for c in ci_i] for ci_i in las1.ci]
+    return (('c2h4n4 lroots=2', las, ci0, lroots),
+            ('c2h4n4 charge transfer', las1, ci1, None))
+
+def run (las, ci0, lroots, max_workers):
+    ncycle = []
+    kernel0 = ProductStateFCISolver.kernel
+    def kernel (solver, *args, **kwargs):
+        res = kernel0 (solver, *args, **kwargs)
+        ncycle.append (solver.ncycle)
+        return res
+    with lib.temporary_env (ProductStateFCISolver, kernel=kernel):
+        with lib.temporary_env (las, max_workers_ps=max_workers, ci=None):
+            t0 = time.perf_counter ()
+            conv, e_tot, e_states = las.lasci (ci0=ci0, lroots=lroots)[:3]
+            t1 = time.perf_counter ()
+    return np.all (conv), np.asarray (e_states), sum (ncycle), t1-t0
+
+if __name__ == '__main__':
+    max_workers = int (sys.argv[1]) if len (sys.argv) > 1 else 2
+    nseeds = int (sys.argv[2]) if len (sys.argv) > 2 else 8
+    print ("{} OpenMP threads".format (lib.num_threads ()))
+    systems = list (setup ())
+    systems.append (('H4 random Hamiltonians', [setup_h4 (seed) for seed in range (nseeds)],
+                     None, None))
+    for lbl, las_list, ci0, lroots in systems:
+        if not isinstance (las_list, list): las_list = [las_list,]
+        print ("{}: {} x {} rootspaces".format (lbl, len (las_list), las_list[0].nroots))
+        e_ref = None
+        for nw in (1, max_workers):
+            res = [run (las, ci0, lroots, nw) for las in las_list]
+            conv = all ([r[0] for r in res])
+            e_states = np.concatenate ([r[1] for r in res])
+            ncycle = sum ([r[2] for r in res])
+            t = sum ([r[3] for r in res])
+            if e_ref is None: e_ref = e_states
+            print (("  max_workers={}: converged={}; {:4d} cycles; {:.3f} s; "
+                    "max |dE| = {:.1e}").format (nw, conv, ncycle, t,
+                                                  np.amax (np.abs (e_states-e_ref))))
@@ -320,6 +320,17 @@ class KnownValues(unittest.TestCase):
                     sdm1 = make_sdm1 (lsi, iroot, ifrag)
                     self.assertAlmostEqual (lib.fp (fdm1), lib.fp (sdm1), 7)
 
+    def test_lasci_max_workers_ps (self):
+        las1 = all_single_excitations (LASSCF (mf, (2,2), (2,2), spin_sub=(1,1)))
+        las1.max_cycle_macro = 200
+        conv0, e0, e_states0 = las1.lasci ()[:3]
+        self.assertTrue (np.all (conv0))
+        las1.ci = None
+        las1.max_workers_ps = 2
+        conv1, e1, e_states1 = las1.lasci ()[:3]
+        self.assertTrue (np.all (conv1))
+        self.assertAlmostEqual (lib.fp (e_states1), lib.fp (e_states0), 8)
+
 if __name__ == "__main__":
     print("Full Tests for LASSI of random 2,2 system")
     unittest.main()
@@ -19,7 +19,7 @@ import numpy as np
 from scipy import linalg
 from copy import deepcopy
 from itertools import product
-from pyscf import lib, gto, scf, dft, fci, mcscf, df
+from pyscf import lib, gto, scf, dft, fci, mcscf, df, ao2mo
 from pyscf.tools import molden
 from pyscf.fci import cistring
 from pyscf.fci.direct_spin1 import _unpack_nelec
@@ -272,6 +272,87 @@ class KnownValues(unittest.TestCase):
         h0, h1, h2 = ham_2q (las, las.mo_coeff)
         case_contract_op_si (self, las, h1, h2, las.ci, nelec_frs, smult_fr=smult_fr)
 
+    #@unittest.skip('debugging')
+    def test_contract_op_si_reset_ham (self):
+        h1, h2 = ham_2q (las, las.mo_coeff, veff_c=None, h2eff_sub=None)[1:]
+        rng = np.random.default_rng (3)
+        dh1 = rng.random (h1.shape)
+        h1_new = h1 + dh1 + dh1.T
+        h2_new = h2 + ao2mo.restore (1, ao2mo.restore (8, rng.random (h2.shape), las.ncas),
+                                     las.ncas)
+        x = (2 * rng.random (si.shape[0])) - 1
+        ops_ref = op_o1.gen_contract_op_si_hdiag (las, h1_new, h2_new, las.ci, nelec_frs)
+        make_ints = op_o1.frag.make_ints
+        ints = []
+        def make_ints_cache (*args, **kwargs):
+            if not len (ints): ints.append (make_ints (*args, **kwargs))
+            return ints[0]
+        hobj_cache = {}
+        with lib.temporary_env (op_o1.frag, make_ints=make_ints_cache):
+            ham_op = op_o1.gen_contract_op_si_hdiag (las, h1, h2, las.ci, nelec_frs,
+                                                     _hobj_cache=hobj_cache)[0]
+            hx_ref = ham_op (x)
+            ops_test = op_o1.gen_contract_op_si_hdiag (las, h1_new, h2_new, las.ci, nelec_frs,
+                                                       _hobj_cache=hobj_cache)
+        self.assertEqual (len (hobj_cache), 1)
+        self.assertIsNot (ops_test[0].parent, ham_op.parent)
+        self.assertIs (ops_test[0].parent.exc_2c, ham_op.parent.exc_2c)
+        with self.subTest ('old ham_op'):
+            self.assertAlmostEqual (lib.fp (ham_op (x)), lib.fp (hx_ref), 12)
+        for lbl, i in (('ham_op', 0), ('s2_op', 1), ('ovlp_op', 2)):
+            with self.subTest (lbl):
+                self.assertAlmostEqual (lib.fp (ops_test[i] (x)), lib.fp (ops_ref[i] (x)), 9)
+        with self.subTest ('hdiag'):
+            self.assertAlmostEqual (lib.fp (ops_test[3]), lib.fp (ops_ref[3]), 9)
+
+    #@unittest.skip('debugging')
+    def test_parallel_crunch (self):
+        h1, h2 = ham_2q (las, las.mo_coeff, veff_c=None, h2eff_sub=None)[1:]
+        si_ket = si
+        si_bra = np.roll (si, 1, axis=1)
+        x = (2 * rng1.random (si.shape[0])) - 1
+        def get_fps ():
+            fps = {}
+            d12 = make_stdm12s (las, opt=1)
+            fps['stdm1s'], fps['stdm2s'] = lib.fp (d12[0]), lib.fp (d12[1])
+            del d12
+            mats = op_o1.ham (las, h1, h2, las.ci, nelec_frs)[:3]
+            fps['ham'], fps['s2'], fps['ovlp'] = [lib.fp (mat) for mat in mats]
+            d12 = op_o1.roots_trans_rdm12s (las, las.ci, nelec_frs, si_bra, si_ket)
+            fps['rdm1s'], fps['rdm2s'] = lib.fp (d12[0]), lib.fp (d12[1])
+            ops = op_o1.gen_contract_op_si_hdiag (las, h1, h2, las.ci, nelec_frs)
+            fps['ham_op'], fps['s2_op'] = lib.fp (ops[0] (x)), lib.fp (ops[1] (x))
+            fps['hdiag'] = lib.fp (ops[3])
+            # ContractHamCI_CHC and ContractHamCI_SHS always crunch serially
+            hci = op_o1.contract_ham_ci (las, h1, h2, las.ci, nelec_frs)
+            fps['hci'] = sum ([lib.fp (h) for hci_r in hci for h in hci_r])
+            hci = op_o1.contract_ham_ci (las, h1, h2, las.ci, nelec_frs, si_bra=si_bra,
+                                         si_ket=si_ket)
+            fps['hci_si'] = sum ([lib.fp (h) for hci_r in hci for h in hci_r])
+            return fps
+        fps_ref = get_fps ()
+        with lib.temporary_env (op_o1.stdm.LSTDM, nworkers=2):
+            fps_test = get_fps ()
+        for key, fp in fps_ref.items ():
+            with self.subTest (key):
+                self.assertAlmostEqual (fps_test[key], fp, 9)
+
+    def test_batch_2c (self):
+        ints, lroots = op_o1.frag.make_ints (las, las.ci, nelec_frs)
+        log = lib.logger.new_logger (las, las.verbose)
+        outerprod = op_o1.stdm.LSTDM (ints, las.ncas_sub, lroots, log=log)
+        self.assertTrue (len (outerprod.exc_2c) > 0)
+        self.assertTrue (outerprod._crunch_2c_is_batched ())
+        fps = {}
+        for batch_2c in (True, False):
+            with lib.temporary_env (op_o1.stdm.LSTDM, batch_2c=batch_2c):
+                d12 = make_stdm12s (las, opt=1)
+            fps[batch_2c] = lib.fp (d12[0]), lib.fp (d12[1])
+            del d12
+        for lbl, fp_test, fp_ref in zip (('stdm1s', 'stdm2s'), fps[True], fps[False]):
+            with self.subTest (lbl):
+                self.assertAlmostEqual (fp_test, fp_ref, 9)
+
 
 if __name__ == "__main__":
     print("Full Tests for LASSI o1 4-fragment intermediates")
@@ -22,6 +22,7 @@ from pyscf.tools import molden
 from mrh.tests.lasscf.c2h4n4_struct import structure as struct
 from mrh.my_pyscf.mcscf.lasscf_o0 import LASSCF
 from mrh.my_pyscf.lassi.lassi import roots_make_rdm12s, root_make_rdm12s, make_stdm12s, ham_2q
+from mrh.my_pyscf.lassi.lassi import iter_stdm12s, roots_make_rdm1s
 from mrh.my_pyscf.lassi import LASSI, LASSIS
 from mrh.tests.lassi.addons import case_contract_hlas_ci, case_lassis_fbf_2_model_state
 from mrh.tests.lassi.addons import case_lassis_fbfdm, case_contract_op_si
@@ -110,6 +111,50 @@ class KnownValues(unittest.TestCase):
         self.assertAlmostEqual (lib.fp (rdm1s_test), lib.fp (rdm1s), 9)
         self.assertAlmostEqual (lib.fp (rdm2s_test), lib.fp (rdm2s), 9)
 
+    def test_tdms_blockwise (self):
+        las = lsi._las
+        stdm1s, stdm2s = make_stdm12s (las)
+        for blksize in (1, 3):
+            with self.subTest (blksize=blksize):
+                d1, d2 = np.zeros_like (stdm1s), np.zeros_like (stdm2s)
+                for bra, ket, d1s, d2s in iter_stdm12s (las, blksize=blksize):
+                    for i, a in enumerate (bra):
+                        d1[a][...,ket] = d1s[i]
+                        d2[a][...,ket] = d2s[i]
+                self.assertAlmostEqual (lib.fp (d1), lib.fp (stdm1s), 9)
+                self.assertAlmostEqual (lib.fp (d2), lib.fp (stdm2s), 9)
+            with self.subTest ('hdf5', blksize=blksize):
+                with lib.H5TmpFile () as f:
+                    d1, d2 = make_stdm12s (las, blksize=blksize, out=f)
+                    self.assertAlmostEqual (lib.fp (d1[()]), lib.fp (stdm1s), 9)
+                    self.assertAlmostEqual (lib.fp (d2[()]), lib.fp (stdm2s), 9)
+        with self.assertRaises (ValueError):
+            make_stdm12s (las, blksize=3)
+
+    def test_tdms_batch_tdm (self):
+        from mrh.my_pyscf.lassi.op_o1.frag import FragTDMInt
+        las = lsi._las
+        stdm1s, stdm2s = make_stdm12s (las)
+        with lib.temporary_env (FragTDMInt, batch_tdm=False):
+            d1, d2 = make_stdm12s (las)
+        self.assertAlmostEqual (lib.fp (d1), lib.fp (stdm1s), 9)
+        self.assertAlmostEqual (lib.fp (d2), lib.fp (stdm2s), 9)
+
+    def test_max_workers_si (self):
+        for davidson_only in (False, True):
+            with self.subTest (davidson_only=davidson_only):
+                lsi0 = LASSI (lsi._las, davidson_only=davidson_only).run ()
+                lsi1 = LASSI (lsi._las, davidson_only=davidson_only)
+                lsi1.max_workers_si = 3
+                lsi1.run ()
+                # Different OpenMP thread counts: equal only to within roundoff
+                self.assertAlmostEqual (lib.fp (lsi1.e_roots), lib.fp (lsi0.e_roots), 8)
+                self.assertAlmostEqual (lib.fp (lsi1.s2), lib.fp (lsi0.s2), 8)
+                # Invariant to the phase of each root and mixing of degenerate roots
+                proj1 = (lsi1.si * lsi1.e_roots[None,:]) @ lsi1.si.conj ().T
+                proj0 = (lsi0.si * lsi0.e_roots[None,:]) @ lsi0.si.conj ().T
+                self.assertAlmostEqual (lib.fp (proj1), lib.fp (proj0), 6)
+
     def test_rdms (self):
         las, e_roots = lsi._las, lsi.e_roots
         h0, h1, h2 = ham_2q (las, las.mo_coeff)
@@ -123,6 +168,9 @@ class KnownValues(unittest.TestCase):
         e_roots_test = h0 + np.tensordot (d1_r, h1, axes=2) + np.tensordot (d2_r, h2, axes=4) / 2
         for e1, e0 in zip (e_roots_test, e_roots):
             self.assertAlmostEqual (e1, e0, 8)
+        with self.subTest ('rdm1s only'):
+            rdm1s_test = roots_make_rdm1s (las, lsi.ci, lsi.si)
+            self.assertAlmostEqual (lib.fp (rdm1s_test), lib.fp (rdm1s), 9)
 
     def test_singles_constructor (self):
         from mrh.my_pyscf.lassi.spaces import all_single_excitations
@@ -175,6 +223,25 @@ class KnownValues(unittest.TestCase):
             las1.lasci ()
             lsis = LASSIS (las1).run (davidson_only=True, max_cycle_macro=1)
 
+    def test_lassis_scanner (self):
+        las1 = LASSCF (las._scf, (4,4), (4,4), spin_sub=(1,1))
+        las1.mo_coeff = las.mo_coeff
+        las1.lasci ()
+        lsis = LASSIS (las1).run ()
+        mol2 = struct (1.9, 1.9, '6-31g', symmetry=False)
+        mol2.verbose = 0
+        mol2.output = '/dev/null'
+        mol2.build ()
+        e_tot = []
+        for cached in (True, False):
+            with self.subTest (cached=cached):
+                lsi_scanner = lsis.copy ().as_scanner ()
+                if not cached:
+                    lsi_scanner._model_rootspaces = lsi_scanner._fbf_rootspaces = None
+                e_tot.append (lsi_scanner (mol2))
+                self.assertTrue (lsi_scanner.converged)
+        self.assertAlmostEqual (e_tot[1], e_tot[0], 6)
+
     def test_contract_hlas_ci (self):
         las, nelec_frs = lsi._las, lsi.get_nelec_frs ()
         h0, h1, h2 = lsi.ham_2q ()
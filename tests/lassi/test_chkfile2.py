@@ -16,6 +16,7 @@
 import copy
 import unittest
 import tempfile
+import h5py
 import numpy as np
 from pyscf.tools import molden
 from pyscf import gto, scf, lib, mcscf
@@ -23,7 +24,7 @@ from mrh.my_pyscf.mcscf.lasscf_o0 import LASSCF
 from mrh.my_pyscf import lassi
 
 def setUpModule():
-    global mf, lsi, lsi2
+    global mf, lsi, lsi2, mf_h4, lsis, lsis2, chkfile_h4
     xyz='''Li 0 0 0,
            H 2 0 0,
            Li 10 0 0,
@@ -43,10 +44,27 @@ def setUpModule():
         lsi2 = lassi.LASSIrq (las, r=2, q=2)
         lsi2.load_chk_(chkfile=chkfile.name)
 
+    # LASSIS, with spin-flip and charge-hop fragment basis functions
+    xyz='''H 0 0 0
+    H 1 0 0
+    H 3 0 0
+    H 4 0 0'''
+    mol = gto.M (atom=xyz, basis='sto3g', symmetry=False, verbose=0, output='/dev/null')
+    mf_h4 = scf.RHF (mol).run ()
+    chkfile_h4 = tempfile.NamedTemporaryFile ()
+    las = LASSCF (mf_h4, (2,2), (2,2), spin_sub=(1,1))
+    las.chkfile = chkfile_h4.name
+    las.kernel (las.localize_init_guess ([[0,1],[2,3]]))
+    lsis = lassi.LASSIS (las).run ()
+    las = LASSCF (mf_h4, (2,2), (2,2), spin_sub=(1,1))
+    lsis2 = lassi.LASSIS (las).load_chk_(chkfile=chkfile_h4.name)
+
 def tearDownModule():
-    global mf, lsi, lsi2
+    global mf, lsi, lsi2, mf_h4, lsis, lsis2, chkfile_h4
     mf.mol.stdout.close ()
-    del mf, lsi, lsi2
+    mf_h4.mol.stdout.close ()
+    chkfile_h4.close ()
+    del mf, lsi, lsi2, mf_h4, lsis, lsis2, chkfile_h4
 
 class KnownValues(unittest.TestCase):
     def test_config (self):
@@ -74,6 +92,91 @@ class KnownValues(unittest.TestCase):
             for j in range (lsi.nroots):
                 self.assertAlmostEqual (lib.fp (lsi.ci[i][j]), lib.fp (lsi2.ci[i][j]), 9)
 
+    def test_lassis_fbf (self):
+        for i in range (2):
+            for s in range (2):
+                with self.subTest ('spin flip', frag=i, s=s):
+                    ci0, ci1 = lsis.ci_spin_flips[i][s], lsis2.ci_spin_flips[i][s]
+                    self.assertEqual (ci0 is None, ci1 is None)
+                    if ci0 is not None: self.assertAlmostEqual (lib.fp (ci0), lib.fp (ci1), 9)
+            for a in range (2):
+                for s in range (4):
+                    for p in range (2):
+                        with self.subTest ('charge hop', frags=(i,a), s=s, p=p):
+                            ci0 = lsis.ci_charge_hops[i][a][s][p]
+                            ci1 = lsis2.ci_charge_hops[i][a][s][p]
+                            self.assertEqual (ci0 is None, ci1 is None)
+                            if ci0 is not None:
+                                self.assertAlmostEqual (lib.fp (ci0), lib.fp (ci1), 9)
+        self.assertTrue (np.any (lsis.sf_converged))
+        self.assertTrue (np.any (lsis.ch_converged))
+        self.assertListEqual (lsis.sf_converged.tolist (), lsis2.sf_converged.tolist ())
+        self.assertListEqual (lsis.ch_converged.tolist (), lsis2.ch_converged.tolist ())
+        self.assertListEqual (lsis.ch_disc_sval.tolist (), lsis2.ch_disc_sval.tolist ())
+        self.assertEqual (lsis.converged, lsis2.converged)
+        self.assertEqual (lsis.max_disc_sval, lsis2.max_disc_sval)
+
+    def test_lassis_fbf_memo (self):
+        # Repeated dump_fbf calls only rehash the fragment basis functions which were replaced
+        from mrh.my_pyscf.mcscf import chkfile as las_chkfile
+        from mrh.my_pyscf.lassi import chkfile as lsi_chkfile
+        ci_hash = las_chkfile.ci_hash
+        nhash = [0]
+        def counting_hash (ci):
+            nhash[0] += 1
+            return ci_hash (ci)
+        lsis3 = lsis.copy ()
+        lsis3._fbf_keys_memo = None
+        try:
+            las_chkfile.ci_hash = counting_hash
+            with tempfile.NamedTemporaryFile () as chkfile:
+                lsis3.dump_fbf (chkfile=chkfile.name)
+                self.assertGreater (nhash[0], 1)
+                nhash[0] = 0
+                lsis3.dump_fbf (chkfile=chkfile.name)
+                self.assertEqual (nhash[0], 0)
+                i, s = next ((i, s) for i in range (2) for s in range (2)
+                             if lsis3.ci_spin_flips[i][s] is not None)
+                lsis3.ci_spin_flips[i][s] = -lsis3.ci_spin_flips[i][s]
+                lsis3.dump_fbf (chkfile=chkfile.name)
+                self.assertEqual (nhash[0], 1)
+                lsis4 = lsi_chkfile.load_fbf_(lassi.LASSIS (lsis3._las), chkfile=chkfile.name)
+        finally:
+            las_chkfile.ci_hash = ci_hash
+        self.assertAlmostEqual (lib.fp (lsis4.ci_spin_flips[i][s]),
+                                lib.fp (lsis3.ci_spin_flips[i][s]), 9)
+
+    def test_lassis_results (self):
+        self.assertEqual (lsis.nroots, lsis2.nroots)
+        self.assertListEqual (list (lsis.entmaps), list (lsis2.entmaps))
+        self.assertListEqual (list(lsis.e_roots), list(lsis2.e_roots))
+        self.assertAlmostEqual (lib.fp (lsis.si), lib.fp (lsis2.si), 9)
+        for i in range (2):
+            for j in range (lsis.nroots):
+                self.assertAlmostEqual (lib.fp (lsis.ci[i][j]), lib.fp (lsis2.ci[i][j]), 9)
+        self.assertAlmostEqual (lsis2.energy_tot ()[0], lsis.e_roots[0], 9)
+
+    def test_lassis_restart (self):
+        # Only the charge hop marked unconverged in the chkfile should be reoptimized
+        with tempfile.NamedTemporaryFile () as chkfile:
+            lsis.dump_chk (chkfile=chkfile.name)
+            with h5py.File (chkfile.name, 'a') as fh5:
+                fh5['lsi/fbf/ch_converged'][0,1,:] = False
+            las = LASSCF (mf_h4, (2,2), (2,2), spin_sub=(1,1))
+            las.chkfile = chkfile.name
+            lsis3 = lassi.LASSIS (las).load_chk_()
+            ci_sf = [[c for c in ci_i] for ci_i in lsis3.ci_spin_flips]
+            ci_ch = lsis3.copy ().ci_charge_hops
+            lsis3.kernel ()
+        self.assertFalse (lsis3._fbf_from_chk)
+        self.assertAlmostEqual (lsis3.e_roots[0], lsis.e_roots[0], 8)
+        self.assertTrue (lsis3.ch_converged[0,1,3])
+        for i in range (2):
+            for s in range (2):
+                self.assertIs (lsis3.ci_spin_flips[i][s], ci_sf[i][s])
+        self.assertIs (lsis3.ci_charge_hops[1][0][3][0], ci_ch[1][0][3][0])
+        self.assertIsNot (lsis3.ci_charge_hops[0][1][3][0], ci_ch[0][1][3][0])
+
 if __name__ == "__main__":
     print("Full Tests for LASSCF chkfile")
     unittest.main()
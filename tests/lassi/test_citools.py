@@ -49,6 +49,46 @@ def case_umat_dot_1frag (ks, rng, nroots, nfrags, nvecs, lroots):
     ks.assertAlmostEqual (lib.fp (UUsiT), lib.fp (si0.conj ().T))
     return
 
+def case_get_unique_roots (ks, rng, nroots, screen_linequiv):
+    from mrh.tests.lassi.addons import random_orthrows
+    ndet, nelec_choices = 12, [(2,1),(1,2)]
+    ci, nelec_r, disc = [], [], []
+    for i in range (nroots):
+        mode = rng.integers (6) if i else 0
+        j = rng.integers (i) if i else 0
+        if mode == 0: # new space
+            lr = rng.integers (1, high=4)
+            ci.append (random_orthrows (lr, ndet, rng=rng).reshape (lr,3,4))
+            nelec_r.append (nelec_choices[rng.integers (2)])
+            disc.append (rng.integers (2))
+        elif mode == 1: # non-orthonormal space
+            lr = rng.integers (1, high=4)
+            ci.append (rng.random ((lr,3,4)))
+            nelec_r.append (nelec_choices[rng.integers (2)])
+            disc.append (rng.integers (2))
+        else:
+            lr = ci[j].shape[0]
+            if mode == 2: # same object
+                ci.append (ci[j])
+            elif mode == 3: # copy
+                ci.append (ci[j].copy ())
+            elif mode == 4: # view
+                ci.append (ci[j].reshape (lr,3,4)[:,:,:])
+            elif mode == 5: # rotated copy
+                umat = linalg.qr (rng.random ((lr,lr)))[0]
+                ci.append (np.tensordot (umat, ci[j], axes=1))
+            nelec_r.append (nelec_r[j] if rng.random () < 0.8 else nelec_choices[rng.integers (2)])
+            disc.append (disc[j] if rng.random () < 0.8 else rng.integers (2))
+    ref = citools.get_unique_roots_slow (ci, nelec_r, screen_linequiv=screen_linequiv,
+                                         discriminator=disc)
+    test = citools.get_unique_roots (ci, nelec_r, screen_linequiv=screen_linequiv,
+                                     discriminator=disc)
+    ks.assertTrue (np.all (test[0] == ref[0]))
+    ks.assertTrue (np.all (test[1] == ref[1]))
+    ks.assertEqual (sorted (test[2].keys ()), sorted (ref[2].keys ()))
+    for key in ref[2]:
+        ks.assertAlmostEqual (lib.fp (test[2][key]), lib.fp (ref[2][key]), 9)
+
 class KnownValues(unittest.TestCase):
 
     def test_umat_dot_1frag (self):
@@ -58,6 +98,12 @@ class KnownValues(unittest.TestCase):
             with self.subTest (nroots=nroots, nfrags=nfrags, nvecs=nvecs, lroots=lroots):
                 case_umat_dot_1frag (self, rng, nroots, nfrags, nvecs, lroots)
 
+    def test_get_unique_roots (self):
+        for nroots, screen_linequiv in itertools.product ((1,2,5,20,60), (True,False)):
+            for i in range (5):
+                with self.subTest (nroots=nroots, screen_linequiv=screen_linequiv, sample=i):
+                    case_get_unique_roots (self, rng, nroots, screen_linequiv)
+
 if __name__ == "__main__":
     print("Full Tests for LASSI citools module functions")
     unittest.main()
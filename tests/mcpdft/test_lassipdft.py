@@ -1,4 +1,5 @@
 import unittest
+import numpy as np
 from pyscf import lib, gto, scf
 from mrh.my_pyscf.mcscf.lasscf_o0 import LASSCF
 from mrh.my_pyscf.lassi import LASSI
@@ -42,6 +43,119 @@ class KnownValues(unittest.TestCase):
                 lsipdft.kernel()
                 self.assertAlmostEqual (lsipdft.e_tot[0], mc.e_tot, 7)
 
+    def test_stream_ontop (self):
+        mol = gto.M (atom='H 0 0 0; H 1 0 0; H 3 0 0; H 4 0 0', basis='sto3g', symmetry=False,
+                     verbose=0, output='/dev/null')
+        mf = scf.RHF (mol).run ()
+        las = LASSCF (mf, (2,2), (2,2), spin_sub=(1,1))
+        las.lasci ()
+        las1 = all_single_excitations (las)
+        las1.lasci ()
+        lsi = LASSI (las1).run ()
+        from mrh.my_pyscf import mcpdft
+        for fnal in ('tPBE', 'ftPBE', 'tPBE0', 'MC23'):
+            e_tot = []
+            for stream_ontop in (False, True):
+                lsipdft = mcpdft.LASSI (lsi, fnal)
+                lsipdft.stream_ontop = stream_ontop
+                lsipdft.kernel ()
+                e_tot.append (lsipdft.e_tot)
+            with self.subTest (fnal=fnal):
+                self.assertAlmostEqual (lib.fp (e_tot[1]), lib.fp (e_tot[0]), 9)
+
+    def test_lpdft_davidson (self):
+        xyz='''H 0 0 0
+               H 1 0 0
+               H 3 0 0
+               H 4 0 0'''
+        mol = gto.M (atom=xyz, basis='sto3g', symmetry=False, verbose=0, output='/dev/null')
+        mf = scf.RHF (mol).run ()
+        las = LASSCF (mf, (2,2), (2,2), spin_sub=(1,1))
+        las.lasci ()
+        las1 = las
+        for i in range (2): las1 = all_single_excitations (las1)
+        charges, spins, smults, wfnsyms = get_space_info (las1)
+        lroots = 4 - smults
+        idx = (charges!=0) & (lroots==3)
+        lroots[idx] = 1
+        las1.conv_tol_grad = las.conv_tol_self = 9e99
+        las1.lasci (lroots=lroots.T)
+        lsi = LASSI (las1).run ()
+        # LASSI solved for only 5 of the 36 product states. Its singlet guesses only converge to
+        # singlets, and so do the L-PDFT Davidson guesses taken from its SI vectors
+        lsi_dav = LASSI (las1).set (davidson_only=True, nroots_si=5, pspace_size_si=20).run ()
+        from mrh.my_pyscf import mcpdft
+        with self.subTest ('tPBE0 nroots_si < nprods'):
+            lsipdft = mcpdft.LASSI (lsi_dav, 'tPBE0', states=[0,1,2]).multi_state ()
+            with self.assertRaises (NotImplementedError):
+                lsipdft.kernel ()
+        for lbl, fnal, my_lsi in (('tPBE', 'tPBE', lsi), ('tPBE0', 'tPBE0', lsi),
+                                  ('tPBE nroots_si < nprods', 'tPBE', lsi_dav)):
+            results = []
+            for davidson_only in (False, True):
+                lsipdft = mcpdft.LASSI (my_lsi, fnal, states=[0,1,2]).multi_state ()
+                lsipdft.davidson_only = davidson_only
+                lsipdft.pspace_size_si = 20
+                lsipdft.kernel ()
+                results.append (lsipdft)
+            with self.subTest (lbl):
+                self.assertEqual (results[0].si_pdft.shape, (36,36))
+                self.assertEqual (results[1].si_pdft.shape, (36,3))
+                self.assertIsNone (results[1].lpdft_ham)
+                idx_ref = np.arange (36)
+                if my_lsi is lsi_dav: idx_ref = np.where (results[0].s2_roots < 1)[0]
+                for i, j in enumerate (idx_ref[:3]):
+                    self.assertAlmostEqual (results[1].e_states[i], results[0].e_states[j], 7)
+                    ovlp = np.dot (results[1].si_pdft[:,i], results[0].si_pdft[:,j])
+                    self.assertAlmostEqual (abs (ovlp), 1.0, 6)
+        # Davidson for only the first symmetry block with at least 3 states; incore for the rest
+        from mrh.my_pyscf.mcpdft import _lpdft
+        nprods_blks = []
+        def _eig_block_memcheck (las, nprods, *args):
+            nprods_blks.append (nprods)
+            if nprods >= 3 and sum ([n >= 3 for n in nprods_blks]) == 1:
+                return False, 0
+            return _lpdft._eig_block_memcheck (las, nprods, *args)
+        lsipdft = mcpdft.LASSI (lsi, 'tPBE', states=[0,1,2]).multi_state ()
+        lsipdft.pspace_size_si = 20
+        with lib.temporary_env (_lpdft, _eig_block_memcheck=_eig_block_memcheck):
+            lsipdft.kernel ()
+        with self.subTest ('mixed incore and Davidson blocks'):
+            self.assertGreater (len (nprods_blks), 1)
+            self.assertIsNone (lsipdft.lpdft_ham)
+            self.assertEqual (lsipdft.si_pdft.shape[0], 36)
+            e_ref = mcpdft.LASSI (lsi, 'tPBE', states=[0,1,2]).multi_state ().kernel ()[1]
+            for i in range (3):
+                self.assertAlmostEqual (lsipdft.e_states[i], e_ref[i], 7)
+
+    def test_rdmstore (self):
+        import tempfile
+        from mrh.my_pyscf.mcpdft.laspdft import RDMStore
+        ncas = 3
+        rng = np.random.default_rng (0)
+        dms = [(rng.random ((2,ncas,ncas)), rng.random ((ncas,)*4)) for i in range (4)]
+        nbytes = sum (dm.nbytes for dm in dms[0])
+        with tempfile.NamedTemporaryFile (dir=lib.param.TMPDIR) as ftmp:
+            store = RDMStore (ftmp.name, max_memory=2.5*nbytes/1e6)
+            for i, (dm1s, dm2) in enumerate (dms): store.put (i, dm1s, dm2)
+            with self.subTest ('LRU'):
+                self.assertEqual (list (store._cache.keys ()), [2,3])
+                store.get (2)
+                store.get (0)
+                self.assertEqual (list (store._cache.keys ()), [2,0])
+            for i, (dm1s, dm2) in enumerate (dms):
+                with self.subTest (state=i):
+                    self.assertAlmostEqual (lib.fp (store.get_casdm1s (i)), lib.fp (dm1s), 12)
+                    self.assertAlmostEqual (lib.fp (store.get_casdm2 (i)), lib.fp (dm2), 12)
+            with self.subTest ('copies'):
+                store.get_casdm1s (0)[:] = 0
+                self.assertAlmostEqual (lib.fp (store.get_casdm1s (0)), lib.fp (dms[0][0]), 12)
+            store.close ()
+            with self.subTest ('reopen'):
+                self.assertEqual (len (store._cache), 0)
+                self.assertAlmostEqual (lib.fp (store.get_casdm2 (1)), lib.fp (dms[1][1]), 12)
+            store.close ()
+
 if __name__ == "__main__":
     print("Full Tests for LASSI-PDFT")
     unittest.main()
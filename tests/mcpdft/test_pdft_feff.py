@@ -70,6 +70,26 @@ class KnownValues(unittest.TestCase):
                         case (self, mc, mol, state, fnal)
 
 
+    def test_grid_pipeline (self):
+        mc = mcpdft.CASSCF (lih, 'tPBE', 2, 2, grids_level=1).run ()
+        np.random.seed (0)
+        nmo = mc.mo_coeff.shape[1]
+        x = mc.unpack_uniq_var (np.random.rand (*mc.pack_uniq_var (
+            np.zeros ((nmo,nmo))).shape) * 1e-2)
+        hop_ref = EotOrbitalHessianOperator (mc, cache_grid=False)
+        dg_ref, de_ref = hop_ref (x)
+        hop = EotOrbitalHessianOperator (mc, max_workers=2)
+        with temporary_env (hop, get_blocksize=lambda: 112):
+            for i in range (2): # 2nd call uses the cached grid blocks
+                dg_test, de_test = hop (x)
+                with self.subTest (call=i):
+                    self.assertTrue (hop.cache_grid)
+                    self.assertEqual (len (hop._grid_cache),
+                                      len (hop._grid_blocks))
+                    self.assertAlmostEqual (lib.fp (dg_test), lib.fp (dg_ref), 9)
+                    self.assertAlmostEqual (de_test, de_ref, 9)
+
+
 if __name__ == "__main__":
     print("Full Tests for MC-PDFT second fnal derivatives")
     unittest.main()
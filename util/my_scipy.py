@@ -1,13 +1,19 @@
 from scipy.sparse import linalg as sparse_linalg
 
 class CallbackLinearOperator (sparse_linalg.LinearOperator):
-    def __init__(self, parent, shape, dtype=None, matvec=None):
+    def __init__(self, parent, shape, dtype=None, matvec=None, matmat=None):
         self.parent = parent
         self.shape = shape 
         self.dtype = dtype   
         self._matvec_fn = matvec
+        self._matmat_fn = matmat
                              
     def _matvec (self, x):   
         # Just to shut up the stupid warning
         return self._matvec_fn (x)
 
+    def _matmat (self, X):
+        # If provided, matmat acts on all columns of X at once
+        if self._matmat_fn is None: return super ()._matmat (X)
+        return self._matmat_fn (X)
+